@@ -1,3 +1,5 @@
+from collections import deque
+
 from discord.player import AudioSource
 from discord.opus import Encoder
 
@@ -19,3 +21,23 @@ class PCMByteBufferAudio(AudioSource):
         if len(ret) != Encoder.FRAME_SIZE:
             return b""
         return ret
+
+
+class OpusPacketAudio(AudioSource):
+    """
+    Represents 20ms 48KHz Opus packets, sent to Discord without decoding them.
+    """
+
+    def __init__(self) -> None:
+        self.stream: deque = deque()
+
+    def write(self, packet: bytes) -> None:
+        self.stream.append(packet)
+
+    def read(self) -> bytes:
+        if not self.stream:
+            return b""
+        return self.stream.popleft()
+
+    def is_opus(self) -> bool:
+        return True
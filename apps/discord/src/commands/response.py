@@ -3,6 +3,7 @@ import logging
 import requests
 from .base import BaseCommandGroup
 from utils.config import config
+from utils.helper.audio import DISCORD_CH, DISCORD_SR, DISCORD_SW
 
 
 # Grouping of slash commands into a command list
@@ -21,7 +22,12 @@ async def request_response(interaction, output_audio: bool = False) -> None:
         response = requests.post(
             config.jaison_api_endpoint + "/api/response",
             headers={"Content-type": "application/json"},
-            json={"include_audio": output_audio},
+            json={
+                "include_audio": output_audio,
+                # Same as voice responses, so the bot can play either
+                "audio_format": {"sr": DISCORD_SR, "sw": DISCORD_SW, "ch": DISCORD_CH},
+                "codec": config.audio_codec,
+            },
         )
         if response.status_code != 200:
             raise Exception("{} {}".format(response.status_code, response.reason))
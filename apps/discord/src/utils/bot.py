@@ -25,12 +25,13 @@ from enum import Enum, auto
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from commands import add_commands
 from audio.sink import BufferSink, UserAudioBuffer
-from audio.source import PCMByteBufferAudio
+from audio.source import OpusPacketAudio, PCMByteBufferAudio
 from utils.config import config
-from utils.helper.audio import format_audio
+from utils.helper.audio import DISCORD_CH, DISCORD_SR, DISCORD_SW, format_audio
 from utils.time import get_current_time
 
 AUDIO_PACKET_SIZE = 4096
+AUDIO_BATCH_WINDOW = 0.2  # Seconds to wait for others who stop speaking at once
 
 
 class ConnectionState(Enum):
@@ -107,7 +108,7 @@ class DiscordBot(discord.Client):
         self.audio_output_job_id: Optional[str] = None
         self.audio_output_complete_event: Optional[asyncio.Event] = None
         self.audio_player_task: Optional[asyncio.Task] = None
-        self.audio_output: Optional[PCMByteBufferAudio] = None
+        self.audio_output: Optional[discord.AudioSource] = None
         self.audio_ready: Optional[asyncio.Event] = None
 
         self.response_request_id: int = 0
@@ -185,7 +186,12 @@ class DiscordBot(discord.Client):
         self.audio_output_complete_event.set()
 
         self.audio_player_task = asyncio.create_task(self._play_audio_loop())
-        self.audio_output = PCMByteBufferAudio()
+        # Opus packets from JAIson are played as they are, without re-encoding
+        self.audio_output = (
+            OpusPacketAudio()
+            if self.config.audio_codec == "opus"
+            else PCMByteBufferAudio()
+        )
         self.audio_ready = asyncio.Event()
 
         self._is_healthy = True
@@ -325,23 +331,44 @@ class DiscordBot(discord.Client):
 
     async def _input_audio_loop(self) -> None:
         """Process incoming audio from voice chat asynchronously."""
+        next_d = None
         while True:
             try:
-                input_d = await self.audio_input_queue.get()
+                input_d = next_d or await self.audio_input_queue.get()
+                next_d = None
                 if input_d["type"] == "audio_input":
+                    # Speakers who finish together are transcribed together
+                    batch = [input_d]
+                    try:
+                        while True:
+                            next_d = await asyncio.wait_for(
+                                self.audio_input_queue.get(), AUDIO_BATCH_WINDOW
+                            )
+                            if next_d["type"] != "audio_input":
+                                break
+                            batch.append(next_d)
+                            next_d = None
+                    except asyncio.TimeoutError:
+                        pass
+
                     response = requests.post(
                         self.config.jaison_api_endpoint
-                        + "/api/context/conversation/audio",
+                        + "/api/context/conversation/audio/batch",
                         headers={"Content-type": "application/json"},
                         json={
-                            "user": input_d["name"],
-                            "timestamp": input_d["timestamp"],
-                            "audio_bytes": base64.b64encode(
-                                input_d["audio_bytes"]
-                            ).decode("utf-8"),
-                            "sr": input_d["sr"],
-                            "sw": input_d["sw"],
-                            "ch": input_d["ch"],
+                            "segments": [
+                                {
+                                    "user": audio_d["name"],
+                                    "timestamp": audio_d["timestamp"],
+                                    "audio_bytes": base64.b64encode(
+                                        audio_d["audio_bytes"]
+                                    ).decode("utf-8"),
+                                    "sr": audio_d["sr"],
+                                    "sw": audio_d["sw"],
+                                    "ch": audio_d["ch"],
+                                }
+                                for audio_d in batch
+                            ]
                         },
                     ).json()
 
@@ -356,7 +383,16 @@ class DiscordBot(discord.Client):
                         response = requests.post(
                             self.config.jaison_api_endpoint + "/api/response",
                             headers={"Content-type": "application/json"},
-                            json={"include_audio": True},
+                            json={
+                                "include_audio": True,
+                                "codec": self.config.audio_codec,
+                                # Audio arrives ready to play, with no conversion here
+                                "audio_format": {
+                                    "sr": DISCORD_SR,
+                                    "sw": DISCORD_SW,
+                                    "ch": DISCORD_CH,
+                                },
+                            },
                         ).json()
 
                         if response["status"] != 200:
@@ -395,6 +431,11 @@ class DiscordBot(discord.Client):
         self.audio_output.write(audio)
         self.audio_ready.set()
 
+    async def queue_packets(self, job_id, packets: List[Dict[str, Any]]):
+        for packet in packets:
+            self.audio_output.write(base64.b64decode(packet["data"]))
+        self.audio_ready.set()
+
     async def _play_audio_loop(self) -> None:
         """Continuously play audio from the output buffer when available."""
         while True:
@@ -512,6 +553,8 @@ class DiscordBot(discord.Client):
                     self.job_data[job_id]["text_content"] += " " + result["content"]
 
                 # Queue audio for playback
+                if "packets" in result:
+                    await self.queue_packets(job_id, result["packets"])
                 if "audio_bytes" in result:
                     await self.queue_audio(
                         job_id,
@@ -10,9 +10,11 @@ class Config:
         self.jaison_ws_endpoint = self.config["jaison-ws-endpoint"]
         self.opus_filepath = self.config["opus-filepath"]
         self.idle_interval = self.config["idle-interval"]
+        self.audio_codec = self.config.get("audio-codec", "opus")
         assert self.jaison_api_endpoint is not None
         assert self.jaison_ws_endpoint is not None
         assert self.idle_interval >= 0
+        assert self.audio_codec in ["pcm", "opus"]
 
 
 config = Config()
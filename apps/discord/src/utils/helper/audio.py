@@ -1,30 +1,42 @@
 import numpy as np
-import io
+
+DISCORD_SR = 48000
+DISCORD_SW = 2
+DISCORD_CH = 2
+
+# Sample width: (dtype, offset of silence, full scale), same as the core's PCM helpers
+SAMPLE_FORMATS = {
+    1: (np.dtype("u1"), 128, 128.0),
+    2: (np.dtype("<i2"), 0, 32768.0),
+    4: (np.dtype("<i4"), 0, 2147483648.0),
+}
 
 
 def format_audio(str_bytes, src_sr, src_sw, src_channels):
-    dtype = np.dtype(f"i{src_sw}")
-    audio_array = np.frombuffer(str_bytes, dtype=dtype)  # parse bytes
-    audio_array = (
-        audio_array.reshape([int(audio_array.shape[0] / src_channels), src_channels])
-        / src_channels
-    ).sum(
-        1
-    )  # average across channels into 1 channel
-    audio_array = np.interp(
-        np.arange(0, len(audio_array), float(src_sr) / 48000),
-        np.arange(0, len(audio_array)),
-        audio_array,
-    )  # resample
-    audio_array = audio_array.flatten().repeat(2)  # Discord wants 2 channel audio
-    match src_sw:  # Rescale volume
-        case 1:
-            audio_array = audio_array.astype(np.int16) * 256
-        case 2:
-            audio_array = audio_array.astype(np.int16)
-        case 4:
-            audio_array = (audio_array / 65536).astype(np.int16)
-        case _:
-            raise Exception("Invalid sample width given: {src_sw}")
+    if (src_sr, src_sw, src_channels) == (DISCORD_SR, DISCORD_SW, DISCORD_CH):
+        return str_bytes  # Already what Discord plays
+    if src_sw not in SAMPLE_FORMATS:
+        raise Exception(f"Invalid sample width given: {src_sw}")
+    dtype, offset, scale = SAMPLE_FORMATS[src_sw]
+
+    # Parse bytes (8-bit audio is unsigned)
+    sample_count = len(str_bytes) // (src_sw * src_channels)
+    samples = np.frombuffer(str_bytes, dtype=dtype, count=sample_count * src_channels)
+    audio_array = samples.astype(np.float32)
+    if offset:
+        audio_array -= offset
+
+    # Average across channels into 1 channel
+    audio_array = audio_array.reshape(-1, src_channels).mean(axis=1)
+    if src_sr != DISCORD_SR:
+        # Resample
+        positions = np.arange(0, sample_count, src_sr / DISCORD_SR, dtype=np.float32)
+        audio_array = np.interp(
+            positions, np.arange(sample_count, dtype=np.float32), audio_array
+        ).astype(np.float32)
 
-    return audio_array.tobytes()
+    audio_array *= 32768 / scale  # Rescale volume to 16 bits
+    np.rint(audio_array, out=audio_array)
+    np.clip(audio_array, -32768, 32767, out=audio_array)
+    # Discord wants 2 channel audio
+    return audio_array.astype(np.int16).repeat(DISCORD_CH).tobytes()
@@ -0,0 +1,121 @@
+"""
+Benchmark PCM conversion throughput
+
+Converts a few seconds of 16-bit audio between the formats seen in the pipeline and
+reports throughput in MB/s of input PCM, streamed in TTS-sized chunks. Compares the
+previous Discord conversion (channel sum and np.interp over float64) with the core
+conversion helpers.
+
+Run from the project root: python benchmarks/bench_audio_convert.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import numpy as np
+
+from utils.helpers.audio import (
+    AudioConverter,
+    Resampler,
+    from_float,
+    mix_channels,
+    to_float,
+)
+
+SECONDS = 10
+CHUNK_MS = 200
+REPEATS = 3
+# (sr, ch) in, (sr, ch) out
+CONVERSIONS = [
+    ((24000, 1), (48000, 2)),  # OpenAI TTS to Discord
+    ((44100, 1), (48000, 2)),  # Melo to Discord
+    ((48000, 2), (16000, 1)),  # Discord voice to RVC or STT
+    ((22050, 1), (16000, 1)),
+]
+
+
+def legacy_format_audio(str_bytes, src_sr, src_sw, src_channels):
+    dtype = np.dtype(f"i{src_sw}")
+    audio_array = np.frombuffer(str_bytes, dtype=dtype)
+    audio_array = (
+        audio_array.reshape([int(audio_array.shape[0] / src_channels), src_channels])
+        / src_channels
+    ).sum(1)
+    audio_array = np.interp(
+        np.arange(0, len(audio_array), float(src_sr) / 48000),
+        np.arange(0, len(audio_array)),
+        audio_array,
+    )
+    audio_array = audio_array.flatten().repeat(2)
+    return audio_array.astype(np.int16).tobytes()
+
+
+def audio(sr: int, ch: int) -> bytes:
+    rng = np.random.default_rng(0)
+    return from_float(rng.uniform(-0.5, 0.5, (sr * SECONDS, ch)), 2)
+
+
+def chunks(ab: bytes, sr: int, ch: int):
+    size = int(sr * CHUNK_MS / 1000) * 2 * ch
+    return [ab[i : i + size] for i in range(0, len(ab), size)]
+
+
+def throughput(fn, size: int) -> float:
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / best / 1e6
+
+
+def report(name: str, mbps: float):
+    print("{:<36} {:>8.1f} MB/s".format(name, mbps))
+
+
+def main():
+    ab = audio(48000, 2)
+    x = to_float(ab, 2, 2)
+    out = np.empty_like(x)
+    report("to_float", throughput(lambda: to_float(ab, 2, 2), len(ab)))
+    report("to_float (out=)", throughput(lambda: to_float(ab, 2, 2, out=out), len(ab)))
+    report("from_float", throughput(lambda: from_float(x, 2), len(ab)))
+    report("mix_channels", throughput(lambda: mix_channels(x, 1), len(ab)))
+    print()
+
+    for (sr, ch), (to_sr, to_ch) in CONVERSIONS:
+        ab = audio(sr, ch)
+        pieces = chunks(ab, sr, ch)
+        name = "{} Hz x{} -> {} Hz x{}".format(sr, ch, to_sr, to_ch)
+
+        def resample_only():
+            resampler = Resampler(sr, to_sr, ch)
+            for piece in pieces:
+                resampler.process(to_float(piece, 2, ch))
+            resampler.flush()
+
+        def convert():
+            converter = AudioConverter(sr, 2, ch, to_sr, 2, to_ch)
+            for piece in pieces:
+                converter.process(piece)
+            converter.flush()
+
+        report(name + " resample", throughput(resample_only, len(ab)))
+        report(name + " convert", throughput(convert, len(ab)))
+        if (to_sr, to_ch) == (48000, 2):
+
+            def legacy():
+                for piece in pieces:
+                    legacy_format_audio(piece, sr, 2, ch)
+
+            report(name + " legacy", throughput(legacy, len(ab)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark websocket audio bandwidth and encoding speed per codec
+
+Encodes a few seconds of 48 kHz stereo (what Discord asks for) and 24 kHz mono audio in
+TTS-sized chunks, and reports the size of the JSON events sent to clients per second of
+audio and how much faster than real time encoding runs. Opus and FLAC need PyAV.
+
+Run from the project root: python benchmarks/bench_codec.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import numpy as np
+
+from utils.helpers.audio import AudioFormat, from_float
+from utils.helpers.codec import CODECS, encoder_format, open_encoder, packet_events
+
+SECONDS = 10
+CHUNK_MS = 200
+FORMATS = [AudioFormat(48000, 2, 2), AudioFormat(24000, 2, 1)]
+
+
+def speech_like(fmt: AudioFormat) -> bytes:
+    """Harmonics under a syllable-rate envelope, which compresses like speech"""
+    t = np.arange(fmt.sr * SECONDS) / fmt.sr
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / fmt.sr
+    x = sum(np.sin(k * phase) / k for k in range(1, 8))
+    x *= 0.3 * np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    x += np.random.default_rng(0).normal(0, 0.002, len(t))
+    return from_float(np.repeat(x[:, None], fmt.ch, axis=1), fmt.sw)
+
+
+def run(codec: str, fmt: AudioFormat, ab: bytes):
+    fmt = encoder_format(codec, fmt)
+    size = int(fmt.sr * CHUNK_MS / 1000) * fmt.sw * fmt.ch
+    start = time.perf_counter()
+    encoder = open_encoder(codec, fmt)
+    packets = list()
+    for i in range(0, len(ab), size):
+        packets.extend(encoder.encode(ab[i : i + size], fmt))
+    packets.extend(encoder.flush())
+    elapsed = time.perf_counter() - start
+
+    wire = sum(len(json.dumps(result)) for result in packet_events(codec, fmt, packets))
+    return wire / SECONDS, SECONDS / elapsed
+
+
+def main():
+    for fmt in FORMATS:
+        ab = speech_like(fmt)
+        baseline = None
+        print(fmt)
+        for codec in CODECS:
+            try:
+                per_second, speed = run(codec, fmt, ab)
+            except ImportError:
+                print("  {:<6} skipped, PyAV not installed".format(codec))
+                continue
+            baseline = baseline or per_second
+            print(
+                "  {:<6} {:>8.1f} kB/s on the wire ({:>5.1f}x less), {:>6.0f}x real time".format(
+                    codec, per_second / 1000, baseline / per_second, speed
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark per-sentence overhead of the text filter pipeline against chain length
+
+Compares the nested generator tower (OperationManager._use_filter over
+Operation.__call__) with the compiled FilterTextChain, using trivial pure-Python
+filters so the measurement is dominated by pipeline overhead.
+
+Run from the project root: python benchmarks/bench_filter_chain.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from utils.operations.manager import OperationManager
+from utils.operations.filter_text.base import FilterTextOperation
+from utils.operations.filter_text.chain import FilterTextChain
+
+CHAIN_LENGTHS = [1, 2, 4, 8, 16]
+SENTENCE_COUNT = 2000
+SENTENCE = "This is a perfectly ordinary sentence for the filters to pass along."
+
+
+class PassthroughFilter(FilterTextOperation):
+    def __init__(self, idx: int):
+        super().__init__("passthrough_{}".format(idx))
+        self.active = True
+
+    def _apply(self, record):
+        record["content"] = record["content"].strip()
+
+    async def _generate(self, content: str = None, **kwargs):
+        yield {"content": content.strip()}
+
+
+async def bench_nested(filters) -> float:
+    manager = OperationManager()
+    start = time.perf_counter()
+    for _ in range(SENTENCE_COUNT):
+        async for _ in manager._use_filter(filters, 0, {"content": SENTENCE}):
+            pass
+    return (time.perf_counter() - start) / SENTENCE_COUNT * 1e6
+
+
+async def bench_chain(filters) -> float:
+    chain = FilterTextChain(filters)
+    start = time.perf_counter()
+    for _ in range(SENTENCE_COUNT):
+        async for _ in chain({"content": SENTENCE}):
+            pass
+    return (time.perf_counter() - start) / SENTENCE_COUNT * 1e6
+
+
+async def main():
+    print(f"Per-sentence overhead over {SENTENCE_COUNT} sentences")
+    for length in CHAIN_LENGTHS:
+        filters = [PassthroughFilter(i) for i in range(length)]
+        nested = await bench_nested(filters)
+        chained = await bench_chain(filters)
+        print(
+            f"{length:>2} filters: {nested:8.1f} us nested, {chained:8.1f} us chain "
+            f"({nested / chained:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark memory recall latency at 100k memories
+
+Fills a memory index with clustered random vectors, the way embeddings of conversation
+cluster around topics, and reports search latency when searched exhaustively and through
+the inverted file, along with how many of the exhaustive top 5 the inverted file finds.
+Dimensions match the local (384) and OpenAI (1536) embedding models.
+
+Run from the project root: python benchmarks/bench_memory.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import numpy as np
+
+from utils.memory.index import VectorIndex, normalize
+
+MEMORIES = 100_000
+TOPICS = 2000
+QUERIES = 200
+TOP_K = 5
+ADD_BATCH = 10_000
+
+
+def clustered(rng: np.random.Generator, count: int, dims: int) -> np.ndarray:
+    topics = normalize(rng.normal(size=(TOPICS, dims)))
+    x = topics[rng.integers(TOPICS, size=count)] + rng.normal(
+        0, 0.6 / np.sqrt(dims), size=(count, dims)
+    )
+    return normalize(x)
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray):
+    results, times = list(), list()
+    for query in queries:
+        start = time.perf_counter()
+        results.append([item["id"] for _, item in index.search(query, TOP_K)])
+        times.append((time.perf_counter() - start) * 1000)
+    return results, np.array(times)
+
+
+def run(dims: int):
+    rng = np.random.default_rng(0)
+    vectors = clustered(rng, MEMORIES + QUERIES, dims)
+    memories, queries = vectors[:MEMORIES], vectors[MEMORIES:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(directory, ivf_threshold=MEMORIES + 1)
+        start = time.perf_counter()
+        for i in range(0, MEMORIES, ADD_BATCH):
+            index.add(
+                memories[i : i + ADD_BATCH],
+                [{"id": j} for j in range(i, min(i + ADD_BATCH, MEMORIES))],
+            )
+        added = time.perf_counter() - start
+        exact, flat_ms = timed_search(index, queries)
+
+        start = time.perf_counter()
+        index._train()
+        trained = time.perf_counter() - start
+        found, ivf_ms = timed_search(index, queries)
+
+    recall = np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(exact, found)])
+    print("{} dimensions, {} memories".format(dims, MEMORIES))
+    print("  added in {:.2f} s, clustered in {:.2f} s".format(added, trained))
+    for name, ms in [("flat", flat_ms), ("ivf", ivf_ms)]:
+        print(
+            "  {:<4} p50 {:>6.2f} ms  p99 {:>6.2f} ms".format(
+                name, np.percentile(ms, 50), np.percentile(ms, 99)
+            )
+        )
+    print("  ivf recall@{} {:.3f}".format(TOP_K, recall))
+
+
+def main():
+    for dims in [384, 1536]:
+        run(dims)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark pitch shifting of synthesized speech
+
+Shifts sentences of audio by a few semi-tones and reports the time spent per second of
+audio. Compares the previous approach (an ffmpeg subprocess per sentence) with the
+native NumPy shifter, on whole sentences and on TTS-sized chunks of them.
+
+Run from the project root: python benchmarks/bench_pitch.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import ffmpeg
+import numpy as np
+
+from utils.helpers.audio import from_float
+from utils.helpers.pitch import PitchShifter
+
+SENTENCE_COUNT = 20
+SENTENCE_SECONDS = 3
+SR, SW, CH = 24000, 2, 1
+PITCH_AMOUNT = 3
+CHUNK_MS = 200
+RAW_FORMATS = {1: "u8", 2: "s16le", 4: "s32le"}
+
+
+def sentence() -> bytes:
+    # Harmonics with a gliding pitch, roughly like a voice
+    t = np.arange(SR * SENTENCE_SECONDS) / SR
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SR
+    x = sum(np.sin(k * phase) / k for k in range(1, 8)) * 0.2
+    return from_float(x[:, None], SW)
+
+
+def pitch_audio(ab: bytes, sr: int, sw: int, ch: int, pitch_amount: float):
+    """The previous filter, spawning ffmpeg for every sentence"""
+    speed_factor = 2 ** (pitch_amount / 12)
+    raw_format = RAW_FORMATS[sw]
+    out, _ = (
+        ffmpeg.input("pipe:", format=raw_format, ar=sr, ac=ch)
+        .filter("atempo", 1 / speed_factor)
+        .filter("asetrate", int(round(sr * speed_factor)))
+        .output("pipe:", format=raw_format, ac=ch)
+        .run(input=ab, capture_stdout=True, quiet=True)
+    )
+    return out
+
+
+def bench_ffmpeg(ab: bytes) -> float:
+    start = time.perf_counter()
+    for _ in range(SENTENCE_COUNT):
+        pitch_audio(ab, SR, SW, CH, PITCH_AMOUNT)
+    return time.perf_counter() - start
+
+
+def bench_native(ab: bytes, chunk_size: int) -> float:
+    start = time.perf_counter()
+    for _ in range(SENTENCE_COUNT):
+        shifter = PitchShifter(SR, SW, CH, PITCH_AMOUNT)
+        for i in range(0, len(ab), chunk_size):
+            shifter.process(ab[i : i + chunk_size])
+        shifter.flush()
+    return time.perf_counter() - start
+
+
+def report(name: str, elapsed: float):
+    audio_seconds = SENTENCE_COUNT * SENTENCE_SECONDS
+    print(
+        "{:<24} {:>8.2f} ms per second of audio".format(
+            name, elapsed / audio_seconds * 1000
+        )
+    )
+
+
+def main():
+    ab = sentence()
+    chunk_size = int(SR * CHUNK_MS / 1000) * SW * CH
+
+    report("ffmpeg per sentence", bench_ffmpeg(ab))
+    report("native per sentence", bench_native(ab, len(ab)))
+    report("native {} ms chunks".format(CHUNK_MS), bench_native(ab, chunk_size))
+
+
+if __name__ == "__main__":
+    main()
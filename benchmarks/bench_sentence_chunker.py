@@ -0,0 +1,84 @@
+"""
+Benchmark the sentence chunker on a streamed reply
+
+Feeds a reply to chunker_sentence in small deltas, as a T2T model would produce them,
+and reports the characters received before the first sentence is emitted and the CPU
+time per reply. Compares the previous approach (full spaCy pipeline over the complete
+reply) with the streaming chunker, with and without spaCy confirmation.
+
+Run from the project root: python benchmarks/bench_sentence_chunker.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import spacy
+
+from utils.config import Config
+from utils.operations.filter_text.chunker_sentence import SentenceChunkerFilter
+
+REPLY_COUNT = 50
+DELTA_SIZE = 4
+REPLY = (
+    "Oh, that's a great question! I think Mr. Smith said the map was updated last "
+    "week. Let's check it out together, shall we? If we hurry, we might even find the "
+    "hidden room before anyone else does. Honestly... I can't wait."
+)
+
+
+def deltas():
+    return [REPLY[i : i + DELTA_SIZE] for i in range(0, len(REPLY), DELTA_SIZE)]
+
+
+def bench_full_pipeline():
+    nlp = spacy.load(Config().spacy_model)
+    start = time.process_time()
+    for _ in range(REPLY_COUNT):
+        [sent.text.strip() for sent in nlp(REPLY).sents]
+    return len(REPLY), (time.process_time() - start) / REPLY_COUNT * 1000
+
+
+async def bench_stream(config_d):
+    op = SentenceChunkerFilter()
+    await op.configure(config_d)
+    await op.start()
+
+    first_at = None
+    start = time.process_time()
+    for _ in range(REPLY_COUNT):
+        stream, received = op.open_stream(), 0
+        for delta in deltas():
+            received += len(delta)
+            if stream.feed(delta) and first_at is None:
+                first_at = received
+        stream.flush()
+    cpu_ms = (time.process_time() - start) / REPLY_COUNT * 1000
+
+    await op.close()
+    return first_at, cpu_ms
+
+
+async def main():
+    print(f"Reply of {len(REPLY)} chars in deltas of {DELTA_SIZE}, {REPLY_COUNT} runs")
+    first_at, cpu_ms = bench_full_pipeline()
+    print(
+        f"full spaCy pipeline: first sentence after {first_at:>4} chars, {cpu_ms:.2f} ms CPU"
+    )
+    for name, config_d in [
+        ("stream, rules", {}),
+        ("stream, spaCy", {"use_spacy": True}),
+    ]:
+        first_at, cpu_ms = await bench_stream(config_d)
+        print(
+            f"{name:<19}: first sentence after {first_at:>4} chars, {cpu_ms:.2f} ms CPU"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+Benchmark sentences per second of the classifier text filters on CPU
+
+Compares batch sizes 1, 8 and 32 for emotion_roberta and mod_koala, both calling the
+batch function directly and going through the MicroBatcher with concurrent submissions.
+
+Run from the project root: python benchmarks/bench_text_classifiers.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+os.environ["CUDA_VISIBLE_DEVICES"] = ""  # force CPU for comparable numbers
+
+from utils.operations.filter_text.emotion_roberta import RobertaEmotionFilter
+from utils.operations.filter_text.mod_koala import KoalaModerationFilter
+
+BATCH_SIZES = [1, 8, 32]
+SENTENCE_COUNT = 256
+SENTENCES = [
+    "I can't believe you actually did that, it's amazing!",
+    "Well, that was a little disappointing to be honest.",
+    "Let's go check out the new map together.",
+    "Why would anyone think that is a good idea?",
+]
+
+
+def sentences():
+    return [SENTENCES[i % len(SENTENCES)] for i in range(SENTENCE_COUNT)]
+
+
+def bench_direct(op, batch_size: int) -> float:
+    texts = sentences()
+    op._classify_batch(texts[:batch_size])  # warmup
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        op._classify_batch(texts[i : i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+async def bench_batcher(op, batch_size: int) -> float:
+    op.batcher.max_batch_size = batch_size
+    texts = sentences()
+    await op.batcher.submit_many(texts[:batch_size])  # warmup
+    start = time.perf_counter()
+    await asyncio.gather(*[op.batcher.submit(text) for text in texts])
+    return len(texts) / (time.perf_counter() - start)
+
+
+async def main():
+    for op in [RobertaEmotionFilter(), KoalaModerationFilter()]:
+        await op.configure({})
+        await op.start()
+        print(f"== {op.op_id} ({SENTENCE_COUNT} sentences, CPU)")
+        for batch_size in BATCH_SIZES:
+            direct = bench_direct(op, batch_size)
+            batched = await bench_batcher(op, batch_size)
+            print(
+                f"batch {batch_size:>3}: {direct:8.1f} sent/s direct, "
+                f"{batched:8.1f} sent/s through batcher"
+            )
+        await op.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
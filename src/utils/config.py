@@ -36,18 +36,36 @@ class Config(metaclass=Singleton):
         os.path.join(os.getcwd(), "output", "history.txt")
     )  # debug
 
+    # Memory
+    MEMORY_DIR: str = portable_path(os.path.join(os.getcwd(), "output", "memory"))
+    memory: dict = dict()
+
     # MCP
     MCP_DIR: str = portable_path(os.path.join(os.getcwd(), "models", "mcp"))
+    MCP_CATALOGUE_DIR: str = portable_path(
+        os.path.join(os.getcwd(), "output", "mcp_catalogue")
+    )
     mcp: list = list()
+    mcp_cache: dict = dict()
+    mcp_router: dict = dict()
 
     # Kobold
     kobold_filepath: str = None
     kcpps_filepath: str = None
+    kobold_ready_timeout: float = 300  # seconds to load its models
+
+    # Process pools
+    processes: dict = dict()
+
+    # Unloading idle models and processes
+    lifecycle: dict = dict()
 
     # Melo
     MELO_DIR: str = portable_path(os.path.join(os.getcwd(), "models", "melotts"))
 
     # Shared
+    # Working files are no longer used since audio is kept in memory. Still accepted
+    # so existing configs load
     stt_working_src: str = portable_path(os.path.join(WORKING_DIR, "stt_src.wav"))
     ffmpeg_working_src: str = portable_path(os.path.join(WORKING_DIR, "ffmpeg_src.wav"))
     ffmpeg_working_dest: str = portable_path(
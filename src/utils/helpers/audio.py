@@ -1,26 +1,274 @@
-import wave
-import ffmpeg
-
-from utils.config import Config
-
-
-def pitch_audio(ab: bytes, sr: int, sw: int, ch: int, pitch_amount: int):
-    # ffmpeg -i "input.wav" -af "rubberband=smoothing=on:pitch=2^(1/2):pitchq=quality:window=short:channels=apart:phase=independent" "output.wav"
-    speed_factor = 2 ** (pitch_amount / 12)
-
-    with wave.open(Config().ffmpeg_working_src, "wb") as f:
-        f.setframerate(sr)
-        f.setsampwidth(sw)
-        f.setnchannels(ch)
-        f.writeframes(ab)
-
-    ffmpeg.input(Config().ffmpeg_working_src).filter("atempo", 1 / speed_factor).filter(
-        "asetrate", sr * speed_factor
-    ).output(Config().ffmpeg_working_dest).run(overwrite_output=True, quiet=True)
-    with wave.open(Config().ffmpeg_working_dest, "r") as f:
-        return (
-            f.readframes(f.getnframes()),
-            f.getframerate(),
-            f.getsampwidth(),
-            f.getnchannels(),
-        )
+"""
+PCM conversion on NumPy arrays
+
+Audio is passed between operations as bytes of interleaved PCM, described by its sample
+rate (sr), sample width in bytes (sw) and channel count (ch). For processing it is
+converted to float32 arrays of shape (samples, channels) in [-1, 1):
+
+- to_float/from_float convert between the two, reading the bytes without copying them
+- mix_channels averages channels down or copies them up
+- Resampler resamples a stream with a polyphase windowed-sinc filter, whose kernels are
+  cached per conversion ratio
+- AudioConverter and convert_audio do all of the above between any two formats, each
+  described by an AudioFormat
+
+Functions taking out= write into that preallocated array instead of allocating a new
+one, so a stream can reuse the same buffers chunk after chunk.
+"""
+
+import functools
+import math
+from typing import Any, Dict, NamedTuple, Tuple
+
+import numpy as np
+
+# Sample width: (dtype, offset of silence, full scale)
+SAMPLE_FORMATS = {
+    1: (np.dtype("u1"), 128, 128.0),
+    2: (np.dtype("<i2"), 0, 32768.0),
+    4: (np.dtype("<i4"), 0, 2147483648.0),
+}
+
+ZERO_CROSSINGS = 16  # of the sinc on each side, at the lower of the two rates
+ROLLOFF = 0.945  # cutoff as a fraction of the lower Nyquist frequency
+KAISER_BETA = 8.6
+MAX_PHASES = 1024  # kernels are tabulated at most at this many positions
+MIN_PHASE_RUN = 16  # fewer outputs per phase than this are computed one by one
+BLOCK_SIZE = 4096  # output samples computed at once, bounding temporary memory
+
+
+class UnsupportedSampleWidth(Exception):
+    def __init__(self, sw: int):
+        super().__init__("Unsupported sample width {}".format(sw))
+
+
+class AudioFormat(NamedTuple):
+    sr: int
+    sw: int
+    ch: int
+
+    @classmethod
+    def of(cls, d: Dict[str, Any]) -> "AudioFormat":
+        """Format described by the sr, sw and ch fields of a chunk or request"""
+        fmt = cls(int(d["sr"]), int(d["sw"]), int(d["ch"]))
+        _sample_format(fmt.sw)
+        assert fmt.sr > 0 and fmt.ch > 0
+        return fmt
+
+    @property
+    def rate(self) -> int:
+        """Samples per second across all channels, which conversion cost scales with"""
+        return self.sr * self.ch
+
+    def __str__(self) -> str:
+        return "{} Hz {}-bit x{}".format(self.sr, self.sw * 8, self.ch)
+
+
+def _sample_format(sw: int):
+    if sw not in SAMPLE_FORMATS:
+        raise UnsupportedSampleWidth(sw)
+    return SAMPLE_FORMATS[sw]
+
+
+def to_float(ab: bytes, sw: int, ch: int, out: np.ndarray = None) -> np.ndarray:
+    dtype, offset, scale = _sample_format(sw)
+
+    # View the bytes as samples without copying, only converting once to float
+    samples = np.frombuffer(ab, dtype=dtype, count=len(ab) // (sw * ch) * ch)
+    if out is None:
+        x = samples.astype(np.float32)
+    else:
+        x = out.reshape(-1)[: len(samples)]
+        np.copyto(x, samples, casting="unsafe")
+    if offset:
+        x -= offset
+    x *= 1 / scale
+    return x.reshape(-1, ch)
+
+
+def from_float(x: np.ndarray, sw: int, out: np.ndarray = None) -> bytes:
+    """Convert to PCM bytes, using out (which may be x itself) as scratch space"""
+    dtype, offset, scale = _sample_format(sw)
+
+    y = np.multiply(x, scale, out=out)
+    if offset:
+        y += offset
+    np.rint(y, out=y)
+    np.clip(y, np.iinfo(dtype).min, np.iinfo(dtype).max, out=y)
+    return y.astype(dtype).tobytes()
+
+
+def mix_channels(x: np.ndarray, ch: int, out: np.ndarray = None) -> np.ndarray:
+    """Average channels down to mono, or copy mono (or their average) to ch channels"""
+    if x.shape[1] == ch:
+        if out is None:
+            return x
+        out = out[: len(x)]
+        out[...] = x
+        return out
+
+    if out is None:
+        out = np.empty((len(x), ch), dtype=np.float32)
+    out = out[: len(x)]
+    if ch == 1:
+        # Column by column, which is much faster than a mean across each row
+        np.copyto(out[:, 0], x[:, 0])
+        for c in range(1, x.shape[1]):
+            out[:, 0] += x[:, c]
+        out *= 1 / x.shape[1]
+    elif x.shape[1] == 1:
+        out[...] = x
+    else:
+        out[...] = mix_channels(x, 1)
+    return out
+
+
+@functools.lru_cache(maxsize=32)
+def _kernels(phases: int, cutoff: float) -> Tuple[np.ndarray, int]:
+    """Windowed-sinc filter at each of phases fractional positions between samples"""
+    cutoff *= ROLLOFF
+    half = math.ceil(ZERO_CROSSINGS / cutoff)
+    # Distance from the output position to each input tap
+    u = np.arange(-half + 1, half + 1)[None, :] - (np.arange(phases) / phases)[:, None]
+
+    window = np.i0(KAISER_BETA * np.sqrt(np.clip(1 - (u / half) ** 2, 0, None)))
+    kernels = cutoff * np.sinc(cutoff * u) * window / np.i0(KAISER_BETA)
+    kernels /= kernels.sum(axis=1, keepdims=True)  # Unity gain at every phase
+
+    kernels = kernels.astype(np.float32)
+    kernels.setflags(write=False)
+    return kernels, half
+
+
+class Resampler:
+    """Resamples a stream, with the same output as resampling it all at once"""
+
+    def __init__(self, sr_in: int, sr_out: int, ch: int):
+        gcd = math.gcd(sr_in, sr_out)
+        self.up, self.down = sr_out // gcd, sr_in // gcd
+        self.ch = ch
+        self.passthrough = self.up == self.down
+
+        self.phases = min(self.up, MAX_PHASES)
+        self.kernels, self.half = _kernels(self.phases, min(1.0, self.up / self.down))
+        self.taps = np.arange(-self.half + 1, self.half + 1)
+
+        # Silence before the start, so the first outputs have a full window of input
+        self.buffer = np.zeros((self.half - 1, ch), dtype=np.float32)
+        self.base = -(self.half - 1)  # input index of buffer[0]
+        self.received = 0
+        self.m = 0  # index of the next output sample
+
+    def output_length(self, input_length: int) -> int:
+        return -(-input_length * self.up // self.down)
+
+    def process(self, x: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Resample the next input, returning every output sample ready so far"""
+        if self.passthrough:
+            return x
+        self.received += len(x)
+        return self._run(x, self.received - 1 - self.half, out)
+
+    def flush(self, out: np.ndarray = None) -> np.ndarray:
+        """Return the rest of the output once the input is complete"""
+        if self.passthrough:
+            return np.zeros((0, self.ch), dtype=np.float32)
+        padding = np.zeros((self.half, self.ch), dtype=np.float32)
+        end = self.output_length(self.received)
+        return self._run(padding, self.received - 1, out, end)
+
+    def _polyphase(self, buffer: np.ndarray, y: np.ndarray) -> None:
+        """Outputs up samples apart share a phase and are down inputs apart, so each
+        phase is a strided correlation of the input with one kernel"""
+        # Channels first, so each window is contiguous
+        channels = np.ascontiguousarray(buffer.T)
+        windows = np.lib.stride_tricks.sliding_window_view(channels, len(self.taps), 1)
+        for i in range(min(self.up, len(y))):
+            position = (self.m + i) * self.down
+            start = position // self.up - self.half + 1 - self.base
+            rows = windows[:, start :: self.down][:, : len(range(i, len(y), self.up))]
+            kernel = self.kernels[position % self.up * self.phases // self.up]
+            y[i :: self.up] = (rows @ kernel).T
+
+    def _gather(self, buffer: np.ndarray, y: np.ndarray) -> None:
+        """Gather the window of inputs and the kernel of each output"""
+        channels = np.ascontiguousarray(buffer.T)
+        for start in range(0, len(y), BLOCK_SIZE):
+            stop = min(len(y), start + BLOCK_SIZE)
+            positions = np.arange(self.m + start, self.m + stop, dtype=np.int64)
+            positions *= self.down
+            kernels = self.kernels[positions % self.up * self.phases // self.up]
+            idx = (positions // self.up - self.base)[:, None] + self.taps[None, :]
+            for c in range(self.ch):
+                y[start:stop, c] = np.einsum("mt,mt->m", kernels, channels[c][idx])
+
+    def _run(
+        self, x: np.ndarray, last_start: int, out: np.ndarray, end: int = None
+    ) -> np.ndarray:
+        buffer = np.concatenate([self.buffer, x]) if len(self.buffer) else x
+
+        # Output m sits between inputs m * down // up and the one after it, and its
+        # window reaches half samples past the first of these
+        m_end = max(self.m, -(-(last_start + 1) * self.up // self.down))
+        if end is not None:
+            m_end = min(m_end, end)
+        count = m_end - self.m
+        y = np.empty((count, self.ch), np.float32) if out is None else out[:count]
+
+        if count >= MIN_PHASE_RUN * self.up:
+            self._polyphase(buffer, y)
+        elif count:
+            self._gather(buffer, y)
+
+        self.m = m_end
+        keep_from = self.m * self.down // self.up - self.half + 1
+        if keep_from > self.base:
+            buffer = buffer[keep_from - self.base :]
+            self.base = keep_from
+        self.buffer = buffer
+        return y
+
+
+def resample(x: np.ndarray, sr_in: int, sr_out: int) -> np.ndarray:
+    resampler = Resampler(sr_in, sr_out, x.shape[1])
+    y = resampler.process(x)
+    return np.concatenate([y, resampler.flush()])
+
+
+class AudioConverter:
+    """Converts a stream of PCM from one format to another"""
+
+    def __init__(self, sr: int, sw: int, ch: int, to_sr: int, to_sw: int, to_ch: int):
+        self.sr, self.sw, self.ch = sr, sw, ch
+        self.to_sr, self.to_sw, self.to_ch = to_sr, to_sw, to_ch
+        self.passthrough = (sr, sw, ch) == (to_sr, to_sw, to_ch)
+        # Resample as few channels as possible
+        self.resampler = Resampler(sr, to_sr, min(ch, to_ch))
+
+    def process(self, ab: bytes) -> bytes:
+        if self.passthrough:
+            return ab
+        return self._convert(self.resampler.process(self._mix_down(ab)))
+
+    def flush(self) -> bytes:
+        if self.passthrough:
+            return b""
+        return self._convert(self.resampler.flush())
+
+    def _mix_down(self, ab: bytes) -> np.ndarray:
+        x = to_float(ab, self.sw, self.ch)
+        if self.to_ch < self.ch:
+            x = mix_channels(x, self.to_ch)
+        return x
+
+    def _convert(self, x: np.ndarray) -> bytes:
+        if self.to_ch > self.ch:
+            x = mix_channels(x, self.to_ch)
+        return from_float(x, self.to_sw)
+
+
+def convert_audio(
+    ab: bytes, sr: int, sw: int, ch: int, to_sr: int, to_sw: int, to_ch: int
+) -> bytes:
+    converter = AudioConverter(sr, sw, ch, to_sr, to_sw, to_ch)
+    return converter.process(ab) + converter.flush()
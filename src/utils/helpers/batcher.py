@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, List
+
+"""
+MicroBatcher runs a batch function on a dedicated worker thread.
+
+Items submitted from the event loop within a short time window of each other are
+coalesced into a single call of the batch function, so model-backed operations can
+run one forward pass for many inputs without blocking the event loop.
+"""
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        batch_window_ms: float = 5.0,
+        name: str = "batcher",
+    ):
+        assert max_batch_size > 0
+        assert batch_window_ms >= 0
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batch_window_ms = batch_window_ms
+        self.name = name
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._thread = threading.Thread(
+            target=self._worker, name=self.name, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single item and wait for its result"""
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """Queue several items at once and wait for all results in order"""
+        if not self.running:
+            raise RuntimeError("MicroBatcher {} is not running".format(self.name))
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._queue.put((item, future, loop))
+
+        return list(await asyncio.gather(*futures))
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window_ms / 1000
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before waiting out the window
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if job is _STOP:
+                self._queue.put(_STOP)  # handle after finishing this batch
+                break
+            batch.append(job)
+
+        return batch
+
+    def _worker(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._drain()
+                break
+
+            batch = [
+                job for job in self._collect(first) if not job[1].cancelled()
+            ]  # skip anything whose caller already gave up
+            if not batch:
+                continue
+
+            try:
+                results = self.batch_fn([job[0] for job in batch])
+                assert len(results) == len(batch)
+                for (_, future, loop), result in zip(batch, results):
+                    loop.call_soon_threadsafe(_resolve, future, result, None)
+            except Exception as err:
+                logging.error(
+                    "Batch function of {} failed".format(self.name), exc_info=True
+                )
+                for _, future, loop in batch:
+                    loop.call_soon_threadsafe(_resolve, future, None, err)
+
+    def _drain(self) -> None:
+        err = RuntimeError("MicroBatcher {} was stopped".format(self.name))
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP:
+                job[2].call_soon_threadsafe(_resolve, job[1], None, err)
+
+
+def _resolve(future: asyncio.Future, result: Any, err: Exception) -> None:
+    if future.done():
+        return
+    if err is not None:
+        future.set_exception(err)
+    else:
+        future.set_result(result)
@@ -0,0 +1,77 @@
+"""
+Blocking SDK calls and SDK callbacks from the event loop
+
+Cloud SDKs such as Azure Speech and Fish Audio either block until a request is done or
+report progress through callbacks on threads of their own. Neither may touch the event
+loop directly: a blocking call would freeze every other coroutine for a whole round
+trip, and asyncio objects are not thread-safe.
+
+- run_blocking runs a call on a small shared thread pool, giving up after a timeout
+- CallbackQueue takes items from SDK threads and hands them to a coroutine in order
+
+A call that times out or is cancelled keeps its thread until the SDK returns, but its
+result is dropped and the caller moves on.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from typing import Any, AsyncIterator, Callable
+
+BLOCKING_WORKERS = 8
+
+_executor: ThreadPoolExecutor = None
+_END = object()
+
+
+class CallTimedOut(Exception):
+    def __init__(self, name: str, timeout: float):
+        super().__init__("{} took longer than {} seconds".format(name, timeout))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return _executor
+
+
+async def run_blocking(fn: Callable, *args, timeout: float = None, **kwargs) -> Any:
+    """Result of fn(*args, **kwargs), run off the event loop"""
+    future = asyncio.get_running_loop().run_in_executor(
+        _get_executor(), functools.partial(fn, *args, **kwargs)
+    )
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise CallTimedOut(getattr(fn, "__qualname__", repr(fn)), timeout) from None
+
+
+class CallbackQueue:
+    """Items put from any thread, read in order by one coroutine. Must be created on
+    the event loop"""
+
+    def __init__(self, name: str = "callback", timeout: float = None):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.name = name
+        self.timeout = timeout  # longest wait for the next item
+
+    def put(self, item: Any) -> None:
+        """Add an item, or an exception to raise to the reader"""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def finish(self) -> None:
+        self.put(_END)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), self.timeout)
+            except asyncio.TimeoutError:
+                raise CallTimedOut(self.name, self.timeout) from None
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
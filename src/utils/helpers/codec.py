@@ -0,0 +1,210 @@
+"""
+Encoding audio for clients
+
+Response audio is broadcast to every websocket client, so it is encoded once per job
+rather than once per client. PCM is sent as is, while Opus and FLAC are encoded with
+PyAV, only imported when one of them is asked for.
+
+An encoder takes consecutive PCM bytes of one format and returns packets, each with:
+- data: (bytes) one encoded frame, or a slice of whole PCM samples
+- pts: (int) position of its first sample since the start of the job, in samples
+- duration: (int) number of samples it covers
+"""
+
+import base64
+from fractions import Fraction
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .audio import SAMPLE_FORMATS, AudioFormat
+
+CODECS = ["pcm", "opus", "flac"]
+OPUS_SAMPLE_RATES = [8000, 12000, 16000, 24000, 48000]
+OPUS_BIT_RATE = 64000
+FLAC_FRAME_SIZE = 4608
+PCM_PACKET_SIZE = 3072  # bytes, which base64 encode to 4096 characters
+EVENT_SIZE = 4096  # most base64 characters of encoded packets in one event
+
+# Used by codecs that need a fixed format when the client does not ask for one
+DEFAULT_FORMAT = AudioFormat(48000, 2, 1)
+
+Packet = Dict[str, Any]
+
+
+class UnsupportedCodec(Exception):
+    def __init__(self, codec: str):
+        super().__init__(
+            "Unsupported codec {}, expected one of {}".format(codec, ", ".join(CODECS))
+        )
+
+
+def encoder_format(codec: str, fmt: Optional[AudioFormat]) -> Optional[AudioFormat]:
+    """Nearest format to fmt that codec can encode, or None to keep any format"""
+    match codec:
+        case "pcm":
+            return fmt
+        case "opus":
+            fmt = fmt or DEFAULT_FORMAT
+            sr = fmt.sr if fmt.sr in OPUS_SAMPLE_RATES else 48000
+            return AudioFormat(sr, 2, min(fmt.ch, 2))
+        case "flac":
+            fmt = fmt or DEFAULT_FORMAT
+            return AudioFormat(fmt.sr, 4 if fmt.sw == 4 else 2, min(fmt.ch, 8))
+        case _:
+            raise UnsupportedCodec(codec)
+
+
+class AudioEncoder:
+    def __init__(self, codec: str, fmt: Optional[AudioFormat]):
+        self.codec = codec
+        self.format = fmt
+        self.pts = 0
+
+    @property
+    def header(self) -> Optional[bytes]:
+        """Codec setup a decoder needs before the first packet, if any"""
+        return None
+
+    def encode(self, ab: bytes, fmt: AudioFormat) -> List[Packet]:
+        """Encode the next audio in fmt, returning every packet that is complete"""
+        raise NotImplementedError
+
+    def flush(self) -> List[Packet]:
+        """Return the remaining packets once the audio is complete"""
+        raise NotImplementedError
+
+
+class PCMEncoder(AudioEncoder):
+    """Slices PCM into packets of whole samples, in whatever format it arrives in"""
+
+    def __init__(self, fmt: Optional[AudioFormat] = None):
+        super().__init__("pcm", fmt)
+
+    def encode(self, ab: bytes, fmt: AudioFormat) -> List[Packet]:
+        frame_size = fmt.sw * fmt.ch
+        packet_size = PCM_PACKET_SIZE // frame_size * frame_size
+        packets = list()
+        for i in range(0, len(ab), packet_size):
+            data = ab[i : i + packet_size]
+            packets.append(
+                {"data": data, "pts": self.pts, "duration": len(data) // frame_size}
+            )
+            self.pts += len(data) // frame_size
+        return packets
+
+    def flush(self) -> List[Packet]:
+        return []
+
+
+class AVEncoder(AudioEncoder):
+    """Encodes with a PyAV codec, in frames of the size the codec asks for"""
+
+    CODEC_NAMES = {"opus": "libopus", "flac": "flac"}
+
+    def __init__(self, codec: str, fmt: AudioFormat):
+        import av
+
+        super().__init__(codec, fmt)
+        self.av = av
+        self.layout = {1: "mono", 2: "stereo"}.get(fmt.ch, "{}c".format(fmt.ch))
+        self.sample_format = "s16" if fmt.sw == 2 else "s32"
+
+        self.context = av.CodecContext.create(self.CODEC_NAMES[codec], "w")
+        self.context.sample_rate = fmt.sr
+        self.context.layout = self.layout
+        self.context.format = self.sample_format
+        self.context.time_base = Fraction(1, fmt.sr)
+        if codec == "opus":
+            self.context.bit_rate = OPUS_BIT_RATE
+        self.context.open()
+        self.frame_size = self.context.frame_size or FLAC_FRAME_SIZE
+
+        dtype, _, _ = SAMPLE_FORMATS[fmt.sw]
+        self.dtype = dtype
+        self.pending = np.zeros(0, dtype=dtype)  # interleaved samples not yet encoded
+
+    @property
+    def header(self) -> Optional[bytes]:
+        return self.context.extradata or None
+
+    def encode(self, ab: bytes, fmt: AudioFormat) -> List[Packet]:
+        if fmt != self.format:
+            raise ValueError("Expected audio in {}, got {}".format(self.format, fmt))
+        samples = np.frombuffer(ab, dtype=self.dtype)
+        self.pending = np.concatenate([self.pending, samples])
+
+        packets = list()
+        frame_len = self.frame_size * self.format.ch
+        while len(self.pending) >= frame_len:
+            packets.extend(self._encode_frame(self.pending[:frame_len]))
+            self.pending = self.pending[frame_len:]
+        return packets
+
+    def flush(self) -> List[Packet]:
+        packets = list()
+        if len(self.pending):
+            # Codecs pad a short last frame themselves, trimming it when decoded
+            packets.extend(self._encode_frame(self.pending))
+            self.pending = np.zeros(0, dtype=self.dtype)
+        packets.extend(self._packets(self.context.encode(None)))
+        return packets
+
+    def _encode_frame(self, samples: np.ndarray) -> List[Packet]:
+        frame = self.av.AudioFrame.from_ndarray(
+            samples.reshape(1, -1), format=self.sample_format, layout=self.layout
+        )
+        frame.sample_rate = self.format.sr
+        frame.time_base = self.context.time_base
+        frame.pts = self.pts
+        self.pts += frame.samples
+        return self._packets(self.context.encode(frame))
+
+    def _packets(self, av_packets) -> List[Packet]:
+        return [
+            {"data": bytes(packet), "pts": packet.pts, "duration": packet.duration}
+            for packet in av_packets
+        ]
+
+
+def open_encoder(codec: str, fmt: Optional[AudioFormat]) -> AudioEncoder:
+    """Encoder for audio in fmt, which must already suit codec (see encoder_format)"""
+    if codec == "pcm":
+        return PCMEncoder(fmt)
+    if codec not in CODECS:
+        raise UnsupportedCodec(codec)
+    return AVEncoder(codec, fmt)
+
+
+def packet_events(
+    codec: str, fmt: AudioFormat, packets: List[Packet]
+) -> List[Dict[str, Any]]:
+    """Websocket event results carrying packets, with data in base64"""
+    if codec == "pcm":
+        # Same fields as before codecs were added, so older clients keep working
+        return [
+            {
+                "audio_bytes": base64.b64encode(packet["data"]).decode("utf-8"),
+                "sr": fmt.sr,
+                "sw": fmt.sw,
+                "ch": fmt.ch,
+                "codec": "pcm",
+                "pts": packet["pts"],
+            }
+            for packet in packets
+        ]
+
+    # Encoded packets are small, so several are sent in each event
+    batches, size = list(), EVENT_SIZE
+    for packet in packets:
+        data = base64.b64encode(packet["data"]).decode("utf-8")
+        if size + len(data) > EVENT_SIZE:
+            batches.append(list())
+            size = 0
+        batches[-1].append({**packet, "data": data})
+        size += len(data)
+
+    return [
+        {"codec": codec, "sr": fmt.sr, "sw": fmt.sw, "ch": fmt.ch, "packets": batch}
+        for batch in batches
+    ]
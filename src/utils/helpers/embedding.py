@@ -0,0 +1,76 @@
+"""
+Storing and sending embedding vectors
+
+Embeddings are kept as C-contiguous float32 arrays of shape (texts, dimensions). The
+same texts are often embedded again (repeated messages, memories looked up on every
+response), so vectors are cached by a hash of the text and whatever decides the vector
+(model and dimensions), keeping the most recently used.
+
+Over JSON, a batch of vectors is sent as the base64 of its raw little-endian float32
+bytes along with its shape. A single vector is the same bytes as before batching.
+"""
+
+import base64
+from collections import OrderedDict
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DTYPE = np.dtype("<f4")
+
+
+def as_vectors(x: Any) -> np.ndarray:
+    """Vectors as a C-contiguous float32 array with one row per text"""
+    x = np.ascontiguousarray(x, dtype=DTYPE)
+    return x.reshape(1, -1) if x.ndim == 1 else x
+
+
+def to_base64(vectors: np.ndarray) -> Dict[str, Any]:
+    """Event fields carrying vectors over JSON"""
+    vectors = as_vectors(vectors)
+    return {
+        "embedding": base64.b64encode(vectors.tobytes()).decode("utf-8"),
+        "shape": list(vectors.shape),
+        "dtype": "float32",
+    }
+
+
+def from_base64(embedding: str, shape: List[int] = None) -> np.ndarray:
+    """Vectors sent with to_base64, or a single vector without a shape"""
+    x = np.frombuffer(base64.b64decode(embedding), dtype=DTYPE)
+    return x.reshape(shape or (1, -1))
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(namespace: str, text: str) -> bytes:
+        return hashlib.sha256(
+            namespace.encode("utf-8") + b"\0" + text.encode("utf-8")
+        ).digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self.entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -0,0 +1,24 @@
+"""
+Models from the Hugging Face hub, loaded from its local cache
+
+The hub already keeps a snapshot of every model it downloaded. Models unloaded to stay
+within the memory budget are loaded again straight from that snapshot, without asking
+the hub whether the model changed. Only safetensors weights are fetched, which are
+memory-mapped when read instead of unpickled like PyTorch checkpoints.
+"""
+
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
+
+# Configs, tokenizer files and safetensors weights, skipping checkpoints in other formats
+SNAPSHOT_PATTERNS = ["*.json", "*.txt", "*.model", "*.safetensors"]
+
+
+def hub_snapshot(model: str) -> str:
+    """Directory of the model's snapshot in the hub cache, downloaded if not cached"""
+    try:
+        return snapshot_download(
+            model, allow_patterns=SNAPSHOT_PATTERNS, local_files_only=True
+        )
+    except LocalEntryNotFoundError:
+        return snapshot_download(model, allow_patterns=SNAPSHOT_PATTERNS)
@@ -0,0 +1,77 @@
+"""
+On-disk cache of what each MCP server offers
+
+Listing the tools, resources and resource templates of a server takes several round
+trips after it has been spawned and initialized. The lists are saved per server command,
+so after a restart the server's tools can be offered straight away while its session
+is initialized in the background. The saved lists are kept while the server reports the
+same name and version when it is initialized, and listed again when it doesn't.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+KINDS = ["tools", "resources", "templates"]
+
+
+def catalogue_key(command: str, args: List[str] = None, cwd: str = None) -> str:
+    """Same key for the same server command"""
+    document = json.dumps(
+        {"command": command, "args": list(args or []), "cwd": cwd}, sort_keys=True
+    )
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+
+
+class CatalogueCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, "{}.json".format(key))
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Saved server info and lists for key, or None if there are none usable"""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logging.warning("Ignoring unreadable MCP catalogue {}".format(key))
+            return None
+        if not isinstance(record.get("server"), dict) or any(
+            not isinstance(record.get(kind), list) for kind in KINDS
+        ):
+            return None
+        return record
+
+    def save(
+        self,
+        key: str,
+        server: Dict[str, Any],
+        tools: List[Dict],
+        resources: List[Dict],
+        templates: List[Dict],
+    ) -> None:
+        """Save server info ({name, version}) with its lists, each item as a dict"""
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            "server": server,
+            "tools": tools,
+            "resources": resources,
+            "templates": templates,
+        }
+        # Written whole, so a restart never reads half a catalogue
+        temp_path = self._path(key) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(temp_path, self._path(key))
+
+    def clear(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,242 @@
+"""
+Starting MCP servers and attaching them once they are ready
+
+Each ServerSession runs the session with one server in a single task from spawn to
+close, as the stdio client has to be entered and exited by the same task. How the
+session is opened is given as a connect function, so the lifecycle doesn't depend on
+the transport.
+
+A ServerGroup starts every server at once. Adding a server waits for it until its
+startup timeout at most; a server that is slower is attached when it becomes ready. A
+server whose catalogue was saved on a previous run (see mcp_catalogue) is offered
+straight away and calls to it wait for its session. A server that fails or exits is
+dropped.
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncContextManager, Callable, Dict, List
+
+from .mcp_catalogue import KINDS, CatalogueCache
+
+
+class ServerSession:
+    def __init__(
+        self,
+        server_id: str,
+        connect: Callable[[], AsyncContextManager],
+        catalogue: CatalogueCache = None,
+        catalogue_key: str = None,
+    ):
+        self.server_id = server_id
+        self.connect = connect  # opens a session that is yet to be initialized
+        self.catalogue = catalogue
+        self.catalogue_key = catalogue_key
+        self.session = None
+
+        self.runner: asyncio.Task = None
+        self.ready = asyncio.Event()  # set once started or failed to
+        self.closing = asyncio.Event()
+        self.error: Exception = None
+        self.on_change: Callable[["ServerSession"], None] = None
+
+        self.server: Dict[str, str] = None  # name and version reported when initialized
+        self.tools = list()
+        self.resources = list()
+        self.templates = list()
+
+    ## OPTIONALLY IMPLEMENTED ####
+    def _load_item(self, kind: str, data: Dict) -> Any:
+        """Item of the catalogue from how it was saved"""
+        return data
+
+    def _dump_item(self, item: Any) -> Dict:
+        """Item of the catalogue as a dict to save"""
+        return item
+
+    def set_details(self, details: Dict[str, List]) -> None:
+        """Take the tools, resources and templates the server offers"""
+        self.tools = details["tools"]
+        self.resources = details["resources"]
+        self.templates = details["templates"]
+
+    ## PROVIDED ####
+    def load_catalogue(self) -> bool:
+        """Offer what the server offered last time, before it has started. Returns
+        whether a catalogue was saved"""
+        if self.catalogue is None:
+            return False
+        record = self.catalogue.load(self.catalogue_key)
+        if record is None:
+            return False
+        try:
+            self.set_details(
+                {
+                    kind: [self._load_item(kind, data) for data in record[kind]]
+                    for kind in KINDS
+                }
+            )
+        except Exception:
+            logging.warning(
+                "Ignoring outdated MCP catalogue for {}".format(self.server_id),
+                exc_info=True,
+            )
+            return False
+        self.server = record["server"]
+        return True
+
+    def start(self, on_change: Callable[["ServerSession"], None] = None):
+        """Spawn the server in the background. on_change is called when what it
+        offers changes, or when it fails"""
+        self.on_change = on_change
+        self.runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            async with self.connect() as session:
+                logging.debug("initializing session for {}".format(self.server_id))
+                result = await session.initialize()
+                self.session = session
+
+                server = {
+                    "name": result.serverInfo.name,
+                    "version": result.serverInfo.version,
+                }
+                changed = server != self.server
+                if changed:
+                    details = await self.get_details()
+                    self.set_details(details)
+                    self.server = server
+                    self._save_catalogue(details)
+                self.ready.set()
+                if changed and self.on_change:
+                    self.on_change(self)
+
+                await self.closing.wait()
+        except Exception as err:
+            if not self.closing.is_set():
+                logging.error(
+                    "MCP server {} stopped".format(self.server_id), exc_info=True
+                )
+                self.error = err
+        finally:
+            self.session = None
+            if self.error is None and not self.closing.is_set():
+                self.error = Exception("MCP server {} exited".format(self.server_id))
+            self.ready.set()
+            if self.error is not None and self.on_change:
+                self.on_change(self)
+
+    async def get_details(self) -> Dict[str, List]:
+        tools, resources, templates = list(), list(), list()
+        try:
+            tools = (await self.session.list_tools()).tools
+        except:
+            pass
+        try:
+            resources = (await self.session.list_resources()).resources
+        except:
+            pass
+        try:
+            templates = (await self.session.list_resource_templates()).resourceTemplates
+        except:
+            pass
+
+        return {
+            "tools": tools,
+            "resources": resources,
+            "templates": templates,
+        }
+
+    def _save_catalogue(self, details: Dict[str, List]):
+        if self.catalogue is None:
+            return
+        try:
+            self.catalogue.save(
+                self.catalogue_key,
+                self.server,
+                *[[self._dump_item(item) for item in details[kind]] for kind in KINDS],
+            )
+        except Exception:
+            logging.warning(
+                "Failed to save MCP catalogue for {}".format(self.server_id),
+                exc_info=True,
+            )
+
+    async def get_session(self):
+        """The session once the server is ready, as calls to tools known from the
+        catalogue may come before it is"""
+        await self.ready.wait()
+        if self.session is None:
+            raise Exception("MCP server {} is not running".format(self.server_id))
+        return self.session
+
+    async def close(self):
+        self.closing.set()
+        if self.runner is None:
+            return
+        if not self.ready.is_set():
+            # Still starting, so there is nothing to wait for
+            self.runner.cancel()
+        try:
+            await self.runner
+        except asyncio.CancelledError:
+            pass
+
+
+class ServerGroup:
+    def __init__(
+        self,
+        on_update: Callable[[], None] = None,
+        on_drop: Callable[[ServerSession], None] = None,
+    ):
+        # In the order servers were added, which decides whose name wins
+        self.clients: Dict[str, ServerSession] = dict()
+        self.on_update = on_update  # what the servers offer changed
+        self.on_drop = on_drop  # a server failed and was dropped
+
+    async def add(self, client: ServerSession, startup_timeout: float = 10):
+        """Start a server, returning once it is ready, once its saved catalogue is
+        offered, or after startup_timeout seconds"""
+        # Added before it is ready to keep the order servers were configured in
+        self.clients[client.server_id] = client
+        cached = client.load_catalogue()
+        if cached:
+            self._update()
+        client.start(on_change=self._on_client_change)
+        if cached:
+            return
+
+        try:
+            await asyncio.wait_for(client.ready.wait(), startup_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                "MCP server {} is not ready after {} seconds, using it once it is".format(
+                    client.server_id, startup_timeout
+                )
+            )
+
+    def _on_client_change(self, client: ServerSession):
+        if self.clients.get(client.server_id) is not client:
+            return
+        if client.error is not None:
+            # Failed servers are dropped along with results they gave
+            del self.clients[client.server_id]
+            if self.on_drop:
+                self.on_drop(client)
+        self._update()
+
+    def _update(self):
+        if self.on_update:
+            self.on_update()
+
+    async def remove(self, server_id: str) -> bool:
+        client = self.clients.pop(server_id, None)
+        if client is None:
+            return False
+        await client.close()
+        self._update()
+        return True
+
+    async def close(self):
+        await asyncio.gather(*[client.close() for client in self.clients.values()])
@@ -0,0 +1,239 @@
+import asyncio
+import collections
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import traceback
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator
+
+"""
+ModelWorker runs a blocking model on a dedicated worker that owns it.
+
+The model is loaded by the worker itself, on its own thread or in its own process,
+and every call runs there, so slow synthesis or inference never blocks the event loop.
+Calls are handed off from the event loop and their outputs streamed back as soon as
+the model produces them.
+
+- thread mode shares memory with the core, suited to models that release the GIL
+- process mode gives the model its own interpreter, for pure-Python or thread-affine
+  engines. load_fn and run_fn must then be picklable (module-level functions or
+  functools.partial of them)
+
+At most max_queue calls are outstanding at once and further callers wait for a slot.
+Closing a call's stream early cancels it, skipping it if not yet started or stopping
+it at its next output otherwise.
+"""
+
+MODES = ["thread", "process"]
+POLL_INTERVAL = 0.5
+
+
+class ModelWorkerError(Exception):
+    def __init__(self, name: str, reason: str):
+        super().__init__("Model worker {} failed: {}".format(name, reason))
+
+
+def _worker_main(load_fn: Callable, run_fn: Callable, requests, responses) -> None:
+    """Entry point of the worker thread or process"""
+    try:
+        model = load_fn()
+    except Exception:
+        responses.put((None, "error", traceback.format_exc()))
+        return
+    responses.put((None, "ready", None))
+
+    pending, cancelled = collections.deque(), set()
+
+    def take(msg) -> bool:
+        kind, call_id, payload = msg
+        if kind == "stop":
+            return False
+        if kind == "cancel":
+            cancelled.add(call_id)
+        else:
+            pending.append((call_id, payload))
+        return True
+
+    def poll() -> bool:
+        while True:
+            try:
+                msg = requests.get_nowait()
+            except queue.Empty:
+                return True
+            if not take(msg):
+                return False
+
+    running = True
+    while running:
+        if not pending and not take(requests.get()):
+            break
+        running = poll()
+
+        while pending:
+            call_id, (args, kwargs) = pending.popleft()
+            if call_id in cancelled:
+                cancelled.discard(call_id)
+                continue
+            try:
+                for output in run_fn(model, *args, **kwargs):
+                    responses.put((call_id, "output", output))
+                    running = poll() and running
+                    if call_id in cancelled or not running:
+                        break
+                responses.put((call_id, "done", None))
+            except Exception:
+                responses.put((call_id, "error", traceback.format_exc()))
+            cancelled.discard(call_id)
+            if not running:
+                break
+
+    del model
+    responses.put((None, "stopped", None))
+
+
+class ModelWorker:
+    def __init__(
+        self,
+        load_fn: Callable[[], Any],
+        run_fn: Callable[..., Iterator[Any]],
+        mode: str = "thread",
+        max_queue: int = 8,
+        name: str = "model_worker",
+    ):
+        assert mode in MODES
+        assert max_queue > 0
+
+        self.load_fn = load_fn
+        self.run_fn = run_fn
+        self.mode = mode
+        self.max_queue = max_queue
+        self.name = name
+
+        self._worker = None
+        self._dispatcher: threading.Thread = None
+        self._requests, self._responses = None, None
+        self._streams: Dict[int, asyncio.Queue] = dict()
+        self._call_ids = itertools.count()
+        self._slots: asyncio.Semaphore = None
+        self._loop: asyncio.AbstractEventLoop = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    @property
+    def pid(self):
+        """Process id of a worker in process mode, otherwise None"""
+        return getattr(self._worker, "pid", None)
+
+    async def start(self) -> None:
+        """Start the worker and wait until it has loaded the model"""
+        if self.running:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_queue)
+        if self.mode == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self._requests, self._responses = ctx.Queue(), ctx.Queue()
+            self._worker = ctx.Process(
+                target=_worker_main,
+                args=(self.load_fn, self.run_fn, self._requests, self._responses),
+                name=self.name,
+                daemon=True,
+            )
+        else:
+            self._requests, self._responses = queue.Queue(), queue.Queue()
+            self._worker = threading.Thread(
+                target=_worker_main,
+                args=(self.load_fn, self.run_fn, self._requests, self._responses),
+                name=self.name,
+                daemon=True,
+            )
+        self._worker.start()
+
+        kind, payload = await asyncio.to_thread(self._wait_ready)
+        if kind != "ready":
+            self._worker.join()
+            self._worker = None
+            raise ModelWorkerError(self.name, payload)
+
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="{}_dispatch".format(self.name), daemon=True
+        )
+        self._dispatcher.start()
+
+    async def stop(self) -> None:
+        """Stop the worker, failing any calls still outstanding"""
+        if self._worker is None:
+            return
+        if self.running:
+            self._requests.put(("stop", None, None))
+        await asyncio.to_thread(self._worker.join)
+        await asyncio.to_thread(self._dispatcher.join)
+        self._worker, self._dispatcher = None, None
+
+    async def stream(self, *args, **kwargs) -> AsyncGenerator[Any, None]:
+        """Run a call on the worker, yielding its outputs as they are produced"""
+        async with self._slots:
+            if not self.running:
+                raise ModelWorkerError(self.name, "not running")
+
+            call_id = next(self._call_ids)
+            outputs = asyncio.Queue()
+            self._streams[call_id] = outputs
+            self._requests.put(("call", call_id, (args, kwargs)))
+
+            finished = False
+            try:
+                while True:
+                    kind, payload = await outputs.get()
+                    if kind == "output":
+                        yield payload
+                    elif kind == "done":
+                        finished = True
+                        break
+                    else:
+                        finished = True
+                        raise ModelWorkerError(self.name, payload)
+            finally:
+                self._streams.pop(call_id, None)
+                if not finished and self.running:
+                    self._requests.put(("cancel", call_id, None))
+
+    def _wait_ready(self):
+        while True:
+            try:
+                _, kind, payload = self._responses.get(timeout=POLL_INTERVAL)
+                return kind, payload
+            except queue.Empty:
+                if not self._worker.is_alive():
+                    return "error", "worker exited while loading"
+
+    def _dispatch(self) -> None:
+        """Route outputs from the worker to the stream of their call"""
+        while True:
+            try:
+                call_id, kind, payload = self._responses.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self._worker.is_alive():
+                    continue
+                kind, payload = "exit", "worker exited unexpectedly"
+                logging.error("Model worker {} exited unexpectedly".format(self.name))
+
+            if kind in ["stopped", "exit"]:
+                reason = "stopped" if kind == "stopped" else payload
+                self._loop.call_soon_threadsafe(self._fail_all, reason)
+                return
+            self._loop.call_soon_threadsafe(self._route, call_id, kind, payload)
+
+    def _route(self, call_id: int, kind: str, payload: Any) -> None:
+        outputs = self._streams.get(call_id, None)
+        if outputs is not None:  # otherwise the caller already gave up
+            outputs.put_nowait((kind, payload))
+
+    def _fail_all(self, reason: str) -> None:
+        for outputs in self._streams.values():
+            outputs.put_nowait(("error", reason))
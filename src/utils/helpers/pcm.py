@@ -0,0 +1,190 @@
+"""
+Helpers for streaming raw PCM audio
+
+Audio arriving from the network comes in arbitrarily sized pieces, which may even split
+a sample in two. PCMFramer regroups such pieces into frames of whole samples of a given
+duration, and WavStreamParser strips the header off a WAV file that is still being
+received so its samples can be framed the same way.
+
+Audio is kept in memory everywhere else too. to_wav/from_wav convert PCM to and from
+WAV bytes, and scratch_file gives each call its own in-memory file (memfd on Linux) for
+libraries that only read or write file paths, so concurrent jobs never share a file.
+"""
+
+import io
+import os
+import struct
+import tempfile
+import wave
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Iterator, List, Tuple
+
+
+class WavFormatError(Exception):
+    def __init__(self, reason: str):
+        super().__init__("Unable to read streamed WAV: {}".format(reason))
+
+
+def to_wav(ab: bytes, sr: int, sw: int, ch: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setframerate(sr)
+        f.setsampwidth(sw)
+        f.setnchannels(ch)
+        f.writeframes(ab)
+    return buffer.getvalue()
+
+
+def from_wav(data: bytes) -> Tuple[bytes, int, int, int]:
+    with wave.open(io.BytesIO(data), "rb") as f:
+        return (
+            f.readframes(f.getnframes()),
+            f.getframerate(),
+            f.getsampwidth(),
+            f.getnchannels(),
+        )
+
+
+@contextmanager
+def scratch_file(suffix: str = ".wav") -> Iterator[str]:
+    """Unique path to an empty file, deleted afterwards. Kept in memory on Linux"""
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("voxelle-scratch", os.MFD_CLOEXEC)
+        try:
+            # Through the pid rather than self so subprocesses such as ffmpeg can open it
+            yield "/proc/{}/fd/{}".format(os.getpid(), fd)
+        finally:
+            os.close(fd)
+    else:
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            yield path
+        finally:
+            os.remove(path)
+
+
+@contextmanager
+def wav_file(ab: bytes, sr: int, sw: int, ch: int) -> Iterator[str]:
+    """Unique path to a WAV file of the given audio, deleted afterwards"""
+    with scratch_file() as path:
+        with open(path, "wb") as f:
+            f.write(to_wav(ab, sr, sw, ch))
+        yield path
+
+
+class PCMFramer:
+    def __init__(self, sr: int, sw: int, ch: int, frame_ms: float):
+        self.sr, self.sw, self.ch = sr, sw, ch
+        self.sample_size = sw * ch
+        self.frame_size = max(1, int(sr * frame_ms / 1000)) * self.sample_size
+        self.buffer = bytearray()
+
+    def push(self, data: bytes) -> List[bytes]:
+        """Add received bytes, returning every complete frame"""
+        self.buffer += data
+        frame_count = len(self.buffer) // self.frame_size
+        if not frame_count:
+            return []
+
+        end = frame_count * self.frame_size
+        view = memoryview(self.buffer)
+        frames = [
+            bytes(view[i : i + self.frame_size]) for i in range(0, end, self.frame_size)
+        ]
+        view.release()
+        del self.buffer[:end]
+        return frames
+
+    def flush(self) -> bytes:
+        """Return the last partial frame, dropping any incomplete sample"""
+        end = len(self.buffer) - len(self.buffer) % self.sample_size
+        frame = bytes(self.buffer[:end])
+        self.buffer.clear()
+        return frame
+
+    def chunk(self, frame: bytes) -> Dict[str, Any]:
+        return {"audio_bytes": frame, "sr": self.sr, "sw": self.sw, "ch": self.ch}
+
+
+class WavStreamParser:
+    """Reads the header of a WAV file from the first bytes received"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.sr, self.sw, self.ch = None, None, None
+        self.in_data = False
+
+    def push(self, data: bytes) -> bytes:
+        """Add received bytes, returning any sample data past the header"""
+        if self.in_data:
+            return data
+
+        self.buffer += data
+        if len(self.buffer) < 12:
+            return b""
+        if self.buffer[:4] != b"RIFF" or self.buffer[8:12] != b"WAVE":
+            raise WavFormatError("missing RIFF/WAVE header")
+
+        pos = 12
+        while len(self.buffer) >= pos + 8:
+            chunk_id = bytes(self.buffer[pos : pos + 4])
+            (chunk_size,) = struct.unpack("<I", self.buffer[pos + 4 : pos + 8])
+            if chunk_id == b"data":
+                # Streamed files may not know their data size, so read to the end
+                if self.sr is None:
+                    raise WavFormatError("data before fmt chunk")
+                self.in_data = True
+                data = bytes(self.buffer[pos + 8 :])
+                self.buffer.clear()
+                return data
+
+            if len(self.buffer) < pos + 8 + chunk_size:
+                break  # Wait for the rest of this chunk
+            if chunk_id == b"fmt ":
+                audio_format, ch, sr, _, _, bits = struct.unpack(
+                    "<HHIIHH", self.buffer[pos + 8 : pos + 24]
+                )
+                if audio_format not in (1, 0xFFFE):
+                    raise WavFormatError("unsupported format {}".format(audio_format))
+                self.sr, self.sw, self.ch = sr, bits // 8, ch
+            pos += 8 + chunk_size + chunk_size % 2
+
+        return b""
+
+
+async def stream_pcm(
+    byte_stream: AsyncIterator[bytes], sr: int, sw: int, ch: int, frame_ms: float
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Yield TTS output chunks of frame_ms each from raw PCM as it is received"""
+    framer = PCMFramer(sr, sw, ch, frame_ms)
+    async for data in byte_stream:
+        for frame in framer.push(data):
+            yield framer.chunk(frame)
+
+    frame = framer.flush()
+    if frame:
+        yield framer.chunk(frame)
+
+
+async def stream_wav(
+    byte_stream: AsyncIterator[bytes], frame_ms: float
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Yield TTS output chunks of frame_ms each from a WAV file as it is received"""
+    parser, framer = WavStreamParser(), None
+    async for data in byte_stream:
+        data = parser.push(data)
+        if not data:
+            continue
+        if framer is None:
+            framer = PCMFramer(parser.sr, parser.sw, parser.ch, frame_ms)
+        for frame in framer.push(data):
+            yield framer.chunk(frame)
+
+    if framer is None:
+        if not parser.in_data:
+            raise WavFormatError("stream ended within the header")
+        return
+    frame = framer.flush()
+    if frame:
+        yield framer.chunk(frame)
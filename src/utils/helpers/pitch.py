@@ -0,0 +1,159 @@
+"""
+In-process pitch shifting on NumPy arrays
+
+Pitch is shifted by a factor f by first stretching time by f with WSOLA (waveform
+similarity overlap-add), then resampling by 1/f, so duration and sample rate are kept.
+Both stages keep just enough state between calls to process a stream frame by frame,
+with output identical to processing the whole audio at once.
+
+WSOLA overlap-adds Hann-windowed frames of the input at synthesis hop Hs, taking each
+frame from near its ideal analysis position k * Hs / f. Within a small tolerance, the
+position chosen is the one best correlated with the natural continuation of the previous
+frame, which avoids the phase jumps of plain overlap-add.
+"""
+
+import math
+
+import numpy as np
+
+from .audio import from_float, to_float
+
+
+class TimeStretcher:
+    def __init__(
+        self,
+        sr: int,
+        ch: int,
+        alpha: float,
+        frame_ms: float = 30,
+        tolerance_ms: float = 10,
+    ):
+        self.ch = ch
+        self.hop = max(1, int(sr * frame_ms / 2000))  # synthesis hop Hs
+        self.frame_len = 2 * self.hop
+        self.tolerance = int(sr * tolerance_ms / 1000)
+        self.analysis_hop = self.hop / alpha
+
+        n = np.arange(self.frame_len)
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * n / self.frame_len)).astype(
+            np.float32
+        )[:, None]
+
+        # Frame k is centered on input k * Ha, so starts half a frame earlier
+        pad = self.hop + self.tolerance
+        self.buffer = np.zeros((pad, ch), dtype=np.float32)
+        self.base = -pad  # input index of buffer[0]
+        self.k = 0
+        self.prev = None
+        self.overlap = np.zeros((self.hop, ch), dtype=np.float32)
+        self.dropped_first = False
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        self.buffer = np.concatenate([self.buffer, x])
+        mono = self.buffer.mean(axis=1) if self.ch > 1 else self.buffer[:, 0]
+        blocks = list()
+
+        while True:
+            ideal = int(round(self.k * self.analysis_hop)) - self.hop
+            end = ideal + self.tolerance + self.frame_len
+            if self.prev is not None:
+                end = max(end, self.prev + self.hop + self.frame_len)
+            if end - self.base > len(self.buffer):
+                break
+
+            if self.prev is None:
+                pos = ideal
+            else:
+                start = self.prev + self.hop - self.base
+                template = mono[start : start + self.frame_len]
+                lo = ideal - self.tolerance - self.base
+                segment = mono[lo : lo + 2 * self.tolerance + self.frame_len]
+                corr = np.correlate(segment, template, mode="valid")
+                pos = ideal - self.tolerance + int(np.argmax(corr))
+
+            start = pos - self.base
+            frame = self.buffer[start : start + self.frame_len] * self.window
+            blocks.append(self.overlap + frame[: self.hop])
+            self.overlap = frame[self.hop :]
+            self.prev = pos
+            self.k += 1
+
+        # Keep only what later frames may still read
+        keep_from = min(
+            int(round(self.k * self.analysis_hop)) - self.hop - self.tolerance,
+            (self.prev + self.hop) if self.prev is not None else self.base,
+        )
+        if keep_from > self.base:
+            self.buffer = self.buffer[keep_from - self.base :]
+            self.base = keep_from
+
+        if not blocks:
+            return np.zeros((0, self.ch), dtype=np.float32)
+        out = np.concatenate(blocks)
+        if not self.dropped_first:
+            # The first block lies before the start of the output
+            out = out[self.hop :]
+            self.dropped_first = True
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Process the rest of the input, padded with silence"""
+        padding = self.frame_len + 2 * self.tolerance + int(self.analysis_hop) * 4
+        return self.process(np.zeros((padding, self.ch), dtype=np.float32))
+
+
+class LinearResampler:
+    def __init__(self, ch: int, step: float):
+        self.step = step  # input samples advanced per output sample
+        self.t = 0.0  # position of the next output sample in the buffer
+        self.buffer = np.zeros((0, ch), dtype=np.float32)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self.buffer, x]) if len(self.buffer) else x
+        # Interpolating needs the sample after each position
+        count = max(0, math.ceil((len(buffer) - 1 - self.t) / self.step))
+        positions = self.t + np.arange(count) * self.step
+        idx = positions.astype(np.int64)
+        frac = (positions - idx).astype(np.float32)[:, None]
+        out = (
+            buffer[idx] * (1 - frac)
+            + buffer[np.minimum(idx + 1, len(buffer) - 1)] * frac
+        )
+
+        self.t += count * self.step
+        drop = min(int(self.t), len(buffer))
+        self.buffer = buffer[drop:]
+        self.t -= drop
+        return out
+
+
+class PitchShifter:
+    """Shifts the pitch of a PCM stream by a number of semitones"""
+
+    def __init__(self, sr: int, sw: int, ch: int, semitones: float):
+        self.sr, self.sw, self.ch = sr, sw, ch
+        factor = 2 ** (semitones / 12)
+        self.passthrough = semitones == 0
+        self.stretcher = TimeStretcher(sr, ch, factor)
+        self.resampler = LinearResampler(ch, factor)
+        self.samples_in, self.samples_out = 0, 0
+
+    def process(self, ab: bytes) -> bytes:
+        if self.passthrough:
+            return ab
+        x = to_float(ab, self.sw, self.ch)
+        self.samples_in += len(x)
+        y = self.resampler.process(self.stretcher.process(x))
+        self.samples_out += len(y)
+        return from_float(y, self.sw)
+
+    def flush(self) -> bytes:
+        """Return the rest of the audio, making the output as long as the input"""
+        if self.passthrough:
+            return b""
+        y = self.resampler.process(self.stretcher.flush())
+        remaining = max(0, self.samples_in - self.samples_out)
+        if len(y) < remaining:
+            y = np.concatenate([y, np.zeros((remaining - len(y), self.ch), np.float32)])
+        self.samples_out = self.samples_in
+        return from_float(y[:remaining], self.sw)
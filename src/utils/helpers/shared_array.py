@@ -0,0 +1,61 @@
+"""
+NumPy arrays in shared memory, for handing audio to a model worker process
+
+Arguments and outputs of a ModelWorker call are pickled through a queue, copying them
+twice on the way. Instead, the caller creates a SharedArray and passes only its small
+ref, and the worker attaches to it by name and reads or writes the samples in place.
+
+The caller owns every SharedArray it creates and unlinks it once the call is over, so
+memory is released even when a call is cancelled before the worker gets to it.
+"""
+
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy as np
+
+# (shared memory name, shape, dtype)
+SharedArrayRef = Tuple[str, Tuple[int, ...], str]
+
+
+class SharedArray:
+    def __init__(self, shm: shared_memory.SharedMemory, shape, dtype, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype) -> "SharedArray":
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        return cls(
+            shared_memory.SharedMemory(create=True, size=size), shape, dtype, True
+        )
+
+    @classmethod
+    def copy_of(cls, x: np.ndarray) -> "SharedArray":
+        shared = cls.create(x.shape, x.dtype)
+        shared.array[...] = x
+        return shared
+
+    @classmethod
+    def attach(cls, ref: SharedArrayRef) -> "SharedArray":
+        name, shape, dtype = ref
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, False)
+
+    @property
+    def ref(self) -> SharedArrayRef:
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+    def close(self) -> None:
+        """Release this process's view, unlinking the memory if it created it"""
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
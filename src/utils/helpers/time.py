@@ -1,4 +1,5 @@
 import datetime
+from typing import Dict, Iterable
 from dateutil import tz
 
 
@@ -21,3 +22,14 @@ def timestamp_to_str(timestamp: int, include_ms: bool = True):
     time = time.astimezone(tz.tzlocal()).isoformat()
 
     return time
+
+
+def latency_stats(latencies: Iterable[float]) -> Dict[str, float]:
+    """Count, mean and percentiles of latencies in seconds"""
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+    }
@@ -0,0 +1,138 @@
+"""
+Cache of MCP tool results
+
+The tool phase of every response tends to repeat the calls of the last one, such as
+reading the same resources. Results are kept for a time to live (TTL) after they are
+fetched, keyed by name and arguments, so a repeated call is answered without asking
+the server.
+
+Resources and resource templates are reads, so they are cached for resource_ttl seconds
+by default. Tools may act on something (sending a message, rolling dice), so they are
+not cached unless given a TTL. Either can be set per name:
+
+```yaml
+mcp_cache:
+  resource_ttl: 60
+  tool_ttl: 0
+  tools:
+    weather: {ttl: 600}
+    notes: {cacheable: false}
+```
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .tool_calls import TOOL
+
+
+def cache_key(name: str, arguments: Dict[str, Any]) -> str:
+    """Same key for the same arguments however they were written"""
+    return "{}\0{}".format(
+        name,
+        json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str),
+    )
+
+
+class ToolResultCache:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # key: (expiry, result)
+        self.counts: Dict[str, Dict[str, int]] = dict()  # name: hits and misses
+
+        self.resource_ttl: float = 60
+        self.tool_ttl: float = 0
+        self.max_entries: int = 1024
+        self.tools: Dict[str, Dict[str, Any]] = dict()
+
+    def configure(self, config_d: Dict[str, Any]):
+        if "resource_ttl" in config_d:
+            self.resource_ttl = float(config_d["resource_ttl"])
+        if "tool_ttl" in config_d:
+            self.tool_ttl = float(config_d["tool_ttl"])
+        if "max_entries" in config_d:
+            self.max_entries = int(config_d["max_entries"])
+        if "tools" in config_d:
+            self.tools = {
+                str(name): dict(policy or {})
+                for name, policy in dict(config_d["tools"]).items()
+            }
+
+        assert self.resource_ttl >= 0
+        assert self.tool_ttl >= 0
+        assert self.max_entries >= 0
+        for policy in self.tools.values():
+            assert float(policy.get("ttl", 0)) >= 0
+
+        self.clear()
+
+    def ttl(self, name: str, kind: str) -> float:
+        """Seconds a result of name is kept, 0 if it is not cached"""
+        policy = self.tools.get(name, {})
+        if not policy.get("cacheable", True):
+            return 0
+        if "ttl" in policy:
+            return float(policy["ttl"])
+        return self.tool_ttl if kind == TOOL else self.resource_ttl
+
+    def get(self, name: str, kind: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        if not self.ttl(name, kind):
+            return None
+        counts = self.counts.setdefault(name, {"hits": 0, "misses": 0})
+        key = cache_key(name, arguments)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self.entries[key]
+            counts["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        counts["hits"] += 1
+        return entry[1]
+
+    def put(self, name: str, kind: str, arguments: Dict[str, Any], result: Any):
+        ttl = self.ttl(name, kind)
+        if not ttl or not self.max_entries:
+            return
+        key = cache_key(name, arguments)
+        self.entries[key] = (self.clock() + ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, name: str = None, arguments: Dict[str, Any] = None) -> int:
+        """Forget results of one call, every call to name, or everything. Returns the
+        number of results forgotten"""
+        if name is None:
+            removed = len(self.entries)
+            self.entries.clear()
+            return removed
+        if arguments is not None:
+            return 1 if self.entries.pop(cache_key(name, arguments), None) else 0
+
+        prefix = name + "\0"
+        keys = [key for key in self.entries if key.startswith(prefix)]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.counts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits, misses and hit rate overall and per name"""
+
+        def rate(counts):
+            total = counts["hits"] + counts["misses"]
+            return {**counts, "hit_rate": counts["hits"] / total if total else 0.0}
+
+        hits = sum(counts["hits"] for counts in self.counts.values())
+        misses = sum(counts["misses"] for counts in self.counts.values())
+        return {
+            **rate({"hits": hits, "misses": misses}),
+            "entries": len(self.entries),
+            "tools": {name: rate(counts) for name, counts in self.counts.items()},
+        }
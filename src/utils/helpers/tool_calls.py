@@ -0,0 +1,105 @@
+"""
+Running the tool calls of one tooling response
+
+The tooling LLM replies with one tool call per line. Every call is started at once, so
+the MCP phase of a response takes as long as its slowest call rather than the sum of
+them. Each server still runs at most its own max_concurrency calls at a time, and a call
+that takes longer than its server's timeout is given up on. Results come back in the
+order the calls were written. Results can be reused from a ToolResultCache.
+
+Names are looked up in an index built when servers are loaded. When two servers offer
+the same name, the one loaded first is used.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+CALL_PATTERN = re.compile(r"^<[\S]*>")
+
+TOOL = "tool"
+RESOURCE = "resource"
+TEMPLATE = "template"
+
+
+class ToolEntry(NamedTuple):
+    client_id: str
+    kind: str  # TOOL, RESOURCE or TEMPLATE
+    target: Any  # tool name, resource URI or URI template
+
+
+def build_tool_index(clients: Dict[str, Any]) -> Dict[str, ToolEntry]:
+    """Every name offered by clients, in the order the clients were loaded"""
+    index = dict()
+    for client_id, client in clients.items():
+        for tool in client.tools:
+            index.setdefault(tool.name, ToolEntry(client_id, TOOL, tool.name))
+        for resource in client.resources:
+            index.setdefault(
+                resource.name, ToolEntry(client_id, RESOURCE, resource.uri)
+            )
+        for template in client.templates:
+            index.setdefault(
+                template.name, ToolEntry(client_id, TEMPLATE, template.uriTemplate)
+            )
+    return index
+
+
+def parse_tool_calls(tooling_response: str) -> List[Tuple[str, Any]]:
+    """Name and arguments of each call, or the error parsing its arguments"""
+    calls = list()
+    for line in tooling_response.split("\n"):
+        match = CALL_PATTERN.search(line)
+        if match is None:
+            continue
+        name = line[: match.span()[1]].lstrip("<").rstrip(">")
+        arguments = line[match.span()[1] :].rstrip(" ")
+        try:
+            calls.append((name, json.loads(arguments) if len(arguments) else dict()))
+        except Exception as err:
+            calls.append((name, err))
+    return calls
+
+
+async def dispatch_tool_calls(
+    calls: List[Tuple[str, Any]],
+    index: Dict[str, ToolEntry],
+    clients: Dict[str, Any],
+    cache: Any = None,
+) -> List[Tuple[str, str]]:
+    """Run calls concurrently, returning the name and result of each call that
+    produced one, in order. Results in cache (a ToolResultCache) are reused"""
+
+    async def run(name: str, arguments: Any):
+        try:
+            if isinstance(arguments, Exception):
+                raise arguments
+            entry = index.get(name)
+            if entry is None:
+                return None
+            if cache is not None:
+                result = cache.get(name, entry.kind, arguments)
+                if result is not None:
+                    return result
+
+            client = clients[entry.client_id]
+            async with client.limit:
+                try:
+                    result = await asyncio.wait_for(
+                        client.call(entry, arguments), client.timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise TimeoutError(
+                        "no result after {} seconds".format(client.timeout)
+                    ) from None
+            if cache is not None and result:
+                cache.put(name, entry.kind, arguments, result)
+            return result
+        except Exception as err:
+            logging.critical("Error occured during MCP", exc_info=True)
+            return "Attempt to use MCP tool failed due to {}".format(str(err))
+
+    results = await asyncio.gather(*[run(name, arguments) for name, arguments in calls])
+    return [(name, result) for (name, _), result in zip(calls, results) if result]
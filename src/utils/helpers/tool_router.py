@@ -0,0 +1,151 @@
+"""
+Deciding which tools a response may need
+
+Planning tool calls costs a whole LLM generation before the response can start, and
+most of the time the plan is to call nothing. The router compares the latest lines of
+the conversation with the name and description of every tool, resource and template,
+and only those that look relevant are offered to the tooling LLM. When none are,
+planning is skipped altogether.
+
+Only what was said is compared. Speaker names (such as "user") and results of earlier
+tool calls (which name their tool) would otherwise match tools by who spoke or by what
+was already called.
+
+Modes:
+- always: offer everything on every response, as before there was a router
+- keyword: score words shared with a tool's name and description, weighing words used
+  by fewer tools higher. A word used by only that tool scores 1, however many tools
+  there are
+- embedding: cosine similarity of embeddings of the conversation and of each tool,
+  falling back to keyword while no embedding operation is loaded
+"""
+
+import math
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from utils.prompter.message import MCPMessage, Message
+
+MODES = ["always", "keyword", "embedding"]
+
+# Words too common to say anything about which tool is wanted
+STOPWORDS = set("""
+    the and for are but not you your yours with this that these those from have has
+    had was were will would could should can what when where which who whom why how
+    all any each few more most other some such than too very just about into over
+    under again then once here there their them they its it's our ours out off only
+    own same also get gets got use uses used using tool tools return returns given
+    give does did doing done been being let lets like make made want wants need needs
+    """.split())
+
+Embed = Callable[[List[str]], Awaitable[Optional[np.ndarray]]]
+
+
+def tokenize(text: str) -> Set[str]:
+    """Distinct lowercase words of text, splitting names like get_weather and
+    getWeather into their words"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+class ToolRouter:
+    def __init__(self):
+        self.documents: Dict[str, str] = dict()  # name: text describing it
+        self.tokens: Dict[str, Set[str]] = dict()
+        # word: inverse document frequency, relative to that of a word used by one tool
+        self.weights: Dict[str, float] = dict()
+
+        self.mode: str = "keyword"
+        self.query_lines: int = 3
+        self.keyword_threshold: float = 1.0
+        self.embedding_threshold: float = 0.35
+        self.max_tools: int = 8
+
+    def configure(self, config_d: Dict):
+        if "mode" in config_d:
+            self.mode = str(config_d["mode"])
+        if "query_lines" in config_d:
+            self.query_lines = int(config_d["query_lines"])
+        if "keyword_threshold" in config_d:
+            self.keyword_threshold = float(config_d["keyword_threshold"])
+        if "embedding_threshold" in config_d:
+            self.embedding_threshold = float(config_d["embedding_threshold"])
+        if "max_tools" in config_d:
+            self.max_tools = int(config_d["max_tools"])
+
+        assert self.mode in MODES
+        assert self.query_lines > 0
+        assert self.keyword_threshold > 0
+        assert -1 <= self.embedding_threshold <= 1
+        assert self.max_tools > 0
+
+    def set_catalogue(self, descriptions: Dict[str, str]) -> None:
+        """Replace the tools routed to with a mapping of name to description"""
+        self.documents = {
+            name: "{} {}".format(name, description or "")
+            for name, description in descriptions.items()
+        }
+        self.tokens = {name: tokenize(text) for name, text in self.documents.items()}
+        counts = dict()
+        for words in self.tokens.values():
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+        # Relative, so the same threshold holds with one tool as with twenty
+        unique = math.log(1 + len(self.tokens))
+        self.weights = {
+            word: math.log(1 + len(self.tokens) / count) / unique
+            for word, count in counts.items()
+        }
+
+    def query_text(self, messages: List[Message]) -> str:
+        """What was said in the latest query_lines messages, without who said it or the
+        results of tools"""
+        said = [
+            message.message
+            for message in messages
+            if not isinstance(message, MCPMessage)
+        ]
+        return "\n".join(said[-self.query_lines :])
+
+    def keyword_scores(self, text: str) -> Dict[str, float]:
+        words = tokenize(text)
+        return {
+            name: sum(self.weights[word] for word in words & tool_words)
+            for name, tool_words in self.tokens.items()
+        }
+
+    async def route(self, text: str, embed: Embed = None) -> List[str]:
+        """Names worth offering for text, most relevant first. Empty when planning
+        can be skipped"""
+        if not self.documents:
+            return []
+        if self.mode == "always":
+            return list(self.documents)
+
+        scores, threshold = None, self.keyword_threshold
+        if self.mode == "embedding" and embed is not None:
+            names = list(self.documents)
+            # Descriptions don't change, so they come from the embedding cache
+            vectors = await embed([self.documents[name] for name in names] + [text])
+            if vectors is not None:
+                vectors = vectors / np.maximum(
+                    np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+                )
+                similarity = vectors[:-1] @ vectors[-1]
+                scores = dict(zip(names, similarity.tolist()))
+                threshold = self.embedding_threshold
+        if scores is None:
+            scores = self.keyword_scores(text)
+
+        selected = [name for name in scores if scores[name] >= threshold]
+        selected.sort(key=lambda name: -scores[name])
+        return selected[: self.max_tools]
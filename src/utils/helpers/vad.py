@@ -0,0 +1,137 @@
+"""
+Voice activity detection on a stream of PCM
+
+Audio is split into frames of frame_ms, and a frame counts as speech when its level is
+margin_db above the noise floor (and above min_level_db). The noise floor follows
+quiet frames down at once and rises slowly, so it adapts to background noise without
+following speech up.
+
+A segment opens after min_speech_ms of speech, starting pre_roll_ms early so the first
+syllable is not cut, and closes after silence_ms without speech or once it reaches
+max_segment_ms. Segments are returned as soon as they close, in the format of the input.
+"""
+
+from collections import deque
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .audio import AudioFormat, mix_channels, to_float
+
+NOISE_RISE = 0.005  # of the difference to the frame level, per frame
+SILENCE_DB = -100.0
+
+
+class VADSegmenter:
+    def __init__(
+        self,
+        fmt: AudioFormat,
+        frame_ms: int = 20,
+        margin_db: float = 12.0,
+        min_level_db: float = -50.0,
+        min_speech_ms: int = 100,
+        silence_ms: int = 600,
+        pre_roll_ms: int = 200,
+        max_segment_ms: int = 15000,
+    ):
+        assert frame_ms > 0
+        assert margin_db >= 0
+        assert 0 < min_speech_ms <= max_segment_ms
+        assert silence_ms > 0
+        assert pre_roll_ms >= 0
+
+        self.fmt = fmt
+        self.frame_ms = frame_ms
+        self.frame_size = max(1, fmt.sr * frame_ms // 1000) * fmt.sw * fmt.ch
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.min_speech_frames = math.ceil(min_speech_ms / frame_ms)
+        self.silence_frames = math.ceil(silence_ms / frame_ms)
+        self.max_segment_frames = max_segment_ms // frame_ms
+
+        self.buffer = b""  # start of the next frame
+        self.frame_index = 0
+        self.noise_floor = None
+
+        # Frames before a segment opens, long enough to hold its pre-roll
+        self.recent = deque(maxlen=pre_roll_ms // frame_ms + self.min_speech_frames)
+        self.speech_run = 0
+        self.segment: List[bytes] = None  # frames of the open segment
+        self.segment_start = 0
+        self.silence_run = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self.segment is not None
+
+    def feed(self, ab: bytes) -> List[Dict[str, Any]]:
+        """Take the next audio, returning every segment that closed"""
+        ab = self.buffer + ab
+        count = len(ab) // self.frame_size
+        self.buffer = ab[count * self.frame_size :]
+        if not count:
+            return []
+
+        frames = ab[: count * self.frame_size]
+        x = mix_channels(to_float(frames, self.fmt.sw, self.fmt.ch), 1)
+        rms = np.sqrt(np.mean(np.square(x[:, 0].reshape(count, -1)), axis=1))
+        levels = 20 * np.log10(np.maximum(rms, 10 ** (SILENCE_DB / 20)))
+
+        segments = list()
+        for i, level in enumerate(levels.tolist()):
+            frame = frames[i * self.frame_size : (i + 1) * self.frame_size]
+            segment = self._step(frame, self._is_speech(level))
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Close the open segment, if any, once the audio is complete"""
+        if self.segment is None:
+            return []
+        if self.buffer:
+            self.segment.append(self.buffer)
+        return [self._close()]
+
+    def _is_speech(self, level: float) -> bool:
+        if self.noise_floor is None or level < self.noise_floor:
+            self.noise_floor = level
+        else:
+            self.noise_floor += (level - self.noise_floor) * NOISE_RISE
+        return level >= max(self.noise_floor + self.margin_db, self.min_level_db)
+
+    def _step(self, frame: bytes, speech: bool):
+        self.frame_index += 1
+        if self.segment is None:
+            self.recent.append(frame)
+            self.speech_run = self.speech_run + 1 if speech else 0
+            if self.speech_run >= self.min_speech_frames:
+                self.segment = list(self.recent)
+                self.segment_start = self.frame_index - len(self.segment)
+                self.recent.clear()
+                self.speech_run = 0
+                self.silence_run = 0
+            return None
+
+        self.segment.append(frame)
+        self.silence_run = 0 if speech else self.silence_run + 1
+        if (
+            self.silence_run >= self.silence_frames
+            or len(self.segment) >= self.max_segment_frames
+        ):
+            return self._close()
+        return None
+
+    def _close(self) -> Dict[str, Any]:
+        audio_bytes = b"".join(self.segment)
+        start_ms = self.segment_start * self.frame_ms
+        frame_bytes = self.fmt.sw * self.fmt.ch
+        duration_ms = len(audio_bytes) // frame_bytes * 1000 // self.fmt.sr
+        self.segment = None
+        self.silence_run = 0
+        return {
+            "audio_bytes": audio_bytes,
+            "start_ms": start_ms,
+            "end_ms": start_ms + duration_ms,
+        }
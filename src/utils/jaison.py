@@ -7,11 +7,20 @@ from typing import Dict, Coroutine, List, Any, Tuple
 from enum import Enum
 
 from utils.helpers.singleton import Singleton
-from utils.helpers.iterable import chunk_buffer
+from utils.helpers.audio import AudioFormat
+from utils.helpers.codec import (
+    AudioEncoder,
+    encoder_format,
+    open_encoder,
+    packet_events,
+)
+from utils.helpers.embedding import to_base64
 from utils.helpers.observer import ObserverServer
 
 from utils.config import Config, UnknownField, UnknownFile
 from utils.prompter import Prompter
+from utils.memory import MemoryStore
+from utils.lifecycle import LifecycleManager
 from utils.prompter.message import (
     RawMessage,
     RequestMessage,
@@ -22,6 +31,7 @@ from utils.prompter.message import (
 from utils.processes import ProcessManager
 from utils.operations import (
     OperationManager,
+    STTStream,
     OpRoles,
     Operation,
     UnknownOpType,
@@ -51,6 +61,8 @@ class JobType(Enum):
     CONTEXT_REQUEST_ADD = "context_request_add"
     CONTEXT_CONVERSATION_ADD_TEXT = "context_conversation_add_text"
     CONTEXT_CONVERSATION_ADD_AUDIO = "context_conversation_add_audio"
+    CONTEXT_CONVERSATION_STREAM_AUDIO = "context_conversation_stream_audio"
+    CONTEXT_CONVERSATION_ADD_AUDIO_BATCH = "context_conversation_add_audio_batch"
     CONTEXT_CUSTOM_REGISTER = "context_custom_register"
     CONTEXT_CUSTOM_REMOVE = "context_custom_remove"
     CONTEXT_CUSTOM_ADD = "context_custom_add"
@@ -67,11 +79,14 @@ class JobType(Enum):
 class JAIson(metaclass=Singleton):
     def __init__(self):  # attribute stubs
         self.job_loop: asyncio.Task = None
+        self.maintenance_loop: asyncio.Task = None
         self.job_queue: asyncio.Queue = None
         self.job_map: Dict[str, Tuple[JobType, Coroutine]] = None
         self.job_current_id: str = None
         self.job_current: asyncio.Task = None
         self.job_skips: dict = None
+        # Tasks of streamed jobs still taking input, which are only queued once it ends
+        self.job_streams: Dict[str, asyncio.Task] = None
 
         # Any asyncio.Tasks in this list will be cancelled before the next job runs
         self.tasks_to_clean: List = list()
@@ -88,13 +103,18 @@ class JAIson(metaclass=Singleton):
         self.job_queue = asyncio.Queue()
         self.job_map = dict()
         self.job_skips = dict()
+        self.job_streams = dict()
         self.job_loop = asyncio.create_task(self._process_job_loop())
 
         self.event_server = ObserverServer()
 
         self.prompter = Prompter()
         await self.prompter.configure(Config().prompter)
+        self.memory = MemoryStore()
+        await self.memory.configure(Config().memory)
 
+        self.lifecycle = LifecycleManager()
+        await self.lifecycle.configure(Config().lifecycle)
         self.process_manager = ProcessManager()
         self.op_manager = OperationManager()
         self.mcp_manager = MCPManager()
@@ -105,10 +125,16 @@ class JAIson(metaclass=Singleton):
         )
         await self.op_manager.load_operations_from_config()
         await self.process_manager.reload()
+        self.maintenance_loop = asyncio.create_task(self._maintenance_loop())
         logging.info("JAIson application layer has started.")
 
     async def stop(self):
         logging.info("Shutting down JAIson application layer")
+        if self.maintenance_loop is not None:
+            self.maintenance_loop.cancel()
+            self.maintenance_loop = None
+        for task in list(self.job_streams.values()):
+            task.cancel()
         await self.op_manager.close_operation_all()
         await self.mcp_manager.close()
         await self.process_manager.unload()
@@ -135,6 +161,23 @@ class JAIson(metaclass=Singleton):
             coro = self.append_conversation_context_audio(
                 new_job_id, job_type_enum, **kwargs
             )
+        elif job_type_enum == JobType.CONTEXT_CONVERSATION_STREAM_AUDIO:
+            # Transcribed while the audio arrives without holding up the queue, which
+            # only gets the job committing the transcription once the audio ends
+            self.job_map[new_job_id] = (job_type_enum, None)
+            self.job_streams[new_job_id] = asyncio.create_task(
+                self.stream_conversation_context_audio(
+                    new_job_id, job_type_enum, **kwargs
+                )
+            )
+            logging.info(
+                "Streaming new {} job {}".format(job_type_enum.value, new_job_id)
+            )
+            return new_job_id
+        elif job_type_enum == JobType.CONTEXT_CONVERSATION_ADD_AUDIO_BATCH:
+            coro = self.append_conversation_context_audio_batch(
+                new_job_id, job_type_enum, **kwargs
+            )
         elif job_type_enum == JobType.CONTEXT_CLEAR:
             coro = self.clear_context(new_job_id, job_type_enum, **kwargs)
         elif job_type_enum == JobType.CONTEXT_CONFIGURE:
@@ -179,13 +222,16 @@ class JAIson(metaclass=Singleton):
             cancel_message += f" because {reason}"
         logging.info(cancel_message)
 
-        if job_id == self.job_current_id:
+        if job_id in self.job_streams:
+            # If job is still taking input, its stream is cancelled with it
+            self.job_streams.pop(job_id).cancel(cancel_message)
+        elif job_id == self.job_current_id:
             # If job is already running
             self._clear_current_job(reason=cancel_message)
         else:
             # If job is still in Queue
             # Simply flag to skip. Unzipping queue can potentially process a job out of order
-            self.job_skips[job_id](cancel_message)
+            self.job_skips[job_id] = cancel_message
 
     def _clear_current_job(self, reason: str = None):
         self.job_map.pop(self.job_current_id, None)
@@ -204,9 +250,6 @@ class JAIson(metaclass=Singleton):
     async def _process_job_loop(self):
         while True:
             try:
-                await self.process_manager.reload()
-                await self.process_manager.unload()
-
                 self.job_current_id = await self.job_queue.get()
                 job_type, coro = self.job_map[self.job_current_id]
 
@@ -217,7 +260,7 @@ class JAIson(metaclass=Singleton):
                         self.job_current_id, job_type, asyncio.CancelledError(reason)
                     )
                     self._clear_current_job(reason=reason)
-                    del coro
+                    coro.close()
                 else:
                     # Run and wait for completion
                     self.job_current = asyncio.create_task(coro)
@@ -241,6 +284,19 @@ class JAIson(metaclass=Singleton):
                 )
                 await asyncio.sleep(1)
 
+    # Side loop applying process reload and unload signals and unloading idle models
+    # and processes, whether or not jobs are coming in
+    async def _maintenance_loop(self):
+        while True:
+            try:
+                await self.process_manager.reload()
+                await self.process_manager.unload()
+                await self.lifecycle.evict_idle()
+                await self.lifecycle.enforce_budget()
+            except Exception as err:
+                logging.error("Encountered error in maintenance loop", exc_info=True)
+            await asyncio.sleep(self.lifecycle.check_interval)
+
     ## Regular Request Handlers ###################
 
     def get_loaded_operations(self):
@@ -258,6 +314,30 @@ class JAIson(metaclass=Singleton):
     def get_current_config(self):
         return Config().get_config_dict()
 
+    def get_process_stats(self):
+        return self.process_manager.get_stats()
+
+    def get_resource_stats(self):
+        return self.lifecycle.get_stats()
+
+    def get_mcp_cache_stats(self):
+        return self.mcp_manager.get_cache_stats()
+
+    def invalidate_mcp_cache(self, name: str = None, arguments: Dict = None) -> int:
+        return self.mcp_manager.invalidate_cache(name, arguments)
+
+    def open_conversation_audio_stream(
+        self, sr: int, sw: int, ch: int, vad: Dict[str, Any] = None
+    ) -> STTStream:
+        """Start transcribing audio sent piece by piece, for use in a
+        context_conversation_stream_audio job"""
+        prompt = self.prompter.get_history_text() or "You're name is {}".format(
+            self.prompter.character_name
+        )
+        return self.op_manager.open_stt_stream(
+            AudioFormat.of({"sr": sr, "sw": sw, "ch": ch}), prompt, **(vad or {})
+        )
+
     ## Async Job Handlers #########################
 
     """
@@ -266,43 +346,46 @@ class JAIson(metaclass=Singleton):
     """
 
     async def response_pipeline(
-        self, job_id: str, job_type: JobType, include_audio: bool = True
+        self,
+        job_id: str,
+        job_type: JobType,
+        include_audio: bool = True,
+        audio_format: Dict[str, int] = None,
+        codec: str = "pcm",
     ):
+        # Audio is converted to this format once, at the end of the audio filters
+        target_format = AudioFormat.of(audio_format) if audio_format else None
+        target_format = encoder_format(codec, target_format)
 
         # Adjust flags based on loaded ops
         if not self.op_manager.get_operation(OpRoles.TTS):
             include_audio = False
 
+        # Audio of the whole response is encoded as one stream
+        encoder = open_encoder(codec, target_format) if include_audio else None
+        codec_header = encoder.header if encoder else None
+
         # Broadcast start conditions
         await self._handle_broadcast_start(
-            job_id, job_type, {"include_audio": include_audio}
+            job_id,
+            job_type,
+            {
+                "include_audio": include_audio,
+                "audio_format": target_format._asdict() if target_format else None,
+                "codec": codec,
+                "codec_header": (
+                    base64.b64encode(codec_header).decode("utf-8")
+                    if codec_header
+                    else None
+                ),
+            },
         )
 
-        # Handle MCP stuff
+        # Plan and call tools while memories for the prompt are recalled
+        prepare = [self.prompter.recall_memories()]
         if self.op_manager.get_operation(OpRoles.MCP):
-            self.prompter.add_mcp_usage_prompt(
-                self.mcp_manager.get_tooling_prompt(),
-                self.mcp_manager.get_response_prompt(),
-            )
-            mcp_sys_prompt, mcp_user_prompt = (
-                self.prompter.generate_mcp_system_context(),
-                self.prompter.generate_mcp_user_context(),
-            )
-            tooling_response = ""
-            async for chunk in self.op_manager.use_operation(
-                OpRoles.MCP,
-                {
-                    "instruction_prompt": mcp_sys_prompt,
-                    "messages": [RawMessage(mcp_user_prompt)],
-                },
-            ):
-                tooling_response += chunk["content"]
-
-            ## Perform MCP tool calls
-            tool_call_results = await self.mcp_manager.use(tooling_response)
-
-            ## Add results and usage prompt to prompter
-            self.prompter.add_mcp_results(tool_call_results)
+            prepare.append(self._use_tools())
+        await asyncio.gather(*prepare)
 
         # Get prompts
         instruction_prompt, history = (
@@ -310,61 +393,97 @@ class JAIson(metaclass=Singleton):
             self.prompter.get_history(),
         )
 
-        # Appy t2t
-        t2t_result = ""
-        async for chunk_out in self.op_manager.use_operation(
-            OpRoles.T2T, {"instruction_prompt": instruction_prompt, "messages": history}
-        ):
-            t2t_result += chunk_out["content"]
-
-        # Broadcast raw results
+        # Broadcast prompts
         await self._handle_broadcast_event(
             job_id, job_type, {"instruction_prompt": instruction_prompt}
         )
         await self._handle_broadcast_event(
             job_id, job_type, {"history": [msg.to_dict() for msg in history]}
         )
-        await self._handle_broadcast_event(
-            job_id, job_type, {"raw_content": t2t_result}
-        )
+
+        # Appy t2t, streaming its output into text filters as it is generated
+        async def t2t_stream():
+            t2t_result = ""
+            async for chunk_out in self.op_manager.use_operation(
+                OpRoles.T2T,
+                {"instruction_prompt": instruction_prompt, "messages": history},
+            ):
+                if chunk_out["content"]:
+                    t2t_result += chunk_out["content"]
+                    yield chunk_out
+
+            # Broadcast raw results
+            await self._handle_broadcast_event(
+                job_id, job_type, {"raw_content": t2t_result}
+            )
 
         # Apply text filters
-        async for text_chunk_out in self.op_manager.use_operation(
-            OpRoles.FILTER_TEXT, {"content": t2t_result}
+        async for text_chunk_out in self.op_manager.use_filter_text_stream(
+            t2t_stream()
         ):
             self.prompter.add_chat(
                 self.prompter.character_name, text_chunk_out["content"]
             )
             await self._handle_broadcast_event(job_id, job_type, text_chunk_out)
             if include_audio:
-                # Apply tts
+                # Apply tts filters over the whole sentence, as it is synthesized
+                audio_stream = self.op_manager.open_filter_audio_stream(
+                    target_format
+                )
                 async for audio_chunk_out in self.op_manager.use_operation(
                     OpRoles.TTS, text_chunk_out
                 ):
-                    # Apply tts filters
-                    async for final_audio_chunk_out in self.op_manager.use_operation(
-                        OpRoles.FILTER_AUDIO, audio_chunk_out
+                    for final_audio_chunk_out in await audio_stream.feed(
+                        audio_chunk_out
                     ):
-                        # Broadcast results (only the audio data for now)
-                        for ws_chunk in chunk_buffer(
-                            base64.b64encode(
-                                final_audio_chunk_out["audio_bytes"]
-                            ).decode("utf-8")
-                        ):
-                            await self._handle_broadcast_event(
-                                job_id,
-                                job_type,
-                                {
-                                    "audio_bytes": ws_chunk,
-                                    "sr": final_audio_chunk_out["sr"],
-                                    "sw": final_audio_chunk_out["sw"],
-                                    "ch": final_audio_chunk_out["ch"],
-                                },
-                            )
+                        await self._handle_broadcast_audio(
+                            job_id, job_type, encoder, final_audio_chunk_out
+                        )
+                for final_audio_chunk_out in await audio_stream.flush():
+                    await self._handle_broadcast_audio(
+                        job_id, job_type, encoder, final_audio_chunk_out
+                    )
+
+        if encoder is not None:
+            packets = await asyncio.to_thread(encoder.flush)
+            await self._handle_broadcast_packets(
+                job_id, job_type, encoder, encoder.format, packets
+            )
 
         # Broadcast completion
         await self._handle_broadcast_success(job_id, job_type)
 
+    async def _use_tools(self):
+        """Plan and make MCP tool calls, adding their results to the script. Planning
+        is skipped when the router finds no tool relevant to the conversation"""
+        tool_names = await self.mcp_manager.route(self.prompter.get_history())
+        self.prompter.add_mcp_usage_prompt(
+            self.mcp_manager.get_tooling_prompt(tool_names),
+            self.mcp_manager.get_response_prompt(),
+        )
+        if not tool_names:
+            return
+
+        mcp_sys_prompt, mcp_user_prompt = (
+            self.prompter.generate_mcp_system_context(),
+            self.prompter.generate_mcp_user_context(),
+        )
+        tooling_response = ""
+        async for chunk in self.op_manager.use_operation(
+            OpRoles.MCP,
+            {
+                "instruction_prompt": mcp_sys_prompt,
+                "messages": [RawMessage(mcp_user_prompt)],
+            },
+        ):
+            tooling_response += chunk["content"]
+
+        ## Perform MCP tool calls
+        tool_call_results = await self.mcp_manager.use(tooling_response)
+
+        ## Add results and usage prompt to prompter
+        self.prompter.add_mcp_results(tool_call_results)
+
     # Context modification
     async def clear_context(self, job_id: str, job_type: JobType):
         await self._handle_broadcast_start(job_id, job_type, {})
@@ -526,6 +645,176 @@ class JAIson(metaclass=Singleton):
         )
         await self._handle_broadcast_success(job_id, job_type)
 
+    async def append_conversation_context_audio_batch(
+        self,
+        job_id: str,
+        job_type: JobType,
+        segments: List[Dict[str, Any]] = None,
+    ):
+        assert segments, "No segments given"
+        for segment in segments:
+            assert "audio_bytes" in segment and "user" in segment
+        await self._handle_broadcast_start(
+            job_id,
+            job_type,
+            {
+                "segments": [
+                    {
+                        "user": segment["user"],
+                        "timestamp": segment.get("timestamp"),
+                        "sr": segment.get("sr"),
+                        "sw": segment.get("sw"),
+                        "ch": segment.get("ch"),
+                        "audio_bytes": True,
+                    }
+                    for segment in segments
+                ]
+            },
+        )  # Don't send full audio bytes over websocket, just flag as gotten
+
+        # Lines are added in the order they were spoken, not the order given
+        segments = sorted(
+            segments,
+            key=lambda segment: (
+                segment.get("timestamp") is None,
+                segment.get("timestamp") or 0,
+            ),
+        )
+        prompt = self.prompter.get_history_text() or "You're name is {}".format(
+            self.prompter.character_name
+        )
+        contents = await self.op_manager.use_stt_batch(
+            [
+                {
+                    "prompt": prompt,
+                    "audio_bytes": base64.b64decode(segment["audio_bytes"]),
+                    "sr": segment.get("sr"),
+                    "sw": segment.get("sw"),
+                    "ch": segment.get("ch"),
+                }
+                for segment in segments
+            ]
+        )
+
+        for segment, content in zip(segments, contents):
+            if not content.strip():
+                continue  # Nothing was said, such as background noise
+            timestamp = segment.get("timestamp")
+            self.prompter.add_chat(
+                segment["user"],
+                content,
+                time=(
+                    datetime.datetime.fromtimestamp(timestamp)
+                    if isinstance(timestamp, int)
+                    else timestamp
+                ),
+            )
+            last_line_o = self.prompter.history[-1]
+            await self._handle_broadcast_event(
+                job_id,
+                job_type,
+                {
+                    "user": last_line_o.user,
+                    "timestamp": last_line_o.time.timestamp(),
+                    "content": last_line_o.message,
+                    "line": last_line_o.to_line(),
+                },
+            )
+        await self._handle_broadcast_success(job_id, job_type)
+
+    async def stream_conversation_context_audio(
+        self,
+        job_id: str,
+        job_type: JobType,
+        user: str = None,
+        timestamp: int = None,
+        stream: STTStream = None,
+    ):
+        """Follow a context_conversation_stream_audio job's stream outside of the queue,
+        then queue committing what was said"""
+
+        async def broadcast_partial(result: Dict[str, Any], partial: str):
+            await self._handle_broadcast_event(
+                job_id,
+                job_type,
+                {
+                    "user": user,
+                    "transcription": result["transcription"],
+                    "start_ms": result["start_ms"],
+                    "end_ms": result["end_ms"],
+                    "partial": partial,
+                },
+            )
+
+        try:
+            await self._handle_broadcast_start(
+                job_id,
+                job_type,
+                {
+                    "user": user,
+                    "timestamp": timestamp,
+                    "sr": stream.fmt.sr,
+                    "sw": stream.fmt.sw,
+                    "ch": stream.fmt.ch,
+                },
+            )
+            content = await stream.collect(broadcast_partial)
+        except asyncio.CancelledError as err:
+            stream.cancel()
+            self.job_map.pop(job_id, None)
+            await self._handle_broadcast_error(job_id, job_type, err)
+            raise
+        except Exception as err:
+            stream.cancel()
+            self.job_map.pop(job_id, None)
+            logging.warning(
+                f"Job was cancelled due to an error: {err}", exc_info=err
+            )
+            await self._handle_broadcast_error(job_id, job_type, err)
+            return
+        finally:
+            self.job_streams.pop(job_id, None)
+
+        self.job_map[job_id] = (
+            job_type,
+            self.append_conversation_context_audio_stream(
+                job_id, job_type, user=user, timestamp=timestamp, content=content
+            ),
+        )
+        await self.job_queue.put(job_id)
+        logging.info("Queued new {} job {}".format(job_type.value, job_id))
+
+    async def append_conversation_context_audio_stream(
+        self,
+        job_id: str,
+        job_type: JobType,
+        user: str = None,
+        timestamp: int = None,
+        content: str = None,
+    ):
+        if content:
+            self.prompter.add_chat(
+                user,
+                content,
+                time=(
+                    datetime.datetime.fromtimestamp(timestamp)
+                    if isinstance(timestamp, int)
+                    else timestamp
+                ),
+            )
+            last_line_o = self.prompter.history[-1]
+            await self._handle_broadcast_event(
+                job_id,
+                job_type,
+                {
+                    "user": last_line_o.user,
+                    "timestamp": last_line_o.time.timestamp(),
+                    "content": last_line_o.message,
+                    "line": last_line_o.to_line(),
+                },
+            )
+        await self._handle_broadcast_success(job_id, job_type)
+
     async def register_custom_context(
         self,
         job_id: str,
@@ -701,6 +990,8 @@ class JAIson(metaclass=Singleton):
             async for chunk_out in self.op_manager.use_operation(
                 OpRoles(role), payload, op_id=id
             ):
+                if "embeddings" in chunk_out:
+                    chunk_out = to_base64(chunk_out["embeddings"])
                 await self._handle_broadcast_event(job_id, job_type, chunk_out)
         except OperationUnloaded:
             op = self.op_manager.loose_load_operation(OpRoles(role), id)
@@ -710,6 +1001,8 @@ class JAIson(metaclass=Singleton):
                     chunk_out["audio_bytes"] = base64.b64encode(
                         chunk_out["audio_bytes"]
                     ).decode("utf-8")
+                if "embeddings" in chunk_out:
+                    chunk_out = to_base64(chunk_out["embeddings"])
                 await self._handle_broadcast_event(job_id, job_type, chunk_out)
             await op.close()
 
@@ -758,6 +1051,30 @@ class JAIson(metaclass=Singleton):
         )
         await self.event_server.broadcast_event(job_type.value, to_broadcast)
 
+    async def _handle_broadcast_audio(
+        self, job_id: str, job_type: JobType, encoder: AudioEncoder, audio_chunk: dict
+    ):
+        fmt = AudioFormat.of(audio_chunk)
+        if encoder.codec == "pcm":
+            packets = encoder.encode(audio_chunk["audio_bytes"], fmt)
+        else:
+            # Encoding takes long enough to hold up other jobs if done in the loop
+            packets = await asyncio.to_thread(
+                encoder.encode, audio_chunk["audio_bytes"], fmt
+            )
+        await self._handle_broadcast_packets(job_id, job_type, encoder, fmt, packets)
+
+    async def _handle_broadcast_packets(
+        self,
+        job_id: str,
+        job_type: JobType,
+        encoder: AudioEncoder,
+        fmt: AudioFormat,
+        packets: List[Dict[str, Any]],
+    ):
+        for result in packet_events(encoder.codec, fmt, packets):
+            await self._handle_broadcast_event(job_id, job_type, result)
+
     async def _handle_broadcast_success(self, job_id: str, job_type: JobType):
         to_broadcast = {"job_id": job_id, "finished": True, "success": True}
         logging.debug(
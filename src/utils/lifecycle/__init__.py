@@ -0,0 +1,2 @@
+from .manager import LifecycleManager
+from .resource import ManagedResource
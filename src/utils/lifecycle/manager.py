@@ -0,0 +1,249 @@
+"""
+Unloading idle models and model servers under memory pressure
+
+Every registered ManagedResource (Kobold pools, models of operations such as Melo,
+RVC, RoBERTa and Koala) that has gone unused for idle_timeout seconds is unloaded while
+the system's memory use is at or above memory_threshold percent, least recently used
+first, until it is below again. A threshold of 0 unloads anything idle.
+
+Models can also be kept within a memory budget, in megabytes, regardless of how much
+memory the rest of the system uses. Each resource reports the memory it holds (measured
+when it was loaded), and when their total goes over memory_budget the least recently
+used that aren't in use are unloaded until it fits. Before something is loaded, room is
+made the same way for what loading it took last time.
+
+Unloaded resources are loaded again when next used. To hide that wait, the manager
+learns which resource tends to be used after which (T2T, then TTS, then RVC for a
+response), and when one is used, starts loading the ones likely to follow it.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from utils.helpers.singleton import Singleton
+
+from .resource import ManagedResource
+
+
+class LifecycleManager(metaclass=Singleton):
+    def __init__(self):
+        self.resources: Dict[str, ManagedResource] = dict()
+        # resource id: ids of resources used next and how many times
+        self.transitions: Dict[str, Dict[str, int]] = dict()
+        self.previous: str = None
+        self.previous_time: float = 0
+        self.prefetches: Dict[str, asyncio.Task] = dict()
+        self.budget_task: Optional[asyncio.Task] = None
+
+        self.enabled: bool = False
+        self.idle_timeout: float = 600
+        self.memory_threshold: float = 85
+        self.check_interval: float = 5
+        self.prefetch: bool = True
+        self.prefetch_probability: float = 0.5
+        self.prefetch_window: float = 60
+        self.memory_budget: float = 0  # megabytes, 0 for no budget
+
+    async def configure(self, config_d: Dict[str, Any]):
+        if "enabled" in config_d:
+            self.enabled = bool(config_d["enabled"])
+        if "idle_timeout" in config_d:
+            self.idle_timeout = float(config_d["idle_timeout"])
+        if "memory_threshold" in config_d:
+            self.memory_threshold = float(config_d["memory_threshold"])
+        if "check_interval" in config_d:
+            self.check_interval = float(config_d["check_interval"])
+        if "prefetch" in config_d:
+            self.prefetch = bool(config_d["prefetch"])
+        if "prefetch_probability" in config_d:
+            self.prefetch_probability = float(config_d["prefetch_probability"])
+        if "prefetch_window" in config_d:
+            self.prefetch_window = float(config_d["prefetch_window"])
+        if "memory_budget" in config_d:
+            self.memory_budget = float(config_d["memory_budget"])
+
+        assert self.idle_timeout >= 0
+        assert 0 <= self.memory_threshold <= 100
+        assert self.check_interval > 0
+        assert 0 < self.prefetch_probability <= 1
+        assert self.prefetch_window > 0
+        assert self.memory_budget >= 0
+
+    def register(self, resource: ManagedResource) -> None:
+        self.resources[resource.resource_id] = resource
+        resource.on_use = self.record_use
+        resource.before_load = self.make_room
+        resource.on_load = self._on_load
+
+    def unregister(self, resource: ManagedResource) -> None:
+        if self.resources.get(resource.resource_id) is resource:
+            del self.resources[resource.resource_id]
+        resource.on_use = None
+        resource.before_load = None
+        resource.on_load = None
+        task = self.prefetches.pop(resource.resource_id, None)
+        if task is not None:
+            task.cancel()
+
+    def record_use(self, resource: ManagedResource) -> None:
+        """Learn what follows what, and prefetch what is likely to follow this"""
+        now = time.monotonic()
+        resource_id = resource.resource_id
+        if (
+            self.previous is not None
+            and self.previous != resource_id
+            and now - self.previous_time <= self.prefetch_window
+        ):
+            following = self.transitions.setdefault(self.previous, dict())
+            following[resource_id] = following.get(resource_id, 0) + 1
+        self.previous, self.previous_time = resource_id, now
+
+        if self.enabled and self.prefetch:
+            for predicted in self.predict(resource_id):
+                self._prefetch(predicted)
+
+    def predict(self, resource_id: str) -> List[str]:
+        """Resources likely to be used after resource_id"""
+        following = self.transitions.get(resource_id, dict())
+        total = sum(following.values())
+        return [
+            next_id
+            for next_id, count in following.items()
+            if count / total >= self.prefetch_probability
+        ]
+
+    def _prefetch(self, resource_id: str) -> None:
+        resource = self.resources.get(resource_id)
+        if resource is None or resource.is_loaded():
+            return
+        task = self.prefetches.get(resource_id)
+        if task is not None and not task.done():
+            return
+
+        async def load():
+            try:
+                await resource.ensure_loaded()
+            except Exception:
+                logging.error(
+                    "Failed to prefetch {}".format(resource_id), exc_info=True
+                )
+
+        logging.debug("Prefetching {}".format(resource_id))
+        self.prefetches[resource_id] = asyncio.create_task(load())
+
+    def memory_percent(self) -> float:
+        return psutil.virtual_memory().percent
+
+    async def evict_idle(self) -> List[str]:
+        """Unload idle resources, least recently used first, while memory is under
+        pressure. Returns ids of those unloaded"""
+        if not self.enabled:
+            return []
+        idle = sorted(
+            (
+                resource
+                for resource in self.resources.values()
+                if resource.is_loaded() and resource.idle_seconds() >= self.idle_timeout
+            ),
+            key=lambda resource: resource.last_used,
+        )
+        evicted = list()
+        for resource in idle:
+            if self.memory_percent() < self.memory_threshold:
+                break
+            try:
+                if await resource.evict():
+                    evicted.append(resource.resource_id)
+            except Exception:
+                logging.error(
+                    "Failed to unload {}".format(resource.resource_id), exc_info=True
+                )
+        return evicted
+
+    def budget_bytes(self) -> int:
+        return int(self.memory_budget * 1024 * 1024)
+
+    def resident(self) -> int:
+        """Bytes of memory held by loaded resources"""
+        return sum(resource.footprint() for resource in self.resources.values())
+
+    async def make_room(self, resource: ManagedResource) -> List[str]:
+        """Unload others until what resource took to load last time fits the budget"""
+        return await self.enforce_budget(
+            keep=resource, incoming=resource.measured_footprint
+        )
+
+    def _on_load(self, resource: ManagedResource) -> None:
+        # Checked in its own task, as evicting waits on the load locks of others
+        if not self.enabled or not self.memory_budget:
+            return
+        if self.budget_task is None or self.budget_task.done():
+            self.budget_task = asyncio.create_task(self.enforce_budget(keep=resource))
+
+    async def enforce_budget(
+        self, keep: ManagedResource = None, incoming: int = 0
+    ) -> List[str]:
+        """Unload resources not in use, least recently used first, while they hold
+        more than the budget (less incoming bytes). Returns ids of those unloaded"""
+        if not self.enabled or not self.memory_budget:
+            return []
+        budget = self.budget_bytes() - incoming
+        resident = self.resident()
+        if resident <= budget:
+            return []
+        candidates = sorted(
+            (
+                resource
+                for resource in self.resources.values()
+                if resource is not keep
+                and resource.is_loaded()
+                and not resource.users
+                and not resource.load_lock.locked()
+            ),
+            key=lambda resource: resource.last_used,
+        )
+        evicted = list()
+        for resource in candidates:
+            if resident <= budget:
+                break
+            footprint = resource.footprint()
+            try:
+                if await resource.evict():
+                    evicted.append(resource.resource_id)
+                    resident -= footprint
+            except Exception:
+                logging.error(
+                    "Failed to unload {}".format(resource.resource_id), exc_info=True
+                )
+        if resident > budget:
+            logging.warning(
+                "Models hold {} MB, over the memory budget of {} MB, but the rest are in use".format(
+                    (resident + incoming) // (1024 * 1024), self.memory_budget
+                )
+            )
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Whether each resource is loaded, how long it has been idle and the memory it
+        is estimated to hold"""
+        resources = {
+            resource_id: {
+                "loaded": resource.is_loaded(),
+                "users": resource.users,
+                "idle": resource.idle_seconds(),
+                "loads": resource.loads,
+                "footprint": resource.footprint(),
+                **resource.stats(),
+            }
+            for resource_id, resource in self.resources.items()
+        }
+        return {
+            "memoryPercent": self.memory_percent(),
+            "memoryBudget": self.budget_bytes(),
+            "footprint": sum(stats["footprint"] for stats in resources.values()),
+            "resources": resources,
+        }
@@ -0,0 +1,123 @@
+"""
+Something heavy that can be unloaded while idle
+
+A managed resource (a model server, a model held by an operation) is loaded on first
+use after being unloaded, so whatever uses it doesn't need to know whether it was. It
+is never unloaded while in use or while loading, and a use that comes while it is
+being unloaded waits for that to finish and loads it again.
+
+How much memory loading it took is measured, and kept once it is unloaded, so room can
+be made for it before it is loaded again. This counts both resident memory and memory
+PyTorch allocated on CUDA devices, where models on a GPU hold their weights.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import psutil
+
+
+def process_memory(pid: Optional[int] = None) -> int:
+    """Resident memory in bytes of a process (this one by default) and its children"""
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes)
+    except psutil.Error:
+        return 0
+
+
+def gpu_memory() -> int:
+    """Bytes allocated by PyTorch on every CUDA device, none if it wasn't imported"""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    return sum(
+        torch.cuda.memory_allocated(device)
+        for device in range(torch.cuda.device_count())
+    )
+
+
+def loaded_memory() -> int:
+    """Memory this process holds that loading a model adds to"""
+    return process_memory() + gpu_memory()
+
+
+class ManagedResource:
+    def __init__(self, resource_id: str):
+        self.resource_id = resource_id
+        self.users: int = 0
+        self.last_used: float = time.monotonic()
+        self.loads: int = 0
+        self.measured_footprint: int = 0  # growth of this process's memory on load
+        self.load_lock = asyncio.Lock()
+        self.on_use: Callable[["ManagedResource"], None] = None
+        self.before_load: Callable[["ManagedResource"], Awaitable[None]] = None
+        self.on_load: Callable[["ManagedResource"], None] = None
+
+    ## TO BE IMPLEMENTED ####
+    def is_loaded(self) -> bool:
+        raise NotImplementedError
+
+    async def _load(self) -> None:
+        raise NotImplementedError
+
+    async def _unload(self) -> None:
+        raise NotImplementedError
+
+    ## OPTIONALLY IMPLEMENTED ####
+    def footprint(self) -> int:
+        """Estimated bytes of memory held while loaded"""
+        return self.measured_footprint if self.is_loaded() else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Figures of the resource's own to report alongside whether it is loaded"""
+        return {}
+
+    ## PROVIDED ####
+    async def ensure_loaded(self) -> None:
+        async with self.load_lock:
+            if self.is_loaded():
+                return
+            if self.before_load is not None:
+                await self.before_load(self)
+            logging.info("Loading {}".format(self.resource_id))
+            before = loaded_memory()
+            await self._load()
+            self.measured_footprint = max(loaded_memory() - before, 0)
+            self.loads += 1
+        if self.on_load is not None:
+            self.on_load(self)
+
+    async def evict(self) -> bool:
+        """Unload unless in use. Returns whether it was unloaded"""
+        if self.users or not self.is_loaded():
+            return False
+        async with self.load_lock:
+            if self.users or not self.is_loaded():
+                return False
+            logging.info("Unloading idle {}".format(self.resource_id))
+            await self._unload()
+            return True
+
+    @asynccontextmanager
+    async def use(self):
+        """Context for using the resource, loading it first if needed"""
+        self.users += 1
+        try:
+            # Still loaded while being unloaded, so wait that out and load it again
+            if not self.is_loaded() or self.load_lock.locked():
+                await self.ensure_loaded()
+            if self.on_use is not None:
+                self.on_use(self)
+            yield self
+        finally:
+            self.users -= 1
+            self.last_used = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return 0.0 if self.users else time.monotonic() - self.last_used
@@ -1,9 +1,10 @@
 import os
 import json
 import datetime
-import re
-import urllib
+import asyncio
+import urllib.parse
 import logging
+from contextlib import asynccontextmanager
 from typing import List, Dict
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
@@ -16,8 +17,27 @@ from mcp.types import (
 )
 
 from utils.config import Config
+from utils.helpers.embedding import to_base64
+from utils.helpers.mcp_catalogue import CatalogueCache, catalogue_key
+from utils.helpers.mcp_session import ServerGroup, ServerSession
+from utils.helpers.tool_cache import ToolResultCache
+from utils.helpers.tool_router import ToolRouter
+from utils.helpers.tool_calls import (
+    RESOURCE,
+    TOOL,
+    ToolEntry,
+    build_tool_index,
+    dispatch_tool_calls,
+    parse_tool_calls,
+)
 from utils.operations import OperationManager, OpRoles
 
+CATALOGUE_TYPES = {
+    "tools": types.Tool,
+    "resources": types.Resource,
+    "templates": types.ResourceTemplate,
+}
+
 
 def parse_tool_result(result):
     if isinstance(result, TextContent):
@@ -59,107 +79,123 @@ def details_to_response_prompt(details):
     return prompt
 
 
-def details_to_tool_prompt(details):
-    tools = details["tools"]
-    resources = details["resources"]
-    templates = details["templates"]
+def details_to_tool_prompts(details):
+    """Description of each tool, resource and template for the tooling prompt, by
+    name"""
+    prompts = dict()
 
-    prompt = ""
-
-    for tool in tools:
+    for tool in details["tools"]:
         name = tool.name
         description = tool.description
         inputSchema = json.dumps(tool.inputSchema)
-        prompt += f"<{name}> {description}\nThis is the input schema for {name}: {inputSchema}\n"
+        prompts[name] = (
+            f"<{name}> {description}\nThis is the input schema for {name}: {inputSchema}\n"
+        )
 
-    for resource in resources:
+    for resource in details["resources"]:
         name = resource.name
         description = resource.description
-        prompt += f"<{name}> {description}\n"
+        prompts[name] = f"<{name}> {description}\n"
 
-    for template in templates:
+    for template in details["templates"]:
         name = template.name
         description = template.description
         uri_template = template.uriTemplate
-        prompt += f"<{name}> {description}\nThis is the URI template: {uri_template}\n"
+        prompts[name] = (
+            f"<{name}> {description}\nThis is the URI template: {uri_template}\n"
+        )
+
+    return prompts
 
-    return prompt
+
+def details_to_tool_prompt(details):
+    return "".join(details_to_tool_prompts(details).values())
 
 
-class MCPClient:
+class MCPClient(ServerSession):
     """Managing of a single server instance"""
 
-    def __init__(self, mcp_id: str, params: StdioServerParameters):
+    def __init__(
+        self,
+        mcp_id: str,
+        params: StdioServerParameters,
+        max_concurrency: int = 4,
+        timeout: float = 30,
+        catalogue: CatalogueCache = None,
+    ):
+        super().__init__(
+            mcp_id,
+            self._connect,
+            catalogue=catalogue,
+            catalogue_key=catalogue_key(params.command, params.args, params.cwd),
+        )
         self.mcp_id = mcp_id
         self.params = params
-        self.server_generator = None
-        self.server_read = None
-        self.server_write = None
-        self.session = None
-
-        self.tools = list()
-        self.resources = list()
-        self.templates = list()
+        # Calls to this server at once, and how long each may take in seconds
+        self.limit = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
 
         self.tool_names = list()
         self.resource_names = list()
         self.template_names = list()
 
         self.tool_prompt = ""
+        self.tool_prompts = dict()
         self.response_prompt = ""
 
-    async def start(self):
-        self.server_generator = stdio_client(self.params)
-        logging.debug("starting context")
-        self.server_read, self.server_write = await self.server_generator.__aenter__()
-        logging.debug("{} {}".format(type(self.server_read), type(self.server_write)))
-        logging.debug("starting session")
-        self.session = ClientSession(
-            self.server_read,
-            self.server_write,
-            read_timeout_seconds=datetime.timedelta(seconds=10),
-            sampling_callback=self.handle_sampling_message,
-        )
-
-        logging.debug("initializing session")
-        await self.session.__aenter__()
-        await self.session.initialize()
-
-        details = await self.get_details()
-        self.tool_prompt = details_to_tool_prompt(details)
+    @asynccontextmanager
+    async def _connect(self):
+        async with stdio_client(self.params) as (server_read, server_write):
+            logging.debug("starting session for {}".format(self.mcp_id))
+            async with ClientSession(
+                server_read,
+                server_write,
+                read_timeout_seconds=datetime.timedelta(seconds=10),
+                sampling_callback=self.handle_sampling_message,
+            ) as session:
+                yield session
+
+    def _load_item(self, kind: str, data: Dict):
+        return CATALOGUE_TYPES[kind].model_validate(data)
+
+    def _dump_item(self, item) -> Dict:
+        return item.model_dump(mode="json")
+
+    async def call(self, entry: ToolEntry, arguments: Dict):
+        """Result of calling a tool, or reading a resource or resource template"""
+        # Calls to tools known from the catalogue wait for the session
+        session = await self.get_session()
+
+        if entry.kind == TOOL:
+            result = await session.call_tool(entry.target, arguments=arguments)
+            return parse_tool_result(result.content[0])
+        if entry.kind == RESOURCE:
+            result = await session.read_resource(entry.target)
+            return parse_tool_result(result.contents[0])
+
+        arguments = {
+            key: urllib.parse.quote(value) if isinstance(value, str) else value
+            for key, value in arguments.items()
+        }
+        logging.debug("Calling resource: {} {}".format(entry.target, arguments))
+        result = await session.read_resource(entry.target.format(**arguments))
+        return parse_tool_result(result.contents[0])
+
+    def set_details(self, details: Dict):
+        super().set_details(details)
+        self.tool_names = [tool.name for tool in self.tools]
+        self.resource_names = [resource.name for resource in self.resources]
+        self.template_names = [template.name for template in self.templates]
+
+        self.tool_prompts = details_to_tool_prompts(details)
+        self.tool_prompt = "".join(self.tool_prompts.values())
         self.response_prompt = details_to_response_prompt(details)
 
-    async def close(self):
-        await self.session.__aexit__(None, None, None)
-        await self.server_generator.__aexit__(None, None, None)
-
-    async def get_details(self):
-        try:
-            self.tools = (await self.session.list_tools()).tools
-        except:
-            pass
-        try:
-            self.resources = (await self.session.list_resources()).resources
-        except:
-            pass
-        try:
-            self.templates = (
-                await self.session.list_resource_templates()
-            ).resourceTemplates
-        except:
-            pass
-
-        for tool in self.tools:
-            self.tool_names.append(tool.name)
-        for resource in self.resources:
-            self.resource_names.append(resource.name)
-        for template in self.templates:
-            self.template_names.append(template.name)
-
+    def get_descriptions(self) -> Dict[str, str]:
+        """Description of each tool, resource and template, by name"""
         return {
-            "tools": self.tools,
-            "resources": self.resources,
-            "templates": self.templates,
+            item.name: item.description or ""
+            for item in self.tools + self.resources + self.templates
         }
 
     async def handle_sampling_message(
@@ -198,15 +234,15 @@ class MCPClient:
                     },
                 )
 
-                response = ""
+                vectors = None
                 async for chunk_out in response_stream:
-                    response += chunk_out["embedding"]
+                    vectors = chunk_out["embeddings"]
 
                 return types.CreateMessageResult(
                     role="assistant",
                     content=types.TextContent(
                         type="text",
-                        text=response,
+                        text=to_base64(vectors)["embedding"],
                     ),
                     model="embedding",
                     stopReason="endTurn",
@@ -216,6 +252,9 @@ class MCPClient:
             return ""
 
 
+MAX_TOOLING_PROMPTS = 64
+
+
 class MCPManager:
     tooling_prompt = """
 You are calling tools based on the user input to gather more information to enrich a role-playing response and to perform relevant actions. Only reply with the appropriate tool calls and nothing else.
@@ -237,17 +276,27 @@ Below is a list of descriptions for all available tool:\n
     # Below is a list of all available contexts and their descriptions:
     # """
 
-    pattern = re.compile(r"^<[\S]*>")
-
     def __init__(self):
         # servers are loaded at start and at no other point
         # self.client_params: List[StdioServerParameters] = list()
-        self.clients: Dict[str, MCPClient] = dict()
+        self.servers = ServerGroup(
+            on_update=self._update_catalogue, on_drop=self._on_client_drop
+        )
+        self.clients: Dict[str, MCPClient] = self.servers.clients
+        self.tool_index: Dict[str, ToolEntry] = dict()
+        self.cache = ToolResultCache()
+        self.router = ToolRouter()
+        self.tooling_prompts: Dict[tuple, str] = dict()  # by names offered
+        self.catalogue: CatalogueCache = None
 
     async def start(self):
+        """Start every server at once. Core startup waits for each until its
+        startup_timeout at most, and servers that are slower attach once ready"""
         config = Config()
-        for mcp_detail in config.mcp:
-            await self.load_mcp(mcp_detail)
+        self.cache.configure(config.mcp_cache)
+        self.router.configure(config.mcp_router)
+        self.catalogue = CatalogueCache(config.MCP_CATALOGUE_DIR)
+        await asyncio.gather(*[self.load_mcp(mcp_detail) for mcp_detail in config.mcp])
 
     async def load_mcp(self, mcp_detail: Dict):
         # TODO validate the mcp_detail
@@ -258,22 +307,69 @@ Below is a list of descriptions for all available tool:\n
             env=os.environ,  # Optional environment variables
             cwd=mcp_detail["cwd"],
         )
-        client = MCPClient(mcp_detail["id"], params)
-        await client.start()
-        self.clients[mcp_detail["id"]] = client
+        client = MCPClient(
+            mcp_detail["id"],
+            params,
+            max_concurrency=int(mcp_detail.get("max_concurrency", 4)),
+            timeout=float(mcp_detail.get("timeout", 30)),
+            catalogue=self.catalogue,
+        )
+        await self.servers.add(
+            client, startup_timeout=float(mcp_detail.get("startup_timeout", 10))
+        )
 
-    async def close_mcp(self, mcp_id: str):
-        target = self.clients.get(mcp_id, None)
-        if target:
-            await target.close()
-            del self.clients[mcp_id]
+    def _on_client_drop(self, client: MCPClient):
+        self.cache.invalidate()
 
-    def get_tooling_prompt(self):
-        prompt = self.tooling_prompt
-        for client_key in self.clients:
-            prompt += self.clients[client_key].tool_prompt
+    async def close_mcp(self, mcp_id: str):
+        if await self.servers.remove(mcp_id):
+            self.cache.invalidate()
+
+    def _update_catalogue(self):
+        """Index names and describe them to the router after servers change"""
+        self.tool_index = build_tool_index(self.clients)
+        descriptions = dict()
+        for client in reversed(list(self.clients.values())):
+            descriptions.update(client.get_descriptions())
+        self.router.set_catalogue(
+            {name: descriptions[name] for name in self.tool_index}
+        )
+        self.tooling_prompts = dict()
+
+    def get_tooling_prompt(self, names: List[str] = None):
+        """Tooling prompt offering names, or everything. Built once per set of names
+        until servers change"""
+        key = tuple(names) if names is not None else None
+        if key not in self.tooling_prompts:
+            prompt = self.tooling_prompt
+            if names is None:
+                for client_key in self.clients:
+                    prompt += self.clients[client_key].tool_prompt
+            else:
+                for name in names:
+                    entry = self.tool_index[name]
+                    prompt += self.clients[entry.client_id].tool_prompts[name]
+            if len(self.tooling_prompts) >= MAX_TOOLING_PROMPTS:
+                self.tooling_prompts = dict()
+            self.tooling_prompts[key] = prompt
+
+        return self.tooling_prompts[key]
+
+    async def route(self, messages: List) -> List[str]:
+        """Names of tools worth planning calls to for the latest messages, empty to
+        skip planning"""
+        return await self.router.route(
+            self.router.query_text(messages), embed=self._embed
+        )
 
-        return prompt
+    async def _embed(self, texts: List[str]):
+        op = OperationManager().get_operation(OpRoles.EMBEDDING)
+        if op is None:
+            return None
+        vectors = None
+        async for chunk_out in op({"content": texts}):
+            vectors = chunk_out["embeddings"]
+        return vectors
 
     def get_response_prompt(self):
         # prompt = self.response_prompt
@@ -284,73 +380,19 @@ Below is a list of descriptions for all available tool:\n
         return prompt
 
     async def use(self, tooling_response: str):
-        tool_calls = tooling_response.split("\n")
-
-        result_list = list()
-
-        for tool_call in tool_calls:
-            result = None
-            tool_name = ""
-            try:
-                match = self.pattern.search(tool_call)
-                if match is None:
-                    continue
-                name_token = tool_call[: match.span()[1]]
-                tool_name = name_token.lstrip("<").rstrip(">")
-                if name_token == "no_op":
-                    continue
-                tool_call = tool_call[match.span()[1] :].rstrip(" ")
-                input_json = json.loads(tool_call) if len(tool_call) else dict()
-
-                tool = {"name": name_token, "input": input_json}
-
-                for client in self.clients:
-                    if tool_name in self.clients[client].tool_names:
-                        result = await self.clients[client].session.call_tool(
-                            tool_name, arguments=tool["input"]
-                        )
-                        result = parse_tool_result(result.content[0])
-                        break
-                    elif tool_name in self.clients[client].resource_names:
-                        uri = None
-                        for resource in self.clients[client].resources:
-                            if resource.name == tool_name:
-                                uri = resource.uri
-                                break
-                        result = await self.clients[client].session.read_resource(uri)
-                        result = parse_tool_result(result.contents[0])
-                        break
-                    elif tool_name in self.clients[client].template_names:
-                        uri_template = None
-                        for templates in self.clients[client].templates:
-                            if templates.name == tool_name:
-                                uri_template = templates.uriTemplate
-                                break
-                        for key in tool["input"]:
-                            if isinstance(tool["input"][key], str):
-                                urllib.parse.quote(tool["input"][key])
-                                tool["input"][key] = urllib.parse.quote(
-                                    tool["input"][key]
-                                )
-                        logging.debug(
-                            "Calling resource: {} {} {}".format(
-                                tool_name, tool["input"], uri_template
-                            )
-                        )
-                        logging.debug(uri_template.format(**tool["input"]))
-                        result = await self.clients[client].session.read_resource(
-                            uri_template.format(**tool["input"])
-                        )
-                        result = parse_tool_result(result.contents[0])
-                        break
-            except Exception as err:
-                logging.critical("Error occured during MCP", exc_info=True)
-                result = "Attempt to use MCP tool failed due to {}".format(str(err))
-            if result:
-                result_list.append((tool_name, result))
-
-        return result_list
+        return await dispatch_tool_calls(
+            parse_tool_calls(tooling_response),
+            self.tool_index,
+            self.clients,
+            cache=self.cache,
+        )
+
+    def invalidate_cache(self, name: str = None, arguments: Dict = None) -> int:
+        """Forget cached results so the next calls reach the servers"""
+        return self.cache.invalidate(name, arguments)
+
+    def get_cache_stats(self):
+        return self.cache.stats()
 
     async def close(self):
-        for client_key in self.clients:
-            await self.clients[client_key].close()
+        await self.servers.close()
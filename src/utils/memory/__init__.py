@@ -0,0 +1,2 @@
+from .index import VectorIndex
+from .store import MemoryStore
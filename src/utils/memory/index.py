@@ -0,0 +1,254 @@
+"""
+On-disk vector index of memories
+
+Vectors are appended to a raw float32 file that is memory-mapped for search, so the
+index opens instantly and only the pages a search touches are read. Each vector is
+normalized when added, making the dot product with a normalized query its cosine
+similarity. Alongside it:
+- items.jsonl: the memory stored with each vector, one JSON object per line
+- meta.json: the number of dimensions of the vectors
+- centroids.npy, lists.i32: the inverted file, once there is one
+
+Small indexes are searched exhaustively. Once an index holds ivf_threshold vectors, it
+is clustered into about sqrt(n) lists with k-means (an inverted file, IVF), and a search
+only scores the vectors in the nprobe lists whose centroids are nearest the query. New
+vectors join their nearest list, and the lists are clustered again each time the index
+grows RETRAIN_GROWTH times past the size they were clustered at.
+
+Adds are expected from one thread at a time. Searches can run on other threads
+alongside them.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+ITEMS_FILE = "items.jsonl"
+CENTROIDS_FILE = "centroids.npy"
+LISTS_FILE = "lists.i32"
+
+DTYPE = np.dtype("<f4")
+LIST_DTYPE = np.dtype("<i4")
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 64
+ASSIGN_BATCH = 16384
+RETRAIN_GROWTH = 4
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=DTYPE)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def nearest_centroids(centroids: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid to each vector, in batches to bound memory"""
+    result = np.empty(len(x), dtype=LIST_DTYPE)
+    for i in range(0, len(x), ASSIGN_BATCH):
+        result[i : i + ASSIGN_BATCH] = np.argmax(
+            x[i : i + ASSIGN_BATCH] @ centroids.T, axis=1
+        )
+    return result
+
+
+def spherical_kmeans(x: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    """Normalized centroids of count clusters of normalized vectors, trained on a
+    sample of them"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(x), count * KMEANS_SAMPLES_PER_LIST)
+    sample = np.asarray(x[np.sort(rng.choice(len(x), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, count, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = nearest_centroids(centroids, sample)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=count)
+        # Empty clusters restart at a random vector
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+    def __init__(self, directory: str, ivf_threshold: int = 20000, nprobe: int = 8):
+        assert ivf_threshold > 0
+        assert nprobe > 0
+
+        self.directory = directory
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.lock = threading.Lock()
+
+        self.dims: int = None
+        self.vectors: np.ndarray = None  # memory-mapped, read only
+        self.items: List[Dict[str, Any]] = list()
+        self.centroids: np.ndarray = None
+        self.lists: List[np.ndarray] = None  # vector ids in each list
+        self.trained_size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def is_ivf(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, vectors: np.ndarray, items: List[Dict[str, Any]]) -> None:
+        """Store vectors with the memory each stands for"""
+        if not items:
+            return
+        vectors = normalize(vectors).reshape(len(items), -1)
+        if self.dims is None:
+            self.dims = vectors.shape[1]
+            with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"dims": self.dims}, f)
+        if vectors.shape[1] != self.dims:
+            raise ValueError(
+                "Expected vectors of {} dimensions, got {}".format(
+                    self.dims, vectors.shape[1]
+                )
+            )
+
+        # Items are written first, so a vector is never without its memory
+        with open(self._path(ITEMS_FILE), "a", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.write(vectors.tobytes())
+
+        start = len(self)
+        with self.lock:
+            self.items.extend(items)
+            self.vectors = self._map_vectors(len(self.items))
+            if self.is_ivf:
+                self._assign(start, vectors)
+
+        if len(self) >= self.ivf_threshold and (
+            not self.is_ivf or len(self) >= self.trained_size * RETRAIN_GROWTH
+        ):
+            self._train()
+
+    def search(
+        self, query: np.ndarray, k: int, min_score: float = -1.0
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Up to k memories most similar to query, most similar first"""
+        query = normalize(query).reshape(-1)
+        with self.lock:
+            if not len(self.items) or k <= 0:
+                return []
+            if query.shape[0] != self.dims:
+                raise ValueError(
+                    "Expected a query of {} dimensions, got {}".format(
+                        self.dims, query.shape[0]
+                    )
+                )
+
+            if self.is_ivf:
+                nprobe = min(self.nprobe, len(self.centroids))
+                probed = np.argpartition(-(self.centroids @ query), nprobe - 1)
+                ids = np.concatenate([self.lists[i] for i in probed[:nprobe]])
+                ids.sort()  # reads the mapped file front to back
+                scores = self.vectors[ids] @ query
+            else:
+                ids = None
+                scores = self.vectors @ query
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (float(scores[i]), self.items[i if ids is None else ids[i]])
+                for i in top
+                if scores[i] >= min_score
+            ]
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _map_vectors(self, count: int) -> Optional[np.ndarray]:
+        if not count:
+            return None
+        return np.memmap(
+            self._path(VECTORS_FILE), dtype=DTYPE, mode="r", shape=(count, self.dims)
+        )
+
+    def _assign(self, start: int, vectors: np.ndarray) -> None:
+        """Add vectors starting at id start to their nearest lists"""
+        assignments = nearest_centroids(self.centroids, vectors)
+        with open(self._path(LISTS_FILE), "ab") as f:
+            f.write(assignments.tobytes())
+        for i in np.unique(assignments):
+            new_ids = start + np.flatnonzero(assignments == i)
+            self.lists[i] = np.concatenate([self.lists[i], new_ids])
+
+    def _train(self) -> None:
+        """Cluster every vector into lists, replacing any lists from before"""
+        count = len(self)
+        vectors = self.vectors[:count]
+        centroids = spherical_kmeans(vectors, max(1, int(math.sqrt(count))))
+        assignments = nearest_centroids(centroids, vectors)
+
+        np.save(self._path(CENTROIDS_FILE), centroids)
+        assignments.tofile(self._path(LISTS_FILE))
+        with self.lock:
+            self.centroids = centroids
+            self.lists = self._build_lists(assignments, len(centroids))
+            self.trained_size = count
+        logging.info(
+            "Clustered {} memories into {} lists".format(count, len(centroids))
+        )
+
+    @staticmethod
+    def _build_lists(assignments: np.ndarray, count: int) -> List[np.ndarray]:
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(count + 1))
+        return [order[bounds[i] : bounds[i + 1]] for i in range(count)]
+
+    def _load(self) -> None:
+        if not os.path.isfile(self._path(META_FILE)):
+            return
+        with open(self._path(META_FILE), encoding="utf-8") as f:
+            self.dims = int(json.load(f)["dims"])
+        items = list()
+        if os.path.isfile(self._path(ITEMS_FILE)):
+            with open(self._path(ITEMS_FILE), encoding="utf-8") as f:
+                items = [json.loads(line) for line in f if line.strip()]
+        vector_bytes = 0
+        if os.path.isfile(self._path(VECTORS_FILE)):
+            vector_bytes = os.path.getsize(self._path(VECTORS_FILE))
+
+        # An add cut short leaves memories without vectors or the other way round,
+        # which are dropped so the files line up again
+        row_bytes = self.dims * DTYPE.itemsize
+        count = min(len(items), vector_bytes // row_bytes)
+        if count < len(items):
+            items = items[:count]
+            with open(self._path(ITEMS_FILE), "w", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(item) + "\n")
+        if count * row_bytes < vector_bytes:
+            os.truncate(self._path(VECTORS_FILE), count * row_bytes)
+        self.items = items
+        self.vectors = self._map_vectors(count)
+
+        if count and os.path.isfile(self._path(CENTROIDS_FILE)):
+            self.centroids = np.load(self._path(CENTROIDS_FILE))
+            assignments = np.fromfile(self._path(LISTS_FILE), dtype=LIST_DTYPE)
+            assignments = assignments[:count]
+            assignments.tofile(self._path(LISTS_FILE))
+            self.lists = self._build_lists(assignments, len(self.centroids))
+            self.trained_size = len(assignments)
+            if len(assignments) < count:
+                self._assign(len(assignments), self.vectors[len(assignments) :])
@@ -0,0 +1,142 @@
+"""
+Long-term memory of the conversation
+
+Lines that fall out of the prompter's history are not lost: they are embedded in the
+background with the embedding operation and stored in a VectorIndex. At response time
+the most recent lines are embedded as a query, and the memories most similar to them
+are recalled into the prompt.
+
+Memories are kept per embedding model, since vectors from different models can't be
+compared. Without an embedding operation loaded, nothing is remembered or recalled.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, List
+
+import numpy as np
+
+from utils.config import Config
+from utils.helpers.singleton import Singleton
+from utils.operations import OperationManager, OpRoles
+
+from .index import VectorIndex
+
+if TYPE_CHECKING:
+    # The prompter stores evicted lines here, so it is imported only for types
+    from utils.prompter.message import Message
+
+REMEMBER_BATCH = 64
+
+
+class MemoryStore(metaclass=Singleton):
+    def __init__(self):
+        self.indexes: Dict[str, VectorIndex] = dict()
+        self.pending: List[Dict[str, Any]] = list()
+        self.worker: asyncio.Task = None
+
+        self.enabled: bool = False
+        self.top_k: int = 5
+        self.min_score: float = 0.3
+        self.query_lines: int = 3
+        self.ivf_threshold: int = 20000
+        self.nprobe: int = 8
+
+    async def configure(self, config_d: Dict[str, Any]):
+        if "enabled" in config_d:
+            self.enabled = bool(config_d["enabled"])
+        if "top_k" in config_d:
+            self.top_k = int(config_d["top_k"])
+        if "min_score" in config_d:
+            self.min_score = float(config_d["min_score"])
+        if "query_lines" in config_d:
+            self.query_lines = int(config_d["query_lines"])
+        if "ivf_threshold" in config_d:
+            self.ivf_threshold = int(config_d["ivf_threshold"])
+        if "nprobe" in config_d:
+            self.nprobe = int(config_d["nprobe"])
+
+        assert self.top_k > 0
+        assert -1 <= self.min_score <= 1
+        assert self.query_lines > 0
+        assert self.ivf_threshold > 0
+        assert self.nprobe > 0
+
+        # Indexes are opened again with the new settings
+        self.indexes = dict()
+
+    def remember(self, messages: List["Message"]) -> None:
+        """Store lines that left the history, embedding them in the background"""
+        if not self.enabled or not messages:
+            return
+        for message in messages:
+            item = {"text": message.to_line()}
+            if getattr(message, "time", None) is not None:
+                item["time"] = message.time.timestamp()
+            self.pending.append(item)
+
+        if self.worker is None or self.worker.done():
+            try:
+                self.worker = asyncio.get_running_loop().create_task(
+                    self._remember_loop()
+                )
+            except RuntimeError:
+                pass  # Stored once lines are evicted with a loop running
+
+    async def recall(self, messages: List["Message"]) -> List[str]:
+        """Memories most relevant to the latest messages, most relevant first"""
+        if not self.enabled or not messages:
+            return []
+        query = "\n".join(
+            message.to_line() for message in messages[-self.query_lines :]
+        )
+        try:
+            namespace, vectors = await self._embed([query])
+        except Exception:
+            logging.debug("Could not embed memory query", exc_info=True)
+            return []
+        if namespace is None:
+            return []
+
+        index = self._get_index(namespace)
+        results = await asyncio.to_thread(
+            index.search, vectors[0], self.top_k, self.min_score
+        )
+        return [item["text"] for _, item in results]
+
+    async def _embed(self, texts: List[str]):
+        """Namespace of the embedding operation and its vectors for texts, or None
+        if there is no embedding operation"""
+        op = OperationManager().get_operation(OpRoles.EMBEDDING)
+        if op is None:
+            return None, None
+        vectors = None
+        async for chunk_out in op({"content": texts}):
+            vectors = chunk_out["embeddings"]
+        return op.cache_namespace(), vectors
+
+    def _get_index(self, namespace: str) -> VectorIndex:
+        if namespace not in self.indexes:
+            directory = os.path.join(
+                Config().MEMORY_DIR,
+                hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:16],
+            )
+            self.indexes[namespace] = VectorIndex(
+                directory, ivf_threshold=self.ivf_threshold, nprobe=self.nprobe
+            )
+        return self.indexes[namespace]
+
+    async def _remember_loop(self):
+        while self.pending:
+            batch = self.pending[:REMEMBER_BATCH]
+            del self.pending[:REMEMBER_BATCH]
+            try:
+                namespace, vectors = await self._embed([item["text"] for item in batch])
+                if namespace is None:
+                    continue
+                index = self._get_index(namespace)
+                await asyncio.to_thread(index.add, np.asarray(vectors), batch)
+            except Exception:
+                logging.error("Failed to store memories", exc_info=True)
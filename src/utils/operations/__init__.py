@@ -1,5 +1,6 @@
 from .manager import OpRoles, OperationManager
 from .base import Operation, StartActiveError, CloseInactiveError, UsedInactiveError
+from .stt.stream import STTStream
 from .error import (
     UnknownOpType,
     UnknownOpRole,
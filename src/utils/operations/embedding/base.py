@@ -1,19 +1,32 @@
 """
 Embedding Operations (at minimum) require the following fields for input chunks:
-- content: (str) text to be embedded
+- content: (str | List[str]) text to be embedded, or several texts embedded together
 
 Adds to chunk:
-- embedding: (str)  UTF-8 string containing base64 bytes
+- embeddings: (np.ndarray) C-contiguous float32 vectors, one row per text in order
+
+Texts are looked up in a cache of recent vectors first, and the rest are sent to the
+backend in batches of at most MAX_BATCH_SIZE.
 """
 
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, List
+
+import numpy as np
+
+from utils.helpers.embedding import EmbeddingCache, as_vectors
 
 from ..base import Operation
 
 
 class EmbeddingOperation(Operation):
+    # Most texts sent to the backend in one request
+    MAX_BATCH_SIZE = 256
+    # Most vectors kept for texts embedded before
+    CACHE_SIZE = 4096
+
     def __init__(self, op_id: str):
         super().__init__("EMBEDDING", op_id)
+        self.cache = EmbeddingCache(self.CACHE_SIZE)
 
     ## TO BE OVERRIDEN ####
     async def start(self) -> None:
@@ -27,10 +40,48 @@ class EmbeddingOperation(Operation):
     async def _parse_chunk(self, chunk_in: Dict[str, Any]) -> Dict[str, Any]:
         """Extract information from input for use in _generate"""
         assert "content" in chunk_in
-        assert isinstance(chunk_in["content"], str)
-        assert len(chunk_in["content"]) > 0
+        content = chunk_in["content"]
+        if isinstance(content, str):
+            content = [content]
+        assert isinstance(content, list) and len(content) > 0
+        for text in content:
+            assert isinstance(text, str)
+            assert len(text) > 0
 
-        return {"content": chunk_in["content"]}
+        return {"content": content}
+
+    async def _generate(
+        self, content: List[str] = None, **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Generate a output stream"""
+        namespace = self.cache_namespace()
+        keys = [EmbeddingCache.key(namespace, text) for text in content]
+        vectors = [self.cache.get(key) for key in keys]
+
+        # Each distinct text missing from the cache is embedded once
+        missing = list(
+            dict.fromkeys(
+                text for text, vector in zip(content, vectors) if vector is None
+            )
+        )
+        embedded = dict()
+        for i in range(0, len(missing), self.MAX_BATCH_SIZE):
+            batch = missing[i : i + self.MAX_BATCH_SIZE]
+            batch_vectors = as_vectors(await self._embed(batch))
+            assert len(batch_vectors) == len(batch)
+            for text, vector in zip(batch, batch_vectors):
+                # Copied so a cached row does not keep its whole batch alive
+                embedded[text] = vector.copy()
+                self.cache.put(EmbeddingCache.key(namespace, text), embedded[text])
+
+        yield {
+            "embeddings": np.stack(
+                [
+                    embedded[text] if vector is None else vector
+                    for text, vector in zip(content, vectors)
+                ]
+            )
+        }
 
     ## TO BE IMPLEMENTED ####
     async def configure(self, config_d: Dict[str, Any]):
@@ -41,10 +92,12 @@ class EmbeddingOperation(Operation):
         """Returns values of configurable fields"""
         raise NotImplementedError
 
-    async def _generate(
-        self, content: str = None, **kwargs
-    ) -> AsyncGenerator[Dict[str, Any], None]:
-        """Generate a output stream"""
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts, returning one float32 vector per text in order"""
         raise NotImplementedError
 
-        yield {"embedding": b""}
+    ## OPTIONALLY IMPLEMENTED ####
+    def cache_namespace(self) -> str:
+        """Everything besides the text that decides a vector, such as model and
+        dimensions, so cached vectors are not reused after reconfiguring"""
+        return self.op_id
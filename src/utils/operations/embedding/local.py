@@ -0,0 +1,87 @@
+from typing import List
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+import torch
+
+from utils.helpers.batcher import MicroBatcher
+
+from .base import EmbeddingOperation
+
+
+class LocalEmbedding(EmbeddingOperation):
+    def __init__(self):
+        super().__init__("local")
+        self.model = None
+        self.batcher = None
+
+        self.model_id: str = "sentence-transformers/all-MiniLM-L6-v2"
+        self.device: str = "cpu"
+        self.normalize: bool = True
+        self.max_batch_size: int = 64
+        self.batch_window_ms: float = 5.0
+
+    async def start(self):
+        await super().start()
+        self.model = SentenceTransformer(self.model_id, device=self.device)
+        self.batcher = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=self.max_batch_size,
+            batch_window_ms=self.batch_window_ms,
+            name="embedding_local",
+        )
+        self.batcher.start()
+
+    async def close(self):
+        await super().close()
+        self.batcher.stop()
+        self.batcher = None
+        del self.model
+        self.model = None
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()  # clean cache on cuda
+
+    async def configure(self, config_d):
+        """Configure and validate operation-specific configuration"""
+        if "model_id" in config_d:
+            self.model_id = str(config_d["model_id"])
+        if "device" in config_d:
+            self.device = str(config_d["device"])
+        if "normalize" in config_d:
+            self.normalize = bool(config_d["normalize"])
+        if "max_batch_size" in config_d:
+            self.max_batch_size = int(config_d["max_batch_size"])
+        if "batch_window_ms" in config_d:
+            self.batch_window_ms = float(config_d["batch_window_ms"])
+
+        assert self.model_id is not None and len(self.model_id) > 0
+        assert self.device is not None and len(self.device) > 0
+        assert self.max_batch_size > 0
+        assert self.batch_window_ms >= 0
+
+    async def get_configuration(self):
+        """Returns values of configurable fields"""
+        return {
+            "model_id": self.model_id,
+            "device": self.device,
+            "normalize": self.normalize,
+            "max_batch_size": self.max_batch_size,
+            "batch_window_ms": self.batch_window_ms,
+        }
+
+    def cache_namespace(self):
+        return "{}:{}".format(self.model_id, self.normalize)
+
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Runs on the batcher's worker thread"""
+        vectors = self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize,
+        )
+        return list(vectors.astype(np.float32, copy=False))
+
+    async def _embed(self, texts):
+        # Texts from concurrent requests are coalesced into one forward pass
+        return np.stack(await self.batcher.submit_many(texts))
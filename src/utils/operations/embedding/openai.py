@@ -1,11 +1,17 @@
 from openai import AsyncOpenAI
-import struct
 import base64
 
+import numpy as np
+
+from utils.helpers.embedding import DTYPE
+
 from .base import EmbeddingOperation
 
 
 class OpenAIEmbedding(EmbeddingOperation):
+    # OpenAI accepts up to 2048 inputs per request
+    MAX_BATCH_SIZE = 512
+
     def __init__(self):
         super().__init__("openai")
         self.client = None
@@ -34,7 +40,7 @@ class OpenAIEmbedding(EmbeddingOperation):
 
         assert self.base_url is not None and len(self.base_url) > 0
         assert self.model is not None and len(self.model) > 0
-        assert self.dimensions in [1536]
+        assert self.dimensions > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
@@ -44,19 +50,21 @@ class OpenAIEmbedding(EmbeddingOperation):
             "dimensions": self.dimensions,
         }
 
-    async def _generate(self, content: str = None, **kwargs):
-        response = (
-            await self.client.embeddings.create(  # dimension 1536 default for small
-                model=self.model,
-                input=content,
-                dimensions=self.dimensions,
-                encoding_format="float",
-            )
-        )
+    def cache_namespace(self):
+        return "{}:{}:{}".format(self.base_url, self.model, self.dimensions)
 
-        float_list = response.data[0].embedding
-        format_string = "<" + "f" * len(float_list)
-        packed_bytes = struct.pack(format_string, *float_list)
-        result = base64.b64encode(packed_bytes).decode("utf-8")
+    async def _embed(self, texts):
+        # Raw float32 in base64 skips parsing thousands of floats out of JSON
+        response = await self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+            dimensions=self.dimensions,
+            encoding_format="base64",
+        )
 
-        yield {"embedding": result}
+        vectors = np.empty((len(texts), self.dimensions), dtype=DTYPE)
+        for data in response.data:
+            vectors[data.index] = np.frombuffer(
+                base64.b64decode(data.embedding), dtype=DTYPE
+            )
+        return vectors
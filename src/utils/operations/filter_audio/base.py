@@ -12,11 +12,38 @@ Overwrites in chunk (OR augments chunk):
 - ch: (int) new audio channels
 """
 
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, List, Optional
+
+from utils.helpers.audio import AudioFormat
 
 from ..base import Operation
 
 
+class AudioStream:
+    """State of a filter over consecutive chunks of the same audio (such as a sentence)"""
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Take the next chunk and return any output that is ready"""
+        raise NotImplementedError
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        """Return all remaining output once the audio is complete"""
+        raise NotImplementedError
+
+
+class ChunkStream(AudioStream):
+    """Filters every chunk on its own, for filters without state between chunks"""
+
+    def __init__(self, op: "FilterAudioOperation"):
+        self.op = op
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [chunk_out async for chunk_out in self.op(chunk_in)]
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        return []
+
+
 class FilterAudioOperation(Operation):
     def __init__(self, op_id: str):
         super().__init__("FILTER_AUDIO", op_id)
@@ -73,3 +100,19 @@ class FilterAudioOperation(Operation):
         raise NotImplementedError
 
         yield {"audio_bytes": b"", "sr": 123, "sw": 123, "ch": 123}
+
+    ## OPTIONALLY IMPLEMENTED ####
+    def open_stream(self) -> AudioStream:
+        """Start filtering a new audio stream chunk by chunk, carrying state across
+        chunk boundaries. By default every chunk is filtered on its own"""
+        return ChunkStream(self)
+
+    def input_format(self) -> Optional[AudioFormat]:
+        """Format this filter works in, if it needs one. Audio is then converted to it
+        at the cheapest point before the filter. By default any format is accepted"""
+        return None
+
+    def output_format(self, input_format: AudioFormat) -> Optional[AudioFormat]:
+        """Format of the output for a given input format, or None if not known before
+        filtering. By default the format is kept"""
+        return input_format
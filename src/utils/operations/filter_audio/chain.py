@@ -0,0 +1,153 @@
+"""
+Chain of audio filters over a stream of chunks
+
+TTS output arrives as many short chunks. Each audio filter opens its own AudioStream so
+filters that need context across chunk boundaries (such as pitch shifting) can carry it,
+and chunks are passed through the streams in the order the filters were loaded.
+
+Audio formats are negotiated once the first chunk shows the format TTS produces. Filters
+that need a format of their own (such as RVC) and the format requested by the client
+split the chain into stretches of filters that keep any format. Each stretch gets at
+most one conversion, placed before its filters if that lowers the sample rate (so they
+have less to process) and after them otherwise.
+"""
+
+from typing import Any, Dict, List, Optional, Union
+
+from utils.helpers.audio import AudioConverter, AudioFormat
+
+from ..base import UsedInactiveError
+from .base import AudioStream, FilterAudioOperation
+
+# Filters, and formats to convert to, in the order audio goes through them
+ChainPlan = List[Union[FilterAudioOperation, AudioFormat]]
+
+
+def plan_chain(
+    filters: List[FilterAudioOperation],
+    source: Optional[AudioFormat],
+    target: Optional[AudioFormat] = None,
+) -> ChainPlan:
+    """Where to convert audio going from source, through filters, into target"""
+    plan, stretch, fmt = list(), list(), source
+
+    def close_stretch(required: Optional[AudioFormat]):
+        if required is None or required == fmt:
+            plan.extend(stretch)
+        elif fmt is not None and required.rate < fmt.rate:
+            plan.extend([required] + stretch)
+        else:
+            plan.extend(stretch + [required])
+        stretch.clear()
+
+    for op in filters:
+        required = op.input_format()
+        if required is not None:
+            close_stretch(required)
+            plan.append(op)
+            fmt = op.output_format(required)
+        elif fmt is not None and op.output_format(fmt) == fmt:
+            stretch.append(op)
+        else:
+            # Changes the format on its own, so conversions can't move past it
+            close_stretch(None)
+            plan.append(op)
+            fmt = op.output_format(fmt) if fmt is not None else None
+    close_stretch(target)
+
+    return plan
+
+
+def describe_plan(plan: ChainPlan, source: Optional[AudioFormat]) -> str:
+    steps = [str(source) if source else "unknown format"]
+    for step in plan:
+        steps.append(
+            "convert to {}".format(step)
+            if isinstance(step, AudioFormat)
+            else step.op_id
+        )
+    return " -> ".join(steps)
+
+
+class ConvertStream(AudioStream):
+    """Converts audio to a given format, whatever format it arrives in"""
+
+    def __init__(self, to_format: AudioFormat):
+        self.to_format = to_format
+        self.from_format = None
+        self.converter = None
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        outputs = list()
+        fmt = AudioFormat.of(chunk_in)
+        if fmt != self.from_format:
+            outputs.extend(await self.flush())
+            self.from_format = fmt
+            self.converter = AudioConverter(*fmt, *self.to_format)
+
+        return outputs + self._chunks(self.converter.process(chunk_in["audio_bytes"]))
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        if self.converter is None:
+            return []
+        converter, self.converter, self.from_format = self.converter, None, None
+        return self._chunks(converter.flush())
+
+    def _chunks(self, ab: bytes) -> List[Dict[str, Any]]:
+        if not ab:
+            return []
+        return [{"audio_bytes": ab, **self.to_format._asdict()}]
+
+
+class FilterAudioChainStream:
+    def __init__(self, filters: List[FilterAudioOperation], target: AudioFormat = None):
+        self.filters = filters
+        self.target = target
+        self.source = None
+        self.streams: List[AudioStream] = None
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Filter the next chunk, returning any output that is ready"""
+        outputs = list()
+        fmt = AudioFormat.of(chunk_in)
+        if fmt != self.source:
+            outputs.extend(await self.flush())  # Format changed, so plan again
+            self.source = fmt
+            self.streams = [
+                (
+                    ConvertStream(step)
+                    if isinstance(step, AudioFormat)
+                    else step.open_stream()
+                )
+                for step in plan_chain(self.filters, fmt, self.target)
+            ]
+        return outputs + await self._feed([chunk_in])
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        """Return all remaining output once the audio is complete"""
+        if self.streams is None:
+            return []
+        outputs = await self._feed([], flush=True)
+        self.source, self.streams = None, None
+        return outputs
+
+    async def _feed(
+        self, chunks: List[Dict[str, Any]], flush: bool = False
+    ) -> List[Dict[str, Any]]:
+        for stream in self.streams:
+            outputs = list()
+            for chunk in chunks:
+                outputs.extend(await stream.feed(chunk))
+            if flush:
+                outputs.extend(await stream.flush())
+            chunks = outputs
+        return chunks
+
+
+def open_chain_stream(
+    filters: List[FilterAudioOperation], target: AudioFormat = None
+) -> FilterAudioChainStream:
+    for op in filters:
+        if not op.active:
+            raise UsedInactiveError(op.op_type, op.op_id)
+    return FilterAudioChainStream(filters, target)
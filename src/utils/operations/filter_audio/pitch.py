@@ -1,31 +1,70 @@
-from utils.config import Config
-from utils.helpers.audio import pitch_audio
+from typing import Any, Dict, List
 
-from .base import FilterAudioOperation
+from utils.helpers.pitch import PitchShifter
+
+from .base import AudioStream, FilterAudioOperation
+
+
+class PitchStream(AudioStream):
+    def __init__(self, pitch_amount: float):
+        self.pitch_amount = pitch_amount
+        self.shifter = None
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        outputs = list()
+        sr, sw, ch = chunk_in["sr"], chunk_in["sw"], chunk_in["ch"]
+        fmt = (sr, sw, ch)
+        if self.shifter and (self.shifter.sr, self.shifter.sw, self.shifter.ch) != fmt:
+            outputs.extend(await self.flush())  # Format changed, so start over
+        if self.shifter is None:
+            self.shifter = PitchShifter(sr, sw, ch, self.pitch_amount)
+
+        ab = self.shifter.process(chunk_in["audio_bytes"])
+        if ab:
+            outputs.append({"audio_bytes": ab, "sr": sr, "sw": sw, "ch": ch})
+        return outputs
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        if self.shifter is None:
+            return []
+        shifter, self.shifter = self.shifter, None
+        ab = shifter.flush()
+        if not ab:
+            return []
+        return [
+            {"audio_bytes": ab, "sr": shifter.sr, "sw": shifter.sw, "ch": shifter.ch}
+        ]
 
 
 class PitchFilter(FilterAudioOperation):
     def __init__(self):
         super().__init__("pitch")
 
-        self.pitch_amount: int = 0
+        self.pitch_amount: float = 0
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
         if "pitch_amount" in config_d:
-            self.pitch_amount = str(config_d["pitch_amount"])
+            self.pitch_amount = float(config_d["pitch_amount"])
+
+        assert -24 <= self.pitch_amount <= 24
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
         return {"pitch_amount": self.pitch_amount}
 
+    def open_stream(self):
+        return PitchStream(self.pitch_amount)
+
     async def _generate(
         self,
         audio_bytes: bytes = None,
         sr: int = None,
         sw: int = None,
         ch: int = None,
-        **kwargs
+        **kwargs,
     ):
-        ab, sr, sw, ch = pitch_audio(audio_bytes, sr, sw, ch, self.pitch_amount)
+        """Generate a output stream"""
+        shifter = PitchShifter(sr, sw, ch, self.pitch_amount)
+        ab = shifter.process(audio_bytes) + shifter.flush()
         yield {"audio_bytes": ab, "sr": sr, "sw": sw, "ch": ch}
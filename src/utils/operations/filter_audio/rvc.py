@@ -1,21 +1,238 @@
-import wave
-from rvc.modules.vc.modules import VC
-import torch
-import fairseq
+"""
+Voice conversion with RVC on a model worker
 
-from utils.config import Config
+The voice model is loaded once by a ModelWorker (its own process by default), so
+inference never blocks the event loop. Audio is resampled to the 16 kHz mono RVC
+expects and handed over in shared memory, with converted audio written back the same
+way, and is passed straight to the RVC pipeline rather than through a file.
 
-from .base import FilterAudioOperation
+Long audio is converted in blocks of chunk_ms as it arrives. Each block also converts
+the first overlap_ms of the next one, and the two renditions of that overlap are
+crossfaded, so the output streams out block by block without audible seams.
+"""
 
+from collections import deque
+from functools import partial
+from itertools import count
+import logging
+import os
+import time
+from typing import Any, Dict, List
 
-class RVCFilter(FilterAudioOperation):
-    TARGET_SR = 16000
+import numpy as np
+
+from utils.helpers.model_worker import MODES, ModelWorker
+from utils.lifecycle import LifecycleManager, ManagedResource
+from utils.lifecycle.resource import process_memory
+from utils.helpers.audio import (
+    AudioFormat,
+    Resampler,
+    from_float,
+    mix_channels,
+    to_float,
+)
+from utils.helpers.shared_array import SharedArray, SharedArrayRef
+from utils.helpers.time import latency_stats
+
+from .base import AudioStream, FilterAudioOperation
+
+INPUT_SR = 16000
+MAX_OUTPUT_SR = 48000
+OUTPUT_MARGIN = 4096
+MIN_BLOCK_LEN = INPUT_SR // 10  # shorter audio is padded with silence
+SPEAKER_ID = 1
+LATENCY_SAMPLES = 1000
+
+# The pipeline memoizes harvest pitch by the path of the input audio, so each block is
+# given a path of its own to not be converted with the pitch of an earlier one
+_block_ids = count()
+
+
+def load_voice(voice: str):
+    import fairseq
+    import torch
+    from rvc.modules.vc.modules import VC
+    from rvc.modules.vc.utils import load_hubert
+
+    torch.serialization.add_safe_globals([fairseq.data.dictionary.Dictionary])
+    vc = VC()
+    vc.get_vc(voice if voice.endswith(".pth") else f"{voice}.pth")
+    # Loaded now rather than on the first conversion
+    vc.hubert_model = load_hubert(vc.config, os.getenv("hubert_path"))
+    return vc
+
+
+def _forget_audio(path: str) -> None:
+    """Drop the audio the pipeline keeps for each path given to harvest"""
+    try:
+        from rvc.modules.vc import pipeline
+    except ImportError:
+        return
+    getattr(pipeline, "input_audio_path2wav", {}).pop(path, None)
+
+
+def convert(
+    vc,
+    audio_ref: SharedArrayRef,
+    out_ref: SharedArrayRef,
+    f0_up_key: int,
+    f0_method: str,
+    f0_file: str,
+    index_file: str,
+    index_rate: float,
+    filter_radius: int,
+    resample_sr: int,
+    rms_mix_rate: float,
+    protect: float,
+):
+    """Runs on the model worker, writing 16-bit PCM into out_ref"""
+    with SharedArray.attach(audio_ref) as shared_in:
+        audio = shared_in.array.copy()
+
+    # Same steps as VC.vc_single once it has read the audio file
+    audio_max = np.abs(audio).max() / 0.95
+    if audio_max > 1:
+        audio /= audio_max
+    path = "voxelle-{}".format(next(_block_ids))
+    try:
+        audio_opt = vc.pipeline.pipeline(
+            vc.hubert_model,
+            vc.net_g,
+            SPEAKER_ID,
+            audio,
+            path,
+            [0, 0, 0],
+            f0_up_key,
+            f0_method,
+            index_file or "",
+            index_rate,
+            vc.if_f0,
+            filter_radius,
+            vc.tgt_sr,
+            resample_sr,
+            rms_mix_rate,
+            vc.version,
+            protect,
+            f0_file,
+        )
+    finally:
+        _forget_audio(path)
+    tgt_sr = resample_sr if vc.tgt_sr != resample_sr >= 16000 else vc.tgt_sr
+
+    with SharedArray.attach(out_ref) as shared_out:
+        if len(audio_opt) > len(shared_out.array):
+            raise ValueError("Converted audio larger than its output buffer")
+        shared_out.array[: len(audio_opt)] = audio_opt
+    yield tgt_sr, len(audio_opt)
+
+
+class RVCStream(AudioStream):
+    def __init__(self, op: "RVCFilter"):
+        self.op = op
+        self.block_len = int(INPUT_SR * op.chunk_ms / 1000)
+        self.overlap_len = int(INPUT_SR * op.overlap_ms / 1000)
+
+        self.fmt = None
+        self.resampler = None
+        self.pending = np.zeros(0, dtype=np.float32)  # 16 kHz input not yet converted
+        self.tail = None  # converted overlap of the last block, to crossfade
+        self.tail_sr = None
+
+    async def feed(self, chunk_in: Dict[str, Any]) -> List[Dict[str, Any]]:
+        outputs = list()
+        sr, sw, ch = chunk_in["sr"], chunk_in["sw"], chunk_in["ch"]
+        if self.fmt != (sr, sw, ch):
+            outputs.extend(await self.flush())  # Format changed, so start over
+            self.fmt = (sr, sw, ch)
+            self.resampler = Resampler(sr, INPUT_SR, 1)
+
+        x = mix_channels(to_float(chunk_in["audio_bytes"], sw, ch), 1)
+        self._add_pending(self.resampler.process(x))
+
+        while len(self.pending) >= self.block_len + self.overlap_len:
+            outputs.append(
+                await self._convert(self.pending[: self.block_len + self.overlap_len])
+            )
+            self.pending = self.pending[self.block_len :]
+        return outputs
+
+    async def flush(self) -> List[Dict[str, Any]]:
+        outputs = list()
+        if self.resampler is not None:
+            self._add_pending(self.resampler.flush())
+        if len(self.pending):
+            outputs.append(await self._convert(self.pending, final=True))
+        elif self.tail is not None and len(self.tail):
+            outputs.append(self._chunk(self.tail, self.tail_sr))
+
+        self.fmt, self.resampler, self.tail = None, None, None
+        self.pending = np.zeros(0, dtype=np.float32)
+        return outputs
+
+    def _add_pending(self, x: np.ndarray) -> None:
+        self.pending = np.concatenate([self.pending, x[:, 0]])
+
+    async def _convert(self, block: np.ndarray, final: bool = False) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        block_len = len(block)
+        if block_len < MIN_BLOCK_LEN:
+            block = np.pad(block, (0, MIN_BLOCK_LEN - block_len))
+        capacity = len(block) * MAX_OUTPUT_SR // INPUT_SR + OUTPUT_MARGIN
+        with (
+            SharedArray.copy_of(block) as shared_in,
+            SharedArray.create((capacity,), "<i2") as shared_out,
+        ):
+            async with self.op.use():
+                async for tgt_sr, length in self.op.worker.stream(
+                    shared_in.ref, shared_out.ref, **self.op.conversion_params()
+                ):
+                    y = shared_out.array[:length].astype(np.float32) / 32768
+        y = y[: round(block_len * tgt_sr / INPUT_SR)]
+
+        if self.tail is not None:
+            fade_len = min(len(self.tail), len(y))
+            fade = np.linspace(0, 1, fade_len, endpoint=False, dtype=np.float32)
+            y[:fade_len] = self.tail[:fade_len] * (1 - fade) + y[:fade_len] * fade
+
+        if final:
+            self.tail = None
+        else:
+            # Output lines up with the input, scaled to the output sample rate
+            block_out = round(self.block_len * tgt_sr / INPUT_SR)
+            overlap_out = round(self.overlap_len * tgt_sr / INPUT_SR)
+            y, self.tail = y[:block_out], y[block_out : block_out + overlap_out]
+            self.tail_sr = tgt_sr
+
+        elapsed = time.perf_counter() - start_time
+        self.op.latencies.append(elapsed)
+        self.op.real_time_factors.append(elapsed / (block_len / INPUT_SR))
+        logging.debug(
+            "RVC converted {:.0f} ms of audio in {:.0f} ms".format(
+                block_len / INPUT_SR * 1000, elapsed * 1000
+            )
+        )
+        return self._chunk(y, tgt_sr)
+
+    def _chunk(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
+        return {
+            "audio_bytes": from_float(y[:, None], RVCFilter.TARGET_SW),
+            "sr": sr,
+            "sw": RVCFilter.TARGET_SW,
+            "ch": RVCFilter.TARGET_CH,
+        }
+
+
+class RVCFilter(FilterAudioOperation, ManagedResource):
     TARGET_SW = 2
     TARGET_CH = 1
 
     def __init__(self):
         super().__init__("rvc")
-        self.vc = None
+        ManagedResource.__init__(self, "filter_audio/rvc")
+        self.worker = None
+        # Of each block converted, for the metrics
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.real_time_factors: deque = deque(maxlen=LATENCY_SAMPLES)
 
         self.voice: str = None
         self.f0_up_key: int = 0
@@ -27,14 +244,50 @@ class RVCFilter(FilterAudioOperation):
         self.resample_sr: int = 0
         self.rms_mix_rate: float = 0
         self.protect: float = 0.5
-
-        torch.serialization.add_safe_globals([fairseq.data.dictionary.Dictionary])
+        self.executor: str = "process"
+        self.max_queue: int = 8
+        self.chunk_ms: int = 1000
+        self.overlap_ms: int = 150
 
     async def start(self):
         await super().start()
-        self.vc = VC()
-        model_name = self.voice if self.voice.endswith(".pth") else f"{self.voice}.pth"
-        self.vc.get_vc(model_name)
+        await self.ensure_loaded()
+        LifecycleManager().register(self)
+
+    async def close(self):
+        await super().close()
+        LifecycleManager().unregister(self)
+        if self.is_loaded():
+            await self._unload()
+
+    def is_loaded(self) -> bool:
+        return self.worker is not None
+
+    async def _load(self):
+        self.worker = ModelWorker(
+            partial(load_voice, self.voice),
+            convert,
+            mode=self.executor,
+            max_queue=self.max_queue,
+            name="rvc",
+        )
+        await self.worker.start()
+
+    async def _unload(self):
+        await self.worker.stop()
+        self.worker = None
+
+    def footprint(self) -> int:
+        if self.worker is not None and self.worker.pid is not None:
+            return process_memory(self.worker.pid)
+        return super().footprint()
+
+    def stats(self) -> Dict[str, Any]:
+        """Seconds taken to convert each block, and those per second of audio"""
+        return {
+            "latency": latency_stats(self.latencies),
+            "realTimeFactor": latency_stats(self.real_time_factors),
+        }
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
@@ -58,8 +311,20 @@ class RVCFilter(FilterAudioOperation):
             self.rms_mix_rate = float(config_d["rms_mix_rate"])
         if "protect" in config_d:
             self.protect = float(config_d["protect"])
+        if "executor" in config_d:
+            self.executor = str(config_d["executor"])
+        if "max_queue" in config_d:
+            self.max_queue = int(config_d["max_queue"])
+        if "chunk_ms" in config_d:
+            self.chunk_ms = int(config_d["chunk_ms"])
+        if "overlap_ms" in config_d:
+            self.overlap_ms = int(config_d["overlap_ms"])
 
-        # TODO check assertions
+        assert self.resample_sr <= MAX_OUTPUT_SR
+        assert self.executor in MODES
+        assert self.max_queue > 0
+        assert self.chunk_ms > 0
+        assert 0 <= self.overlap_ms <= self.chunk_ms
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
@@ -74,8 +339,37 @@ class RVCFilter(FilterAudioOperation):
             "resample_sr": self.resample_sr,
             "rms_mix_rate": self.rms_mix_rate,
             "protect": self.protect,
+            "executor": self.executor,
+            "max_queue": self.max_queue,
+            "chunk_ms": self.chunk_ms,
+            "overlap_ms": self.overlap_ms,
+        }
+
+    def conversion_params(self) -> Dict[str, Any]:
+        return {
+            "f0_up_key": self.f0_up_key,
+            "f0_method": self.f0_method,
+            "f0_file": self.f0_file,
+            "index_file": self.index_file,
+            "index_rate": self.index_rate,
+            "filter_radius": self.filter_radius,
+            "resample_sr": self.resample_sr,
+            "rms_mix_rate": self.rms_mix_rate,
+            "protect": self.protect,
         }
 
+    def open_stream(self):
+        return RVCStream(self)
+
+    def input_format(self):
+        return AudioFormat(INPUT_SR, self.TARGET_SW, self.TARGET_CH)
+
+    def output_format(self, input_format):
+        # Otherwise the sample rate the voice was trained at
+        if self.resample_sr >= 16000:
+            return AudioFormat(self.resample_sr, self.TARGET_SW, self.TARGET_CH)
+        return None
+
     async def _generate(
         self,
         audio_bytes: bytes = None,
@@ -84,29 +378,8 @@ class RVCFilter(FilterAudioOperation):
         ch: int = None,
         **kwargs,
     ):
-        with wave.open(Config().ffmpeg_working_src, "wb") as f:
-            f.setframerate(sr)
-            f.setsampwidth(sw)
-            f.setnchannels(ch)
-            f.writeframes(audio_bytes)
-
-        tgt_sr, audio_opt, times, _ = self.vc.vc_single(
-            1,
-            Config().ffmpeg_working_src,
-            f0_up_key=self.f0_up_key,
-            f0_method=self.f0_method,
-            f0_file=self.f0_file,
-            index_file=self.index_file,
-            index_rate=self.index_rate,
-            filter_radius=self.filter_radius,
-            resample_sr=self.resample_sr,
-            rms_mix_rate=self.rms_mix_rate,
-            protect=self.protect,
-        )
-
-        yield {
-            "audio_bytes": audio_opt.tobytes(),
-            "sr": tgt_sr,
-            "sw": self.TARGET_SW,
-            "ch": self.TARGET_CH,
-        }
+        """Generate a output stream"""
+        stream = self.open_stream()
+        chunk_in = {"audio_bytes": audio_bytes, "sr": sr, "sw": sw, "ch": ch}
+        for chunk_out in await stream.feed(chunk_in) + await stream.flush():
+            yield chunk_out
@@ -6,11 +6,26 @@ Overwrites in chunk (OR augments chunk):
 - content: (str) text after filter application
 """
 
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, List, Any, AsyncGenerator
 
 from ..base import Operation
 
 
+class TextStream:
+    """Incremental state of a filter over text arriving in pieces (such as T2T deltas)"""
+
+    # Whether each output is a separate record (chunkers) or a fragment of one text
+    splits: bool = False
+
+    def feed(self, text: str) -> List[str]:
+        """Take the next piece of text and return any output that is ready"""
+        raise NotImplementedError
+
+    def flush(self) -> List[str]:
+        """Return all remaining output once the text is complete"""
+        raise NotImplementedError
+
+
 class FilterTextOperation(Operation):
     def __init__(self, op_id: str):
         super().__init__("FILTER_TEXT", op_id)
@@ -48,3 +63,19 @@ class FilterTextOperation(Operation):
         raise NotImplementedError
 
         yield {"content": "example response text"}
+
+    ## OPTIONALLY IMPLEMENTED ####
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """Apply filter synchronously by updating record in place.
+        For cheap pure-Python filters so they can be fused into a single pass"""
+        raise NotImplementedError
+
+    async def _generate_batch(self, contents: List[str]) -> List[Dict[str, Any]]:
+        """Apply filter to many texts at once, returning one result per text in order.
+        Only for filters that produce exactly one result per input (not chunkers)"""
+        raise NotImplementedError
+
+    def open_stream(self) -> TextStream:
+        """Start filtering a new text incrementally. Filters doing so should still
+        implement _apply or _generate for complete texts"""
+        raise NotImplementedError
@@ -0,0 +1,230 @@
+"""
+Compiled chain of text filters
+
+Applying filters one by one through Operation.__call__ nests an async generator per
+filter and copies the chunk at every level. FilterTextChain instead groups the loaded
+filters into stages once, whenever the filter list changes:
+- fused: consecutive pure-Python filters (implementing _apply) run back to back on each
+  record in a single pass
+- batch: model-backed filters (implementing _generate_batch) get every record at once
+- generic: any other filter (such as chunkers) falls back to its _generate stream
+
+Records are plain dicts merged in place, so metadata added by earlier filters (emotion,
+filtered, ...) is carried through to the end rather than copied per filter. Only
+generic filters copy records, since they may split one record into several.
+
+When the text arrives in pieces (FilterTextChain.stream), the leading filters that
+support streams (implementing open_stream) work on the pieces as they arrive, and the
+remaining stages run once the text is complete.
+"""
+
+import logging
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List
+
+from ..base import UsedInactiveError
+from .base import FilterTextOperation, TextStream
+
+
+def is_fusable(op: FilterTextOperation) -> bool:
+    return type(op)._apply is not FilterTextOperation._apply
+
+
+def is_batchable(op: FilterTextOperation) -> bool:
+    return type(op)._generate_batch is not FilterTextOperation._generate_batch
+
+
+def is_streamable(op: FilterTextOperation) -> bool:
+    return type(op).open_stream is not FilterTextOperation.open_stream
+
+
+class Stage:
+    def __init__(self, ops: List[FilterTextOperation]):
+        self.ops = ops
+
+    async def run(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def stream(self, records: List[Dict[str, Any]]):
+        for record in await self.run(records):
+            yield record
+
+
+class FusedStage(Stage):
+
+    async def run(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = list()
+        for record in records:
+            for op in self.ops:
+                op._apply(record)
+                if not record["content"]:
+                    break
+            else:
+                result.append(record)
+        return result
+
+
+class BatchStage(Stage):
+    def __init__(self, op: FilterTextOperation):
+        super().__init__([op])
+
+    async def run(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = await self.ops[0]._generate_batch([r["content"] for r in records])
+        for record, result in zip(records, results):
+            record.update(result)
+        return [record for record in records if record["content"]]
+
+
+class GenericStage(Stage):
+    def __init__(self, op: FilterTextOperation):
+        super().__init__([op])
+
+    async def stream(self, records: List[Dict[str, Any]]):
+        op = self.ops[0]
+        for record in records:
+            async for chunk_out in op._generate(**(await op._parse_chunk(record))):
+                # May yield several outputs per record, each needing their own copy
+                split = dict(record)
+                split.update(chunk_out)
+                if split["content"]:
+                    yield split
+
+    async def run(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [record async for record in self.stream(records)]
+
+
+def compile_stages(filters: List[FilterTextOperation]) -> List[Stage]:
+    stages = list()
+    for op in filters:
+        if is_fusable(op):
+            if stages and isinstance(stages[-1], FusedStage):
+                stages[-1].ops.append(op)
+            else:
+                stages.append(FusedStage([op]))
+        elif is_batchable(op):
+            stages.append(BatchStage(op))
+        else:
+            stages.append(GenericStage(op))
+
+    return stages
+
+
+class FilterTextChain:
+    def __init__(self, filters: List[FilterTextOperation]):
+        self.filters = list(filters)
+        self.stages = compile_stages(self.filters)
+        # Stages left after the first N filters were streamed, by N
+        self.stages_after: Dict[int, List[Stage]] = {0: self.stages}
+
+        logging.debug(
+            "Compiled text filter chain: {}".format(
+                " -> ".join(
+                    "{}({})".format(
+                        type(stage).__name__, ",".join(op.op_id for op in stage.ops)
+                    )
+                    for stage in self.stages
+                )
+            )
+        )
+
+    async def __call__(
+        self, chunk_in: Dict[str, Any]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Apply all filters in order, yielding finished records as they are ready"""
+        self._check_active()
+        start_time = time.perf_counter()
+
+        async for record in self._run(self.stages, [dict(chunk_in)]):
+            yield record
+
+        self._log_timing(start_time)
+
+    async def stream(
+        self, chunks_in: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Apply all filters in order to a text arriving as a stream of pieces"""
+        self._check_active()
+        start_time = time.perf_counter()
+
+        streams: List[TextStream] = list()
+        for op in self.filters:
+            if not is_streamable(op):
+                break
+            streams.append(op.open_stream())
+            if streams[-1].splits:
+                break  # later filters need the split records
+        splits = bool(streams) and streams[-1].splits
+
+        if len(streams) not in self.stages_after:
+            self.stages_after[len(streams)] = compile_stages(
+                self.filters[len(streams) :]
+            )
+        stages = self.stages_after[len(streams)]
+
+        fragments = list()
+        async for chunk_in in chunks_in:
+            pieces = self._feed(streams, [chunk_in["content"]])
+            if splits:
+                async for record in self._run_pieces(stages, pieces):
+                    yield record
+            else:
+                fragments.extend(pieces)
+
+        pieces = self._feed(streams, [], flush=True)
+        if not splits:
+            pieces = ["".join(fragments + pieces)]
+        async for record in self._run_pieces(stages, pieces):
+            yield record
+
+        self._log_timing(start_time)
+
+    def _check_active(self):
+        for op in self.filters:
+            if not op.active:
+                raise UsedInactiveError(op.op_type, op.op_id)
+
+    def _feed(
+        self, streams: List[TextStream], pieces: List[str], flush: bool = False
+    ) -> List[str]:
+        for stream in streams:
+            outputs = list()
+            for piece in pieces:
+                outputs.extend(stream.feed(piece))
+            if flush:
+                outputs.extend(stream.flush())
+            pieces = outputs
+        return pieces
+
+    async def _run_pieces(
+        self, stages: List[Stage], pieces: List[str]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        # Pieces split out together (such as the sentences left when the text ends) go
+        # through the stages as one batch
+        records = [{"content": piece} for piece in pieces if piece]
+        if records:
+            async for record in self._run(stages, records):
+                yield record
+
+    async def _run(
+        self, stages: List[Stage], records: List[Dict[str, Any]]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        if not stages:
+            for record in records:
+                yield record
+            return
+
+        for stage in stages[:-1]:
+            records = await stage.run(records)
+            if not records:
+                return
+
+        # Last stage streams so chunkers can hand off each piece immediately
+        async for record in stages[-1].stream(records):
+            yield record
+
+    def _log_timing(self, start_time: float):
+        logging.info(
+            "FILTER_TEXT chain of {} filters completed in {} ms".format(
+                len(self.filters), (time.perf_counter() - start_time) * 1000
+            )
+        )
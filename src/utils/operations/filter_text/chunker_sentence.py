@@ -1,8 +1,159 @@
-import spacy
+"""
+Splits text into sentences as it arrives.
+
+A sentence is only emitted once its boundary is confirmed, meaning a terminator has been
+followed by whitespace and the start of the next sentence, so the first sentence of a
+reply can be passed down the pipeline while the rest is still being generated.
+
+The rules flag candidate boundaries and, as before streaming, spaCy decides which are
+real. It is loaded with nothing but sentence segmentation and only run on the text not
+yet emitted, when the rules find a candidate. With use_spacy off, the rules alone decide, which needs no spaCy
+model and costs less CPU but handles unusual text worse.
+"""
+
+import re
+from typing import List
 
 from utils.config import Config
 
-from .base import FilterTextOperation
+from .base import FilterTextOperation, TextStream
+
+# Terminator (with closing quotes or brackets) and whitespace before the next sentence
+BOUNDARY = re.compile(r"(?:[.!?…]+[\"'”’)\]]*([ \t]+)|([ \t]*\n\s*))(?=\S)")
+# Possibly unconfirmed boundary at the end of the buffer
+TRAILING = re.compile(r"(?:[.!?…]+[\"'”’)\]]*)?\s*\Z")
+PRECEDING_WORD = re.compile(r"((?:\w+\.)*\w+)\Z")
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "no", "approx",
+    "fig", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct",
+    "nov", "dec",
+}  # fmt: skip
+CLAUSE_BREAK = re.compile(r"[,;:—][ \t]+")
+WHITESPACE = re.compile(r"\s+")
+LOOKBACK = 64
+
+SPACY_EXCLUDE = [
+    "tok2vec",
+    "tagger",
+    "morphologizer",
+    "parser",
+    "attribute_ruler",
+    "lemmatizer",
+    "ner",
+]
+
+
+class SentenceStream(TextStream):
+    splits = True
+
+    def __init__(self, chunker: "SentenceChunkerFilter"):
+        self.chunker = chunker
+        self.buffer = ""
+        self.scan_from = 0
+        self.carry = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        outputs = list()
+        for sentence in self._confirmed_sentences():
+            outputs.extend(self._pack(sentence))
+
+        # Force a split when no boundary shows up in time
+        max_length = self.chunker.max_length
+        while max_length and len(self.buffer) > max_length:
+            cut = split_point(self.buffer, max_length)
+            outputs.extend(self._pack(self.buffer[:cut]))
+            self.buffer = self.buffer[cut:]
+            self.scan_from = 0
+
+        return outputs
+
+    def flush(self) -> List[str]:
+        outputs = list()
+        for sentence in self._confirmed_sentences() + [self.buffer]:
+            outputs.extend(self._pack(sentence))
+        self.buffer, self.scan_from = "", 0
+
+        if self.carry:
+            outputs.append(self.carry)
+            self.carry = ""
+        return outputs
+
+    def _confirmed_sentences(self) -> List[str]:
+        sentences, start = list(), 0
+        for match in BOUNDARY.finditer(self.buffer, self.scan_from):
+            if is_boundary(self.buffer, match.start(), match.end()):
+                sentences.append(self.buffer[start : match.start(match.lastindex)])
+                start = match.end()
+
+        if sentences and self.chunker.nlp is not None:
+            # Rules found a candidate, so let spaCy decide on the whole buffer
+            sents = list(self.chunker.nlp(self.buffer).sents)
+            sentences = [sent.text for sent in sents[:-1]]
+            start = sents[-1].start_char if len(sents) > 1 else 0
+
+        self.buffer = self.buffer[start:]
+        trailing = TRAILING.search(self.buffer, max(0, len(self.buffer) - LOOKBACK))
+        self.scan_from = trailing.start()
+        return sentences
+
+    def _pack(self, sentence: str) -> List[str]:
+        """Split long sentences and merge short ones into evenly sized chunks"""
+        min_length, max_length = self.chunker.min_length, self.chunker.max_length
+        outputs = list()
+
+        sentence = sentence.strip()
+        while max_length and len(sentence) > max_length:
+            cut = split_point(sentence, max_length)
+            outputs.extend(self._pack(sentence[:cut]))
+            sentence = sentence[cut:].strip()
+        if not sentence:
+            return outputs
+
+        if self.carry:
+            if max_length and len(self.carry) + 1 + len(sentence) > max_length:
+                outputs.append(self.carry)
+                self.carry = sentence
+            else:
+                self.carry = "{} {}".format(self.carry, sentence)
+        else:
+            self.carry = sentence
+
+        if len(self.carry) >= min_length:
+            outputs.append(self.carry)
+            self.carry = ""
+        return outputs
+
+
+def is_boundary(text: str, start: int, end: int) -> bool:
+    """Whether a boundary match really ends a sentence"""
+    if text[end].islower():
+        return False  # such as "Well... maybe"
+    if text[start] != ".":
+        return True
+
+    # Abbreviations, initials and dotted abbreviations such as "e.g." or "U.S."
+    match = PRECEDING_WORD.search(text, max(0, start - 16), start)
+    if match is None:
+        return True
+    word = match.group(1)
+    return not (
+        (len(word) == 1 and word.isupper())
+        or "." in word
+        or word.lower() in ABBREVIATIONS
+    )
+
+
+def split_point(text: str, max_length: int) -> int:
+    """Where to split text longer than max_length, preferring clause breaks"""
+    head = text[: max_length + 1]
+    for pattern in (CLAUSE_BREAK, WHITESPACE):
+        cut = None
+        for match in pattern.finditer(head, max_length // 2):
+            cut = match.end()
+        if cut:
+            return cut
+    return max_length
 
 
 class SentenceChunkerFilter(FilterTextOperation):
@@ -10,9 +161,14 @@ class SentenceChunkerFilter(FilterTextOperation):
         super().__init__("chunker_sentence")
         self.nlp = None
 
+        self.use_spacy: bool = True
+        self.min_length: int = 0
+        self.max_length: int = 0
+
     async def start(self):
         await super().start()
-        self.nlp = spacy.load(Config().spacy_model)
+        if self.use_spacy:
+            self.nlp = self._load_spacy()
 
     async def close(self):
         await super().close()
@@ -20,15 +176,45 @@ class SentenceChunkerFilter(FilterTextOperation):
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
-        return
+        if "use_spacy" in config_d:
+            self.use_spacy = bool(config_d["use_spacy"])
+        if "min_length" in config_d:
+            self.min_length = int(config_d["min_length"])
+        if "max_length" in config_d:
+            self.max_length = int(config_d["max_length"])
+
+        assert self.min_length >= 0
+        assert self.max_length >= 0
+        assert not self.max_length or self.min_length <= self.max_length
+
+        if self.active and self.use_spacy and self.nlp is None:
+            self.nlp = self._load_spacy()
+        elif not self.use_spacy:
+            self.nlp = None
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {}
+        return {
+            "use_spacy": self.use_spacy,
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+        }
+
+    def _load_spacy(self):
+        import spacy
+
+        nlp = spacy.load(Config().spacy_model, exclude=SPACY_EXCLUDE)
+        if "senter" in nlp.component_names:
+            nlp.enable_pipe("senter")
+        else:
+            nlp.add_pipe("sentencizer")
+        return nlp
+
+    def open_stream(self):
+        return SentenceStream(self)
 
     async def _generate(self, content: str = None, **kwargs):
         """Generate a output stream"""
-        sentences = [sent.text.strip() for sent in self.nlp(content).sents]
-
-        for s in sentences:
-            yield {"content": s}
+        stream = self.open_stream()
+        for sentence in stream.feed(content) + stream.flush():
+            yield {"content": sentence}
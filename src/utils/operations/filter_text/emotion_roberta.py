@@ -1,36 +1,102 @@
+import asyncio
+from typing import List
 from transformers import pipeline
 import torch
 
+from utils.helpers.batcher import MicroBatcher
+from utils.helpers.hub import hub_snapshot
+from utils.lifecycle import LifecycleManager, ManagedResource
+
 from .base import FilterTextOperation
 
 
-class RobertaEmotionFilter(FilterTextOperation):
+class RobertaEmotionFilter(FilterTextOperation, ManagedResource):
+    MODEL = "SamLowe/roberta-base-go_emotions"
+
     def __init__(self):
         super().__init__("emotion_roberta")
+        ManagedResource.__init__(self, "filter_text/emotion_roberta")
         self.classifier = None
+        self.batcher = None
+
+        self.max_batch_size: int = 32
+        self.batch_window_ms: float = 5.0
 
     async def start(self):
         await super().start()
-        self.classifier = pipeline(
+        await self.ensure_loaded()
+        LifecycleManager().register(self)
+
+    async def close(self):
+        await super().close()
+        LifecycleManager().unregister(self)
+        if self.is_loaded():
+            await self._unload()
+
+    def is_loaded(self) -> bool:
+        return self.batcher is not None
+
+    async def _load(self):
+        # Off the event loop, as it may be loaded again in the middle of a response
+        self.classifier = await asyncio.to_thread(self._pipeline, self.MODEL)
+        self.batcher = MicroBatcher(
+            self._classify_batch,
+            max_batch_size=self.max_batch_size,
+            batch_window_ms=self.batch_window_ms,
+            name="emotion_roberta",
+        )
+        self.batcher.start()
+
+    def _pipeline(self, model: str):
+        return pipeline(
             task="text-classification",
-            model="SamLowe/roberta-base-go_emotions",
+            model=hub_snapshot(model),
             top_k=1,
             device=("cuda" if torch.cuda.is_available() else "cpu"),
+            model_kwargs={"use_safetensors": True},
         )
 
-    async def close(self):
-        await super().close()
-        del self.classifier
+    async def _unload(self):
+        self.batcher.stop()
+        self.batcher = None
+        self.classifier = None
         if torch.cuda.is_available():
             torch.cuda.empty_cache()  # clean cache on cuda
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
-        return
+        if "max_batch_size" in config_d:
+            self.max_batch_size = int(config_d["max_batch_size"])
+        if "batch_window_ms" in config_d:
+            self.batch_window_ms = float(config_d["batch_window_ms"])
+
+        assert self.max_batch_size > 0
+        assert self.batch_window_ms >= 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {}
+        return {
+            "max_batch_size": self.max_batch_size,
+            "batch_window_ms": self.batch_window_ms,
+        }
+
+    def _classify_batch(self, contents: List[str]) -> List[str]:
+        """Runs on the batcher's worker thread"""
+        with torch.inference_mode():
+            results = self.classifier(
+                contents, batch_size=len(contents), truncation=True
+            )
+        return [result[0]["label"] for result in results]
 
     async def _generate(self, content: str = None, **kwargs):
-        yield {"content": content, "emotion": self.classifier(content)[0][0]["label"]}
+        async with self.use():
+            emotion = await self.batcher.submit(content)
+        yield {"content": content, "emotion": emotion}
+
+    async def _generate_batch(self, contents: List[str]):
+        async with self.use():
+            emotions = await self.batcher.submit_many(contents)
+        return [
+            {"content": content, "emotion": emotion}
+            for content, emotion in zip(contents, emotions)
+        ]
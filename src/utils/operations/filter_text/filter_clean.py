@@ -1,37 +1,180 @@
+"""
+Cleans text with one linear pass of a single combined regex.
+
+Each pattern set is an alternative in the combined regex. Matches are either removed
+or, for markdown, replaced by the text they wrap. Every pattern set also has a partial
+regex matching any unfinished prefix of a match at the end of the text, which lets
+CleaningStream hold back just enough of a streamed reply to never split a match across
+two deltas.
+"""
+
 import re
+from typing import Dict, List, Tuple
+
+from .base import FilterTextOperation, TextStream
+
+EMOJI_RANGES = (
+    r"\U0001f000-\U0001faff"  # pictographs, emoticons, transport, symbols
+    r"\u2600-\u27bf"  # misc symbols and dingbats
+    r"\u2b00-\u2bff"  # arrows and stars
+    r"\ufe0f\u200d\u20e3"  # variation selector, zero width joiner, keycap
+)
+
+# name: (pattern, partial pattern, keep wrapped text)
+# Patterns that keep wrapped text must contain exactly one unnamed group to keep
+PATTERN_SETS: Dict[str, List[Tuple[str, str, bool]]] = {
+    "speaker_tags": [
+        (r"\[[^\[\]]+\]:\s*", r"\[(?:[^\[\]]+(?:\](?::\s*)?)?)?\Z", False),
+    ],
+    "stage_directions": [
+        (r"\*[^*\n]+\*[ \t]*", r"\*[^*\n]*(?:\*[ \t]*)?\Z", False),
+    ],
+    "markdown": [
+        (r"\*\*([^*\n]+)\*\*", r"\*\*?[^*\n]*\*?\Z", True),
+        (r"__([^_\n]+)__", r"_\Z|__[^_\n]*_?\Z", True),
+        (r"\*([^*\n]+)\*", r"\*[^*\n]*\Z", True),
+        (r"`([^`\n]+)`", r"`[^`\n]*\Z", True),
+        (
+            r"\[([^\[\]\n]+)\]\([^()\s]*\)",
+            r"\[[^\[\]\n]*(?:\](?:\([^()\s]*)?)?\Z",
+            True,
+        ),
+        (r"^#{1,6}[ \t]+", r"^#{1,6}[ \t]*\Z", False),
+    ],
+    "emoji": [
+        (r"[{0}]+".format(EMOJI_RANGES), r"[{0}]+\Z".format(EMOJI_RANGES), False),
+    ],
+}
+DEFAULT_PATTERN_SETS = ["speaker_tags"]
+
+
+class Cleaner:
+    """Compiled combination of pattern sets"""
+
+    def __init__(self, pattern_sets: List[str]):
+        alternatives, partials = list(), list()
+        self.keep_groups: Dict[str, int] = dict()
+
+        for set_name in pattern_sets:
+            for idx, (pattern, partial, keep) in enumerate(PATTERN_SETS[set_name]):
+                group_name = "{}_{}".format(set_name, idx)
+                alternatives.append("(?P<{}>{})".format(group_name, pattern))
+                partials.append("(?:{})".format(partial))
+                if keep:
+                    self.keep_groups[group_name] = None
+
+        self.pattern = re.compile("|".join(alternatives) or r"(?!)", re.MULTILINE)
+        self.partial = re.compile("|".join(partials) or r"(?!)", re.MULTILINE)
+        for group_name in self.keep_groups:
+            # The wrapped text is the first group nested inside the named one
+            self.keep_groups[group_name] = self.pattern.groupindex[group_name] + 1
+
+    def clean(self, text: str, pos: int = 0) -> str:
+        """Clean text[pos:], with text[:pos] only used as context for anchors"""
+        pieces = list()
+        last = pos
+        for match in self.pattern.finditer(text, pos):
+            pieces.append(text[last : match.start()])
+            keep_idx = self.keep_groups.get(match.lastgroup, None)
+            if keep_idx is not None:
+                pieces.append(match.group(keep_idx))
+            last = match.end()
+        pieces.append(text[last:])
+
+        return "".join(pieces)
+
 
-from .base import FilterTextOperation
+class CleaningStream(TextStream):
+    def __init__(self, cleaner: Cleaner, max_carry: int):
+        self.cleaner = cleaner
+        self.max_carry = max_carry
+        self.pending = ""
+        self.context = ""
+
+    def feed(self, text: str) -> List[str]:
+        text = self.pending + text
+        cut = self._safe_cut(text)
+        self.pending = text[cut:]
+
+        return self._release(text[:cut])
+
+    def _safe_cut(self, text: str) -> int:
+        """Find where a possibly unfinished match starts, if anywhere"""
+        full, offset = self.context + text, len(self.context)
+        search_start = max(0, len(text) - self.max_carry)
+        spans = [
+            (match.start() - offset, match.end() - offset)
+            for match in self.cleaner.pattern.finditer(full, offset)
+        ]
+
+        pos, span_idx = search_start, 0
+        while match := self.cleaner.partial.search(full, pos + offset):
+            cut = match.start() - offset
+            while span_idx < len(spans) and spans[span_idx][1] <= cut:
+                span_idx += 1
+            if span_idx < len(spans) and spans[span_idx][0] < cut:
+                # Inside a finished match, such as a closing "**" looking like an opener
+                pos = spans[span_idx][1]
+                continue
+
+            if cut == search_start and search_start > 0:
+                break  # Unfinished match outgrew max_carry, so stop waiting on it
+            return cut
+
+        return len(text)
+
+    def flush(self) -> List[str]:
+        text, self.pending = self.pending, ""
+        return self._release(text)
+
+    def _release(self, text: str) -> List[str]:
+        if not text:
+            return []
+        cleaned = self.cleaner.clean(self.context + text, len(self.context))
+        self.context = text[-1]
+        return [cleaned] if cleaned else []
 
 
 class ResponseCleaningFilter(FilterTextOperation):
     def __init__(self):
         super().__init__("filter_clean")
-        self.pattern = None
+        self.cleaner = None
+
+        self.patterns: List[str] = list(DEFAULT_PATTERN_SETS)
+        self.max_carry: int = 256
 
     async def start(self):
         await super().start()
-        self.pattern = re.compile(r"\[[^\[\]]+\]:\s*")
+        self.cleaner = Cleaner(self.patterns)
 
     async def close(self):
         await super().close()
+        self.cleaner = None
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
-        return
+        if "patterns" in config_d:
+            self.patterns = list(config_d["patterns"])
+        if "max_carry" in config_d:
+            self.max_carry = int(config_d["max_carry"])
+
+        for set_name in self.patterns:
+            assert set_name in PATTERN_SETS, "Unknown pattern set {}".format(set_name)
+        assert self.max_carry > 0
+
+        if self.active:
+            self.cleaner = Cleaner(self.patterns)
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {}
+        return {"patterns": self.patterns, "max_carry": self.max_carry}
+
+    def open_stream(self):
+        return CleaningStream(self.cleaner, self.max_carry)
+
+    def _apply(self, record):
+        record["content"] = self.cleaner.clean(record["content"])
 
     async def _generate(self, content: str = None, **kwargs):
         """Generate a output stream"""
-        while True:
-            match = self.pattern.search(content)
-            if match:
-                tmp = content[: match.span()[0]]
-                tmp += content[match.span()[1] :]
-                content = tmp
-            else:
-                break
-
-        yield {"content": content}
+        yield {"content": self.cleaner.clean(content)}
@@ -1,57 +1,112 @@
+import asyncio
+from typing import List
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import torch
+
+from utils.helpers.batcher import MicroBatcher
+from utils.helpers.hub import hub_snapshot
+from utils.lifecycle import LifecycleManager, ManagedResource
+
 from .base import FilterTextOperation
 
 
-class KoalaModerationFilter(FilterTextOperation):
+class KoalaModerationFilter(FilterTextOperation, ManagedResource):
     GOOD_LABEL = "OK"
+    MODEL = "KoalaAI/Text-Moderation"
 
     def __init__(self):
         super().__init__("mod_koala")
+        ManagedResource.__init__(self, "filter_text/mod_koala")
         self.model, self.tokenizer = None, None
+        self.batcher = None
+
+        self.max_batch_size: int = 32
+        self.batch_window_ms: float = 5.0
 
     async def start(self):
         await super().start()
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            "KoalaAI/Text-Moderation"
-        ).to(self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained("KoalaAI/Text-Moderation")
+        await self.ensure_loaded()
+        LifecycleManager().register(self)
 
     async def close(self):
         await super().close()
-        del self.model, self.tokenizer
+        LifecycleManager().unregister(self)
+        if self.is_loaded():
+            await self._unload()
+
+    def is_loaded(self) -> bool:
+        return self.batcher is not None
+
+    async def _load(self):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Off the event loop, as it may be loaded again in the middle of a response
+        self.model, self.tokenizer = await asyncio.to_thread(self._load_model)
+        self.batcher = MicroBatcher(
+            self._classify_batch,
+            max_batch_size=self.max_batch_size,
+            batch_window_ms=self.batch_window_ms,
+            name="mod_koala",
+        )
+        self.batcher.start()
+
+    def _load_model(self):
+        path = hub_snapshot(self.MODEL)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            path, use_safetensors=True
+        )
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = model.to(self.device)
+        model.eval()
+        return model, tokenizer
+
+    async def _unload(self):
+        self.batcher.stop()
+        self.batcher = None
+        self.model, self.tokenizer = None, None
         if torch.cuda.is_available():
             torch.cuda.empty_cache()  # clean cache on cuda
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
-        return
+        if "max_batch_size" in config_d:
+            self.max_batch_size = int(config_d["max_batch_size"])
+        if "batch_window_ms" in config_d:
+            self.batch_window_ms = float(config_d["batch_window_ms"])
+
+        assert self.max_batch_size > 0
+        assert self.batch_window_ms >= 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {}
+        return {
+            "max_batch_size": self.max_batch_size,
+            "batch_window_ms": self.batch_window_ms,
+        }
 
-    async def _generate(self, content: str = None, **kwargs):
-        """Generate a output stream"""
-        # Classify content
-        inputs = self.tokenizer(content, return_tensors="pt").to(self.device)
-        outputs = self.model(**inputs)
-
-        # Get class scores
-        logits = outputs.logits
-        probabilities = logits.softmax(dim=-1).squeeze()
+    def _classify_batch(self, contents: List[str]) -> List[bool]:
+        """Runs on the batcher's worker thread. Returns whether each text is filtered"""
+        inputs = self.tokenizer(
+            contents, return_tensors="pt", padding=True, truncation=True
+        ).to(self.device)
+        with torch.inference_mode():
+            logits = self.model(**inputs).logits
 
-        # Retrieve the labels
+        # Top classification is the same under softmax, so skip it
         id2label = self.model.config.id2label
-        labels = [id2label[idx] for idx in range(len(probabilities))]
-
-        # Sort labels by score
-        label_prob_pairs = list(zip(labels, probabilities))
-        label_prob_pairs.sort(key=lambda item: item[1], reverse=True)
-
-        # Handle top classification
-        top_label, _ = label_prob_pairs[0]
-        filtered = top_label != self.GOOD_LABEL
+        return [
+            id2label[idx] != self.GOOD_LABEL for idx in logits.argmax(dim=-1).tolist()
+        ]
 
+    async def _generate(self, content: str = None, **kwargs):
+        """Generate a output stream"""
+        async with self.use():
+            filtered = await self.batcher.submit(content)
         yield {"content": content, "filtered": filtered}
+
+    async def _generate_batch(self, contents: List[str]):
+        async with self.use():
+            filtered = await self.batcher.submit_many(contents)
+        return [
+            {"content": content, "filtered": is_filtered}
+            for content, is_filtered in zip(contents, filtered)
+        ]
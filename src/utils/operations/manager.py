@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Dict, List, AsyncGenerator, Any
+import logging
+from typing import Dict, List, AsyncGenerator, AsyncIterator, Any
 
 from .error import (
     UnknownOpType,
@@ -9,6 +10,16 @@ from .error import (
     OperationUnloaded,
 )
 from .base import Operation
+from .filter_text.chain import FilterTextChain
+from .filter_audio.chain import (
+    FilterAudioChainStream,
+    describe_plan,
+    open_chain_stream,
+    plan_chain,
+)
+from .stt.batch import transcribe_all
+from .stt.stream import STTStream, open_stt_stream
+from utils.helpers.audio import AudioFormat
 from utils.helpers.singleton import Singleton
 from utils.config import Config
 
@@ -153,6 +164,10 @@ def load_op(op_type: OpTypes, op_id: str):
                 from .embedding.openai import OpenAIEmbedding
 
                 return OpenAIEmbedding()
+            elif op_id == "local":
+                from .embedding.local import LocalEmbedding
+
+                return LocalEmbedding()
             else:
                 raise UnknownOpID("EMBEDDING", op_id)
         case _:
@@ -168,6 +183,7 @@ class OperationManager(metaclass=Singleton):
         self.tts = None
         self.filter_audio = list()
         self.filter_text = list()
+        self.filter_text_chain = FilterTextChain(self.filter_text)
         self.embedding = None
 
     def get_operation(self, op_role: OpRoles) -> Operation:
@@ -295,6 +311,7 @@ class OperationManager(metaclass=Singleton):
                 self.filter_audio.append(new_op)
             case OpRoles.FILTER_TEXT:
                 self.filter_text.append(new_op)
+                self.filter_text_chain = FilterTextChain(self.filter_text)
             case OpRoles.EMBEDDING:
                 if self.embedding:
                     await self.embedding.close()
@@ -303,6 +320,9 @@ class OperationManager(metaclass=Singleton):
                 # Should never get here if op_role is indeed OpRoles
                 raise UnknownOpRole(op_role)
 
+        if op_role in [OpRoles.TTS, OpRoles.FILTER_AUDIO]:
+            self._log_audio_plan()
+
     async def load_operations_from_config(self) -> None:
         """Load, start, and save all operations specified in config in the OperationManager"""
         config = Config()
@@ -361,6 +381,7 @@ class OperationManager(metaclass=Singleton):
                     if op.op_id == op_id:
                         await op.close()
                         self.filter_text.remove(op)
+                        self.filter_text_chain = FilterTextChain(self.filter_text)
                         return
                 raise OperationUnloaded("FILTER_TEXT", op_id=op_id)
             case OpRoles.EMBEDDING:
@@ -394,6 +415,7 @@ class OperationManager(metaclass=Singleton):
         for op in self.filter_text:
             await op.close()
         self.filter_text.clear()
+        self.filter_text_chain = FilterTextChain(self.filter_text)
         if self.embedding:
             await self.embedding.close()
             self.embedding = None
@@ -519,7 +541,7 @@ class OperationManager(metaclass=Singleton):
                             return op(chunk_in)
                     raise OperationUnloaded("FILTER_TEXT", op_id=op_id)
                 else:
-                    return self._use_filter(self.filter_text, 0, chunk_in)
+                    return self.filter_text_chain(chunk_in)
             case OpRoles.EMBEDDING:
                 if not self.embedding:
                     raise OperationUnloaded("EMBEDDING")
@@ -530,3 +552,38 @@ class OperationManager(metaclass=Singleton):
             case _:
                 # Should never get here if op_role is indeed OpRoles
                 raise UnknownOpType(op_role)
+
+    def use_filter_text_stream(
+        self, chunks_in: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Use all loaded text filters on text arriving as a stream of pieces"""
+        return self.filter_text_chain.stream(chunks_in)
+
+    def open_filter_audio_stream(
+        self, target: AudioFormat = None
+    ) -> FilterAudioChainStream:
+        """Start using all loaded audio filters on consecutive chunks of one audio,
+        converting the result to target if given"""
+        return open_chain_stream(self.filter_audio, target)
+
+    async def use_stt_batch(self, chunks_in: List[Dict[str, Any]]) -> List[str]:
+        """Transcribe several pieces of audio concurrently, returning them in order"""
+        if not self.stt:
+            raise OperationUnloaded("STT")
+        return await transcribe_all(self.stt, chunks_in)
+
+    def open_stt_stream(
+        self, fmt: AudioFormat, prompt: str = "", **vad_config
+    ) -> STTStream:
+        """Start transcribing speech from audio arriving in consecutive pieces"""
+        if not self.stt:
+            raise OperationUnloaded("STT")
+        return open_stt_stream(self.stt, fmt, prompt=prompt, **vad_config)
+
+    def _log_audio_plan(self) -> None:
+        """Show how audio from TTS will be converted on its way through filters"""
+        if not self.tts:
+            return
+        source = self.tts.output_format()
+        plan = plan_chain(self.filter_audio, source)
+        logging.info("Audio chain: {}".format(describe_plan(plan, source)))
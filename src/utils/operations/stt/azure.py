@@ -4,16 +4,25 @@ import azure.cognitiveservices.speech as speechsdk
 import logging
 
 from utils.config import Config
+from utils.helpers.blocking import CallbackQueue, run_blocking
 
 from .base import STTOperation
 
 
+class AzureTranscriptionCanceled(Exception):
+    def __init__(self, details: str):
+        super().__init__("Azure speech transcription canceled: {}".format(details))
+
+
 class AzureSTT(STTOperation):
+    MAX_CONCURRENCY = 4
+
     def __init__(self):
         super().__init__("azure")
         self.client = None
 
         self.language: str = "en-US"
+        self.timeout: float = 30  # longest wait on the SDK, in seconds
 
     async def start(self) -> None:
         """General setup needed to start generated"""
@@ -27,13 +36,16 @@ class AzureSTT(STTOperation):
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
         if "language" in config_d:
-            self.model_id = str(config_d["language"])
+            self.language = str(config_d["language"])
+        if "timeout" in config_d:
+            self.timeout = float(config_d["timeout"])
 
         assert self.language is not None and len(self.language) > 0
+        assert self.timeout > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {"language": self.language}
+        return {"language": self.language, "timeout": self.timeout}
 
     async def _generate(
         self,
@@ -60,28 +72,40 @@ class AzureSTT(STTOperation):
             language=self.language,
         )
 
-        # Setup event callbacks
-        transcription = ""
-        done = asyncio.Event()
-        done.clear()
+        # Setup event callbacks, called from the SDK's threads
+        results = CallbackQueue("Azure speech transcription", timeout=self.timeout)
 
         def transcribed_cb(evt):
-            nonlocal transcription
             if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                transcription += str(evt.result)
+                results.put(evt.result.text)
 
         def stop_cb(evt: speechsdk.SessionEventArgs):
-            done.set()
+            results.finish()
+
+        def canceled_cb(evt):
+            details = evt.cancellation_details
+            if details.reason == speechsdk.CancellationReason.Error:
+                results.put(AzureTranscriptionCanceled(details.error_details))
+            else:
+                results.finish()
 
         transcriber.transcribed.connect(transcribed_cb)
         transcriber.session_stopped.connect(stop_cb)
-        transcriber.canceled.connect(stop_cb)
+        transcriber.canceled.connect(canceled_cb)
 
         # Start transcribing
-        transcriber.start_transcribing_async()
-        stream.write(audio_bytes)
-        stream.close()
-        await done.wait()
-        transcriber.stop_transcribing_async()
-
-        yield {"transcription": transcription}
+        transcription = list()
+        await run_blocking(
+            transcriber.start_transcribing_async().get, timeout=self.timeout
+        )
+        try:
+            stream.write(audio_bytes)
+            stream.close()
+            async for text in results:
+                transcription.append(text)
+        finally:
+            await run_blocking(
+                transcriber.stop_transcribing_async().get, timeout=self.timeout
+            )
+
+        yield {"transcription": " ".join(transcription)}
@@ -16,6 +16,9 @@ from ..base import Operation
 
 
 class STTOperation(Operation):
+    # Most transcriptions run at once when several speakers are transcribed together
+    MAX_CONCURRENCY = 1
+
     def __init__(self, op_id: str):
         super().__init__("STT", op_id)
 
@@ -0,0 +1,38 @@
+"""
+Transcription of several speakers at once
+
+When several people finish speaking together, their audio is transcribed concurrently
+rather than one after another, so the wait is that of the slowest one. Each backend
+sets how many transcriptions it runs at once with MAX_CONCURRENCY.
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+from ..base import UsedInactiveError
+from .base import STTOperation
+
+
+async def transcribe_all(
+    op: STTOperation, chunks_in: List[Dict[str, Any]]
+) -> List[str]:
+    """Transcriptions of every chunk, in the same order as chunks_in"""
+    if not op.active:
+        raise UsedInactiveError(op.op_type, op.op_id)
+    limit = asyncio.Semaphore(op.MAX_CONCURRENCY)
+
+    async def transcribe(chunk_in: Dict[str, Any]) -> str:
+        async with limit:
+            content = ""
+            async for chunk_out in op(chunk_in):
+                content += chunk_out["transcription"]
+            return content
+
+    results = await asyncio.gather(
+        *[transcribe(chunk_in) for chunk_in in chunks_in], return_exceptions=True
+    )
+    # Only fail once all are done, so none is left running
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
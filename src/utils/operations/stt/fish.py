@@ -1,33 +1,46 @@
-import io
-import wave
+import inspect
 import os
 
 from fish_audio_sdk import Session, ASRRequest
 
+from utils.helpers.blocking import run_blocking
+from utils.helpers.pcm import to_wav
+
 from .base import STTOperation
 
 
 class FishSTT(STTOperation):
+    MAX_CONCURRENCY = 4
+
     def __init__(self):
         super().__init__("fish")
         self.session = None
 
+        self.timeout: float = 30  # longest wait for a transcription, in seconds
+
     async def start(self):
+        """General setup needed to start generated"""
         await super().start()
         self.session = Session(os.getenv("FISH_API_KEY"))
 
-    async def unload(self):
+    async def close(self) -> None:
+        """Clean up resources before unloading"""
         await super().close()
-        await self.session.close()
+        closed = self.session.close()
+        if inspect.isawaitable(closed):
+            await closed
         self.session = None
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
-        return
+        if "timeout" in config_d:
+            self.timeout = float(config_d["timeout"])
+
+        assert self.timeout > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {}
+        return {"timeout": self.timeout}
 
     async def _generate(
         self,
@@ -39,16 +52,15 @@ class FishSTT(STTOperation):
         **kwargs
     ):
         """Generate a output stream"""
-        audio_data = io.BytesIO()
-        with wave.open(audio_data, "wb") as f:
-            f.setframerate(sr)
-            f.setsampwidth(sw)
-            f.setnchannels(ch)
-            f.writeframes(audio_bytes)
-        audio_data.seek(0)
-
-        response = self.session.asr(
-            ASRRequest(audio=audio_data.read(), language="en", ignore_timestamps=False)
+        # The SDK's requests block, so they are sent from a worker thread
+        response = await run_blocking(
+            self.session.asr,
+            ASRRequest(
+                audio=to_wav(audio_bytes, sr, sw, ch),
+                language="en",
+                ignore_timestamps=False,
+            ),
+            timeout=self.timeout,
         )
         result = response.text
 
@@ -1,9 +1,8 @@
-from io import BytesIO
-import wave
-import requests
+import aiohttp
 import base64
 
 from utils.config import Config
+from utils.helpers.pcm import to_wav
 from utils.processes import ProcessManager, ProcessType
 
 from .base import STTOperation
@@ -14,7 +13,10 @@ class KoboldSTT(STTOperation):
 
     def __init__(self):
         super().__init__("kobold")
-        self.uri = None
+        self.process = None
+
+        self.pool: str = "kobold"
+        self.session = None
 
         self.suppress_non_speech: bool = True
         self.langcode: str = "en"
@@ -22,18 +24,23 @@ class KoboldSTT(STTOperation):
     async def start(self) -> None:
         """General setup needed to start generated"""
         await super().start()
-        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
-        self.uri = "http://127.0.0.1:{}".format(
-            ProcessManager().get_process(ProcessType.KOBOLD).port
-        )
+        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool)
+        self.process = ProcessManager().get_process(ProcessType.KOBOLD, self.pool)
+        self.session = aiohttp.ClientSession()
 
     async def close(self) -> None:
         """Clean up resources before unloading"""
         await super().close()
-        await ProcessManager().unlink(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
+        await self.session.close()
+        self.session = None
+        await ProcessManager().unlink(
+            self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool
+        )
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
+        if "pool" in config_d:
+            self.pool = str(config_d["pool"])
         if "suppress_non_speech" in config_d:
             self.suppress_non_speech = bool(config_d["suppress_non_speech"])
         if "langcode" in config_d:
@@ -58,28 +65,21 @@ class KoboldSTT(STTOperation):
         **kwargs,
     ):
         """Generate a output stream"""
-        audio_data = BytesIO()
-        with wave.open(audio_data, "wb") as f:
-            f.setframerate(sr)
-            f.setsampwidth(sw)
-            f.setnchannels(ch)
-            f.writeframes(audio_bytes)
-        audio_data.seek(0)
-
-        response = requests.post(
-            "{}/api/extra/transcribe".format(self.uri),
-            json={
-                "prompt": prompt,
-                "suppress_non_speech": self.suppress_non_speech,
-                "langcode": self.langcode,
-                "audio_data": base64.b64encode(audio_data.read()).decode("utf-8"),
-            },
-        )
+        audio_data = to_wav(audio_bytes, sr, sw, ch)
+        async with self.process.track() as server:
+            async with self.session.post(
+                "{}/api/extra/transcribe".format(server.uri),
+                json={
+                    "prompt": prompt,
+                    "suppress_non_speech": self.suppress_non_speech,
+                    "langcode": self.langcode,
+                    "audio_data": base64.b64encode(audio_data).decode("utf-8"),
+                },
+            ) as response:
+                if response.status != 200:
+                    raise Exception(
+                        f"Failed to get STT result: {response.status} {response.reason}"
+                    )
+                result = (await response.json())["text"]
 
-        if response.status_code == 200:
-            result = response.json()["text"]
-            yield {"transcription": result}
-        else:
-            raise Exception(
-                f"Failed to get STT result: {response.status_code} {response.reason}"
-            )
+        yield {"transcription": result}
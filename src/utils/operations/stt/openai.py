@@ -1,13 +1,14 @@
-import wave
 from openai import AsyncOpenAI
-from pathlib import Path
 
 from utils.config import Config
+from utils.helpers.pcm import to_wav
 
 from .base import STTOperation
 
 
 class OpenAISTT(STTOperation):
+    MAX_CONCURRENCY = 4
+
     def __init__(self):
         super().__init__("openai")
         self.client = None
@@ -58,14 +59,8 @@ class OpenAISTT(STTOperation):
         **kwargs
     ):
         """Generate a output stream"""
-        with wave.open(Config().stt_working_src, "w") as f:
-            f.setframerate(sr)
-            f.setsampwidth(sw)
-            f.setnchannels(ch)
-            f.writeframes(audio_bytes)
-
         transcription = await self.client.audio.transcriptions.create(
-            file=Path(Config().stt_working_src),
+            file=("audio.wav", to_wav(audio_bytes, sr, sw, ch)),
             model=self.model,
             response_format="text",
             language=self.language,
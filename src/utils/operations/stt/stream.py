@@ -0,0 +1,123 @@
+"""
+Streaming transcription of speech segments
+
+Audio arrives frame by frame while someone is still speaking. A VADSegmenter splits it
+into segments of speech, and each segment is transcribed as soon as it closes, so
+transcription overlaps with the rest of the speech instead of following all of it.
+
+Segments are transcribed one at a time in the order they closed, each prompted with the
+transcriptions before it. Iterating an STTStream yields a result per segment, and ends
+once the stream is closed and every segment is transcribed.
+
+A stream runs on its own task rather than as a job, as it lasts as long as someone is
+speaking and would hold up every job behind it. Only what it transcribed is committed
+by a job, once the stream ends.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+from utils.helpers.audio import AudioFormat
+from utils.helpers.vad import VADSegmenter
+
+from ..base import UsedInactiveError
+from .base import STTOperation
+
+
+class STTStream:
+    def __init__(
+        self, op: STTOperation, fmt: AudioFormat, prompt: str = "", **vad_config
+    ):
+        self.op = op
+        self.fmt = fmt
+        self.prompt = prompt
+        self.segmenter = VADSegmenter(fmt, **vad_config)
+
+        self.segments = asyncio.Queue()
+        self.results = asyncio.Queue()
+        self.closed = False
+        self.worker = asyncio.create_task(self._transcribe_loop())
+
+    def feed(self, ab: bytes) -> None:
+        """Take the next audio, transcribing any segment of speech that closed"""
+        assert not self.closed
+        for segment in self.segmenter.feed(ab):
+            self.segments.put_nowait(segment)
+
+    def close(self) -> None:
+        """End the audio, transcribing whatever speech is still open"""
+        if self.closed:
+            return
+        self.closed = True
+        for segment in self.segmenter.flush():
+            self.segments.put_nowait(segment)
+        self.segments.put_nowait(None)
+
+    def cancel(self) -> None:
+        self.closed = True
+        self.worker.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            result = await self.results.get()
+            if isinstance(result, BaseException):
+                raise result
+            if result is None:
+                return
+            yield result
+
+    async def collect(
+        self, on_result: Callable[[Dict[str, Any], str], Awaitable[None]] = None
+    ) -> str:
+        """Wait for every segment, giving on_result each result and the transcription so
+        far, and return the whole transcription. Cancelling this cancels the stream"""
+        content = list()
+        try:
+            async for result in self:
+                if result["transcription"]:
+                    content.append(result["transcription"])
+                if on_result is not None:
+                    await on_result(result, " ".join(content))
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        return " ".join(content)
+
+    async def _transcribe_loop(self):
+        transcriptions = list()
+        try:
+            while (segment := await self.segments.get()) is not None:
+                prompt = " ".join([self.prompt] + transcriptions).strip()
+                content = ""
+                async for chunk_out in self.op(
+                    {
+                        "prompt": prompt,
+                        "audio_bytes": segment["audio_bytes"],
+                        "sr": self.fmt.sr,
+                        "sw": self.fmt.sw,
+                        "ch": self.fmt.ch,
+                    }
+                ):
+                    content += chunk_out["transcription"]
+
+                content = content.strip()
+                if content:
+                    transcriptions.append(content)
+                await self.results.put(
+                    {
+                        "transcription": content,
+                        "start_ms": segment["start_ms"],
+                        "end_ms": segment["end_ms"],
+                    }
+                )
+            await self.results.put(None)
+        except Exception as err:
+            await self.results.put(err)
+
+
+def open_stt_stream(
+    op: STTOperation, fmt: AudioFormat, prompt: str = "", **vad_config
+) -> STTStream:
+    if not op.active:
+        raise UsedInactiveError(op.op_type, op.op_id)
+    return STTStream(op, fmt, prompt=prompt, **vad_config)
@@ -1,4 +1,4 @@
-import requests
+import aiohttp
 
 from utils.processes import ProcessManager, ProcessType
 
@@ -12,7 +12,10 @@ class KoboldT2T(T2TOperation):
 
     def __init__(self):
         super().__init__("kobold")
-        self.uri = None
+        self.process = None
+
+        self.pool: str = "kobold"
+        self.session = None
 
         self.max_context_length: int = 2048
         self.max_length: int = 100
@@ -29,18 +32,23 @@ class KoboldT2T(T2TOperation):
     async def start(self) -> None:
         """General setup needed to start generated"""
         await super().start()
-        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
-        self.uri = "http://127.0.0.1:{}".format(
-            ProcessManager().get_process(ProcessType.KOBOLD).port
-        )
+        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool)
+        self.process = ProcessManager().get_process(ProcessType.KOBOLD, self.pool)
+        self.session = aiohttp.ClientSession()
 
     async def close(self) -> None:
         """Clean up resources before unloading"""
         await super().close()
-        await ProcessManager().unlink(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
+        await self.session.close()
+        self.session = None
+        await ProcessManager().unlink(
+            self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool
+        )
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
+        if "pool" in config_d:
+            self.pool = str(config_d["pool"])
         if "max_context_length" in config_d:
             self.max_context_length = config_d["max_context_length"]
         if "max_length" in config_d:
@@ -105,30 +113,30 @@ class KoboldT2T(T2TOperation):
                 next_hist = {"role": "user", "content": msg.to_line()}
             history.append(next_hist)
 
-        response = requests.post(
-            "{}/v1/chat/completions".format(self.uri),
-            json={
-                "model": "kcpp",
-                "messages": history,
-                "max_context_length": self.max_context_length,
-                "max_length": self.max_length,
-                "quiet": True,
-                "rep_pen": self.rep_pen,
-                "rep_pen_range": self.rep_pen_range,
-                "rep_pen_slope": self.rep_pen_slope,
-                "temperature": self.temperature,
-                "tfs": self.tfs,
-                "top_a": self.top_a,
-                "top_k": self.top_k,
-                "top_p": self.top_p,
-                "typical": self.typical,
-            },
-        )
+        async with self.process.track() as server:
+            async with self.session.post(
+                "{}/v1/chat/completions".format(server.uri),
+                json={
+                    "model": "kcpp",
+                    "messages": history,
+                    "max_context_length": self.max_context_length,
+                    "max_length": self.max_length,
+                    "quiet": True,
+                    "rep_pen": self.rep_pen,
+                    "rep_pen_range": self.rep_pen_range,
+                    "rep_pen_slope": self.rep_pen_slope,
+                    "temperature": self.temperature,
+                    "tfs": self.tfs,
+                    "top_a": self.top_a,
+                    "top_k": self.top_k,
+                    "top_p": self.top_p,
+                    "typical": self.typical,
+                },
+            ) as response:
+                if response.status != 200:
+                    raise Exception(
+                        f"Failed to get T2T result: {response.status} {response.reason}"
+                    )
+                result = (await response.json())["choices"][0]["message"]["content"]
 
-        if response.status_code == 200:
-            result = response.json()["choices"][0]["message"]["content"]
-            yield {"content": result}
-        else:
-            raise Exception(
-                f"Failed to get T2T result: {response.status_code} {response.reason}"
-            )
+        yield {"content": result}
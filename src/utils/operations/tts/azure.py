@@ -1,19 +1,33 @@
 import os
-import wave
-from io import BytesIO
+import asyncio
 import azure.cognitiveservices.speech as speechsdk
 
 from utils.config import Config
+from utils.helpers.blocking import CallbackQueue, run_blocking
+from utils.helpers.pcm import stream_pcm
 
 from .base import TTSOperation
 
 
+class AzureSynthesisCanceled(Exception):
+    def __init__(self, details: str):
+        super().__init__("Azure speech synthesis canceled: {}".format(details))
+
+
 class AzureTTS(TTSOperation):
+    # Format of Raw48Khz16BitMonoPcm
+    SAMPLE_RATE = 48000
+    SAMPLE_WIDTH = 2
+    CHANNELS = 1
+
     def __init__(self):
         super().__init__("azure")
         self.client = None
+        # Synthesis events are per synthesizer, so only one request runs at a time
+        self.lock = asyncio.Lock()
 
         self.voice: str = "en-US-AshleyNeural"
+        self.timeout: float = 30  # longest wait for the next audio, in seconds
 
     async def start(self) -> None:
         """General setup needed to start generated"""
@@ -25,7 +39,7 @@ class AzureTTS(TTSOperation):
         )
         self.speech_config.speech_synthesis_voice_name = self.voice
         self.speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Riff48Khz16BitMonoPcm
+            speechsdk.SpeechSynthesisOutputFormat.Raw48Khz16BitMonoPcm
         )
         # set timeout value to bigger ones to avoid sdk cancel the request when GPT latency too high
         self.speech_config.set_property(
@@ -43,24 +57,51 @@ class AzureTTS(TTSOperation):
         """Configure and validate operation-specific configuration"""
         if "voice" in config_d:
             self.voice = str(config_d["voice"])
+        if "timeout" in config_d:
+            self.timeout = float(config_d["timeout"])
 
         assert self.voice is not None and len(self.voice) > 0
+        assert self.timeout > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {"voice": self.voice}
+        return {"voice": self.voice, "timeout": self.timeout}
 
-    async def _generate(self, content: str = None, **kwargs):
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
         """Generate a output stream"""
-        # create request with TextStream input type
-        result = self.speech_synthesizer.speak_text_async(content).get()
+        audio = CallbackQueue("Azure speech synthesis", timeout=self.timeout)
+
+        # Called from the SDK's threads as audio is synthesized
+        def on_synthesizing(evt):
+            audio.put(evt.result.audio_data)
 
-        output_b = BytesIO(result.audio_data)
+        def on_completed(evt):
+            audio.finish()
 
-        with wave.open(output_b, "r") as f:
-            sr = f.getframerate()
-            sw = f.getsampwidth()
-            ch = f.getnchannels()
-            ab = f.readframes(f.getnframes())
+        def on_canceled(evt):
+            details = evt.result.cancellation_details
+            audio.put(AzureSynthesisCanceled(details.error_details))
 
-        yield {"audio_bytes": ab, "sr": sr, "sw": sw, "ch": ch}
+        async with self.lock:
+            synthesizer = self.speech_synthesizer
+            synthesizer.synthesizing.connect(on_synthesizing)
+            synthesizer.synthesis_completed.connect(on_completed)
+            synthesizer.synthesis_canceled.connect(on_canceled)
+            finished = False
+            try:
+                synthesizer.speak_text_async(content)
+                async for chunk_out in stream_pcm(
+                    audio,
+                    self.SAMPLE_RATE,
+                    self.SAMPLE_WIDTH,
+                    self.CHANNELS,
+                    frame_ms,
+                ):
+                    yield chunk_out
+                finished = True
+            finally:
+                if not finished:
+                    await run_blocking(synthesizer.stop_speaking, timeout=self.timeout)
+                synthesizer.synthesizing.disconnect_all()
+                synthesizer.synthesis_completed.disconnect_all()
+                synthesizer.synthesis_canceled.disconnect_all()
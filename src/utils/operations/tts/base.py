@@ -2,6 +2,12 @@
 TTS Operations (at minimum) require the following fields for input chunks:
 - content: (str) Text to generate speech for
 
+Optional fields for input chunks:
+- frame_ms: (float) preferred duration of each output chunk in milliseconds
+
+Output is streamed as chunks of whole samples while speech is still being generated,
+each roughly frame_ms long (the last one may be shorter).
+
 Adds to chunk:
 - audio_bytes: (bytes) pcm audio data
 - sr: (int) sample rate
@@ -9,12 +15,16 @@ Adds to chunk:
 - ch: (int) audio channels
 """
 
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, Optional
+
+from utils.helpers.audio import AudioFormat
 
 from ..base import Operation
 
 
 class TTSOperation(Operation):
+    DEFAULT_FRAME_MS = 200
+
     def __init__(self, op_id: str):
         super().__init__("TTS", op_id)
 
@@ -32,8 +42,10 @@ class TTSOperation(Operation):
         assert "content" in chunk_in
         assert isinstance(chunk_in["content"], str)
         assert len(chunk_in["content"]) > 0
+        frame_ms = chunk_in.get("frame_ms", self.DEFAULT_FRAME_MS)
+        assert frame_ms > 0
 
-        return {"content": chunk_in["content"]}
+        return {"content": chunk_in["content"], "frame_ms": frame_ms}
 
     ## TO BE IMPLEMENTED ####
     async def configure(self, config_d: Dict[str, Any]):
@@ -45,9 +57,17 @@ class TTSOperation(Operation):
         raise NotImplementedError
 
     async def _generate(
-        self, content: str = None, **kwargs
+        self, content: str = None, frame_ms: float = DEFAULT_FRAME_MS, **kwargs
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """Generate a output stream"""
         raise NotImplementedError
 
         yield {"audio_bytes": b"", "sr": 123, "sw": 123, "ch": 123}
+
+    ## OPTIONALLY IMPLEMENTED ####
+    def output_format(self) -> Optional[AudioFormat]:
+        """Format of the audio produced, or None if only known once synthesized. By
+        default read from SAMPLE_RATE, SAMPLE_WIDTH and CHANNELS when defined"""
+        if getattr(self, "SAMPLE_RATE", None) is None:
+            return None
+        return AudioFormat(self.SAMPLE_RATE, self.SAMPLE_WIDTH, self.CHANNELS)
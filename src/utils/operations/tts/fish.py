@@ -2,11 +2,16 @@ from fish_audio_sdk import AsyncWebSocketSession, TTSRequest
 import os
 
 from utils.config import Config
+from utils.helpers.pcm import stream_pcm
 
 from .base import TTSOperation
 
 
 class FishTTS(TTSOperation):
+    SAMPLE_RATE = 44100
+    SAMPLE_WIDTH = 2
+    CHANNELS = 1
+
     def __init__(self):
         super().__init__("fish")
         self.session = None
@@ -51,7 +56,7 @@ class FishTTS(TTSOperation):
             "latency": self.latency,
         }
 
-    async def _generate(self, content: str = None, **kwargs):
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
         """Generate a output stream"""
         tts_request = TTSRequest(
             text=content,
@@ -60,13 +65,14 @@ class FishTTS(TTSOperation):
             latency=self.latency,
             reference_id=self.model_id,
         )
-        b = b""
-        async for chunk in self.session.tts(
-            tts_request, self._stream(), backend=self.backend
+        async for chunk_out in stream_pcm(
+            self.session.tts(tts_request, self._stream(), backend=self.backend),
+            self.SAMPLE_RATE,
+            self.SAMPLE_WIDTH,
+            self.CHANNELS,
+            frame_ms,
         ):
-            b += chunk
-
-        yield {"audio_bytes": b, "sr": 44100, "sw": 2, "ch": 1}
+            yield chunk_out
 
     async def _stream(self):
         yield ""
@@ -1,8 +1,7 @@
-import requests
-from io import BytesIO
-import wave
+import aiohttp
 
 from utils.config import Config
+from utils.helpers.pcm import stream_wav
 from utils.processes import ProcessManager, ProcessType
 
 from .base import TTSOperation
@@ -13,25 +12,33 @@ class KoboldTTS(TTSOperation):
 
     def __init__(self):
         super().__init__("kobold")
-        self.uri = None
+        self.process = None
+
+        self.pool: str = "kobold"
+        self.session = None
 
         self.voice = "kobo"
 
     async def start(self) -> None:
         """General setup needed to start generated"""
         await super().start()
-        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
-        self.uri = "http://127.0.0.1:{}".format(
-            ProcessManager().get_process(ProcessType.KOBOLD).port
-        )
+        await ProcessManager().link(self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool)
+        self.process = ProcessManager().get_process(ProcessType.KOBOLD, self.pool)
+        self.session = aiohttp.ClientSession()
 
     async def close(self) -> None:
         """Clean up resources before unloading"""
         await super().close()
-        await ProcessManager().unlink(self.KOBOLD_LINK_ID, ProcessType.KOBOLD)
+        await self.session.close()
+        self.session = None
+        await ProcessManager().unlink(
+            self.KOBOLD_LINK_ID, ProcessType.KOBOLD, self.pool
+        )
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
+        if "pool" in config_d:
+            self.pool = str(config_d["pool"])
         if "voice" in config_d:
             self.voice = str(config_d["voice"])
 
@@ -41,23 +48,19 @@ class KoboldTTS(TTSOperation):
         """Returns values of configurable fields"""
         return {"voice": self.voice}
 
-    async def _generate(self, content: str = None, **kwargs):
-        response = requests.post(
-            "{}/api/extra/tts".format(self.uri),
-            json={"input": content, "voice": self.voice, "speaker_json": ""},
-        )
-
-        if response.status_code == 200:
-            result = response.content
-            audio = BytesIO(result)
-            with wave.open(audio, "r") as f:
-                yield {
-                    "audio_bytes": f.readframes(f.getnframes()),
-                    "sr": f.getframerate(),
-                    "sw": f.getsampwidth(),
-                    "ch": f.getnchannels(),
-                }
-        else:
-            raise Exception(
-                f"Failed to get T2T result: {response.status_code} {response.reason}"
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
+        """Generate a output stream"""
+        # Timed until the response starts, as it streams for as long as the speech
+        async with self.process.track() as server:
+            response = await self.session.post(
+                "{}/api/extra/tts".format(server.uri),
+                json={"input": content, "voice": self.voice, "speaker_json": ""},
             )
+        async with response:
+            if response.status != 200:
+                raise Exception(
+                    f"Failed to get TTS result: {response.status} {response.reason}"
+                )
+
+            async for chunk_out in stream_wav(response.content.iter_any(), frame_ms):
+                yield chunk_out
@@ -1,31 +1,51 @@
-import wave
-from io import BytesIO
+from functools import partial
 from melo.api import TTS
 import logging
-import numpy as np
-import torch
-import soundfile
 
 from utils.config import Config
+from utils.lifecycle import LifecycleManager, ManagedResource
+from utils.lifecycle.resource import process_memory
+from utils.helpers.audio import from_float
+from utils.helpers.model_worker import MODES, ModelWorker
+from utils.helpers.pcm import stream_pcm
 
 from .base import TTSOperation
 
 
-class MeloTTS(TTSOperation):
+def load_model(language: str, device: str, config_path: str, ckpt_path: str):
+    return TTS(
+        language=language,
+        device=device,
+        config_path=config_path,
+        ckpt_path=ckpt_path,
+    )
+
+
+def synthesize(model, content: str, speaker_id: str, **kwargs):
+    """Runs on the model worker, yielding 16-bit PCM"""
+    ab_np = model.tts_to_file(
+        content, model.hps.data.spk2id[speaker_id], quiet=True, **kwargs
+    )
+    yield from_float(ab_np, MeloTTS.SAMPLE_WIDTH)
+
+
+class MeloTTS(TTSOperation, ManagedResource):
     SAMPLE_RATE = 44100
     SAMPLE_WIDTH = 2
     CHANNELS = 1
 
     def __init__(self):
         super().__init__("melo")
-        self.model = None
-        self.speaker_ids = dict()
+        ManagedResource.__init__(self, "tts/melo")
+        self.worker = None
 
         self.config_filepath = None
         self.model_filepath = None
         self.speaker_id = None
         self.device = "cpu"
         self.language = "EN"
+        self.executor = "thread"
+        self.max_queue = 8
 
         self.sdp_ratio = 0.2
         self.noise_scale = 0.6
@@ -35,20 +55,43 @@ class MeloTTS(TTSOperation):
     async def start(self) -> None:
         """General setup needed to start generated"""
         await super().start()
-        self.model = TTS(
-            language=self.language,
-            device=self.device,
-            config_path=self.config_filepath,
-            ckpt_path=self.model_filepath,
-        )
-        self.speaker_ids = self.model.hps.data.spk2id
+        await self.ensure_loaded()
+        LifecycleManager().register(self)
 
     async def close(self) -> None:
         """Clean up resources before unloading"""
         await super().close()
-        del self.model
-        self.model = None
-        self.speaker_ids = dict()
+        LifecycleManager().unregister(self)
+        if self.is_loaded():
+            await self._unload()
+
+    def is_loaded(self) -> bool:
+        return self.worker is not None
+
+    async def _load(self) -> None:
+        self.worker = ModelWorker(
+            partial(
+                load_model,
+                self.language,
+                self.device,
+                self.config_filepath,
+                self.model_filepath,
+            ),
+            synthesize,
+            mode=self.executor,
+            max_queue=self.max_queue,
+            name="melo",
+        )
+        await self.worker.start()
+
+    async def _unload(self) -> None:
+        await self.worker.stop()
+        self.worker = None
+
+    def footprint(self) -> int:
+        if self.worker is not None and self.worker.pid is not None:
+            return process_memory(self.worker.pid)
+        return super().footprint()
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
@@ -62,6 +105,10 @@ class MeloTTS(TTSOperation):
             self.device = str(config_d["device"])
         if "language" in config_d:
             self.language = str(config_d["language"])
+        if "executor" in config_d:
+            self.executor = str(config_d["executor"])
+        if "max_queue" in config_d:
+            self.max_queue = int(config_d["max_queue"])
 
         if "sdp_ratio" in config_d:
             self.sdp_ratio = float(config_d["sdp_ratio"])
@@ -75,6 +122,8 @@ class MeloTTS(TTSOperation):
         assert self.speaker_id is not None and len(self.speaker_id) > 0
         assert self.device is not None and len(self.device) > 0
         assert self.language is not None and len(self.language) > 0
+        assert self.executor in MODES
+        assert self.max_queue > 0
         assert self.sdp_ratio < 1.25
         assert self.noise_scale < 1.25 and self.noise_scale >= 0
         assert self.noise_scale_w < 1.25 and self.noise_scale_w >= 0
@@ -88,30 +137,25 @@ class MeloTTS(TTSOperation):
             "speaker_id": self.speaker_id,
             "device": self.device,
             "language": self.language,
+            "executor": self.executor,
+            "max_queue": self.max_queue,
         }
 
-    async def _generate(self, content: str = None, **kwargs):
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
         """Generate a output stream"""
-        ab_np = self.model.tts_to_file(
-            content,
-            self.speaker_ids[self.speaker_id],
-            # output_path="output/temp/melo_out.wav",
-            sdp_ratio=self.sdp_ratio,
-            noise_scale=self.noise_scale,
-            noise_scale_w=self.noise_scale_w,
-            speed=self.speed,
-            quiet=True,
-        )
-        ab = torch.from_numpy(ab_np).float()
-        audio_buffer = BytesIO()
-        soundfile.write(
-            audio_buffer, ab, self.SAMPLE_RATE, format="WAV", subtype="PCM_16"
-        )
-        audio_buffer.seek(0)
-        with wave.open(audio_buffer, "r") as f:
-            yield {
-                "audio_bytes": f.readframes(f.getnframes()),
-                "sr": self.SAMPLE_RATE,
-                "sw": self.SAMPLE_WIDTH,
-                "ch": self.CHANNELS,
-            }
+        async with self.use():
+            async for chunk_out in stream_pcm(
+                self.worker.stream(
+                    content,
+                    self.speaker_id,
+                    sdp_ratio=self.sdp_ratio,
+                    noise_scale=self.noise_scale,
+                    noise_scale_w=self.noise_scale_w,
+                    speed=self.speed,
+                ),
+                self.SAMPLE_RATE,
+                self.SAMPLE_WIDTH,
+                self.CHANNELS,
+                frame_ms,
+            ):
+                yield chunk_out
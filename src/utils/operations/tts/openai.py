@@ -1,13 +1,17 @@
-import wave
-from io import BytesIO
 from openai import AsyncOpenAI
 
 from utils.config import Config
+from utils.helpers.pcm import stream_pcm, stream_wav
 
 from .base import TTSOperation
 
 
 class OpenAITTS(TTSOperation):
+    RESPONSE_FORMATS = ["wav", "pcm"]
+    # Format of response_format pcm, which has no header to read it from
+    SAMPLE_WIDTH = 2
+    CHANNELS = 1
+
     def __init__(self):
         super().__init__("openai")
         self.client = None
@@ -15,6 +19,8 @@ class OpenAITTS(TTSOperation):
         self.base_url = "https://api.openai.com/v1/"
         self.voice = "nova"
         self.model = "tts-1"
+        self.response_format = "wav"
+        self.sample_rate = 24000
 
     async def start(self) -> None:
         """General setup needed to start generated"""
@@ -35,29 +41,45 @@ class OpenAITTS(TTSOperation):
             self.voice = str(config_d["voice"])
         if "model" in config_d:
             self.model = str(config_d["model"])
+        if "response_format" in config_d:
+            self.response_format = str(config_d["response_format"])
+        if "sample_rate" in config_d:
+            self.sample_rate = int(config_d["sample_rate"])
 
         assert self.base_url is not None and len(self.base_url) > 0
         assert self.voice is not None and len(self.voice) > 0
         assert self.model is not None and len(self.model) > 0
+        assert self.response_format in self.RESPONSE_FORMATS
+        assert self.sample_rate > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
-        return {"base_url": self.base_url, "voice": self.voice, "model": self.model}
+        return {
+            "base_url": self.base_url,
+            "voice": self.voice,
+            "model": self.model,
+            "response_format": self.response_format,
+            "sample_rate": self.sample_rate,
+        }
 
-    async def _generate(self, content: str = None, **kwargs):
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
         """Generate a output stream"""
         async with self.client.audio.speech.with_streaming_response.create(
             model=self.model,
             voice=self.voice,
             input=content,
-            response_format="wav",
+            response_format=self.response_format,
         ) as response:
-            output_b = BytesIO(await response.read())
-
-            with wave.open(output_b, "r") as f:
-                sr = f.getframerate()
-                sw = f.getsampwidth()
-                ch = f.getnchannels()
-                ab = f.readframes(f.getnframes())
-
-            yield {"audio_bytes": ab, "sr": sr, "sw": sw, "ch": ch}
+            if self.response_format == "pcm":
+                stream = stream_pcm(
+                    response.iter_bytes(),
+                    self.sample_rate,
+                    self.SAMPLE_WIDTH,
+                    self.CHANNELS,
+                    frame_ms,
+                )
+            else:
+                # Format is read from the header, so it works with any server
+                stream = stream_wav(response.iter_bytes(), frame_ms)
+            async for chunk_out in stream:
+                yield chunk_out
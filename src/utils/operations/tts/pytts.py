@@ -7,44 +7,66 @@ OS can be found using get_available_voices
 
 import logging
 import pyttsx3
-import wave
-import os
+from functools import partial
 
-from utils.helpers.path import portable_path
-from utils.config import Config
+from utils.helpers.model_worker import MODES, ModelWorker
+from utils.helpers.pcm import PCMFramer, from_wav, scratch_file
 
 from .base import TTSOperation
 
 
+def load_engine(voice: str, gender: str):
+    engine = pyttsx3.init()
+    voices = engine.getProperty("voices")
+    logging.info(
+        "Operation pytts: Available voices are: {}".format(
+            list(map(lambda x: x.id, voices))
+        )
+    )
+
+    engine.setProperty("voice", voice)
+    engine.setProperty("gender", gender)
+    return engine
+
+
+def synthesize(engine, content: str):
+    """Runs on the model worker, yielding the audio and its format"""
+    # Engines only write to a path, so give each call an in-memory file of its own
+    with scratch_file() as path:
+        engine.save_to_file(content, path)
+        engine.runAndWait()
+        with open(path, "rb") as f:
+            data = f.read()
+
+    yield from_wav(data)
+
+
 class PyttsTTS(TTSOperation):
     def __init__(self):
         super().__init__("pytts")
-        self.engine = None
+        self.worker = None
 
         self.voice: str = None
         self.gender: str = "female"
-        self.working_file: str = portable_path(
-            os.path.join(Config().WORKING_DIR, "ttsg-synth-out.wav")
-        )
+        # Some platforms' engines only run on the main thread of their process
+        self.executor: str = "process"
+        self.max_queue: int = 8
 
     async def start(self):
         await super().start()
-
-        self.engine = pyttsx3.init()
-        voices = self.engine.getProperty("voices")
-        logging.info(
-            "Operation {}: Available voices are: {}".format(
-                self.op_id, list(map(lambda x: x.id, voices))
-            )
+        self.worker = ModelWorker(
+            partial(load_engine, self.voice, self.gender),
+            synthesize,
+            mode=self.executor,
+            max_queue=self.max_queue,
+            name="pytts",
         )
-
-        self.engine.setProperty("voice", self.voice)
-        self.engine.setProperty("gender", self.gender)
+        await self.worker.start()
 
     async def close(self):
         await super().close()
-        self.engine.stop()
-        self.engine = None
+        await self.worker.stop()
+        self.worker = None
 
     async def configure(self, config_d):
         """Configure and validate operation-specific configuration"""
@@ -52,29 +74,28 @@ class PyttsTTS(TTSOperation):
             self.voice = str(config_d["voice"])
         if "gender" in config_d:
             self.gender = str(config_d["gender"])
-        if "working_file" in config_d:
-            self.working_file = str(config_d["working_file"])
+        if "executor" in config_d:
+            self.executor = str(config_d["executor"])
+        if "max_queue" in config_d:
+            self.max_queue = int(config_d["max_queue"])
 
         assert self.voice is not None and len(self.voice) > 0
-        assert self.working_file is not None and len(self.working_file) > 0
+        assert self.executor in MODES
+        assert self.max_queue > 0
 
     async def get_configuration(self):
         """Returns values of configurable fields"""
         return {
             "voice": self.voice,
             "gender": self.gender,
-            "working_file": self.working_file,
+            "executor": self.executor,
+            "max_queue": self.max_queue,
         }
 
-    async def _generate(self, content: str = None, **kwargs):
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
         """Generate a output stream"""
-        self.engine.save_to_file(content, self.working_file)
-        self.engine.runAndWait()
-
-        with wave.open(self.working_file, "r") as f:
-            yield {
-                "audio_bytes": f.readframes(f.getnframes()),
-                "sr": f.getframerate(),
-                "sw": f.getsampwidth(),
-                "ch": f.getnchannels(),
-            }
+        async for ab, sr, sw, ch in self.worker.stream(content):
+            framer = PCMFramer(sr, sw, ch, frame_ms)
+            for frame in framer.push(ab) + [framer.flush()]:
+                if frame:
+                    yield framer.chunk(frame)
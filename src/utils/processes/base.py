@@ -1,21 +1,27 @@
-import subprocess
-import psutil
 import logging
 
 from .error import DuplicateLink, MissingLink
+from .supervisor import ProcessSupervisor
 
 
 class BaseProcess:  # Be sure to make it a singleton (metaclass=Singleton)
     id: str = None
-    process: subprocess.Popen = None
-    port: int = None
-    links: set = set()
+    supervisor: ProcessSupervisor = None
 
     reload_signal: bool = False
     unload_signal: bool = False
 
     def __init__(self, id):
         self.id = id
+        self.links: set = set()
+
+    @property
+    def port(self) -> int:
+        return self.supervisor.port if self.supervisor else None
+
+    @property
+    def uri(self) -> str:
+        return self.supervisor.uri if self.supervisor else None
 
     async def reload(self):
         # This needs to be implemented
@@ -30,25 +36,43 @@ class BaseProcess:  # Be sure to make it a singleton (metaclass=Singleton)
             )
             logging.warning(f"Links: {self.links}")
 
-        if self.process:
-            ps_process = psutil.Process(self.process.pid)
-            for child in ps_process.children(recursive=True):
-                child.kill()
-            ps_process.kill()
-            self.process = None
-            self.port = None
+        if self.supervisor:
+            await self.stop()
             logging.info(f"Unloaded process {self.id}")
         else:
             logging.warning(
                 f"Attempted to unload process {self.id} when it is already unloaded"
             )
 
+    async def stop(self):
+        """Stop the running process, keeping links so it can be started again"""
+        if self.supervisor:
+            await self.supervisor.stop()
+            self.supervisor = None
+
+    def is_running(self) -> bool:
+        """Started, whether or not it is ready yet"""
+        return self.supervisor is not None
+
+    def is_ready(self) -> bool:
+        return self.supervisor is not None and self.supervisor.ready.is_set()
+
+    def track(self):
+        """Context for a request to the process, waiting for it to be ready and
+        timing the request"""
+        return self.supervisor.track()
+
+    def get_stats(self):
+        if self.supervisor is None:
+            return {"status": "stopped", "links": sorted(self.links)}
+        return {**self.supervisor.stats(), "links": sorted(self.links)}
+
     async def link(self, link_id):
         logging.debug("Adding link {} to process {}".format(link_id, self.id))
         if link_id in self.links:
             raise DuplicateLink(link_id, self.id)
 
-        if self.process is None:
+        if self.supervisor is None:
             await self.reload()
 
         self.links.add(
@@ -61,6 +85,6 @@ class BaseProcess:  # Be sure to make it a singleton (metaclass=Singleton)
             raise MissingLink(link_id, self.id)
         self.links.remove(link_id)
 
-        if len(self.links):
+        if not len(self.links):
             logging.info(f"No more links to process {self.id}. Unloading...")
             await self.unload()
@@ -20,3 +20,11 @@ class MissingLink(Exception):
         super().__init__(
             "Link ID {} is not linked to process {}".format(link_id, process)
         )
+
+
+class ProcessStartError(Exception):
+    def __init__(self, process, reason, logs=None):
+        message = "Process {} failed to start: {}".format(process, reason)
+        if logs:
+            message += "\nLast output:\n" + "\n".join(logs)
+        super().__init__(message)
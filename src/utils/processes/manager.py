@@ -3,14 +3,30 @@ Global processes manager
 
 Enables expensive processes used in one place to be reused elsewhere
 For example: Kobold server shared between STT and T2T operation implementation
+
+Processes run in named pools of one or more replicas. A pool named after its process
+type (such as "kobold") is always available using the top-level configuration of that
+process. More pools, for example a small STT model and a large T2T model each on their
+own servers, are configured under "processes":
+
+```yaml
+processes:
+  kobold_t2t:
+    type: kobold
+    replicas: 2
+    kcpps_filepath: path/to/t2t.kcpps
+```
 """
 
 import logging
 from enum import Enum
 
+from utils.config import Config
 from utils.helpers.singleton import Singleton
+from utils.lifecycle import LifecycleManager
 
 from .error import UnknownProcessError, UnloadedProcessError
+from .pool import ProcessPool
 
 
 class ProcessType(Enum):
@@ -18,92 +34,91 @@ class ProcessType(Enum):
 
 
 class ProcessManager(metaclass=Singleton):
-    loaded_processes = dict()
-
-    """Perform initial load"""
-
-    async def load(self, process_type: ProcessType):
-        logging.info("Loading process by type {}".format(process_type.value))
+    loaded_processes = dict()  # pool name: ProcessPool
+
+    def _get_pool_config(self, process_type: ProcessType, pool: str):
+        config_d = dict(Config().processes.get(pool, None) or dict())
+        if not config_d and pool != process_type.value:
+            raise UnknownProcessError(pool)
+        if config_d.get("type", process_type.value) != process_type.value:
+            raise UnknownProcessError("{} of type {}".format(pool, process_type.value))
+        replicas = int(config_d.get("replicas", 1))
+        assert replicas > 0
+        return replicas, config_d
+
+    def _create(self, process_type: ProcessType, process_id: str, config_d: dict):
         match process_type:
             case ProcessType.KOBOLD:
                 from .processes.koboldcpp import KoboldCPPProcess
 
-                self.loaded_processes[ProcessType.KOBOLD] = KoboldCPPProcess()
-                await self.loaded_processes[ProcessType.KOBOLD].reload()
+                return KoboldCPPProcess(process_id, config_d)
             case _:
                 raise UnknownProcessError(process_type)
 
+    """Perform initial load"""
+
+    async def load(self, process_type: ProcessType, pool: str = None):
+        pool = pool or process_type.value
+        logging.info(
+            "Loading process by type {} in pool {}".format(process_type.value, pool)
+        )
+        replicas, config_d = self._get_pool_config(process_type, pool)
+        self.loaded_processes[pool] = ProcessPool(
+            pool,
+            process_type,
+            [
+                self._create(
+                    process_type,
+                    pool if replicas == 1 else "{}-{}".format(pool, i),
+                    config_d,
+                )
+                for i in range(replicas)
+            ],
+        )
+        LifecycleManager().register(self.loaded_processes[pool])
+        await self.loaded_processes[pool].reload()
+
     """Reload any process where reload_signal is True"""
 
     async def reload(self):
-        for process_type in self.loaded_processes:
-            if (
-                self.loaded_processes[process_type]
-                and self.loaded_processes[process_type].reload_signal
-            ):
-                logging.info(
-                    "Reloading process {}".format(
-                        self.loaded_processes[process_type].id
-                    )
-                )
-                await self.loaded_processes[process_type].reload()
+        for pool in self.loaded_processes:
+            if self.loaded_processes[pool]:
+                await self.loaded_processes[pool].reload_signaled()
 
     """Unload any process where unload_signal is True"""
 
     async def unload(self):
-        for process_type in self.loaded_processes:
-            if (
-                self.loaded_processes[process_type]
-                and self.loaded_processes[process_type].unload_signal
-            ):
-                logging.info(
-                    "Unloading process {}".format(
-                        self.loaded_processes[process_type].id
-                    )
-                )
-                await self.loaded_processes[process_type].unload()
-
-    async def link(self, link_id: str, process_type: ProcessType):
-        if not (
-            process_type in self.loaded_processes
-            and self.loaded_processes[process_type]
-        ):
-            await self.load(process_type)
-
-        await self.loaded_processes[process_type].link(link_id)
-
-    async def unlink(self, link_id: str, process_type: ProcessType):
-        if not (
-            process_type in self.loaded_processes
-            and self.loaded_processes[process_type]
-        ):
-            raise UnloadedProcessError(process_type.value)
-
-        await self.loaded_processes[process_type].unlink(link_id)
-
-    def signal_reload(self, process_type: ProcessType):
-        if not (
-            process_type in self.loaded_processes
-            and self.loaded_processes[process_type]
-        ):
-            raise UnloadedProcessError(process_type.value)
-
-        self.loaded_processes[process_type].reload_signal = True
-
-    def signal_unload(self, process_type: ProcessType):
-        if not (
-            process_type in self.loaded_processes
-            and self.loaded_processes[process_type]
-        ):
-            raise UnloadedProcessError(process_type.value)
-
-        self.loaded_processes[process_type].unload_signal = True
-
-    def get_process(self, process_type: ProcessType):
-        if not (
-            process_type in self.loaded_processes
-            and self.loaded_processes[process_type]
-        ):
-            raise UnloadedProcessError(process_type.value)
-
-        return self.loaded_processes[process_type]
+        for pool in self.loaded_processes:
+            if self.loaded_processes[pool]:
+                await self.loaded_processes[pool].unload_signaled()
+
+    async def link(self, link_id: str, process_type: ProcessType, pool: str = None):
+        pool = pool or process_type.value
+        if not (pool in self.loaded_processes and self.loaded_processes[pool]):
+            await self.load(process_type, pool)
+
+        await self.loaded_processes[pool].link(link_id)
+
+    async def unlink(self, link_id: str, process_type: ProcessType, pool: str = None):
+        await self.get_process(process_type, pool).unlink(link_id)
+
+    def signal_reload(self, process_type: ProcessType, pool: str = None):
+        self.get_process(process_type, pool).signal_reload()
+
+    def signal_unload(self, process_type: ProcessType, pool: str = None):
+        self.get_process(process_type, pool).signal_unload()
+
+    def get_stats(self):
+        """Status, resource use and request latency of each replica of each pool"""
+        return {
+            pool: process.get_stats()
+            for pool, process in self.loaded_processes.items()
+            if process
+        }
+
+    def get_process(self, process_type: ProcessType, pool: str = None) -> ProcessPool:
+        pool = pool or process_type.value
+        if not (pool in self.loaded_processes and self.loaded_processes[pool]):
+            raise UnloadedProcessError(pool)
+
+        return self.loaded_processes[pool]
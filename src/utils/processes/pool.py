@@ -0,0 +1,129 @@
+"""
+Replicas of a process serving the same model
+
+A pool is a named group of instances of one process type started with the same
+configuration, such as two KoboldCPP servers running a T2T model. Operations link to a
+pool by name, and each request goes to the replica with the fewest requests in flight,
+taking turns between replicas that are equally busy. Replicas that are not ready
+(starting, restarting after a crash or unhealthy) are skipped while any other is ready,
+and replicas that are stopped (such as after failing to start) are always skipped.
+
+A pool is a ManagedResource, so its servers can be stopped while idle and are started
+again on the next request.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from utils.lifecycle.resource import ManagedResource
+
+from .base import BaseProcess
+from .error import UnloadedProcessError
+
+
+class ProcessPool(ManagedResource):
+    def __init__(self, name: str, process_type, replicas: List[BaseProcess]):
+        super().__init__("process/{}".format(name))
+        self.name = name
+        self.process_type = process_type
+        self.replicas = replicas
+        self.in_flight: Dict[str, int] = {replica.id: 0 for replica in replicas}
+        self.turn: int = 0
+
+    @property
+    def links(self) -> set:
+        links = set()
+        for replica in self.replicas:
+            links |= replica.links
+        return links
+
+    async def reload(self):
+        """Start every replica at once"""
+        await asyncio.gather(*[replica.reload() for replica in self.replicas])
+
+    async def reload_signaled(self):
+        await asyncio.gather(
+            *[replica.reload() for replica in self.replicas if replica.reload_signal]
+        )
+
+    async def unload(self):
+        await asyncio.gather(*[replica.unload() for replica in self.replicas])
+
+    async def unload_signaled(self):
+        await asyncio.gather(
+            *[replica.unload() for replica in self.replicas if replica.unload_signal]
+        )
+
+    async def link(self, link_id: str):
+        await asyncio.gather(*[replica.link(link_id) for replica in self.replicas])
+
+    async def unlink(self, link_id: str):
+        await asyncio.gather(*[replica.unlink(link_id) for replica in self.replicas])
+
+    def signal_reload(self):
+        for replica in self.replicas:
+            replica.reload_signal = True
+
+    def signal_unload(self):
+        for replica in self.replicas:
+            replica.unload_signal = True
+
+    def is_loaded(self) -> bool:
+        return any(replica.supervisor is not None for replica in self.replicas)
+
+    async def _load(self):
+        await asyncio.gather(
+            *[
+                replica.reload()
+                for replica in self.replicas
+                if replica.supervisor is None
+            ]
+        )
+
+    async def _unload(self):
+        await asyncio.gather(*[replica.stop() for replica in self.replicas])
+
+    def footprint(self) -> int:
+        return sum(
+            replica.supervisor.stats()["memory"]
+            for replica in self.replicas
+            if replica.supervisor is not None
+        )
+
+    def select(self) -> BaseProcess:
+        """Least loaded replica, preferring ready ones over those still starting"""
+        running = [replica for replica in self.replicas if replica.is_running()]
+        if not running:
+            raise UnloadedProcessError(self.name)
+        candidates = [replica for replica in running if replica.is_ready()] or running
+        self.turn = (self.turn + 1) % len(candidates)
+        rotated = candidates[self.turn :] + candidates[: self.turn]
+        return min(rotated, key=lambda replica: self.in_flight[replica.id])
+
+    @asynccontextmanager
+    async def track(self):
+        """Context for a request to a replica, giving its supervisor (with the uri to
+        send the request to)"""
+        async with self.use():
+            replica = self.select()
+            self.in_flight[replica.id] += 1
+            try:
+                async with replica.track() as supervisor:
+                    yield supervisor
+            finally:
+                self.in_flight[replica.id] -= 1
+
+    def get_stats(self):
+        return {
+            "type": self.process_type.value,
+            "links": sorted(self.links),
+            "replicas": [
+                {
+                    "id": replica.id,
+                    "inFlight": self.in_flight[replica.id],
+                    **replica.get_stats(),
+                }
+                for replica in self.replicas
+            ],
+        }
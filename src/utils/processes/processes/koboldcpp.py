@@ -1,37 +1,52 @@
 import logging
-import subprocess
-from subprocess import DEVNULL
-import socket
+from typing import Dict
 from utils.config import Config
-from utils.helpers.singleton import Singleton
 from ..base import BaseProcess
+from ..supervisor import ProcessSupervisor
 
 
-class KoboldCPPProcess(BaseProcess, metaclass=Singleton):
-    def __init__(self):
-        super().__init__("koboldcpp")
+class KoboldCPPProcess(BaseProcess):
+    def __init__(self, id: str = "koboldcpp", config_d: Dict = None):
+        super().__init__(id)
         self.reload_signal = True
 
+        # Pools may run their own Kobold config, such as a model of their own
+        config = Config()
+        config_d = config_d or dict()
+        self.kobold_filepath: str = config_d.get(
+            "kobold_filepath", config.kobold_filepath
+        )
+        self.kcpps_filepath: str = config_d.get("kcpps_filepath", config.kcpps_filepath)
+        self.ready_timeout: float = float(
+            config_d.get("ready_timeout", config.kobold_ready_timeout)
+        )
+        self.args: list = list(config_d.get("args", []))
+
     async def reload(self):
         # Close any existing servers
-        if self.process is not None:
+        if self.supervisor is not None:
             await self.unload()
 
         await super().reload()
 
-        # Find open port
-        config = Config()
-        sock = socket.socket()
-        sock.bind(("", 0))
-        self.port = sock.getsockname()[1]
-        sock.close()
-
-        # Start Kobold server on that port
-        cmd = '{} --quiet --config "{}" --port {}'.format(
-            config.kobold_filepath, config.kcpps_filepath, self.port
+        # Start Kobold server, returning once its model is loaded. Only kept once
+        # started, so a server that failed to start is started again on the next link
+        supervisor = ProcessSupervisor(
+            self.id,
+            lambda port: [
+                self.kobold_filepath,
+                "--quiet",
+                "--config",
+                self.kcpps_filepath,
+                "--port",
+                str(port),
+                *self.args,
+            ],
+            health_path="/api/extra/version",
+            ready_timeout=self.ready_timeout,
         )
-        logging.debug(f'Running Koboldcpp server using command: "{cmd}"')
-        self.process = subprocess.Popen(cmd, shell=True, stdout=DEVNULL, stderr=DEVNULL)
+        await supervisor.start()
+        self.supervisor = supervisor
         logging.info(
-            f"Opened Koboldcpp server (PID: {self.process.pid}) on port {self.port}"
+            f"Opened Koboldcpp server (PID: {self.supervisor.process.pid}) on port {self.port}"
         )
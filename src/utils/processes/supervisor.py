@@ -0,0 +1,372 @@
+"""
+Supervising a local server process
+
+Starts a server on a free port and only reports it started once it answers HTTP on its
+health path, so the first request never races the server loading its models. When the
+server exits without being stopped it is started again, waiting longer after each crash
+in a row. Its output is kept in a ring buffer for error messages and debugging, and its
+CPU, memory and request latency can be reported.
+
+A ready server keeps being polled. One that stops answering unhealthy_after polls in a
+row is marked unhealthy and not ready, so requests go to other servers, until it
+answers again.
+
+A port can be taken by something else between being found free and the server binding
+it. A server that exits before it is ready is started again on another port, up to
+start_attempts times.
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List
+
+import psutil
+
+from utils.helpers.time import latency_stats
+
+from .error import ProcessStartError
+
+STOPPED = "stopped"
+STARTING = "starting"
+READY = "ready"
+RESTARTING = "restarting"
+UNHEALTHY = "unhealthy"
+
+LATENCY_SAMPLES = 1000
+
+
+class _ExitedEarly(Exception):
+    pass
+
+
+def find_free_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+async def http_ready(port: int, path: str, timeout: float = 2) -> bool:
+    """Whether the server on port answers GET path with a 2xx status"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port), timeout
+        )
+        writer.write(
+            "GET {} HTTP/1.1\r\nHost: 127.0.0.1:{}\r\nConnection: close\r\n\r\n".format(
+                path, port
+            ).encode("ascii")
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        parts = status_line.split()
+        return len(parts) >= 2 and parts[1].startswith(b"2")
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+class ProcessSupervisor:
+    def __init__(
+        self,
+        name: str,
+        command: Callable[[int], List[str]],
+        health_path: str = "/",
+        ready_timeout: float = 120,
+        poll_interval: float = 0.5,
+        backoff_initial: float = 1,
+        backoff_max: float = 30,
+        stable_after: float = 60,
+        start_attempts: int = 3,
+        health_interval: float = 5,
+        unhealthy_after: int = 3,
+        log_lines: int = 500,
+        cwd: str = None,
+        env: Dict[str, str] = None,
+    ):
+        self.name = name
+        self.command = command  # arguments to run the server on a given port
+        self.health_path = health_path
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        # Seconds waited before a restart, doubling for each crash in a row, and how
+        # long a server must run for its next crash not to count as in a row
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.start_attempts = start_attempts
+        self.health_interval = health_interval
+        self.unhealthy_after = unhealthy_after
+        self.cwd = cwd
+        self.env = env
+
+        self.process: asyncio.subprocess.Process = None
+        self.port: int = None
+        self.status: str = STOPPED
+        self.started_at: float = None
+        self.restarts: int = 0
+        self.ready = asyncio.Event()
+        self.stopping: bool = False
+
+        self.logs: deque = deque(maxlen=log_lines)
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self.readers: List[asyncio.Task] = list()
+        self.monitor: asyncio.Task = None
+        self.prober: asyncio.Task = None
+        self.ps_process: psutil.Process = None
+
+    @property
+    def uri(self) -> str:
+        return "http://127.0.0.1:{}".format(self.port)
+
+    async def start(self):
+        """Start the server, returning once it is ready"""
+        self.stopping = False
+        self.status = STARTING
+        try:
+            await self._launch()
+        except Exception:
+            self.status = STOPPED
+            raise
+        self.monitor = asyncio.create_task(self._monitor())
+        self.prober = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        self.stopping = True
+        self.ready.clear()
+        for task in [self.monitor, self.prober]:
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.monitor, self.prober = None, None
+        await self._kill()
+        self.status = STOPPED
+        logging.info("Stopped process {}".format(self.name))
+
+    async def _launch(self, port: int = None):
+        """Spawn the server, preferring port, and wait for it to be ready"""
+        for attempt in range(self.start_attempts):
+            self.port = port if (port and attempt == 0) else find_free_port()
+            await self._spawn()
+            try:
+                await self._wait_ready()
+            except _ExitedEarly:
+                logging.warning(
+                    "Process {} exited before it was ready (attempt {} of {})".format(
+                        self.name, attempt + 1, self.start_attempts
+                    )
+                )
+                await self._kill()
+                continue
+            except Exception:
+                await self._kill()
+                raise
+
+            self.started_at = time.monotonic()
+            self.status = READY
+            self.ready.set()
+            logging.info(
+                "Process {} (PID: {}) is ready on port {}".format(
+                    self.name, self.process.pid, self.port
+                )
+            )
+            return
+
+        raise ProcessStartError(
+            self.name, "exited before it was ready", self.get_logs(20)
+        )
+
+    async def _spawn(self):
+        args = self.command(self.port)
+        logging.debug('Running process {} using command: "{}"'.format(self.name, args))
+        self.process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd,
+            env=self.env,
+        )
+        self.ps_process = None
+        self.readers = [
+            asyncio.create_task(self._read(self.process.stdout, "stdout")),
+            asyncio.create_task(self._read(self.process.stderr, "stderr")),
+        ]
+
+    async def _read(self, stream: asyncio.StreamReader, name: str):
+        # Output must be read as it comes, or the server blocks on a full pipe
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # A line longer than the stream's buffer, kept in pieces
+                line = await stream.read(2**16)
+            if not line:
+                return
+            line = line.decode("utf-8", errors="replace").rstrip()
+            self.logs.append((time.time(), name, line))
+            logging.debug("[{} {}] {}".format(self.name, name, line))
+
+    async def _wait_ready(self):
+        """Poll the health path until it answers"""
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            if self.process.returncode is not None:
+                raise _ExitedEarly(self.name)
+            if await http_ready(self.port, self.health_path):
+                return
+            if time.monotonic() >= deadline:
+                raise ProcessStartError(
+                    self.name,
+                    "not ready after {} seconds".format(self.ready_timeout),
+                    self.get_logs(20),
+                )
+            try:
+                await asyncio.wait_for(self.process.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _monitor(self):
+        """Start the server again whenever it exits without being stopped"""
+        backoff = self.backoff_initial
+        while not self.stopping:
+            returncode = await self.process.wait()
+            if self.stopping:
+                return
+            self.ready.clear()
+            self.status = RESTARTING
+            if (
+                self.started_at is not None
+                and time.monotonic() - self.started_at >= self.stable_after
+            ):
+                backoff = self.backoff_initial
+            logging.error(
+                "Process {} exited with code {}, restarting in {} seconds. Last output:\n{}".format(
+                    self.name, returncode, backoff, "\n".join(self.get_logs(20))
+                )
+            )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+            self.started_at = None
+            try:
+                await self._launch(self.port)
+                self.restarts += 1
+            except Exception:
+                # Its exit is picked up again on the next loop
+                logging.error(
+                    "Failed to restart process {}".format(self.name), exc_info=True
+                )
+
+    async def _probe(self):
+        """Drain the server while it stops answering, without it having exited"""
+        failures = 0
+        while True:
+            await asyncio.sleep(self.health_interval)
+            if self.status not in [READY, UNHEALTHY]:
+                failures = 0
+                continue
+            healthy = await http_ready(self.port, self.health_path)
+            if self.status not in [READY, UNHEALTHY]:
+                continue
+
+            if healthy:
+                failures = 0
+                if self.status == UNHEALTHY:
+                    logging.info("Process {} is healthy again".format(self.name))
+                    self.status = READY
+                    self.ready.set()
+                continue
+            failures += 1
+            if failures >= self.unhealthy_after and self.status == READY:
+                logging.warning(
+                    "Process {} stopped answering on {}, draining it".format(
+                        self.name, self.health_path
+                    )
+                )
+                self.status = UNHEALTHY
+                self.ready.clear()
+
+    async def _kill(self):
+        process = self.process
+        if process is None:
+            return
+        if process.returncode is None:
+            try:
+                ps_process = psutil.Process(process.pid)
+                for child in ps_process.children(recursive=True):
+                    child.kill()
+                ps_process.kill()
+            except psutil.NoSuchProcess:
+                pass
+            await process.wait()
+        for reader in self.readers:
+            try:
+                await asyncio.wait_for(reader, 1)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self.readers = list()
+
+    @asynccontextmanager
+    async def track(self):
+        """Time a request to the server, first waiting for it to be ready if it is
+        restarting"""
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), self.ready_timeout)
+            except asyncio.TimeoutError:
+                raise ProcessStartError(
+                    self.name,
+                    "not ready after {} seconds".format(self.ready_timeout),
+                    self.get_logs(20),
+                )
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def get_logs(self, lines: int = None) -> List[str]:
+        """Latest output of the server, oldest first"""
+        logs = list(self.logs)
+        if lines is not None:
+            logs = logs[-lines:]
+        return ["[{}] {}".format(name, line) for _, name, line in logs]
+
+    def stats(self) -> Dict:
+        """Status, resource use and request latency in seconds"""
+        stats = {
+            "status": self.status,
+            "pid": None,
+            "port": self.port,
+            "restarts": self.restarts,
+            "uptime": (time.monotonic() - self.started_at if self.started_at else 0.0),
+            "cpu": 0.0,
+            "memory": 0,
+        }
+        if self.process is not None and self.process.returncode is None:
+            stats["pid"] = self.process.pid
+            try:
+                if self.ps_process is None or self.ps_process.pid != self.process.pid:
+                    self.ps_process = psutil.Process(self.process.pid)
+                # Summed with children, as launchers may run the server as one
+                processes = [self.ps_process] + self.ps_process.children(recursive=True)
+                for process in processes:
+                    stats["cpu"] += process.cpu_percent()
+                    stats["memory"] += process.memory_info().rss
+            except psutil.Error:
+                pass
+
+        stats["latency"] = latency_stats(self.latencies)
+        return stats
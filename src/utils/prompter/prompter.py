@@ -5,6 +5,7 @@ from utils.helpers.time import get_current_time
 from utils.helpers.singleton import Singleton
 from utils.helpers.path import portable_path
 from utils.config import Config
+from utils.memory import MemoryStore
 from .context import ContextMetadata
 from .message import Message, ChatMessage, RequestMessage, MCPMessage, CustomMessage
 
@@ -13,6 +14,7 @@ class Prompter(metaclass=Singleton):
     def __init__(self):
         self.context_metadata: Dict[str, ContextMetadata] = dict()
         self.history: List[Message] = list()
+        self.memories: List[str] = list()  # recalled for the current response
 
         self.instruction_prompt_filename: str = "example.txt"
         self.character_prompt_filename: str = "example.txt"
@@ -88,7 +90,9 @@ class Prompter(metaclass=Singleton):
 
     def insert_history(self, message: Message):
         self.history.append(message)
+        evicted = self.history[: -(self.history_length)]
         self.history = self.history[-(self.history_length) :]
+        MemoryStore().remember(evicted)
 
         with open(Config().history_filepath, "a", encoding="utf-8") as f:
             f.write(message.to_line())
@@ -204,13 +208,16 @@ class Prompter(metaclass=Singleton):
             return f.read()
 
     def get_sys_prompt(self):
-        return "{instructions}\n{mcp_usage}\n{contexts}\n### Character ###\n{character}\n### Scene ###\n{scene}".format(
+        prompt = "{instructions}\n{mcp_usage}\n{contexts}\n### Character ###\n{character}\n### Scene ###\n{scene}".format(
             instructions=self.get_instructions_prompt(),
             contexts=self.get_context_descriptions(),
             mcp_usage=self.response_template,
             character=self.get_character_prompt(),
             scene=self.get_scene_prompt(),
         )
+        if self.memories:
+            prompt += "\n### Memories ###\n{}".format("\n".join(self.memories))
+        return prompt
 
     def get_history_text(self):
         prompt = ""
@@ -224,6 +231,10 @@ class Prompter(metaclass=Singleton):
     def get_history(self):
         return self.history
 
+    async def recall_memories(self):
+        """Recall memories relevant to the latest history for the next response"""
+        self.memories = await MemoryStore().recall(self.history)
+
     def add_mcp_usage_prompt(self, tooling_prompt: str, response_template: str):
         self.tooling_prompt = tooling_prompt
         self.response_template = response_template
@@ -65,6 +65,65 @@ async def ws():
         raise
 
 
+@app.websocket("/api/context/conversation/audio/stream")
+async def context_conversation_stream_audio():
+    """Stream audio into a context_conversation_stream_audio job
+
+    The first message gives the job's parameters as JSON (user, timestamp, sr, sw, ch
+    and optionally vad), answered with the job ID. Audio follows as binary messages of
+    raw PCM (or JSON with base64 audio_bytes), until {"end": true} or the socket closes.
+    The job is only queued once the audio ends, to commit what was said.
+    """
+    ws = websocket._get_current_object()
+    await ws.accept()
+    job_type = JobType.CONTEXT_CONVERSATION_STREAM_AUDIO
+    stream = None
+    try:
+        request_data = json.loads(await ws.receive())
+        stream = JAIson().open_conversation_audio_stream(
+            request_data.get("sr"),
+            request_data.get("sw"),
+            request_data.get("ch"),
+            vad=request_data.get("vad"),
+        )
+        job_id = await JAIson().create_job(
+            job_type,
+            user=request_data.get("user"),
+            timestamp=request_data.get("timestamp"),
+            stream=stream,
+        )
+        await ws.send(
+            json.dumps(
+                create_response(200, f"{job_type} job created", {"job_id": job_id})
+            )
+        )
+
+        while True:
+            message = await ws.receive()
+            if stream.closed:
+                break  # Job was cancelled
+            if isinstance(message, bytes):
+                stream.feed(message)
+                continue
+            message_d = json.loads(message)
+            if message_d.get("audio_bytes"):
+                stream.feed(base64.b64decode(message_d["audio_bytes"]))
+            if message_d.get("end"):
+                break
+    except asyncio.CancelledError:
+        logging.info("Audio stream closed by client")
+        raise
+    except Exception as err:
+        logging.error(
+            f"Error occured for {job_type} stream", stack_info=True, exc_info=True
+        )
+        await ws.send(json.dumps(create_response(500, str(err), {})))
+    finally:
+        # Whatever was said so far is still transcribed
+        if stream is not None:
+            stream.close()
+
+
 ## Generic endpoints ###################
 
 
@@ -82,6 +141,27 @@ async def get_current_config():
     )
 
 
+@app.route("/api/mcp/cache", methods=["GET"])
+async def get_mcp_cache_stats():
+    return create_response(
+        200, f"MCP cache stats gotten", JAIson().get_mcp_cache_stats(), cors_header
+    )
+
+
+@app.route("/api/mcp/cache", methods=["DELETE"])
+async def invalidate_mcp_cache():
+    try:
+        request_data = (await request.get_json(silent=True)) or dict()
+        removed = JAIson().invalidate_mcp_cache(
+            request_data.get("name"), request_data.get("arguments")
+        )
+        return create_response(
+            200, f"MCP cache invalidated", {"removed": removed}, cors_header
+        )
+    except Exception as err:
+        return create_response(500, str(err), {}, cors_header)
+
+
 ## Job management endpoints ###########
 @app.route("/api/job", methods=["DELETE"])
 async def cancel_job():
@@ -159,6 +239,11 @@ async def context_conversation_add_audio():
     return await _request_job(JobType.CONTEXT_CONVERSATION_ADD_AUDIO)
 
 
+@app.route("/api/context/conversation/audio/batch", methods=["POST"])
+async def context_conversation_add_audio_batch():
+    return await _request_job(JobType.CONTEXT_CONVERSATION_ADD_AUDIO_BATCH)
+
+
 # Context - Custom
 @app.route("/api/context/custom", methods=["PUT"])
 async def context_custom_register():
@@ -267,6 +352,9 @@ async def system_metrics():
                     "memory": process_memory,
                     "cpu": process_cpu,
                 },
+                "mcpCache": JAIson().get_mcp_cache_stats(),
+                "processes": JAIson().get_process_stats(),
+                "resources": JAIson().get_resource_stats(),
             },
             cors_header,
         )
@@ -565,6 +653,11 @@ async def preflight_env():
     return create_preflight("GET, PUT")
 
 
+@app.route("/api/mcp/cache", methods=["OPTIONS"])
+async def preflight_mcp_cache():
+    return create_preflight("GET, DELETE")
+
+
 # Allow CORS
 @app.route("/api/job", methods=["OPTIONS"])
 async def preflight_job():
@@ -0,0 +1,16 @@
+"""
+Shared test configuration
+
+The core is run from src/ and imports its own modules as utils.*, so src/ is put on
+the import path for tests of modules that depend on other parts of the core.
+"""
+
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+# utils.args parses the command line on import, which would otherwise see pytest's
+sys.argv = sys.argv[:1]
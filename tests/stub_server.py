@@ -0,0 +1,47 @@
+"""
+Stub of a local model server for process supervisor tests
+
+Usage: python stub_server.py PORT [--delay SECONDS] [--fail]
+
+Waits delay seconds as if loading a model, then answers GET /health with 200. GET /crash
+makes it exit with code 1. With --fail it exits with code 1 before listening.
+"""
+
+import argparse
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/crash":
+            os._exit(1)
+        self.send_response(200 if self.path == "/health" else 404)
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port", type=int)
+    parser.add_argument("--delay", type=float, default=0)
+    parser.add_argument("--fail", action="store_true")
+    args = parser.parse_args()
+
+    print("loading model", flush=True)
+    if args.fail:
+        print("model file not found", file=sys.stderr, flush=True)
+        sys.exit(1)
+    time.sleep(args.delay)
+    server = HTTPServer(("127.0.0.1", args.port), Handler)
+    print("listening on {}".format(args.port), flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
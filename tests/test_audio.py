@@ -0,0 +1,143 @@
+"""
+Unit Tests for PCM Conversion
+
+Tests for converting PCM to and from float arrays, mixing channels and resampling
+streams with the polyphase resampler.
+"""
+
+import numpy as np
+import pytest
+from utils.helpers.audio import (
+    AudioConverter,
+    Resampler,
+    UnsupportedSampleWidth,
+    convert_audio,
+    from_float,
+    mix_channels,
+    resample,
+    to_float,
+)
+
+RATES = [(24000, 48000), (44100, 48000), (48000, 16000), (22050, 16000)]
+
+
+def sine(freq: float, sr: int, seconds: float = 0.5, ch: int = 1) -> np.ndarray:
+    t = np.arange(int(sr * seconds)) / sr
+    x = (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.repeat(x[:, None], ch, axis=1)
+
+
+class TestFloatConversion:
+    @pytest.mark.parametrize("sw", [1, 2, 4])
+    def test_round_trip(self, sw):
+        x = np.linspace(-0.9, 0.9, 101, dtype=np.float32).reshape(-1, 1)
+        y = to_float(from_float(x, sw), sw, 1)
+        assert np.allclose(x, y, atol=1 / 100)
+
+    def test_unsigned_8_bit_silence(self):
+        assert np.all(to_float(bytes([128] * 4), 1, 1) == 0)
+
+    def test_channels_interleaved(self):
+        ab = from_float(np.array([[0.5, -0.5], [0.25, -0.25]]), 2)
+        x = to_float(ab, 2, 2)
+        assert x.shape == (2, 2)
+        assert np.allclose(x[:, 0], [0.5, 0.25], atol=1e-4)
+
+    def test_clipped(self):
+        ab = from_float(np.array([[2.0], [-2.0]]), 2)
+        assert np.frombuffer(ab, "<i2").tolist() == [32767, -32768]
+
+    def test_into_preallocated(self):
+        out = np.empty((8, 2), dtype=np.float32)
+        ab = from_float(np.full((3, 2), 0.5), 2)
+        x = to_float(ab, 2, 2, out=out)
+        assert x.shape == (3, 2) and np.shares_memory(x, out)
+
+        assert from_float(x, 2, out=x) == ab
+
+    def test_incomplete_sample_dropped(self):
+        assert to_float(b"\x00\x01\x02", 2, 1).shape == (1, 1)
+
+    def test_unsupported_width(self):
+        with pytest.raises(UnsupportedSampleWidth):
+            to_float(b"\x00" * 6, 3, 1)
+
+
+class TestMixChannels:
+    def test_down_to_mono(self):
+        x = np.array([[1.0, 0.0], [0.5, 0.5]], dtype=np.float32)
+        assert mix_channels(x, 1)[:, 0].tolist() == [0.5, 0.5]
+
+    def test_up_from_mono(self):
+        x = np.array([[0.25], [0.5]], dtype=np.float32)
+        assert mix_channels(x, 2).tolist() == [[0.25, 0.25], [0.5, 0.5]]
+
+    def test_into_preallocated(self):
+        out = np.empty((4, 1), dtype=np.float32)
+        y = mix_channels(np.ones((2, 2), dtype=np.float32), 1, out=out)
+        assert y.shape == (2, 1) and np.shares_memory(y, out)
+
+
+class TestResampler:
+    @pytest.mark.parametrize("sr_in,sr_out", RATES)
+    def test_frequency_kept(self, sr_in, sr_out):
+        y = resample(sine(1000, sr_in), sr_in, sr_out)
+        assert len(y) == sr_out // 2
+
+        t = np.arange(len(y)) / sr_out
+        expected = 0.5 * np.sin(2 * np.pi * 1000 * t)
+        assert np.abs(y[100:-100, 0] - expected[100:-100]).max() < 1e-3
+
+    def test_aliasing_removed(self):
+        # 7 kHz is above the Nyquist frequency of 8 kHz audio
+        y = resample(sine(7000, 48000), 48000, 8000)
+        assert np.abs(y[100:-100]).max() < 0.01
+
+    @pytest.mark.parametrize("sr_in,sr_out", RATES)
+    def test_streamed_matches_whole(self, sr_in, sr_out):
+        x = sine(440, sr_in, ch=2)
+        expected = resample(x, sr_in, sr_out)
+
+        resampler, pieces = Resampler(sr_in, sr_out, 2), list()
+        for i in range(0, len(x), 1234):
+            pieces.append(resampler.process(x[i : i + 1234]))
+        pieces.append(resampler.flush())
+        assert np.allclose(np.concatenate(pieces), expected, atol=1e-6)
+
+    def test_tiny_pieces(self):
+        x = sine(440, 24000, 0.01)
+        resampler = Resampler(24000, 16000, 1)
+        pieces = [resampler.process(x[i : i + 3]) for i in range(0, len(x), 3)]
+        y = np.concatenate(pieces + [resampler.flush()])
+        assert np.allclose(y, resample(x, 24000, 16000), atol=1e-6)
+
+    def test_same_rate_passthrough(self):
+        x = sine(440, 16000)
+        assert np.array_equal(resample(x, 16000, 16000), x)
+
+
+class TestConvertAudio:
+    def test_to_discord_format(self):
+        ab = from_float(sine(440, 24000), 1)
+        out = convert_audio(ab, 24000, 1, 1, 48000, 2, 2)
+        y = to_float(out, 2, 2)
+        assert len(y) == 24000
+        assert np.array_equal(y[:, 0], y[:, 1])
+        assert np.abs(y).max() == pytest.approx(0.5, abs=0.02)
+
+    def test_passthrough(self):
+        ab = from_float(sine(440, 16000), 2)
+        converter = AudioConverter(16000, 2, 1, 16000, 2, 1)
+        assert converter.process(ab) == ab
+        assert converter.flush() == b""
+
+    def test_streamed_matches_whole(self):
+        ab = from_float(sine(440, 44100, ch=2), 2)
+        expected = convert_audio(ab, 44100, 2, 2, 16000, 2, 1)
+
+        converter = AudioConverter(44100, 2, 2, 16000, 2, 1)
+        out = b"".join(
+            converter.process(ab[i : i + 4000]) for i in range(0, len(ab), 4000)
+        )
+        streamed = np.frombuffer(out + converter.flush(), "<i2").astype(int)
+        assert np.abs(streamed - np.frombuffer(expected, "<i2")).max() <= 1
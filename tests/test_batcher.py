@@ -0,0 +1,136 @@
+"""
+Unit Tests for the Micro Batcher
+
+Tests for items submitted close together being run as one batch on the worker thread,
+each caller getting its own result, and pending items not hanging once stopped.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from utils.helpers.batcher import _STOP, MicroBatcher
+
+
+class Recorder:
+    """Batch function doubling items, recording each batch it was given"""
+
+    def __init__(self, release: threading.Event = None):
+        self.batches = list()
+        self.release = release
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.release is not None:
+            self.release.wait(5)
+        return [item * 2 for item in items]
+
+
+@pytest.fixture
+def batchers():
+    started = list()
+    yield started
+    for batcher in started:
+        batcher.stop()
+
+
+def start(batchers, batch_fn, **kwargs) -> MicroBatcher:
+    batcher = MicroBatcher(batch_fn, **kwargs)
+    batcher.start()
+    batchers.append(batcher)
+    return batcher
+
+
+async def wait_for(condition, timeout: float = 5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Condition not met in time")
+
+
+async def test_coalesces_within_window(batchers):
+    recorder = Recorder()
+    batcher = start(batchers, recorder, batch_window_ms=100)
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+    assert results == [0, 2, 4, 6, 8]
+    assert recorder.batches == [[0, 1, 2, 3, 4]]
+
+
+async def test_limits_batch_size(batchers):
+    recorder = Recorder()
+    batcher = start(batchers, recorder, max_batch_size=2, batch_window_ms=100)
+    assert await batcher.submit_many(list(range(5))) == [0, 2, 4, 6, 8]
+    assert [len(batch) for batch in recorder.batches] == [2, 2, 1]
+
+
+async def test_results_go_to_their_callers(batchers):
+    batcher = start(batchers, Recorder(), batch_window_ms=50)
+    first, second, third = await asyncio.gather(
+        batcher.submit_many([1, 2]), batcher.submit(10), batcher.submit_many([3])
+    )
+    assert first == [2, 4]
+    assert second == 20
+    assert third == [6]
+
+
+async def test_error_reaches_every_waiter(batchers):
+    def failing(items):
+        raise ValueError("model failed")
+
+    batcher = start(batchers, failing, batch_window_ms=50)
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+    # Still running for the next batch
+    batcher.batch_fn = Recorder()
+    assert await batcher.submit(3) == 6
+
+
+async def test_skips_cancelled_submissions(batchers):
+    release = threading.Event()
+    recorder = Recorder(release)
+    batcher = start(batchers, recorder, max_batch_size=1, batch_window_ms=0)
+
+    running = asyncio.create_task(batcher.submit(1))
+    await wait_for(lambda: recorder.batches)
+    cancelled = asyncio.create_task(batcher.submit(2))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    release.set()
+    assert await running == 2
+    assert await batcher.submit(3) == 6
+    assert recorder.batches == [[1], [3]]
+
+
+async def test_submit_when_stopped():
+    batcher = MicroBatcher(Recorder())
+    with pytest.raises(RuntimeError):
+        await batcher.submit(1)
+
+
+async def test_stop_fails_pending_work():
+    release = threading.Event()
+    recorder = Recorder(release)
+    batcher = MicroBatcher(recorder, max_batch_size=1, batch_window_ms=0)
+    batcher.start()
+
+    running = asyncio.create_task(batcher.submit(1))
+    await wait_for(lambda: recorder.batches)
+    # Stopping waits for the running batch, so it is stopped off the event loop
+    stopping = asyncio.create_task(asyncio.to_thread(batcher.stop))
+    await wait_for(lambda: _STOP in batcher._queue.queue)
+    pending = asyncio.create_task(batcher.submit(2))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.wait_for(stopping, 5)
+    assert await running == 2
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(pending, 5)
+    assert not batcher.running
+    assert recorder.batches == [[1]]
@@ -0,0 +1,95 @@
+"""
+Unit Tests for Blocking SDK Adapters
+
+Tests for blocking calls running off the event loop with a timeout, and for callbacks
+from other threads reaching a coroutine in order.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from utils.helpers.blocking import (
+    BLOCKING_WORKERS,
+    CallbackQueue,
+    CallTimedOut,
+    run_blocking,
+)
+
+DELAY = 0.05
+
+
+async def test_run_blocking_returns_result():
+    assert await run_blocking(pow, 2, 10) == 1024
+    assert await run_blocking(int, "ff", base=16) == 255
+
+
+async def test_run_blocking_leaves_loop_free():
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(DELAY / 10)
+
+    ticker = asyncio.create_task(tick())
+    await run_blocking(time.sleep, DELAY)
+    ticker.cancel()
+    assert ticks > 2
+
+
+async def test_run_blocking_runs_calls_together():
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[run_blocking(time.sleep, DELAY) for _ in range(BLOCKING_WORKERS)]
+    )
+    assert time.perf_counter() - start < DELAY * BLOCKING_WORKERS / 2
+
+
+async def test_run_blocking_timeout():
+    with pytest.raises(CallTimedOut, match="sleep"):
+        await run_blocking(time.sleep, DELAY * 4, timeout=DELAY)
+
+
+async def test_run_blocking_raises_error():
+    with pytest.raises(ValueError):
+        await run_blocking(int, "not a number")
+
+
+async def test_callback_queue_from_threads():
+    queue = CallbackQueue()
+
+    def produce():
+        for i in range(100):
+            queue.put(i)
+        queue.finish()
+
+    threading.Thread(target=produce).start()
+    assert [item async for item in queue] == list(range(100))
+
+
+async def test_callback_queue_raises_error():
+    queue = CallbackQueue()
+
+    def produce():
+        queue.put(1)
+        queue.put(RuntimeError("Canceled"))
+
+    threading.Thread(target=produce).start()
+    items = list()
+    with pytest.raises(RuntimeError, match="Canceled"):
+        async for item in queue:
+            items.append(item)
+    assert items == [1]
+
+
+async def test_callback_queue_timeout():
+    queue = CallbackQueue("synthesis", timeout=DELAY)
+    queue.put(1)
+    items = list()
+    with pytest.raises(CallTimedOut, match="synthesis"):
+        async for item in queue:
+            items.append(item)
+    assert items == [1]
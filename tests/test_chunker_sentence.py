@@ -0,0 +1,94 @@
+"""
+Unit Tests for the Sentence Chunker
+
+Tests for rule-based sentence boundaries, chunk sizing and streamed input.
+"""
+
+import random
+
+import pytest
+from utils.operations.filter_text.chunker_sentence import SentenceChunkerFilter
+
+TEXT = (
+    "Hello there Mr. Smith! How are you? I read it in the U.S. last year... well, "
+    'maybe. "Quoted." A list\nNext line. Pi is 3.14 today. J. R. R. Tolkien wrote it.'
+)
+SENTENCES = [
+    "Hello there Mr. Smith!",
+    "How are you?",
+    "I read it in the U.S. last year... well, maybe.",
+    '"Quoted."',
+    "A list",
+    "Next line.",
+    "Pi is 3.14 today.",
+    "J. R. R. Tolkien wrote it.",
+]
+
+
+async def chunk(op: SentenceChunkerFilter, content: str):
+    return [chunk_out["content"] async for chunk_out in op({"content": content})]
+
+
+@pytest.fixture
+async def chunker():
+    op = SentenceChunkerFilter()
+    await op.configure({"use_spacy": False})
+    await op.start()
+    yield op
+    await op.close()
+
+
+class TestSentenceBoundaries:
+    """Test splitting complete texts."""
+
+    async def test_sentences(self, chunker):
+        assert await chunk(chunker, TEXT) == SENTENCES
+
+    async def test_single_sentence_without_terminator(self, chunker):
+        assert await chunk(chunker, "  no terminator here ") == ["no terminator here"]
+
+
+class TestChunkLengths:
+    """Test merging and splitting to configured lengths."""
+
+    async def test_min_length_merges_short_sentences(self, chunker):
+        await chunker.configure({"min_length": 10})
+        assert await chunk(chunker, "Hi. Yes. This one is long enough.") == [
+            "Hi. Yes. This one is long enough."
+        ]
+
+    async def test_max_length_splits_at_clause(self, chunker):
+        await chunker.configure({"max_length": 30})
+        text = "This sentence is rather long, and it keeps going for a while."
+        chunks = await chunk(chunker, text)
+
+        assert chunks[0] == "This sentence is rather long,"
+        assert all(len(c) <= 30 for c in chunks)
+        assert " ".join(chunks) == text
+
+    async def test_invalid_lengths(self, chunker):
+        with pytest.raises(AssertionError):
+            await chunker.configure({"min_length": 50, "max_length": 10})
+
+
+class TestSentenceStream:
+    """Test splitting text arriving in pieces."""
+
+    @pytest.mark.parametrize("seed", range(10))
+    async def test_random_deltas_match_full_text(self, chunker, seed):
+        rng = random.Random(seed)
+        stream, outputs, pos = chunker.open_stream(), list(), 0
+        while pos < len(TEXT):
+            size = rng.randint(1, 12)
+            outputs.extend(stream.feed(TEXT[pos : pos + size]))
+            pos += size
+        outputs.extend(stream.flush())
+
+        assert outputs == SENTENCES
+
+    async def test_emits_once_boundary_confirmed(self, chunker):
+        stream = chunker.open_stream()
+        assert stream.feed("First sentence.") == []
+        assert stream.feed(" ") == []
+        assert stream.feed("Second") == ["First sentence."]
+        assert stream.flush() == ["Second"]
@@ -0,0 +1,144 @@
+"""
+Unit Tests for Audio Codecs
+
+Tests for the formats each codec is given, PCM packets and their websocket events, and
+(when PyAV is installed) Opus and FLAC packets and timestamps.
+"""
+
+import base64
+
+import numpy as np
+import pytest
+from utils.helpers.audio import AudioFormat, from_float
+from utils.helpers.codec import (
+    EVENT_SIZE,
+    PCM_PACKET_SIZE,
+    PCMEncoder,
+    UnsupportedCodec,
+    encoder_format,
+    open_encoder,
+    packet_events,
+)
+
+MONO = AudioFormat(24000, 2, 1)
+DISCORD = AudioFormat(48000, 2, 2)
+
+
+def tone(fmt: AudioFormat, seconds: float = 1.0) -> bytes:
+    t = np.arange(int(fmt.sr * seconds)) / fmt.sr
+    x = np.repeat((0.5 * np.sin(2 * np.pi * 440 * t))[:, None], fmt.ch, axis=1)
+    return from_float(x, fmt.sw)
+
+
+class TestEncoderFormat:
+    def test_pcm_keeps_format(self):
+        assert encoder_format("pcm", None) is None
+        assert encoder_format("pcm", AudioFormat(22050, 1, 3)) == AudioFormat(
+            22050, 1, 3
+        )
+
+    def test_opus(self):
+        assert encoder_format("opus", None) == AudioFormat(48000, 2, 1)
+        assert encoder_format("opus", DISCORD) == DISCORD
+        assert encoder_format("opus", AudioFormat(44100, 4, 6)) == AudioFormat(
+            48000, 2, 2
+        )
+
+    def test_flac(self):
+        assert encoder_format("flac", AudioFormat(22050, 1, 1)) == AudioFormat(
+            22050, 2, 1
+        )
+        assert encoder_format("flac", AudioFormat(44100, 4, 2)) == AudioFormat(
+            44100, 4, 2
+        )
+
+    def test_unsupported(self):
+        with pytest.raises(UnsupportedCodec):
+            encoder_format("mp3", None)
+        with pytest.raises(UnsupportedCodec):
+            open_encoder("mp3", None)
+
+
+class TestPCMEncoder:
+    def test_whole_samples(self):
+        fmt = AudioFormat(16000, 2, 3)
+        ab = tone(fmt, 0.3)
+        encoder = PCMEncoder()
+        packets = encoder.encode(ab, fmt) + encoder.flush()
+
+        assert b"".join(packet["data"] for packet in packets) == ab
+        assert all(len(packet["data"]) % 6 == 0 for packet in packets)
+        assert all(len(packet["data"]) <= PCM_PACKET_SIZE for packet in packets)
+
+    def test_timestamps(self):
+        encoder = PCMEncoder()
+        packets = encoder.encode(tone(MONO, 0.2), MONO)
+        packets += encoder.encode(tone(MONO, 0.2), MONO)
+        pts = 0
+        for packet in packets:
+            assert packet["pts"] == pts
+            pts += packet["duration"]
+        assert pts == int(MONO.sr * 0.2) * 2
+
+    def test_events_match_previous_fields(self):
+        ab = tone(MONO, 0.2)
+        packets = PCMEncoder().encode(ab, MONO)
+        events = packet_events("pcm", MONO, packets)
+
+        assert len(events) == len(packets)
+        assert all(len(event["audio_bytes"]) <= 4096 for event in events)
+        decoded = b"".join(base64.b64decode(event["audio_bytes"]) for event in events)
+        assert decoded == ab
+        assert events[0]["sr"] == MONO.sr and events[0]["codec"] == "pcm"
+
+
+def test_encoded_events_batch_packets():
+    packets = [{"data": bytes(150), "pts": i * 960, "duration": 960} for i in range(60)]
+    events = packet_events("opus", DISCORD, packets)
+
+    assert 1 < len(events) < len(packets)
+    sent = [packet for event in events for packet in event["packets"]]
+    assert [packet["pts"] for packet in sent] == [packet["pts"] for packet in packets]
+    for event in events:
+        assert sum(len(packet["data"]) for packet in event["packets"]) <= EVENT_SIZE
+
+
+class TestAVEncoder:
+    @pytest.fixture(autouse=True)
+    def needs_av(self):
+        pytest.importorskip("av")
+
+    def test_opus_frames(self):
+        encoder = open_encoder("opus", DISCORD)
+        ab = tone(DISCORD, 0.505)
+        packets = encoder.encode(ab[: len(ab) // 3 // 4 * 4], DISCORD)
+        packets += encoder.encode(ab[len(ab) // 3 // 4 * 4 :], DISCORD)
+        packets += encoder.flush()
+
+        # 20 ms frames, the last trimmed to the end of the audio
+        assert all(packet["duration"] == 960 for packet in packets[:-1])
+        assert packets[-1]["pts"] + packets[-1]["duration"] == len(ab) // 4
+        assert sum(len(packet["data"]) for packet in packets) < len(ab) / 10
+        pts = [packet["pts"] for packet in packets]
+        assert pts == sorted(pts)
+
+    def test_flac_lossless(self):
+        import av
+
+        encoder = open_encoder("flac", MONO)
+        ab = tone(MONO, 0.5)
+        packets = encoder.encode(ab, MONO) + encoder.flush()
+
+        decoder = av.CodecContext.create("flac", "r")
+        decoder.extradata = encoder.header
+        decoded = b"".join(
+            bytes(frame.planes[0])[: frame.samples * 2]
+            for packet in packets
+            for frame in decoder.decode(av.Packet(packet["data"]))
+        )
+        assert decoded == ab
+
+    def test_format_mismatch(self):
+        encoder = open_encoder("opus", DISCORD)
+        with pytest.raises(ValueError):
+            encoder.encode(tone(MONO, 0.1), MONO)
@@ -0,0 +1,110 @@
+"""
+Unit Tests for Batched and Cached Embeddings
+
+Tests for texts being embedded in batches, vectors being reused for texts embedded
+before, and vectors surviving the trip over JSON.
+"""
+
+import numpy as np
+import pytest
+from utils.helpers.embedding import EmbeddingCache, from_base64, to_base64
+from utils.operations.embedding.base import EmbeddingOperation
+
+DIMENSIONS = 8
+
+
+class FakeEmbedding(EmbeddingOperation):
+    """Embeds a text as its length repeated, recording every batch it is sent"""
+
+    MAX_BATCH_SIZE = 3
+
+    def __init__(self):
+        super().__init__("fake")
+        self.batches = list()
+        self.scale = 1.0
+
+    def cache_namespace(self):
+        return str(self.scale)
+
+    async def _embed(self, texts):
+        self.batches.append(list(texts))
+        return [[len(text) * self.scale] * DIMENSIONS for text in texts]
+
+
+async def embed(op, content):
+    chunks = [chunk_out async for chunk_out in op({"content": content})]
+    assert len(chunks) == 1
+    return chunks[0]["embeddings"]
+
+
+@pytest.fixture
+async def op():
+    op = FakeEmbedding()
+    await op.start()
+    return op
+
+
+async def test_single_text(op):
+    vectors = await embed(op, "hello")
+    assert vectors.shape == (1, DIMENSIONS)
+    assert vectors.dtype == np.float32
+    assert vectors.flags["C_CONTIGUOUS"]
+    assert np.all(vectors == 5)
+
+
+async def test_texts_batched_in_order(op):
+    texts = ["a" * n for n in range(1, 8)]
+    vectors = await embed(op, texts)
+    assert vectors[:, 0].tolist() == list(range(1, 8))
+    assert [len(batch) for batch in op.batches] == [3, 3, 1]
+
+
+async def test_cached_texts_not_embedded_again(op):
+    await embed(op, ["one", "three"])
+    vectors = await embed(op, ["three", "five!", "one", "five!"])
+    assert vectors[:, 0].tolist() == [5, 5, 3, 5]
+    assert op.batches == [["one", "three"], ["five!"]]
+    assert op.cache.hits == 2
+
+
+async def test_cache_separated_by_namespace(op):
+    await embed(op, "text")
+    op.scale = 2.0
+    vectors = await embed(op, "text")
+    assert np.all(vectors == 8)
+    assert len(op.batches) == 2
+
+
+async def test_invalid_content(op):
+    for content in ["", [], ["ok", ""], [1]]:
+        with pytest.raises(AssertionError):
+            await embed(op, content)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    keys = [EmbeddingCache.key("model", text) for text in ["a", "b", "c"]]
+    cache.put(keys[0], np.zeros(1))
+    cache.put(keys[1], np.zeros(1))
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], np.zeros(1))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_base64_round_trip():
+    vectors = np.random.default_rng(0).normal(size=(3, DIMENSIONS)).astype(np.float32)
+    event = to_base64(vectors)
+    assert event["shape"] == [3, DIMENSIONS]
+    assert np.array_equal(from_base64(event["embedding"], event["shape"]), vectors)
+
+
+def test_base64_single_vector_is_packed_floats():
+    import base64
+    import struct
+
+    floats = [0.5, -1.25, 3.0]
+    packed = base64.b64encode(struct.pack("<fff", *floats)).decode("utf-8")
+    assert to_base64(np.array(floats))["embedding"] == packed
+    assert from_base64(packed)[0].tolist() == floats
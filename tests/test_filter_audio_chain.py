@@ -0,0 +1,170 @@
+"""
+Unit Tests for Audio Format Negotiation
+
+Tests for where the audio filter chain converts audio between TTS, filters that need a
+format of their own and the format requested by the client.
+"""
+
+import numpy as np
+import pytest
+from utils.helpers.audio import (
+    AudioFormat,
+    UnsupportedSampleWidth,
+    from_float,
+    to_float,
+)
+from utils.operations.filter_audio.base import ChunkStream, FilterAudioOperation
+from utils.operations.filter_audio.chain import (
+    ConvertStream,
+    FilterAudioChainStream,
+    describe_plan,
+    plan_chain,
+)
+
+TTS = AudioFormat(44100, 2, 1)
+RVC = AudioFormat(16000, 2, 1)
+DISCORD = AudioFormat(48000, 2, 2)
+
+
+class PassFilter(FilterAudioOperation):
+    """Keeps any format, recording the formats it saw"""
+
+    def __init__(self, op_id: str = "pass"):
+        super().__init__(op_id)
+        self.seen = list()
+
+    async def _generate(self, audio_bytes=None, sr=None, sw=None, ch=None, **kwargs):
+        self.seen.append(AudioFormat(sr, sw, ch))
+        yield {"audio_bytes": audio_bytes, "sr": sr, "sw": sw, "ch": ch}
+
+
+class FixedFilter(PassFilter):
+    """Only works in one format, producing another"""
+
+    def __init__(self, required: AudioFormat, produced: AudioFormat):
+        super().__init__("fixed")
+        self.required, self.produced = required, produced
+
+    def input_format(self):
+        return self.required
+
+    def output_format(self, input_format):
+        return self.produced
+
+    async def _generate(self, audio_bytes=None, sr=None, sw=None, ch=None, **kwargs):
+        assert AudioFormat(sr, sw, ch) == self.required
+        self.seen.append(self.required)
+        x = to_float(audio_bytes, sw, ch)
+        x = np.repeat(x, self.produced.sr // sr, axis=0)[:, :1]
+        x = np.repeat(x, self.produced.ch, axis=1)
+        yield {
+            "audio_bytes": from_float(x, self.produced.sw),
+            **self.produced._asdict(),
+        }
+
+
+def tone(fmt: AudioFormat, seconds: float = 0.5) -> bytes:
+    t = np.arange(int(fmt.sr * seconds)) / fmt.sr
+    x = np.repeat((0.5 * np.sin(2 * np.pi * 440 * t))[:, None], fmt.ch, axis=1)
+    return from_float(x, fmt.sw)
+
+
+async def run_chain(stream, ab: bytes, fmt: AudioFormat, chunk_len: int = 4410):
+    outputs = list()
+    for i in range(0, len(ab), chunk_len):
+        outputs.extend(
+            await stream.feed({"audio_bytes": ab[i : i + chunk_len], **fmt._asdict()})
+        )
+    return outputs + await stream.flush()
+
+
+async def active(*ops):
+    for op in ops:
+        await op.start()
+    return list(ops)
+
+
+class TestPlanChain:
+    def test_nothing_to_convert(self):
+        op = PassFilter()
+        assert plan_chain([op], TTS) == [op]
+        assert plan_chain([op], TTS, TTS) == [op]
+
+    def test_downsample_before_filters(self):
+        op = PassFilter()
+        assert plan_chain([op], TTS, RVC) == [RVC, op]
+
+    def test_upsample_after_filters(self):
+        op = PassFilter()
+        assert plan_chain([op], TTS, DISCORD) == [op, DISCORD]
+
+    def test_required_input_format(self):
+        first, rvc, last = (
+            PassFilter(),
+            FixedFilter(RVC, AudioFormat(40000, 2, 1)),
+            PassFilter(),
+        )
+        plan = plan_chain([first, rvc, last], TTS, DISCORD)
+        # One conversion on either side of the fixed filter, at the lower rate
+        assert plan == [RVC, first, rvc, last, DISCORD]
+
+    def test_unknown_output_format(self):
+        rvc, last = FixedFilter(RVC, None), PassFilter()
+        assert plan_chain([rvc, last], TTS, DISCORD) == [RVC, rvc, last, DISCORD]
+
+    def test_describe(self):
+        op = PassFilter()
+        assert describe_plan(plan_chain([op], TTS, RVC), TTS) == (
+            "44100 Hz 16-bit x1 -> convert to 16000 Hz 16-bit x1 -> pass"
+        )
+
+
+class TestChainStream:
+    async def test_converts_to_target(self):
+        (op,) = await active(PassFilter())
+        stream = FilterAudioChainStream([op], DISCORD)
+        outputs = await run_chain(stream, tone(TTS), TTS)
+
+        assert op.seen and set(op.seen) == {TTS}
+        assert all(AudioFormat.of(chunk) == DISCORD for chunk in outputs)
+        out = b"".join(chunk["audio_bytes"] for chunk in outputs)
+        assert len(out) == int(DISCORD.sr * 0.5) * DISCORD.sw * DISCORD.ch
+
+    async def test_filter_gets_required_format(self):
+        rvc, last = await active(
+            FixedFilter(RVC, AudioFormat(32000, 2, 1)), PassFilter()
+        )
+        stream = FilterAudioChainStream([rvc, last])
+        outputs = await run_chain(stream, tone(TTS), TTS)
+
+        assert set(rvc.seen) == {RVC}
+        assert set(last.seen) == {AudioFormat(32000, 2, 1)}
+        assert outputs
+
+    async def test_replans_on_format_change(self):
+        (op,) = await active(PassFilter())
+        stream = FilterAudioChainStream([op], RVC)
+        outputs = await run_chain(stream, tone(TTS, 0.1), TTS)
+        outputs += await run_chain(stream, tone(DISCORD, 0.1), DISCORD, 1920)
+
+        assert set(op.seen) == {RVC}
+        assert all(AudioFormat.of(chunk) == RVC for chunk in outputs)
+
+
+class TestConvertStream:
+    async def test_output_format(self):
+        stream = ConvertStream(RVC)
+        outputs = await run_chain(stream, tone(DISCORD), DISCORD, 1920)
+        assert all(AudioFormat.of(chunk) == RVC for chunk in outputs)
+        out = b"".join(chunk["audio_bytes"] for chunk in outputs)
+        assert len(out) == RVC.sr // 2 * RVC.sw
+
+    async def test_unsupported_sample_width(self):
+        with pytest.raises(UnsupportedSampleWidth):
+            await ConvertStream(RVC).feed(
+                {"audio_bytes": b"\0" * 6, "sr": 16000, "sw": 3, "ch": 1}
+            )
+
+
+def test_default_stream():
+    assert isinstance(PassFilter().open_stream(), ChunkStream)
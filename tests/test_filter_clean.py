@@ -0,0 +1,104 @@
+"""
+Unit Tests for the Response Cleaning Filter
+
+Tests for pattern sets and for streamed cleaning matching cleaning of the full text.
+"""
+
+import random
+
+import pytest
+from utils.operations.filter_text.filter_clean import (
+    PATTERN_SETS,
+    Cleaner,
+    CleaningStream,
+    ResponseCleaningFilter,
+)
+
+SAMPLE = (
+    "[Bob]: Hello *waves* there **friend**! Check [this](https://example.com) out "
+    "\U0001f600\U0001f44d\U0001f3fd\n## Title\nSome `code`, a snake_case_name and "
+    "__bold__ text. [Alice]:   Bye* now"
+)
+
+
+def stream_clean(cleaner: Cleaner, pieces, max_carry: int = 256) -> str:
+    stream = CleaningStream(cleaner, max_carry)
+    output = list()
+    for piece in pieces:
+        output.extend(stream.feed(piece))
+    output.extend(stream.flush())
+    return "".join(output)
+
+
+class TestCleaner:
+    """Test cleaning complete texts."""
+
+    def test_default_removes_speaker_tags(self):
+        cleaner = Cleaner(["speaker_tags"])
+        assert cleaner.clean("[Bob]: Hi there. [Alice]:  Hey!") == "Hi there. Hey!"
+
+    def test_stage_directions(self):
+        cleaner = Cleaner(["stage_directions"])
+        assert cleaner.clean("Hi *waves* there") == "Hi there"
+
+    def test_markdown_keeps_text(self):
+        cleaner = Cleaner(["markdown"])
+        text = "# Title\n**bold**, *italic*, `code` and [link](https://a.b)"
+        assert cleaner.clean(text) == "Title\nbold, italic, code and link"
+
+    def test_heading_only_at_line_start(self):
+        cleaner = Cleaner(["markdown"])
+        assert cleaner.clean("Number # 1") == "Number # 1"
+
+    def test_emoji(self):
+        cleaner = Cleaner(["emoji"])
+        assert cleaner.clean("Nice \U0001f44d\U0001f3fd!") == "Nice !"
+
+    def test_no_pattern_sets(self):
+        assert Cleaner([]).clean(SAMPLE) == SAMPLE
+
+
+class TestCleaningStream:
+    """Test cleaning text arriving in pieces."""
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_random_splits_match_full_clean(self, seed):
+        rng = random.Random(seed)
+        cleaner = Cleaner(list(PATTERN_SETS))
+        cuts = sorted(rng.sample(range(1, len(SAMPLE)), rng.randint(1, 40)))
+        pieces = [SAMPLE[i:j] for i, j in zip([0] + cuts, cuts + [len(SAMPLE)])]
+
+        assert stream_clean(cleaner, pieces) == cleaner.clean(SAMPLE)
+
+    def test_character_by_character(self):
+        cleaner = Cleaner(list(PATTERN_SETS))
+        assert stream_clean(cleaner, list(SAMPLE)) == cleaner.clean(SAMPLE)
+
+    def test_releases_text_without_partial_match(self):
+        stream = CleaningStream(Cleaner(["speaker_tags"]), 256)
+        assert stream.feed("Hello there") == ["Hello there"]
+        assert stream.feed(" [Bo") == [" "]
+        assert stream.feed("b]: again") == ["again"]
+
+    def test_max_carry_bounds_held_back_text(self):
+        stream = CleaningStream(Cleaner(["stage_directions"]), 16)
+        released = "".join(stream.feed("*" + "a" * 64))
+        assert len(stream.pending) <= 16
+        assert released + stream.pending == "*" + "a" * 64
+
+
+class TestResponseCleaningFilter:
+    """Test configuration of the filter."""
+
+    async def test_unknown_pattern_set(self):
+        with pytest.raises(AssertionError):
+            await ResponseCleaningFilter().configure({"patterns": ["unknown"]})
+
+    async def test_generate(self):
+        op = ResponseCleaningFilter()
+        await op.configure({"patterns": ["speaker_tags", "emoji"]})
+        await op.start()
+        results = [chunk async for chunk in op({"content": "[Bob]: Hi \U0001f600"})]
+        await op.close()
+
+        assert results == [{"content": "Hi "}]
@@ -0,0 +1,197 @@
+"""
+Unit Tests for the Text Filter Chain
+
+Tests for filters being compiled into fused, batch and generic stages that run in the
+configured order, with metadata added by each filter carried through to the end.
+"""
+
+import pytest
+from utils.operations.base.error import UsedInactiveError
+from utils.operations.filter_text.base import FilterTextOperation, TextStream
+from utils.operations.filter_text.chain import (
+    BatchStage,
+    FilterTextChain,
+    FusedStage,
+    GenericStage,
+    compile_stages,
+)
+
+
+class FakeFilter(FilterTextOperation):
+    def __init__(self, op_id: str, calls: list):
+        super().__init__(op_id)
+        self.calls = calls
+        self.active = True
+
+
+class Suffix(FakeFilter):
+    """Fusable, appending its id to the text"""
+
+    def _apply(self, record):
+        self.calls.append(self.op_id)
+        record["content"] = record["content"] + self.op_id
+
+
+class Drop(FakeFilter):
+    """Fusable, emptying texts containing "drop" """
+
+    def _apply(self, record):
+        self.calls.append(self.op_id)
+        if "drop" in record["content"]:
+            record["content"] = ""
+        record["checked"] = True
+
+
+class Emotion(FakeFilter):
+    """Batchable, adding an emotion to each text"""
+
+    async def _generate_batch(self, contents):
+        self.calls.append((self.op_id, list(contents)))
+        return [{"content": content, "emotion": "joy"} for content in contents]
+
+
+class Words(FakeFilter):
+    """Generic, splitting text into words"""
+
+    async def _generate(self, content=None, **kwargs):
+        self.calls.append(self.op_id)
+        for word in content.split(" "):
+            yield {"content": word}
+
+
+class BarStream(TextStream):
+    splits = True
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        *complete, self.buffer = (self.buffer + text).split("|")
+        return complete
+
+    def flush(self):
+        rest, self.buffer = self.buffer, ""
+        return [rest]
+
+
+class BarSplitter(FakeFilter):
+    """Streamable, splitting text at each "|" """
+
+    def open_stream(self):
+        return BarStream()
+
+
+async def run(chain, chunk_in):
+    return [record async for record in chain(chunk_in)]
+
+
+def test_compiles_stages():
+    calls = list()
+    stages = compile_stages(
+        [
+            Suffix("a", calls),
+            Suffix("b", calls),
+            Emotion("emotion", calls),
+            Suffix("c", calls),
+            Words("words", calls),
+        ]
+    )
+    assert [type(stage) for stage in stages] == [
+        FusedStage,
+        BatchStage,
+        FusedStage,
+        GenericStage,
+    ]
+    assert [op.op_id for op in stages[0].ops] == ["a", "b"]
+
+
+async def test_runs_in_configured_order():
+    calls = list()
+    chain = FilterTextChain(
+        [
+            Suffix("1", calls),
+            Emotion("emotion", calls),
+            Suffix("2", calls),
+            Words("words", calls),
+        ]
+    )
+    records = await run(chain, {"content": "hi there"})
+    assert calls == ["1", ("emotion", ["hi there1"]), "2", "words"]
+    assert [record["content"] for record in records] == ["hi", "there12"]
+
+
+async def test_merges_metadata_across_stages():
+    calls = list()
+    chain = FilterTextChain(
+        [Drop("drop", calls), Emotion("emotion", calls), Words("words", calls)]
+    )
+    records = await run(chain, {"content": "so happy", "job_id": "job"})
+    assert [record["content"] for record in records] == ["so", "happy"]
+    for record in records:
+        # From the input, a fused filter and a batch filter, kept on each split
+        assert record["job_id"] == "job"
+        assert record["checked"]
+        assert record["emotion"] == "joy"
+
+
+async def test_drops_empty_records():
+    calls = list()
+    chain = FilterTextChain(
+        [Drop("drop", calls), Suffix("a", calls), Emotion("emotion", calls)]
+    )
+    assert await run(chain, {"content": "please drop this"}) == []
+    # Later filters never see it
+    assert calls == ["drop"]
+
+
+async def test_generic_filter_drops_empty_splits():
+    calls = list()
+    chain = FilterTextChain([Words("words", calls), Suffix("!", calls)])
+    records = await run(chain, {"content": "a  b"})
+    assert [record["content"] for record in records] == ["a!", "b!"]
+
+
+async def test_no_filters():
+    chain = FilterTextChain([])
+    assert await run(chain, {"content": "as is"}) == [{"content": "as is"}]
+
+
+async def test_stream_joins_pieces_without_stream_filters():
+    calls = list()
+    chain = FilterTextChain([Suffix("!", calls), Emotion("emotion", calls)])
+
+    async def pieces():
+        for piece in ["Hello ", "there"]:
+            yield {"content": piece}
+
+    records = [record async for record in chain.stream(pieces())]
+    assert records == [{"content": "Hello there!", "emotion": "joy"}]
+
+
+async def test_stream_batches_pieces_split_together():
+    calls = list()
+    chain = FilterTextChain([BarSplitter("split", calls), Emotion("emotion", calls)])
+
+    async def pieces():
+        for piece in ["a|b|c", "d|", "e|f|g"]:
+            yield {"content": piece}
+
+    records = [record async for record in chain.stream(pieces())]
+    assert [record["content"] for record in records] == ["a", "b", "cd", "e", "f", "g"]
+    # Pieces completed by the same input are one batch
+    assert calls == [
+        ("emotion", ["a", "b"]),
+        ("emotion", ["cd"]),
+        ("emotion", ["e", "f"]),
+        ("emotion", ["g"]),
+    ]
+
+
+async def test_inactive_filter():
+    calls = list()
+    inactive = Suffix("b", calls)
+    inactive.active = False
+    chain = FilterTextChain([Suffix("a", calls), inactive])
+    with pytest.raises(UsedInactiveError):
+        await run(chain, {"content": "text"})
+    assert calls == []
@@ -0,0 +1,257 @@
+"""
+Unit Tests for the Resource Lifecycle Manager
+
+Tests for idle resources being unloaded under memory pressure and loaded again on use,
+for resources likely to be used next being prefetched, and for loaded resources being
+kept within a memory budget, measured including GPU memory.
+"""
+
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from utils.lifecycle import LifecycleManager, ManagedResource
+
+
+class FakeResource(ManagedResource):
+    def __init__(self, resource_id: str, load_time: float = 0):
+        super().__init__(resource_id)
+        self.loaded = False
+        self.load_time = load_time
+
+    def is_loaded(self):
+        return self.loaded
+
+    async def _load(self):
+        await asyncio.sleep(self.load_time)
+        self.loaded = True
+
+    async def _unload(self):
+        self.loaded = False
+
+
+class SizedResource(FakeResource):
+    """Holds a fixed number of megabytes while loaded"""
+
+    def __init__(self, resource_id: str, megabytes: int):
+        super().__init__(resource_id)
+        self.size = megabytes * 1024 * 1024
+
+    async def _load(self):
+        await super()._load()
+        self.measured_footprint = self.size
+
+    def footprint(self):
+        return self.size if self.loaded else 0
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    LifecycleManager.instance = None
+    manager = LifecycleManager()
+    monkeypatch.setattr(manager, "memory_percent", lambda: 90.0)
+    yield manager
+    LifecycleManager.instance = None
+
+
+def make_idle(resource: FakeResource, seconds: float):
+    resource.last_used = time.monotonic() - seconds
+
+
+async def test_loaded_on_use():
+    resource = FakeResource("model")
+    async with resource.use():
+        assert resource.is_loaded()
+        assert resource.users == 1
+    assert resource.users == 0
+    assert resource.loads == 1
+
+
+async def test_not_evicted_while_used():
+    resource = FakeResource("model")
+    async with resource.use():
+        assert not await resource.evict()
+    assert await resource.evict()
+    assert not resource.is_loaded()
+
+
+async def test_use_while_unloading_loads_again():
+    class SlowUnload(FakeResource):
+        async def _unload(self):
+            await asyncio.sleep(0.05)
+            self.loaded = False
+
+    resource = SlowUnload("model")
+    await resource.ensure_loaded()
+    evicting = asyncio.create_task(resource.evict())
+    await asyncio.sleep(0.01)  # evict is waiting on _unload
+
+    async with resource.use():
+        await asyncio.sleep(0.1)  # the unload has finished by now
+        assert resource.is_loaded()
+    assert await evicting
+    assert resource.loads == 2
+
+
+async def test_evicts_idle_under_pressure(manager):
+    await manager.configure({"enabled": True, "idle_timeout": 60})
+    idle, recent = FakeResource("idle"), FakeResource("recent")
+    for resource in [idle, recent]:
+        manager.register(resource)
+        await resource.ensure_loaded()
+    make_idle(idle, 120)
+    make_idle(recent, 10)
+
+    assert await manager.evict_idle() == ["idle"]
+    assert not idle.is_loaded() and recent.is_loaded()
+
+    # Loaded again when next used
+    async with idle.use():
+        assert idle.is_loaded()
+    assert idle.loads == 2
+
+
+async def test_kept_without_pressure(manager, monkeypatch):
+    await manager.configure(
+        {"enabled": True, "idle_timeout": 60, "memory_threshold": 95}
+    )
+    resource = FakeResource("model")
+    manager.register(resource)
+    await resource.ensure_loaded()
+    make_idle(resource, 120)
+    assert await manager.evict_idle() == []
+
+    await manager.configure({"enabled": False, "memory_threshold": 0})
+    assert await manager.evict_idle() == []
+    assert resource.is_loaded()
+
+
+async def test_evicts_least_recently_used_until_relieved(manager, monkeypatch):
+    await manager.configure({"enabled": True, "idle_timeout": 60})
+    resources = [FakeResource("model-{}".format(i)) for i in range(3)]
+    for i, resource in enumerate(resources):
+        manager.register(resource)
+        await resource.ensure_loaded()
+        make_idle(resource, 100 + i * 100)
+
+    # Pressure is relieved once one resource is unloaded
+    monkeypatch.setattr(
+        manager,
+        "memory_percent",
+        lambda: 90.0 if all(r.is_loaded() for r in resources) else 50.0,
+    )
+    assert await manager.evict_idle() == ["model-2"]
+
+
+async def test_prefetches_what_follows(manager):
+    await manager.configure({"enabled": True, "prefetch_probability": 0.5})
+    t2t, tts = FakeResource("t2t"), FakeResource("tts", load_time=0.05)
+    for resource in [t2t, tts]:
+        manager.register(resource)
+
+    for _ in range(2):
+        async with t2t.use():
+            pass
+        async with tts.use():
+            pass
+    assert manager.predict("t2t") == ["tts"]
+
+    await tts.evict()
+    async with t2t.use():
+        pass
+    task = manager.prefetches["tts"]
+    await task
+    assert tts.is_loaded()
+    assert tts.loads == 2
+
+
+async def test_stats(manager):
+    resource = FakeResource("model")
+    manager.register(resource)
+    async with resource.use():
+        stats = manager.get_stats()
+    assert stats["resources"]["model"]["loaded"]
+    assert stats["resources"]["model"]["users"] == 1
+    assert stats["resources"]["model"]["footprint"] >= 0
+
+    manager.unregister(resource)
+    assert manager.get_stats()["resources"] == {}
+
+
+async def test_unloads_least_recently_used_over_budget(manager):
+    await manager.configure({"enabled": True, "memory_budget": 250})
+    tts, rvc, filter = [
+        SizedResource(resource_id, 100) for resource_id in ["tts", "rvc", "filter"]
+    ]
+    for resource in [tts, rvc, filter]:
+        manager.register(resource)
+    await tts.ensure_loaded()
+    await rvc.ensure_loaded()
+    make_idle(tts, 5)
+    make_idle(rvc, 10)
+
+    # Loading the third goes over, so the least recently used is unloaded
+    await filter.ensure_loaded()
+    await manager.budget_task
+    assert not rvc.is_loaded()
+    assert tts.is_loaded() and filter.is_loaded()
+    assert manager.resident() <= manager.budget_bytes()
+
+
+async def test_makes_room_before_loading_again(manager):
+    await manager.configure({"enabled": True, "memory_budget": 250})
+    tts, rvc = SizedResource("tts", 100), SizedResource("rvc", 100)
+    large = SizedResource("large", 200)
+    for resource in [tts, rvc, large]:
+        manager.register(resource)
+    await tts.ensure_loaded()
+    await rvc.ensure_loaded()
+    make_idle(tts, 5)
+    make_idle(rvc, 10)
+
+    large.measured_footprint = large.size  # as measured when last loaded
+    await large.ensure_loaded()
+    assert not tts.is_loaded() and not rvc.is_loaded()
+    assert large.is_loaded()
+
+
+async def test_budget_keeps_what_is_in_use(manager):
+    await manager.configure({"enabled": True, "memory_budget": 150})
+    tts, rvc = SizedResource("tts", 100), SizedResource("rvc", 100)
+    manager.register(tts)
+    manager.register(rvc)
+    async with tts.use():
+        await rvc.ensure_loaded()
+        await manager.budget_task
+        assert tts.is_loaded() and rvc.is_loaded()
+    assert await manager.enforce_budget(keep=rvc) == ["tts"]
+
+
+async def test_no_budget_by_default(manager):
+    await manager.configure({"enabled": True})
+    resource = SizedResource("model", 100)
+    manager.register(resource)
+    await resource.ensure_loaded()
+    assert await manager.enforce_budget() == []
+    assert resource.is_loaded()
+
+
+async def test_footprint_includes_gpu_memory(monkeypatch):
+    allocated = {0: 0, 1: 0}
+    cuda = SimpleNamespace(
+        is_available=lambda: True,
+        device_count=lambda: len(allocated),
+        memory_allocated=lambda device: allocated[device],
+    )
+    monkeypatch.setitem(sys.modules, "torch", SimpleNamespace(cuda=cuda))
+
+    class GPUResource(FakeResource):
+        async def _load(self):
+            await super()._load()
+            allocated[1] += 500 * 1024 * 1024  # weights moved to the second GPU
+
+    resource = GPUResource("model")
+    await resource.ensure_loaded()
+    assert resource.measured_footprint >= 500 * 1024 * 1024
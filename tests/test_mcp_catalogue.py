@@ -0,0 +1,42 @@
+"""
+Unit Tests for the MCP Catalogue Cache
+
+Tests for what MCP servers offer being saved per server command and read back after a
+restart.
+"""
+
+from utils.helpers.mcp_catalogue import CatalogueCache, catalogue_key
+
+SERVER = {"name": "example", "version": "1.0.0"}
+TOOLS = [{"name": "roll_dice", "description": "Roll dice", "inputSchema": {}}]
+
+
+def test_key_follows_command():
+    key = catalogue_key("python", ["server.py"], "models/mcp/example")
+    assert key == catalogue_key("python", ["server.py"], "models/mcp/example")
+    assert key != catalogue_key("python", ["other.py"], "models/mcp/example")
+    assert key != catalogue_key("python", ["server.py"], "models/mcp/other")
+
+
+def test_save_and_load(tmp_path):
+    cache = CatalogueCache(str(tmp_path / "catalogue"))
+    key = catalogue_key("python", ["server.py"])
+    assert cache.load(key) is None
+
+    cache.save(key, SERVER, TOOLS, [], [])
+    record = CatalogueCache(str(tmp_path / "catalogue")).load(key)
+    assert record["server"] == SERVER
+    assert record["tools"] == TOOLS
+    assert record["resources"] == [] and record["templates"] == []
+
+    cache.clear(key)
+    assert cache.load(key) is None
+
+
+def test_unreadable_catalogue_is_ignored(tmp_path):
+    cache = CatalogueCache(str(tmp_path))
+    key = catalogue_key("python")
+    (tmp_path / "{}.json".format(key)).write_text('{"server": {"na')
+    assert cache.load(key) is None
+    (tmp_path / "{}.json".format(key)).write_text('{"server": {}, "tools": []}')
+    assert cache.load(key) is None
@@ -0,0 +1,204 @@
+"""
+Unit Tests for Starting MCP Servers
+
+Tests for servers being started at once, attached once ready when slower than their
+startup timeout, offered from their saved catalogue before they are ready, and dropped
+when they fail. Sessions are faked, so the mcp package isn't needed.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from utils.helpers.mcp_catalogue import CatalogueCache
+from utils.helpers.mcp_session import ServerGroup, ServerSession
+
+DELAY = 0.2
+
+
+class FakeServer:
+    """What a server does once spawned, and how often it was asked"""
+
+    def __init__(self, name, delay=0.0, fail=False, version="1.0.0"):
+        self.name = name
+        self.version = version
+        self.delay = delay
+        self.fail = fail
+        self.tools = [{"name": "{}_tool".format(name)}]
+        self.initializations = 0
+        self.listings = 0
+        self.exited = False
+
+    @asynccontextmanager
+    async def connect(self):
+        try:
+            yield FakeSession(self)
+        finally:
+            self.exited = True
+
+
+class FakeSession:
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    async def initialize(self):
+        self.server.initializations += 1
+        await asyncio.sleep(self.server.delay)
+        if self.server.fail:
+            raise ConnectionError("server crashed")
+        return SimpleNamespace(
+            serverInfo=SimpleNamespace(
+                name=self.server.name, version=self.server.version
+            )
+        )
+
+    async def list_tools(self):
+        self.server.listings += 1
+        return SimpleNamespace(tools=list(self.server.tools))
+
+    async def list_resources(self):
+        return SimpleNamespace(resources=list())
+
+    async def list_resource_templates(self):
+        raise NotImplementedError  # servers may not support every list
+
+
+class Group(ServerGroup):
+    def __init__(self):
+        super().__init__(on_update=self.count_update, on_drop=self.record_drop)
+        self.updates = 0
+        self.dropped = list()
+
+    def count_update(self):
+        self.updates += 1
+
+    def record_drop(self, client):
+        self.dropped.append(client.server_id)
+
+
+def make_client(server: FakeServer, catalogue: CatalogueCache = None):
+    return ServerSession(
+        server.name, server.connect, catalogue=catalogue, catalogue_key=server.name
+    )
+
+
+async def test_starts_servers_at_once():
+    group = Group()
+    servers = [FakeServer(name, delay=DELAY) for name in ["a", "b", "c"]]
+    start = time.perf_counter()
+    await asyncio.gather(*[group.add(make_client(server)) for server in servers])
+    assert time.perf_counter() - start < DELAY * 2
+
+    # Kept in the order they were added, each ready with what it offers
+    assert list(group.clients) == ["a", "b", "c"]
+    for name, client in group.clients.items():
+        assert client.ready.is_set()
+        assert client.tools == [{"name": "{}_tool".format(name)}]
+        assert client.templates == []
+    await group.close()
+    assert all(server.exited for server in servers)
+
+
+async def test_slow_server_attached_once_ready():
+    group = Group()
+    server = FakeServer("slow", delay=DELAY * 2)
+    client = make_client(server)
+    start = time.perf_counter()
+    await group.add(client, startup_timeout=DELAY / 4)
+    assert time.perf_counter() - start < DELAY
+
+    # Listed, but offering nothing until ready
+    assert list(group.clients) == ["slow"]
+    assert not client.ready.is_set()
+    assert client.tools == []
+    assert group.updates == 0
+
+    await asyncio.wait_for(client.ready.wait(), DELAY * 4)
+    assert client.tools == [{"name": "slow_tool"}]
+    assert group.updates == 1  # catalogue and prompts rebuilt
+    await group.close()
+
+
+async def test_saved_catalogue_offered_before_ready(tmp_path):
+    catalogue = CatalogueCache(str(tmp_path / "catalogue"))
+    first = FakeServer("cached")
+    group = Group()
+    await group.add(make_client(first, catalogue))
+    await group.close()
+
+    # After a restart, offered straight away from the saved catalogue
+    server = FakeServer("cached", delay=DELAY)
+    client = make_client(server, catalogue)
+    group = Group()
+    start = time.perf_counter()
+    await group.add(client, startup_timeout=DELAY * 4)
+    assert time.perf_counter() - start < DELAY / 2
+    assert not client.ready.is_set()
+    assert client.tools == [{"name": "cached_tool"}]
+    assert group.updates == 1
+
+    # Calls wait for the session
+    session = await asyncio.wait_for(client.get_session(), DELAY * 4)
+    assert session is client.session
+    # Same name and version, so not listed again
+    assert server.listings == 0
+    assert group.updates == 1
+    await group.close()
+
+
+async def test_saved_catalogue_refreshed_on_new_version(tmp_path):
+    catalogue = CatalogueCache(str(tmp_path / "catalogue"))
+    group = Group()
+    await group.add(make_client(FakeServer("server"), catalogue))
+    await group.close()
+
+    upgraded = FakeServer("server", version="2.0.0")
+    upgraded.tools = [{"name": "new_tool"}]
+    client = make_client(upgraded, catalogue)
+    group = Group()
+    await group.add(client)
+    await asyncio.wait_for(client.ready.wait(), DELAY * 4)
+    assert upgraded.listings == 1
+    assert client.tools == [{"name": "new_tool"}]
+    assert catalogue.load("server")["tools"] == [{"name": "new_tool"}]
+    await group.close()
+
+
+async def test_failed_server_dropped():
+    group = Group()
+    good, bad = FakeServer("good"), FakeServer("bad", fail=True)
+    await asyncio.gather(
+        group.add(make_client(good)), group.add(make_client(bad), startup_timeout=1)
+    )
+    assert list(group.clients) == ["good"]
+    assert group.dropped == ["bad"]
+    await group.close()
+
+
+async def test_calls_to_failed_server_fail(tmp_path):
+    catalogue = CatalogueCache(str(tmp_path / "catalogue"))
+    group = Group()
+    await group.add(make_client(FakeServer("server"), catalogue))
+    await group.close()
+
+    # Offered from the catalogue, then fails to start
+    client = make_client(FakeServer("server", delay=DELAY / 4, fail=True), catalogue)
+    group = Group()
+    await group.add(client)
+    assert "server" in group.clients
+    with pytest.raises(Exception, match="not running"):
+        await asyncio.wait_for(client.get_session(), DELAY * 4)
+    assert group.dropped == ["server"]
+    assert group.clients == {}
+
+
+async def test_remove_and_close_while_starting():
+    group = Group()
+    server = FakeServer("slow", delay=10)
+    await group.add(make_client(server), startup_timeout=0.01)
+    assert await group.remove("slow")
+    assert not await group.remove("slow")
+    assert group.clients == {}
+    assert group.dropped == []  # closed, not failed
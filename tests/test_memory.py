@@ -0,0 +1,150 @@
+"""
+Unit Tests for Long-Term Memory
+
+Tests for the on-disk vector index, searched exhaustively and through its inverted file,
+and for lines evicted from history being remembered and recalled.
+"""
+
+import asyncio
+import datetime
+import os
+
+import numpy as np
+import pytest
+from utils.config import Config
+from utils.memory import MemoryStore, VectorIndex
+from utils.memory.index import ITEMS_FILE, VECTORS_FILE, normalize
+from utils.prompter.message import ChatMessage
+
+DIMENSIONS = 16
+
+
+def random_vectors(count: int, seed: int = 0) -> np.ndarray:
+    return normalize(np.random.default_rng(seed).normal(size=(count, DIMENSIONS)))
+
+
+def items(count: int, start: int = 0):
+    return [{"id": i} for i in range(start, start + count)]
+
+
+def test_empty_index(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    assert len(index) == 0
+    assert index.search(np.ones(DIMENSIONS), 5) == []
+
+
+def test_flat_search(tmp_path):
+    vectors = random_vectors(100)
+    index = VectorIndex(str(tmp_path))
+    index.add(vectors[:60], items(60))
+    index.add(vectors[60:], items(40, 60))
+    assert not index.is_ivf
+
+    results = index.search(vectors[42] * 3, 3)
+    assert len(results) == 3
+    assert results[0][1] == {"id": 42}
+    assert results[0][0] == pytest.approx(1.0, abs=1e-5)
+    assert results[0][0] >= results[1][0] >= results[2][0]
+
+
+def test_min_score(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add(np.eye(DIMENSIONS)[:2], items(2))
+    results = index.search(np.eye(DIMENSIONS)[0], 2, min_score=0.5)
+    assert [item for _, item in results] == [{"id": 0}]
+
+
+def test_dimension_mismatch(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add(random_vectors(2), items(2))
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, DIMENSIONS + 1)), items(1))
+    with pytest.raises(ValueError):
+        index.search(np.ones(DIMENSIONS + 1), 1)
+
+
+def test_reopened_from_disk(tmp_path):
+    vectors = random_vectors(50)
+    VectorIndex(str(tmp_path)).add(vectors, items(50))
+
+    index = VectorIndex(str(tmp_path))
+    assert len(index) == 50
+    assert index.search(vectors[7], 1)[0][1] == {"id": 7}
+
+
+def test_reopened_after_interrupted_add(tmp_path):
+    vectors = random_vectors(10)
+    VectorIndex(str(tmp_path)).add(vectors, items(10))
+    # Items of an add were written but its vectors only partly
+    with open(tmp_path / ITEMS_FILE, "a") as f:
+        f.write('{"id": 10}\n{"id": 11}\n')
+    with open(tmp_path / VECTORS_FILE, "ab") as f:
+        f.write(b"\0" * 10)
+
+    index = VectorIndex(str(tmp_path))
+    assert len(index) == 10
+    index.add(vectors[:1], [{"id": "again"}])
+    assert len(VectorIndex(str(tmp_path))) == 11
+
+
+def test_ivf_matches_flat(tmp_path):
+    rng = np.random.default_rng(1)
+    topics = random_vectors(20, seed=2)
+    vectors = normalize(
+        topics[rng.integers(20, size=2000)] + rng.normal(0, 0.1, (2000, DIMENSIONS))
+    )
+    flat = VectorIndex(str(tmp_path / "flat"))
+    ivf = VectorIndex(str(tmp_path / "ivf"), ivf_threshold=1000, nprobe=8)
+    for i in range(0, 2000, 500):
+        flat.add(vectors[i : i + 500], items(500, i))
+        ivf.add(vectors[i : i + 500], items(500, i))
+    assert ivf.is_ivf
+    assert sum(len(ids) for ids in ivf.lists) == 2000
+
+    for query in vectors[:50]:
+        assert ivf.search(query, 1)[0][1] == flat.search(query, 1)[0][1]
+
+    # Lists are reloaded rather than clustered again
+    reopened = VectorIndex(str(tmp_path / "ivf"), ivf_threshold=1000)
+    assert reopened.is_ivf
+    assert reopened.search(vectors[3], 1)[0][1] == {"id": 3}
+
+
+class FakeMemoryStore(MemoryStore):
+    """Embeds a line as counts of its letters"""
+
+    async def _embed(self, texts):
+        vectors = np.zeros((len(texts), 26), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for c in text.lower():
+                if "a" <= c <= "z":
+                    vectors[i, ord(c) - ord("a")] += 1
+        return "fake", vectors
+
+
+def chat(message: str) -> ChatMessage:
+    return ChatMessage("user", message, datetime.datetime(2025, 1, 1))
+
+
+async def test_remember_and_recall(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config(), "MEMORY_DIR", str(tmp_path))
+    store = FakeMemoryStore()
+    await store.configure({"enabled": True, "top_k": 1, "min_score": 0.0})
+
+    store.remember([chat("zzzz zzz"), chat("bbbb bbb"), chat("qqq qqqq")])
+    await store.worker
+    assert len(store._get_index("fake")) == 3
+    assert os.listdir(tmp_path)
+
+    assert await store.recall([chat("q")]) == ["[user]: qqq qqqq"]
+
+
+async def test_disabled_store_does_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config(), "MEMORY_DIR", str(tmp_path))
+    store = FakeMemoryStore()
+    await store.configure({"enabled": False})
+    store.remember([chat("hello")])
+    assert store.worker is None or store.worker.done()
+    assert await store.recall([chat("hello")]) == []
+    await asyncio.sleep(0)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,118 @@
+"""
+Unit Tests for the Model Worker
+
+Tests for handing calls off to a worker that owns a blocking model, in both thread and
+process mode.
+"""
+
+import asyncio
+import time
+from functools import partial
+
+import pytest
+from utils.helpers.model_worker import ModelWorker, ModelWorkerError
+
+
+def load_model(prefix: str = "model"):
+    return prefix
+
+
+def load_broken():
+    raise ValueError("no weights")
+
+
+def run_model(model, text: str, pieces: int = 3, delay: float = 0.0):
+    """Stands in for a blocking synthesis, producing output piece by piece"""
+    for i in range(pieces):
+        time.sleep(delay)
+        yield "{}:{}:{}".format(model, text, i)
+
+
+def run_failing(model, text: str):
+    yield "first"
+    raise RuntimeError("synthesis failed")
+
+
+async def collect(worker: ModelWorker, *args, **kwargs):
+    return [output async for output in worker.stream(*args, **kwargs)]
+
+
+class TestThreadWorker:
+    """Test the worker in thread mode."""
+
+    async def test_outputs_in_order(self):
+        worker = ModelWorker(partial(load_model, "m"), run_model)
+        await worker.start()
+        assert await collect(worker, "hi") == ["m:hi:0", "m:hi:1", "m:hi:2"]
+        await worker.stop()
+        assert not worker.running
+
+    async def test_event_loop_keeps_running(self):
+        worker = ModelWorker(load_model, run_model)
+        await worker.start()
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await collect(worker, "hi", pieces=5, delay=0.02)
+        task.cancel()
+        await worker.stop()
+
+        assert ticks >= 5
+
+    async def test_cancel_stops_at_next_output(self):
+        worker = ModelWorker(load_model, run_model)
+        await worker.start()
+
+        stream = worker.stream("long", pieces=100, delay=0.01)
+        assert await stream.__anext__() == "model:long:0"
+        await stream.aclose()
+
+        # The worker moves on to the next call instead of finishing all 100 pieces
+        start = time.perf_counter()
+        assert await collect(worker, "next", pieces=1) == ["model:next:0"]
+        assert time.perf_counter() - start < 0.5
+        await worker.stop()
+
+    async def test_bounded_queue(self):
+        worker = ModelWorker(load_model, run_model, max_queue=1)
+        await worker.start()
+
+        first = asyncio.create_task(collect(worker, "a", pieces=2, delay=0.05))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(collect(worker, "b", pieces=1))
+        await asyncio.sleep(0.02)
+        assert not second.done()  # waiting for a slot
+
+        assert await first == ["model:a:0", "model:a:1"]
+        assert await second == ["model:b:0"]
+        await worker.stop()
+
+    async def test_call_error(self):
+        worker = ModelWorker(load_model, run_failing)
+        await worker.start()
+        with pytest.raises(ModelWorkerError, match="synthesis failed"):
+            await collect(worker, "hi")
+        await worker.stop()
+
+    async def test_load_error(self):
+        worker = ModelWorker(load_broken, run_model)
+        with pytest.raises(ModelWorkerError, match="no weights"):
+            await worker.start()
+
+
+class TestProcessWorker:
+    """Test the worker in process mode."""
+
+    async def test_outputs_in_order(self):
+        worker = ModelWorker(partial(load_model, "p"), run_model, mode="process")
+        await worker.start()
+        assert await collect(worker, "hi", pieces=2) == ["p:hi:0", "p:hi:1"]
+        await worker.stop()
+        assert not worker.running
@@ -0,0 +1,161 @@
+"""
+Unit Tests for PCM Streaming Helpers
+
+Tests for framing streamed PCM, reading streamed WAV headers and TTS output arriving
+while synthesis is still running, framed as raw PCM and as a streamed WAV file.
+"""
+
+import asyncio
+import io
+import struct
+import wave
+
+import pytest
+from utils.helpers.pcm import (
+    PCMFramer,
+    WavFormatError,
+    WavStreamParser,
+    from_wav,
+    scratch_file,
+    stream_pcm,
+    stream_wav,
+    to_wav,
+    wav_file,
+)
+from utils.operations.tts.base import TTSOperation
+
+
+def make_wav(frames: bytes, sr: int = 16000, sw: int = 2, ch: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setframerate(sr)
+        f.setsampwidth(sw)
+        f.setnchannels(ch)
+        f.writeframes(frames)
+    return buffer.getvalue()
+
+
+async def pieces(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+class SlowTTS(TTSOperation):
+    """Produces one piece of PCM per tick, like a network synthesis backend"""
+
+    def __init__(self):
+        super().__init__("slow")
+        self.finished = asyncio.Event()
+
+    async def configure(self, config_d):
+        return
+
+    async def get_configuration(self):
+        return {}
+
+    async def _synthesize(self):
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            yield b"\x01\x00" * 441  # 10 ms at 44.1 kHz
+        self.finished.set()
+
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
+        async for chunk_out in stream_pcm(self._synthesize(), 44100, 2, 1, frame_ms):
+            yield chunk_out
+
+
+class SlowWavTTS(SlowTTS):
+    """Sends a WAV file as it is synthesized, its sizes unknown like OpenAI's wav"""
+
+    async def _send_wav(self):
+        header = make_wav(b"", sr=44100)
+        # Sizes left at their maximum, as the length isn't known when it is sent
+        yield header[:4] + struct.pack("<I", 0xFFFFFFFF) + header[8:-4]
+        yield struct.pack("<I", 0xFFFFFFFF)
+        async for data in self._synthesize():
+            yield data
+
+    async def _generate(self, content: str = None, frame_ms: float = None, **kwargs):
+        async for chunk_out in stream_wav(self._send_wav(), frame_ms):
+            yield chunk_out
+
+
+class TestPCMFramer:
+    """Test regrouping received bytes into frames."""
+
+    def test_frames_of_whole_samples(self):
+        framer = PCMFramer(1000, 2, 2, 10)  # 10 samples of 4 bytes per frame
+        assert framer.push(b"\x00" * 30) == []
+        frames = framer.push(b"\x00" * 53)
+
+        assert [len(frame) for frame in frames] == [40, 40]
+        assert len(framer.flush()) == 0  # 3 bytes left, not a whole sample
+
+    def test_flush_returns_partial_frame(self):
+        framer = PCMFramer(1000, 2, 1, 10)
+        framer.push(b"\x00" * 7)
+        assert len(framer.flush()) == 6
+        assert framer.flush() == b""
+
+
+class TestWavStreamParser:
+    """Test reading WAV files as they are received."""
+
+    @pytest.mark.parametrize("size", [1, 7, 44, 4096])
+    async def test_stream_wav_matches_file(self, size):
+        frames = bytes(range(256)) * 8
+        chunks = [c async for c in stream_wav(pieces(make_wav(frames, ch=2), size), 20)]
+
+        assert b"".join(c["audio_bytes"] for c in chunks) == frames
+        assert {(c["sr"], c["sw"], c["ch"]) for c in chunks} == {(16000, 2, 2)}
+        assert all(len(c["audio_bytes"]) == 1280 for c in chunks[:-1])
+
+    def test_not_a_wav(self):
+        with pytest.raises(WavFormatError):
+            WavStreamParser().push(b"OggS" + b"\x00" * 20)
+
+
+class TestInMemoryWav:
+    """Test converting audio without files on disk."""
+
+    def test_wav_round_trip(self):
+        frames = bytes(range(256)) * 4
+        assert from_wav(to_wav(frames, 22050, 2, 2)) == (frames, 22050, 2, 2)
+
+    def test_scratch_files_are_unique(self):
+        with scratch_file() as first, scratch_file() as second:
+            assert first != second
+            with open(first, "wb") as f:
+                f.write(b"first")
+            with open(second, "wb") as f:
+                f.write(b"second")
+            with open(first, "rb") as f:
+                assert f.read() == b"first"
+
+    def test_wav_file(self):
+        frames = b"\x01\x02" * 100
+        with wav_file(frames, 16000, 2, 1) as path:
+            with wave.open(path, "rb") as f:
+                assert f.readframes(f.getnframes()) == frames
+                assert f.getframerate() == 16000
+
+
+class TestStreamingTTS:
+    """Test TTS output being streamed."""
+
+    @pytest.mark.parametrize("tts_class", [SlowTTS, SlowWavTTS])
+    async def test_first_audio_before_synthesis_finishes(self, tts_class):
+        op = tts_class()
+        await op.start()
+
+        received = 0
+        async for chunk_out in op({"content": "Hello there", "frame_ms": 20}):
+            if received == 0:
+                assert not op.finished.is_set()
+                assert len(chunk_out["audio_bytes"]) == 882 * 2
+                assert chunk_out["sr"] == 44100
+            received += len(chunk_out["audio_bytes"])
+        await op.close()
+
+        assert op.finished.is_set()
+        assert received == 441 * 2 * 10
@@ -0,0 +1,92 @@
+"""
+Unit Tests for Native Pitch Shifting
+
+Tests for the shifted frequency, preserved duration and streamed output matching
+output for the whole audio at once.
+"""
+
+import numpy as np
+import pytest
+from utils.helpers.audio import from_float, to_float
+from utils.helpers.pitch import PitchShifter
+from utils.operations.filter_audio.chain import FilterAudioChainStream
+from utils.operations.filter_audio.pitch import PitchFilter
+
+SR = 16000
+
+
+def tone(freq: float, seconds: float = 1.0, sr: int = SR) -> bytes:
+    t = np.arange(int(sr * seconds)) / sr
+    return from_float((0.5 * np.sin(2 * np.pi * freq * t))[:, None], 2)
+
+
+def dominant_frequency(ab: bytes, sr: int = SR) -> float:
+    x = to_float(ab, 2, 1)[:, 0]
+    x = x[len(x) // 4 : -len(x) // 4]  # Away from the edges
+    spectrum = np.abs(np.fft.rfft(x * np.hanning(len(x))))
+    return np.argmax(spectrum) * sr / len(x)
+
+
+class TestPitchShifter:
+    @pytest.mark.parametrize("semitones,expected", [(12, 880), (-12, 220), (7, 659)])
+    def test_frequency_shifted(self, semitones, expected):
+        shifter = PitchShifter(SR, 2, 1, semitones)
+        out = shifter.process(tone(440)) + shifter.flush()
+        assert dominant_frequency(out) == pytest.approx(expected, rel=0.03)
+
+    @pytest.mark.parametrize("semitones", [-5, 3])
+    def test_duration_preserved(self, semitones):
+        ab = tone(440, 0.73)
+        shifter = PitchShifter(SR, 2, 1, semitones)
+        assert len(shifter.process(ab) + shifter.flush()) == len(ab)
+
+    def test_streamed_matches_whole(self):
+        ab = tone(300, 0.5)
+        whole = PitchShifter(SR, 2, 1, 4)
+        expected = whole.process(ab) + whole.flush()
+
+        streamed = PitchShifter(SR, 2, 1, 4)
+        out = b"".join(
+            streamed.process(ab[i : i + 322]) for i in range(0, len(ab), 322)
+        )
+        assert out + streamed.flush() == expected
+
+    def test_zero_is_passthrough(self):
+        ab = tone(440, 0.1)
+        shifter = PitchShifter(SR, 2, 1, 0)
+        assert shifter.process(ab) + shifter.flush() == ab
+
+    def test_stereo(self):
+        ab = from_float(np.repeat(to_float(tone(440), 2, 1), 2, axis=1), 2)
+        shifter = PitchShifter(SR, 2, 2, 12)
+        out = shifter.process(ab) + shifter.flush()
+        assert len(out) == len(ab)
+        mono = from_float(to_float(out, 2, 2)[:, :1], 2)
+        assert dominant_frequency(mono) == pytest.approx(880, rel=0.03)
+
+
+class TestPitchFilter:
+    async def test_configure(self):
+        op = PitchFilter()
+        await op.configure({"pitch_amount": "2.5"})
+        assert (await op.get_configuration()) == {"pitch_amount": 2.5}
+
+        with pytest.raises(AssertionError):
+            await op.configure({"pitch_amount": 30})
+
+    async def test_stream_over_chunks(self):
+        op = PitchFilter()
+        await op.configure({"pitch_amount": 12})
+        stream = FilterAudioChainStream([op])
+
+        ab = tone(440)
+        outputs = list()
+        for i in range(0, len(ab), 3200):
+            chunk = {"audio_bytes": ab[i : i + 3200], "sr": SR, "sw": 2, "ch": 1}
+            outputs.extend(await stream.feed(chunk))
+        outputs.extend(await stream.flush())
+
+        out = b"".join(chunk["audio_bytes"] for chunk in outputs)
+        assert len(out) == len(ab)
+        assert all(chunk["sr"] == SR for chunk in outputs)
+        assert dominant_frequency(out) == pytest.approx(880, rel=0.03)
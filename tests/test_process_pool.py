@@ -0,0 +1,223 @@
+"""
+Unit Tests for Process Pools
+
+Tests for requests being spread across the least loaded replicas of a pool, for
+replicas that are not ready being drained, and for requests to real servers overlapping
+while they are in flight.
+"""
+
+import asyncio
+import shutil
+import threading
+import time
+import urllib.request
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from utils.helpers.blocking import run_blocking
+from utils.processes import ProcessType
+from utils.processes.base import BaseProcess
+from utils.processes.error import ProcessStartError, UnloadedProcessError
+from utils.processes.pool import ProcessPool
+from utils.processes.processes.koboldcpp import KoboldCPPProcess
+
+DELAY = 0.3
+
+
+class FakeProcess(BaseProcess):
+    def __init__(self, id):
+        super().__init__(id)
+        self.healthy = True
+        self.running = True
+        self.requests = 0
+        self.reloads = 0
+        self.unloads = 0
+
+    @property
+    def uri(self):
+        return "http://{}".format(self.id)
+
+    async def reload(self):
+        self.reloads += 1
+
+    async def unload(self):
+        self.unloads += 1
+
+    def is_running(self):
+        return self.running
+
+    def is_ready(self):
+        return self.running and self.healthy
+
+    @asynccontextmanager
+    async def track(self):
+        self.requests += 1
+        yield self
+
+
+def make_pool(replicas: int = 3):
+    return ProcessPool(
+        "test",
+        ProcessType.KOBOLD,
+        [FakeProcess("test-{}".format(i)) for i in range(replicas)],
+    )
+
+
+async def test_spreads_concurrent_requests():
+    pool = make_pool()
+    uris = list()
+
+    async def request():
+        async with pool.track() as server:
+            uris.append(server.uri)
+            await asyncio.sleep(0.05)
+
+    await asyncio.gather(*[request() for _ in range(3)])
+    assert sorted(uris) == ["http://test-0", "http://test-1", "http://test-2"]
+    assert all(count == 0 for count in pool.in_flight.values())
+
+
+async def test_takes_turns_when_idle():
+    pool = make_pool(2)
+    for _ in range(4):
+        async with pool.track():
+            pass
+    assert [replica.requests for replica in pool.replicas] == [2, 2]
+
+
+async def test_prefers_least_loaded():
+    pool = make_pool(2)
+    pool.in_flight["test-0"] = 2
+    for _ in range(3):
+        async with pool.track() as server:
+            assert server.id == "test-1"
+
+
+async def test_drains_unhealthy_replicas():
+    pool = make_pool(3)
+    pool.replicas[0].healthy = False
+    pool.replicas[2].healthy = False
+    for _ in range(4):
+        async with pool.track() as server:
+            assert server.id == "test-1"
+
+    # With none ready, requests still go somewhere to wait for a replica
+    pool.replicas[1].healthy = False
+    async with pool.track() as server:
+        assert server in pool.replicas
+
+
+async def test_skips_stopped_replicas():
+    pool = make_pool(2)
+    pool.replicas[0].running = False
+    pool.replicas[1].healthy = False
+    # Waits for the one starting rather than the one that won't
+    for _ in range(2):
+        async with pool.track() as server:
+            assert server.id == "test-1"
+
+    pool.replicas[1].running = False
+    with pytest.raises(UnloadedProcessError):
+        async with pool.track():
+            pass
+    assert all(count == 0 for count in pool.in_flight.values())
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(self.server.name.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def servers():
+    started = list()
+    for i in range(2):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        server.name = "test-{}".format(i)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        started.append(server)
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+async def test_real_requests_overlap(servers):
+    pool = make_pool(2)
+    for replica, server in zip(pool.replicas, servers):
+        replica.server_uri = "http://127.0.0.1:{}".format(server.server_port)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    def post(uri):
+        with urllib.request.urlopen(urllib.request.Request(uri, data=b"")) as response:
+            return response.read().decode()
+
+    async def request():
+        async with pool.track() as server:
+            # Off the event loop, so the next request is routed while this one runs
+            return await run_blocking(post, server.server_uri)
+
+    ticker = asyncio.create_task(tick())
+    start = time.perf_counter()
+    answers = await asyncio.gather(request(), request())
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+
+    assert sorted(answers) == ["test-0", "test-1"]
+    assert elapsed < DELAY * 1.8
+    assert ticks > DELAY / 0.01 / 2  # the loop kept running meanwhile
+
+
+async def test_links_every_replica():
+    pool = make_pool(2)
+    await pool.link("op")
+    assert all(replica.reloads == 1 for replica in pool.replicas)
+    assert pool.links == {"op"}
+    assert all(replica.links == {"op"} for replica in pool.replicas)
+    assert pool.get_stats()["links"] == ["op"]
+
+
+async def test_unloaded_when_last_link_removed():
+    process = FakeProcess("test")
+    await process.link("stt")
+    await process.link("t2t")
+    await process.unlink("stt")
+    assert process.unloads == 0
+    await process.unlink("t2t")
+    assert process.unloads == 1
+
+
+@pytest.mark.skipif(shutil.which("false") is None, reason="needs false command")
+async def test_started_again_on_link_after_failed_start():
+    process = KoboldCPPProcess(
+        "kobold",
+        {
+            "kobold_filepath": shutil.which("false"),
+            "kcpps_filepath": "missing.kcpps",
+            "ready_timeout": 5,
+        },
+    )
+    pool = ProcessPool("kobold", ProcessType.KOBOLD, [process])
+    with pytest.raises(ProcessStartError):
+        await pool.link("t2t")
+    assert process.supervisor is None
+    assert not pool.is_loaded()
+    assert process.links == set()
+
+    # Linking again tries to start it again rather than linking a stopped server
+    with pytest.raises(ProcessStartError):
+        await pool.link("t2t")
+    assert process.supervisor is None
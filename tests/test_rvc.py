@@ -0,0 +1,110 @@
+"""
+Unit Tests for Streaming RVC
+
+Tests for handing audio to the RVC worker through shared memory and for converting
+audio block by block with crossfaded overlaps, using a stand-in for the voice model.
+"""
+
+import numpy as np
+import pytest
+from utils.helpers.model_worker import ModelWorker
+from utils.helpers.audio import from_float, to_float
+from utils.helpers.shared_array import SharedArray
+from utils.operations.filter_audio.rvc import RVCFilter, convert
+
+SR = 16000
+
+
+class FakePipeline:
+    """Halves the volume, standing in for voice conversion"""
+
+    def __init__(self):
+        self.calls = list()
+        self.paths = list()
+
+    def pipeline(self, hubert, net_g, sid, audio, path, *args):
+        self.calls.append(len(audio))
+        self.paths.append(path)
+        return (audio * 0.5 * 32768).astype(np.int16)
+
+
+class FakeVC:
+    hubert_model, net_g, if_f0, version = None, None, 1, "v2"
+
+    def __init__(self, tgt_sr: int = SR):
+        self.tgt_sr = tgt_sr
+        self.pipeline = FakePipeline()
+
+
+def speech(seconds: float) -> np.ndarray:
+    t = np.arange(int(SR * seconds)) / SR
+    return (0.5 * np.sin(2 * np.pi * 220 * t) * np.sin(np.pi * t)).astype(np.float32)
+
+
+async def started_filter(vc: FakeVC, config_d: dict = {}) -> RVCFilter:
+    op = RVCFilter()
+    await op.configure({"voice": "test", **config_d})
+    op.worker = ModelWorker(lambda: vc, convert, name="rvc_test")
+    await op.worker.start()
+    return op
+
+
+class TestSharedArray:
+    def test_attached_sees_writes(self):
+        with SharedArray.create((4,), "<i2") as owner:
+            with SharedArray.attach(owner.ref) as other:
+                other.array[:] = [1, 2, 3, 4]
+            assert owner.array.tolist() == [1, 2, 3, 4]
+
+    def test_copy_of(self):
+        x = np.arange(6, dtype=np.float32).reshape(3, 2)
+        with SharedArray.copy_of(x) as shared:
+            assert np.array_equal(shared.array, x)
+            assert shared.ref[1:] == ((3, 2), "<f4")
+
+
+class TestRVCStream:
+    async def test_streamed_blocks_line_up(self):
+        vc = FakeVC()
+        op = await started_filter(vc, {"chunk_ms": 300, "overlap_ms": 50})
+        x = speech(1.3)
+        ab = from_float(x[:, None], 2)
+
+        stream, outputs = op.open_stream(), list()
+        for i in range(0, len(ab), 3200):
+            chunk = {"audio_bytes": ab[i : i + 3200], "sr": SR, "sw": 2, "ch": 1}
+            outputs.extend(await stream.feed(chunk))
+        assert len(outputs) > 1  # audio streamed out before the end
+        outputs.extend(await stream.flush())
+        await op.worker.stop()
+
+        y = to_float(b"".join(chunk["audio_bytes"] for chunk in outputs), 2, 1)[:, 0]
+        assert len(y) == pytest.approx(len(x), abs=2)
+        # Crossfading two identical renditions leaves the audio unchanged
+        n = min(len(x), len(y)) - 2
+        assert np.allclose(y[:n], x[:n] * 0.5, atol=2e-3)
+        assert all(length == SR * 350 // 1000 for length in vc.pipeline.calls[:-1])
+        # Pitch memoized by path is never reused for another block
+        assert len(set(vc.pipeline.paths)) == len(vc.pipeline.paths)
+
+        stats = op.stats()
+        assert stats["latency"]["count"] == len(vc.pipeline.calls)
+        assert stats["realTimeFactor"]["mean"] > 0
+
+    async def test_output_sample_rate(self):
+        op = await started_filter(FakeVC(tgt_sr=SR))
+        ab = from_float(np.zeros((2400, 1)), 2)
+        chunks = [
+            chunk async for chunk in op._generate(audio_bytes=ab, sr=24000, sw=2, ch=1)
+        ]
+        await op.worker.stop()
+
+        assert [(c["sr"], c["sw"], c["ch"]) for c in chunks] == [(SR, 2, 1)]
+        assert len(chunks[0]["audio_bytes"]) == pytest.approx(1600 * 2, abs=4)
+
+    async def test_configure(self):
+        op = RVCFilter()
+        with pytest.raises(AssertionError):
+            await op.configure({"voice": "test", "overlap_ms": 2000})
+        with pytest.raises(AssertionError):
+            await op.configure({"executor": "fork"})
@@ -0,0 +1,76 @@
+"""
+Unit Tests for Concurrent Multi-Speaker Transcription
+
+Tests for transcriptions running concurrently up to the backend's limit and coming back
+in the order they were given.
+"""
+
+import asyncio
+import time
+
+import pytest
+from utils.operations.base import UsedInactiveError
+from utils.operations.stt.base import STTOperation
+from utils.operations.stt.batch import transcribe_all
+
+DELAY = 0.05
+
+
+class SlowSTT(STTOperation):
+    """Transcribes audio as its first byte, after a delay"""
+
+    MAX_CONCURRENCY = 4
+
+    def __init__(self):
+        super().__init__("slow")
+        self.running = 0
+        self.most_running = 0
+
+    async def _generate(self, audio_bytes=None, **kwargs):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        # Later chunks finish first, so order has to be restored
+        await asyncio.sleep(DELAY * (1 + 1 / (1 + audio_bytes[0])))
+        self.running -= 1
+        if audio_bytes[0] == 255:
+            raise RuntimeError("Transcription failed")
+        yield {"transcription": str(audio_bytes[0])}
+
+
+def chunks(*firsts: int):
+    return [
+        {"audio_bytes": bytes([first, 0]), "sr": 16000, "sw": 2, "ch": 1}
+        for first in firsts
+    ]
+
+
+async def started(op: STTOperation) -> STTOperation:
+    await op.start()
+    return op
+
+
+async def test_concurrent_in_order():
+    op = await started(SlowSTT())
+    start = time.perf_counter()
+    assert await transcribe_all(op, chunks(0, 1, 2, 3)) == ["0", "1", "2", "3"]
+    assert time.perf_counter() - start < DELAY * 3
+    assert op.most_running == 4
+
+
+async def test_concurrency_limit():
+    op = await started(SlowSTT())
+    op.MAX_CONCURRENCY = 2
+    assert await transcribe_all(op, chunks(*range(6))) == [str(i) for i in range(6)]
+    assert op.most_running == 2
+
+
+async def test_error_after_all_finish():
+    op = await started(SlowSTT())
+    with pytest.raises(RuntimeError):
+        await transcribe_all(op, chunks(255, 1, 2))
+    assert op.running == 0
+
+
+async def test_inactive_op():
+    with pytest.raises(UsedInactiveError):
+        await transcribe_all(SlowSTT(), chunks(0))
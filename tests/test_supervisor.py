@@ -0,0 +1,110 @@
+"""
+Unit Tests for the Process Supervisor
+
+Tests for a stub server only being reported started once it answers HTTP, being
+restarted after crashing, and reporting its output and resource use.
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+
+import pytest
+from utils.config import Config
+from utils.processes.error import ProcessStartError
+from utils.processes.processes.koboldcpp import KoboldCPPProcess
+from utils.processes.supervisor import READY, ProcessSupervisor, http_ready
+
+STUB_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+
+
+def stub_supervisor(*flags, **kwargs):
+    return ProcessSupervisor(
+        "stub",
+        lambda port: [sys.executable, STUB_SERVER, str(port), *flags],
+        health_path="/health",
+        poll_interval=0.05,
+        backoff_initial=0.05,
+        **kwargs,
+    )
+
+
+async def test_started_once_ready():
+    supervisor = stub_supervisor("--delay", "0.5", ready_timeout=10)
+    try:
+        await supervisor.start()
+        assert supervisor.status == READY
+        assert await http_ready(supervisor.port, "/health")
+        assert "[stdout] loading model" in supervisor.get_logs()
+    finally:
+        await supervisor.stop()
+    assert supervisor.process.returncode is not None
+    assert not await http_ready(supervisor.port, "/health")
+
+
+async def test_ready_timeout():
+    supervisor = stub_supervisor("--delay", "30", ready_timeout=0.5)
+    with pytest.raises(ProcessStartError):
+        await supervisor.start()
+    assert supervisor.process.returncode is not None
+
+
+async def test_exits_before_ready():
+    supervisor = stub_supervisor("--fail", ready_timeout=10, start_attempts=2)
+    with pytest.raises(ProcessStartError) as err:
+        await supervisor.start()
+    assert "model file not found" in str(err.value)
+
+
+async def test_restarted_after_crash():
+    supervisor = stub_supervisor(ready_timeout=10)
+    try:
+        await supervisor.start()
+        pid = supervisor.process.pid
+        assert not await http_ready(supervisor.port, "/crash")
+        await supervisor.process.wait()
+        while supervisor.ready.is_set():
+            await asyncio.sleep(0.01)
+
+        async with supervisor.track():
+            # Waits for the restarted server
+            assert await http_ready(supervisor.port, "/health")
+        assert supervisor.restarts == 1
+        assert supervisor.process.pid != pid
+    finally:
+        await supervisor.stop()
+
+
+async def test_stats():
+    supervisor = stub_supervisor(ready_timeout=10)
+    try:
+        await supervisor.start()
+        async with supervisor.track():
+            await asyncio.sleep(0.01)
+        stats = supervisor.stats()
+        assert stats["status"] == READY
+        assert stats["pid"] == supervisor.process.pid
+        assert stats["memory"] > 0
+        assert stats["latency"]["count"] == 1
+        assert stats["latency"]["p50"] >= 0.01
+    finally:
+        await supervisor.stop()
+
+
+@pytest.mark.skipif(shutil.which("false") is None, reason="needs false command")
+async def test_kobold_started_again_on_link_after_failed_start(monkeypatch):
+    config = Config()
+    monkeypatch.setattr(config, "kobold_filepath", shutil.which("false"))
+    monkeypatch.setattr(config, "kcpps_filepath", "missing.kcpps")
+    monkeypatch.setattr(config, "kobold_ready_timeout", 5)
+    process = KoboldCPPProcess()
+    with pytest.raises(ProcessStartError):
+        await process.link("t2t")
+    assert process.supervisor is None
+    assert process.links == set()
+
+    # Linking again tries to start it again rather than linking a stopped server
+    with pytest.raises(ProcessStartError):
+        await process.link("t2t")
+    assert process.supervisor is None
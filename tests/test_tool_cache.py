@@ -0,0 +1,131 @@
+"""
+Unit Tests for the MCP Tool Result Cache
+
+Tests for results being reused until their TTL runs out, per-name policies,
+invalidation, and hit rates.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from utils.helpers.tool_cache import ToolResultCache, cache_key
+from utils.helpers.tool_calls import (
+    RESOURCE,
+    TOOL,
+    build_tool_index,
+    dispatch_tool_calls,
+    parse_tool_calls,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(config_d=None):
+    clock = Clock()
+    cache = ToolResultCache(clock=clock)
+    cache.configure(config_d or {})
+    return cache, clock
+
+
+def test_key_ignores_argument_order():
+    assert cache_key("t", {"a": 1, "b": [1, 2]}) == cache_key(
+        "t", {"b": [1, 2], "a": 1}
+    )
+    assert cache_key("t", {"a": 1}) != cache_key("t", {"a": 2})
+    assert cache_key("t", {}) != cache_key("u", {})
+
+
+def test_resources_expire_after_ttl():
+    cache, clock = make_cache({"resource_ttl": 10})
+    assert cache.get("notes", RESOURCE, {}) is None
+    cache.put("notes", RESOURCE, {}, "result")
+    clock.now = 9.9
+    assert cache.get("notes", RESOURCE, {}) == "result"
+    clock.now = 10.0
+    assert cache.get("notes", RESOURCE, {}) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_tools_not_cached_by_default():
+    cache, _ = make_cache()
+    cache.put("roll", TOOL, {}, "4")
+    assert cache.get("roll", TOOL, {}) is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_per_name_policies():
+    cache, clock = make_cache(
+        {"tools": {"weather": {"ttl": 600}, "notes": {"cacheable": False}}}
+    )
+    cache.put("weather", TOOL, {"city": "Oslo"}, "rain")
+    cache.put("notes", RESOURCE, {}, "shopping")
+    clock.now = 599
+    assert cache.get("weather", TOOL, {"city": "Oslo"}) == "rain"
+    assert cache.get("weather", TOOL, {"city": "Rome"}) is None
+    assert cache.get("notes", RESOURCE, {}) is None
+
+
+def test_invalidate():
+    cache, _ = make_cache()
+    for name, arguments in [("a", {"x": 1}), ("a", {"x": 2}), ("b", {})]:
+        cache.put(name, RESOURCE, arguments, "result")
+    assert cache.invalidate("a", {"x": 1}) == 1
+    assert cache.invalidate("a") == 1
+    assert cache.get("b", RESOURCE, {}) == "result"
+    assert cache.invalidate() == 1
+    assert cache.get("b", RESOURCE, {}) is None
+
+
+def test_evicts_least_recently_used():
+    cache, _ = make_cache({"max_entries": 2})
+    cache.put("a", RESOURCE, {}, "a")
+    cache.put("b", RESOURCE, {}, "b")
+    cache.get("a", RESOURCE, {})
+    cache.put("c", RESOURCE, {}, "c")
+    assert cache.get("b", RESOURCE, {}) is None
+    assert cache.get("a", RESOURCE, {}) == "a"
+
+
+def test_hit_rates():
+    cache, _ = make_cache()
+    cache.get("a", RESOURCE, {})
+    cache.put("a", RESOURCE, {}, "a")
+    for _ in range(3):
+        cache.get("a", RESOURCE, {})
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.75
+    assert stats["tools"]["a"]["hit_rate"] == 0.75
+
+
+class CountingClient:
+    def __init__(self):
+        self.tools = [SimpleNamespace(name="roll")]
+        self.resources = [SimpleNamespace(name="notes", uri="notes://all")]
+        self.templates = list()
+        self.limit = asyncio.Semaphore(4)
+        self.timeout = 1.0
+        self.calls = 0
+
+    async def call(self, entry, arguments):
+        self.calls += 1
+        return "{} {}".format(entry.target, self.calls)
+
+
+async def test_dispatch_reuses_cached_results():
+    cache, _ = make_cache()
+    clients = {"a": CountingClient()}
+    index = build_tool_index(clients)
+    calls = parse_tool_calls("<notes> {}\n<roll> {}")
+
+    first = await dispatch_tool_calls(calls, index, clients, cache=cache)
+    second = await dispatch_tool_calls(calls, index, clients, cache=cache)
+    assert first == [("notes", "notes://all 1"), ("roll", "roll 2")]
+    assert second == [("notes", "notes://all 1"), ("roll", "roll 3")]
+    assert clients["a"].calls == 3
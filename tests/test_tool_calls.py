@@ -0,0 +1,111 @@
+"""
+Unit Tests for MCP Tool Call Dispatch
+
+Tests for tool calls from one tooling response running concurrently within each server's
+limit, keeping their order, and failing on their own.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from utils.helpers.tool_calls import (
+    RESOURCE,
+    TEMPLATE,
+    TOOL,
+    ToolEntry,
+    build_tool_index,
+    dispatch_tool_calls,
+    parse_tool_calls,
+)
+
+DELAY = 0.1
+
+
+class FakeClient:
+    """Answers every call with its target after a delay"""
+
+    def __init__(self, names, max_concurrency=4, timeout=1.0):
+        self.tools = [SimpleNamespace(name=name) for name in names]
+        self.resources = list()
+        self.templates = list()
+        self.limit = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+        self.running = 0
+        self.most_running = 0
+
+    async def call(self, entry, arguments):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(arguments.get("delay", DELAY))
+        self.running -= 1
+        if arguments.get("fail"):
+            raise RuntimeError("server error")
+        return "{} {}".format(entry.target, arguments.get("n", ""))
+
+
+def test_parse_tool_calls():
+    calls = parse_tool_calls(
+        '<search> {"q": "cats"}\nnot a call\n<time>\n<broken> {nope\n<no-tool>'
+    )
+    assert [name for name, _ in calls] == ["search", "time", "broken", "no-tool"]
+    assert calls[0][1] == {"q": "cats"}
+    assert calls[1][1] == {}
+    assert isinstance(calls[2][1], Exception)
+
+
+def test_build_tool_index_first_server_wins():
+    first = SimpleNamespace(
+        tools=[SimpleNamespace(name="search")],
+        resources=[SimpleNamespace(name="notes", uri="notes://all")],
+        templates=[SimpleNamespace(name="wiki", uriTemplate="wiki://{page}")],
+    )
+    second = SimpleNamespace(
+        tools=[SimpleNamespace(name="search"), SimpleNamespace(name="time")],
+        resources=list(),
+        templates=list(),
+    )
+    index = build_tool_index({"first": first, "second": second})
+    assert index == {
+        "search": ToolEntry("first", TOOL, "search"),
+        "notes": ToolEntry("first", RESOURCE, "notes://all"),
+        "wiki": ToolEntry("first", TEMPLATE, "wiki://{page}"),
+        "time": ToolEntry("second", TOOL, "time"),
+    }
+
+
+async def test_calls_run_concurrently_in_order():
+    clients = {"a": FakeClient(["slow", "fast"]), "b": FakeClient(["other"])}
+    index = build_tool_index(clients)
+    calls = parse_tool_calls(
+        '<slow> {"n": 1, "delay": 0.3}\n<fast> {"n": 2}\n<other> {"n": 3}'
+    )
+
+    start = time.perf_counter()
+    results = await dispatch_tool_calls(calls, index, clients)
+    elapsed = time.perf_counter() - start
+
+    assert results == [("slow", "slow 1"), ("fast", "fast 2"), ("other", "other 3")]
+    assert elapsed < 0.3 + DELAY
+
+
+async def test_concurrency_limited_per_server():
+    clients = {"a": FakeClient(["tool"], max_concurrency=2)}
+    calls = parse_tool_calls("\n".join('<tool> {"n": %d}' % i for i in range(6)))
+    results = await dispatch_tool_calls(calls, build_tool_index(clients), clients)
+    assert [result for _, result in results] == ["tool {}".format(i) for i in range(6)]
+    assert clients["a"].most_running == 2
+
+
+async def test_failures_and_timeouts_reported_alone():
+    clients = {"a": FakeClient(["tool"], timeout=DELAY * 2)}
+    calls = parse_tool_calls(
+        '<tool> {"n": 1}\n<tool> {"fail": true}\n<tool> {"delay": 1}\n'
+        "<tool> {bad json\n<unknown> {}"
+    )
+    results = await dispatch_tool_calls(calls, build_tool_index(clients), clients)
+    assert [name for name, _ in results] == ["tool"] * 4
+    assert results[0][1] == "tool 1"
+    assert "server error" in results[1][1]
+    assert "no result after" in results[2][1]
+    assert results[3][1].startswith("Attempt to use MCP tool failed")
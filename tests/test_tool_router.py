@@ -0,0 +1,144 @@
+"""
+Unit Tests for the MCP Tool Router
+
+Tests for planning being skipped when no tool is relevant to the conversation, for
+only relevant tools being offered when some are, and for only what was said being
+compared with tools.
+"""
+
+import datetime
+
+import numpy as np
+from utils.helpers.tool_router import ToolRouter, tokenize
+from utils.prompter.message import ChatMessage, MCPMessage
+
+NOW = datetime.datetime.now()
+
+CATALOGUE = {
+    "get_weather": "Current weather and forecast for a city",
+    "search_web": "Search the internet for pages about a topic",
+    "roll_dice": "Roll dice for games, returning the total",
+    "read_notes": "Read the streamer's saved notes",
+}
+
+
+def make_router(config_d=None):
+    router = ToolRouter()
+    router.configure(config_d or {})
+    router.set_catalogue(CATALOGUE)
+    return router
+
+
+def test_tokenize():
+    assert tokenize("getWeather get_forecast for Cities") == {
+        "weather",
+        "forecast",
+        "citie",
+    }
+    assert tokenize("a an to") == set()
+
+
+async def test_skips_planning_without_relevant_tools():
+    router = make_router()
+    assert await router.route("[user]: haha that was a funny joke") == []
+
+
+async def test_offers_relevant_tools():
+    router = make_router()
+    assert await router.route("[user]: what's the weather like today?") == [
+        "get_weather"
+    ]
+    assert await router.route("[user]: can you roll some dice") == ["roll_dice"]
+
+
+async def test_one_tool_catalogue():
+    router = ToolRouter()
+    router.configure({})
+    router.set_catalogue({"get_weather": "Current weather for a city"})
+    assert await router.route("[user]: what is the weather in Paris?") == [
+        "get_weather"
+    ]
+    assert await router.route("[user]: haha that was a funny joke") == []
+
+
+async def test_two_tool_catalogue():
+    router = ToolRouter()
+    router.configure({})
+    router.set_catalogue(
+        {
+            "get_weather": "Current weather for a city",
+            "get_time": "Current time in a city",
+        }
+    )
+    # One word only that tool uses is enough
+    assert await router.route("[user]: what is the weather?") == ["get_weather"]
+    # A word both use is not, but with another it is
+    assert await router.route("[user]: anything current?") == []
+    assert await router.route("[user]: current time here") == ["get_time"]
+
+
+async def test_speaker_names_not_compared():
+    router = ToolRouter()
+    router.configure({})
+    router.set_catalogue(
+        {
+            "save_note": "Save a note the user asked to remember",
+            "get_weather": "Current weather for a city",
+        }
+    )
+    messages = [ChatMessage("user", "haha that was a funny joke", NOW)]
+    assert router.query_text(messages) == "haha that was a funny joke"
+    assert await router.route(router.query_text(messages)) == []
+
+
+async def test_tool_results_not_compared():
+    router = make_router({"query_lines": 2})
+    messages = [
+        ChatMessage("user", "what's the weather in Paris?", NOW),
+        MCPMessage("get_weather", "Sunny, 24C in Paris", NOW),
+        ChatMessage("Voxelle", "It's sunny there!", NOW),
+        ChatMessage("user", "haha nice", NOW),
+    ]
+    # Earlier results naming the tool don't keep offering it
+    assert router.query_text(messages) == "It's sunny there!\nhaha nice"
+    assert await router.route(router.query_text(messages)) == []
+
+    # A question about it does, until it drops out of the latest lines
+    assert await router.route(router.query_text(messages[:2])) == ["get_weather"]
+
+
+async def test_always_offers_everything():
+    router = make_router({"mode": "always"})
+    assert await router.route("[user]: hello") == list(CATALOGUE)
+
+
+async def test_empty_catalogue():
+    router = ToolRouter()
+    router.configure({"mode": "always"})
+    assert await router.route("anything") == []
+
+
+async def test_max_tools():
+    router = make_router({"max_tools": 1, "keyword_threshold": 0.1})
+    assert len(await router.route("search the weather notes")) == 1
+
+
+async def test_embedding_mode():
+    names = list(CATALOGUE)
+
+    async def embed(texts):
+        # The query points the same way as the weather tool
+        vectors = np.eye(len(texts), 8, dtype=np.float32)
+        vectors[-1] = vectors[names.index("get_weather")]
+        return vectors
+
+    router = make_router({"mode": "embedding"})
+    assert await router.route("anything", embed=embed) == ["get_weather"]
+
+
+async def test_embedding_mode_falls_back_to_keywords():
+    async def no_embedding(texts):
+        return None
+
+    router = make_router({"mode": "embedding"})
+    assert await router.route("roll the dice", embed=no_embedding) == ["roll_dice"]
@@ -0,0 +1,173 @@
+"""
+Unit Tests for Voice Activity Segmentation and Streaming STT
+
+Tests for where speech segments open and close, streamed input matching input given
+all at once, segments being transcribed in order as they close, and streams being
+cancelled with whatever follows them.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+from utils.helpers.audio import AudioFormat, from_float
+from utils.helpers.vad import VADSegmenter
+from utils.operations.base import UsedInactiveError
+from utils.operations.stt.base import STTOperation
+from utils.operations.stt.stream import open_stt_stream
+
+FMT = AudioFormat(16000, 2, 1)
+
+
+def noise(seconds: float, rng=np.random.default_rng(0)) -> np.ndarray:
+    return rng.normal(0, 0.003, int(FMT.sr * seconds))
+
+
+def voice(seconds: float) -> np.ndarray:
+    t = np.arange(int(FMT.sr * seconds)) / FMT.sr
+    return 0.3 * np.sin(2 * np.pi * 200 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+
+
+def pcm(*parts: np.ndarray) -> bytes:
+    return from_float(np.concatenate(parts)[:, None], FMT.sw)
+
+
+def segment(segmenter: VADSegmenter, ab: bytes, chunk_len: int = 1234):
+    segments = list()
+    for i in range(0, len(ab), chunk_len):
+        segments.extend(segmenter.feed(ab[i : i + chunk_len]))
+    return segments + segmenter.flush()
+
+
+class TestVADSegmenter:
+    def test_segments_speech(self):
+        ab = pcm(noise(1), voice(1.2), noise(1.5), voice(0.8), noise(1))
+        segments = segment(VADSegmenter(FMT, silence_ms=500), ab)
+
+        assert len(segments) == 2
+        first, second = segments
+        # Opened with pre-roll before the speech, closed after silence_ms without it
+        assert 700 <= first["start_ms"] <= 1000
+        assert 2200 < first["end_ms"] <= 2800
+        assert 3400 <= second["start_ms"] <= 3700
+        ab_per_ms = FMT.sr * FMT.sw // 1000
+        assert (
+            len(first["audio_bytes"])
+            == (first["end_ms"] - first["start_ms"]) * ab_per_ms
+        )
+
+    def test_short_pause_kept_in_segment(self):
+        ab = pcm(noise(1), voice(0.6), noise(0.2), voice(0.6), noise(1))
+        assert len(segment(VADSegmenter(FMT, silence_ms=500), ab)) == 1
+
+    def test_clicks_ignored(self):
+        ab = pcm(noise(1), voice(0.04), noise(1))
+        assert segment(VADSegmenter(FMT, min_speech_ms=100), ab) == []
+
+    def test_max_segment_length(self):
+        ab = pcm(noise(0.5), voice(3), noise(1))
+        segments = segment(VADSegmenter(FMT, max_segment_ms=1000), ab)
+        assert len(segments) >= 3
+        assert all(s["end_ms"] - s["start_ms"] <= 1000 for s in segments)
+
+    def test_open_segment_flushed(self):
+        ab = pcm(noise(0.5), voice(1))
+        segmenter = VADSegmenter(FMT)
+        assert segmenter.feed(ab) == []
+        assert segmenter.in_speech
+        assert len(segmenter.flush()) == 1
+
+    def test_streamed_matches_whole(self):
+        ab = pcm(noise(1), voice(1), noise(1), voice(0.5), noise(1))
+        whole = segment(VADSegmenter(FMT), ab, len(ab))
+        assert segment(VADSegmenter(FMT), ab, 321) == whole
+
+    def test_stereo(self):
+        x = np.concatenate([noise(1), voice(1), noise(1)])
+        ab = from_float(np.stack([x, x], axis=1), 2)
+        segments = segment(VADSegmenter(AudioFormat(16000, 2, 2)), ab)
+        assert len(segments) == 1
+
+
+class FakeSTT(STTOperation):
+    """Transcribes each segment as its length, after a delay"""
+
+    def __init__(self):
+        super().__init__("fake")
+        self.prompts = list()
+
+    async def _generate(self, prompt=None, audio_bytes=None, sr=None, **kwargs):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        yield {"transcription": "{} ms ".format(len(audio_bytes) * 500 // sr)}
+
+
+class TestSTTStream:
+    async def test_segments_transcribed_in_order(self):
+        op = FakeSTT()
+        await op.start()
+        stream = open_stt_stream(op, FMT, prompt="History.", silence_ms=300)
+
+        ab = pcm(noise(0.5), voice(0.5), noise(0.6), voice(0.7), noise(0.1))
+        for i in range(0, len(ab), 640):
+            stream.feed(ab[i : i + 640])
+        await asyncio.sleep(0.05)
+        # The first segment is transcribed while the second is still open
+        assert len(op.prompts) == 1
+        stream.close()
+
+        results = [result async for result in stream]
+        assert len(results) == 2
+        assert results[0]["start_ms"] < results[1]["start_ms"]
+        assert op.prompts[0] == "History."
+        assert op.prompts[1] == "History. " + results[0]["transcription"]
+
+    async def test_collect_gives_partial_transcriptions(self):
+        op = FakeSTT()
+        await op.start()
+        stream = open_stt_stream(op, FMT, silence_ms=300)
+        stream.feed(pcm(noise(0.5), voice(0.5), noise(0.6), voice(0.7), noise(0.1)))
+        stream.close()
+
+        partials = list()
+
+        async def on_result(result, partial):
+            partials.append(partial)
+
+        content = await stream.collect(on_result)
+        assert len(partials) == 2
+        assert partials[0] and partials[1].startswith(partials[0])
+        assert content == partials[-1]
+
+    async def test_cancelling_collect_cancels_stream(self):
+        op = FakeSTT()
+        await op.start()
+        stream = open_stt_stream(op, FMT)
+        stream.feed(pcm(noise(0.5), voice(0.5)))
+
+        collecting = asyncio.create_task(stream.collect())
+        await asyncio.sleep(0.05)
+        collecting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await collecting
+        await asyncio.sleep(0)
+        assert stream.closed
+        assert stream.worker.cancelled()
+
+    async def test_errors_raised_to_reader(self):
+        class BrokenSTT(FakeSTT):
+            async def _generate(self, **kwargs):
+                raise RuntimeError("STT down")
+                yield
+
+        op = BrokenSTT()
+        await op.start()
+        stream = open_stt_stream(op, FMT)
+        stream.feed(pcm(noise(0.5), voice(0.5)))
+        stream.close()
+        with pytest.raises(RuntimeError):
+            [result async for result in stream]
+
+    async def test_inactive_op(self):
+        with pytest.raises(UsedInactiveError):
+            open_stt_stream(FakeSTT(), FMT)